@@ -0,0 +1,89 @@
+"""
+Micro-benchmark de las estrategias de normalización (engine.normalization)
+Genera un histórico sintético (indicadores con registros mensuales, algunos sin
+valor o sin fecha, con y sin Meta) y mide, para cada estrategia del registro, el
+kernel sobre todos los COD a la vez y la normalización completa del dataset con ese
+Calculo en todos los indicadores:
+
+    python benchmark_normalization.py
+    python benchmark_normalization.py --indicadores 5000 --anios 10 --repeticiones 7 --estrategia promedio
+"""
+
+import argparse
+import sys
+import time
+import numpy as np
+import pandas as pd
+from engine.normalization import ESTRATEGIAS, NormalizationEngine
+
+def synthetic_dataset(indicadores, anios, semilla=0):
+    """Histórico mensual sintético: un 10 % de registros sin valor y un 1 % sin fecha"""
+    rng = np.random.default_rng(semilla)
+    meses = anios * 12
+    cod = np.repeat(np.arange(indicadores), meses)
+    fechas = (np.datetime64('2010-01', 'M') + np.tile(np.arange(meses), indicadores)).astype('datetime64[ns]')
+    fechas[rng.random(len(cod)) < 0.01] = np.datetime64('NaT')
+
+    nivel = rng.uniform(10, 1000, indicadores)[cod]
+    valor = nivel * (1 + 0.2 * rng.standard_normal(len(cod)))
+    valor[rng.random(len(cod)) < 0.10] = np.nan
+    meta = np.where(rng.random(indicadores) < 0.5, rng.uniform(10, 1000, indicadores), np.nan)[cod]
+
+    return pd.DataFrame({
+        'COD': pd.Categorical.from_codes(cod, [f"IND{i:05d}" for i in range(indicadores)]).astype(object),
+        'Fecha': fechas,
+        'Valor': valor,
+        'Meta': meta
+    })
+
+def measure(funcion, repeticiones):
+    """Mejor tiempo y mediana (s) de varias ejecuciones"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos), float(np.median(tiempos))
+
+def benchmark(df, estrategias, repeticiones):
+    """Tiempos del marco, de cada kernel y de la normalización completa por estrategia"""
+    cod, _ = pd.factorize(df['COD'], sort=False)
+    fechas = df['Fecha'].to_numpy(dtype='datetime64[ns]')
+    valor = df['Valor'].to_numpy(dtype=float)
+    meta = df.groupby(cod, sort=True)['Meta'].first().to_numpy(dtype=float)
+
+    mejor, mediana = measure(lambda: NormalizationEngine.build_frame(cod, fechas, valor, meta), repeticiones)
+    print(f"🧱 Marco (orden y cubetas): {mejor * 1000:.1f} ms (mediana {mediana * 1000:.1f} ms)")
+    marco, _ = NormalizationEngine.build_frame(cod, fechas, valor, meta)
+
+    print(f"{'Estrategia':<16}{'Kernel (ms)':>14}{'Completa (ms)':>16}{'Registros/s':>16}")
+    for nombre in estrategias:
+        kernel = ESTRATEGIAS[nombre]
+        mejor_kernel, _ = measure(lambda: kernel(marco), repeticiones)
+        con_calculo = df.assign(Calculo=nombre)
+        mejor_total, _ = measure(lambda: NormalizationEngine.normalize(con_calculo), repeticiones)
+        print(f"{nombre:<16}{mejor_kernel * 1000:>14.1f}{mejor_total * 1000:>16.1f}{len(df) / mejor_total:>16,.0f}")
+
+def main(argv=None):
+    """Punto de entrada de línea de comandos"""
+    parser = argparse.ArgumentParser(description="Micro-benchmark de las estrategias de normalización")
+    parser.add_argument('--indicadores', type=int, default=2000,
+                        help="Indicadores sintéticos (por defecto: %(default)s)")
+    parser.add_argument('--anios', type=int, default=8,
+                        help="Años de registros mensuales por indicador (por defecto: %(default)s)")
+    parser.add_argument('--repeticiones', type=int, default=5,
+                        help="Ejecuciones por medición; se informa la mejor (por defecto: %(default)s)")
+    parser.add_argument('--estrategia', action='append', choices=sorted(ESTRATEGIAS),
+                        help="Estrategia a medir (repetible; por defecto: todas)")
+    args = parser.parse_args(argv)
+
+    df = synthetic_dataset(args.indicadores, args.anios)
+    print("⏱️ Micro-benchmark de normalización")
+    print("=" * 62)
+    print(f"📊 {len(df):,} registros · {args.indicadores:,} indicadores · {args.anios} años mensuales")
+    benchmark(df, args.estrategia or list(ESTRATEGIAS), max(1, args.repeticiones))
+    print("=" * 62)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
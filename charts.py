@@ -12,6 +12,8 @@ from plotly.subplots import make_subplots
 import plotly.colors as pc
 import plotly.io as pio
 from datetime import datetime, timedelta
+from engine import PeriodMatrixBuilder
+from fingerprint import code_fingerprint
 
 # Plantilla global IDECA: fuente y color de texto institucionales en todas las gráficas
 pio.templates["ideca"] = go.layout.Template(
@@ -194,8 +196,16 @@ class ChartGenerator:
             return ChartGenerator._create_error_chart("Error en barras")
     
     @staticmethod
-    def evolution_chart(df, indicador=None, componente=None, tipo_grafico="Línea", mostrar_meta=True):
-        """Crear gráfico de evolución temporal"""
+    def evolution_chart(df, indicador=None, componente=None, tipo_grafico="Línea", mostrar_meta=True, matriz=None,
+                        proyeccion=None):
+        """
+        Crear gráfico de evolución temporal. Con matriz (PeriodMatrix), la evolución
+        general o de un componente promedia los indicadores alineados por periodo
+        (último valor de cada uno al cierre del periodo) en lugar de agrupar por
+        fechas de reporte, que rara vez coinciden entre indicadores. Con proyeccion
+        (filas de un indicador y un método de ForecastEngine.forecast) se superpone
+        la tendencia proyectada del indicador con su intervalo
+        """
         try:
             if df.empty:
                 return ChartGenerator._create_empty_chart("No hay datos de evolución")
@@ -249,6 +259,26 @@ class ChartGenerator:
 
                 fig.update_traces(line=dict(color='#003A5B'), marker=dict(color='#003A5B'))
 
+                if proyeccion is not None and not proyeccion.empty:
+                    # Misma escala que el histórico: % de la Meta si el indicador la tiene
+                    escala = meta_valor if tiene_meta else 1.0
+                    proyectado = proyeccion.sort_values('Fecha')
+                    fig.add_trace(go.Scatter(
+                        x=proyectado['Fecha'], y=proyectado['Inferior'] / escala, mode='lines',
+                        line=dict(width=0), hoverinfo='skip', showlegend=False
+                    ))
+                    fig.add_trace(go.Scatter(
+                        x=proyectado['Fecha'], y=proyectado['Superior'] / escala, mode='lines',
+                        line=dict(width=0), fill='tonexty', fillcolor='rgba(254, 180, 0, 0.2)',
+                        name='Intervalo', hoverinfo='skip'
+                    ))
+                    fig.add_trace(go.Scatter(
+                        x=proyectado['Fecha'], y=proyectado['Proyeccion'] / escala, mode='lines',
+                        name='Tendencia proyectada', line=dict(color='#FEB400', width=2, dash='dash'),
+                        hovertemplate=('<b>Cierre %{x|%d/%m/%Y}</b><br>Proyección: '
+                                       + ('%{y:.1%}' if tiene_meta else '%{y:.3f}') + '<extra></extra>')
+                    ))
+
                 layout_kwargs = dict(
                     height=400,
                     margin=dict(l=20, r=20, t=40, b=20),
@@ -272,7 +302,15 @@ class ChartGenerator:
                 # Gráfico de evolución general/por componente (promedio del puntaje normalizado
                 # entre indicadores): mantiene la escala 0-1 porque agrega indicadores con
                 # unidades distintas, donde el valor recalculado no es comparable.
-                df_grouped = df_filtered.groupby('Fecha')['Valor_Normalizado'].mean().reset_index()
+                if matriz is not None and len(matriz) > 0:
+                    df_grouped = (PeriodMatrixBuilder.group_mean(matriz, PeriodMatrixBuilder.rows(matriz, componente))
+                                  .rename(columns={'Valor': 'Valor_Normalizado'}))
+                    if df_grouped.empty:
+                        return ChartGenerator._create_empty_chart("No hay datos para el filtro seleccionado")
+                    custom_data = ['N_Indicadores', 'N_Observados']
+                else:
+                    df_grouped = df_filtered.groupby('Fecha')['Valor_Normalizado'].mean().reset_index()
+                    custom_data = None
 
                 if tipo_grafico == "Línea":
                     fig = px.line(
@@ -280,17 +318,25 @@ class ChartGenerator:
                         x='Fecha',
                         y='Valor_Normalizado',
                         title="Evolución General (Promedio)",
-                        markers=True
+                        markers=True,
+                        custom_data=custom_data
                     )
                 else:  # Barras
                     fig = px.bar(
                         df_grouped,
                         x='Fecha',
                         y='Valor_Normalizado',
-                        title="Evolución General (Promedio)"
+                        title="Evolución General (Promedio)",
+                        custom_data=custom_data
                     )
 
                 fig.update_traces(line=dict(color='#7A97A8'), marker=dict(color='#7A97A8'))
+                if custom_data:
+                    fig.update_traces(
+                        hovertemplate=('<b>Cierre %{x|%d/%m/%Y}</b><br>Promedio: %{y:.1%}<br>'
+                                       'Indicadores con dato: %{customdata[0]}<br>'
+                                       'Con registro en el periodo: %{customdata[1]}<extra></extra>')
+                    )
 
                 if mostrar_meta:
                     fig.add_hline(
@@ -315,8 +361,12 @@ class ChartGenerator:
             return ChartGenerator._create_error_chart("Error en evolución")
 
     @staticmethod
-    def ice_historical_evolution_chart(df_historico):
-        """Gráfico de evolución semestral del puntaje general ICE"""
+    def ice_historical_evolution_chart(df_historico, bandas=None):
+        """
+        Gráfico de evolución semestral del puntaje general ICE. Con bandas (salida de
+        calculate_ice_uncertainty_bands) se dibujan bajo la línea las franjas P5–P95 y
+        P25–P75 del puntaje general ante la imputación de los datos faltantes
+        """
         try:
             if df_historico is None or df_historico.empty:
                 return ChartGenerator._create_empty_chart("No hay suficiente histórico para calcular la evolución del ICE")
@@ -337,6 +387,37 @@ class ChartGenerator:
                 hovertemplate='<b>%{x|%b %Y}</b><br>Puntaje ICE: %{y:.1%}<br>Indicadores usados: %{customdata[0]}<extra></extra>'
             )
 
+            if bandas is not None and not bandas.empty:
+                general = bandas[bandas['Nivel'] == 'General'].sort_values('Fecha_Corte')
+                franjas = [('P5', 'P95', 'rgba(0, 58, 91, 0.12)', 'Banda 90%'),
+                           ('P25', 'P75', 'rgba(0, 58, 91, 0.25)', 'Banda 50%')]
+                trazas = []
+                for inferior, superior, color, nombre in franjas:
+                    if inferior not in general.columns or superior not in general.columns:
+                        continue
+                    trazas.append(go.Scatter(
+                        x=general['Fecha_Corte'], y=general[inferior], mode='lines',
+                        line=dict(width=0), hoverinfo='skip', showlegend=False
+                    ))
+                    trazas.append(go.Scatter(
+                        x=general['Fecha_Corte'], y=general[superior], mode='lines',
+                        line=dict(width=0), fill='tonexty', fillcolor=color, name=nombre,
+                        customdata=np.stack([general[inferior], general['Cobertura']], axis=-1),
+                        hovertemplate=(f'<b>%{{x|%b %Y}}</b><br>{nombre}: %{{customdata[0]:.1%}} – %{{y:.1%}}'
+                                       '<br>Peso con dato observado: %{customdata[1]:.0%}<extra></extra>')
+                    ))
+                if 'P50' in general.columns:
+                    trazas.append(go.Scatter(
+                        x=general['Fecha_Corte'], y=general['P50'], mode='lines', name='Mediana simulada',
+                        line=dict(color='#7A97A8', width=1.5, dash='dot'),
+                        hovertemplate='<b>%{x|%b %Y}</b><br>Mediana simulada: %{y:.1%}<extra></extra>'
+                    ))
+                # Las franjas van primero para quedar debajo de la línea del puntaje
+                fig.data[0].update(name='Puntaje ICE', showlegend=True)
+                fig.add_traces(trazas)
+                fig.data = fig.data[1:] + fig.data[:1]
+                fig.update_layout(legend=dict(orientation='h', yanchor='bottom', y=-0.35))
+
             fig.add_hline(
                 y=1.0,
                 line_dash="dash",
@@ -358,6 +439,107 @@ class ChartGenerator:
             st.error(f"Error en gráfico de evolución histórica del ICE: {e}")
             return ChartGenerator._create_error_chart("Error en evolución histórica del ICE")
 
+    @staticmethod
+    def correlation_heatmap(correlaciones, etiquetas=None):
+        """
+        Mapa de calor de la correlación entre indicadores (salida de
+        CorrelationEngine.pairwise), ordenado por componente. Con etiquetas se
+        limita a esos indicadores; las celdas sin periodos suficientes quedan vacías
+        """
+        try:
+            indicadores = correlaciones['indicadores']
+            if etiquetas is not None:
+                indicadores = indicadores.loc[list(etiquetas)]
+            indicadores = indicadores.sort_values(['Componente', 'COD'], na_position='last')
+            if len(indicadores) < 2:
+                return ChartGenerator._create_empty_chart("Se requieren al menos 2 indicadores para correlacionar")
+
+            orden = indicadores.index
+            matriz = correlaciones['correlacion'].loc[orden, orden]
+            periodos = correlaciones['periodos'].loc[orden, orden]
+            nombres = indicadores['Indicador'].astype(str).to_numpy()
+
+            fig = go.Figure(go.Heatmap(
+                z=matriz.to_numpy(),
+                x=list(orden),
+                y=list(orden),
+                zmin=-1, zmax=1,
+                colorscale=[[0, '#E3192F'], [0.5, '#F5F5F5'], [1, '#003A5B']],
+                colorbar=dict(title='r'),
+                customdata=np.dstack([
+                    np.broadcast_to(nombres[:, None], matriz.shape),
+                    np.broadcast_to(nombres[None, :], matriz.shape),
+                    periodos.to_numpy()
+                ]),
+                hovertemplate=('<b>%{customdata[0]}</b><br>vs <b>%{customdata[1]}</b><br>'
+                               'Correlación: %{z:.2f}<br>Periodos en común: %{customdata[2]}<extra></extra>'),
+                hoverongaps=False
+            ))
+
+            # Separadores entre componentes
+            componentes = indicadores['Componente'].to_numpy()
+            limites = np.flatnonzero(componentes[1:] != componentes[:-1])
+            for limite in limites:
+                fig.add_hline(y=limite + 0.5, line_width=1, line_color='#7A97A8')
+                fig.add_vline(x=limite + 0.5, line_width=1, line_color='#7A97A8')
+
+            lado = min(900, max(400, 18 * len(orden)))
+            fig.update_layout(
+                title="Correlación entre indicadores",
+                height=lado,
+                margin=dict(l=20, r=20, t=40, b=20),
+                xaxis=dict(showticklabels=len(orden) <= 40, tickangle=-45),
+                yaxis=dict(showticklabels=len(orden) <= 40, autorange='reversed')
+            )
+            return fig
+
+        except Exception as e:
+            st.error(f"Error en mapa de correlación: {e}")
+            return ChartGenerator._create_error_chart("Error en correlación")
+
+    @staticmethod
+    def entity_comparison_chart(entity_cube):
+        """Barras agrupadas por entidad: puntaje general y de cada componente"""
+        try:
+            if entity_cube is None or entity_cube.empty:
+                return ChartGenerator._create_empty_chart("No hay datos para comparar entidades")
+
+            niveles = entity_cube[entity_cube['Nivel'].isin(['General', 'Componente'])].copy()
+            niveles['Serie'] = niveles['Componente'].where(niveles['Nivel'] == 'Componente', 'General')
+            entidades = list(pd.unique(niveles['Entidad']))
+            series = ['General'] + sorted(s for s in niveles['Serie'].unique() if s != 'General')
+            paleta = ['#003A5B', '#7A97A8', '#FEB400', '#E3192F', '#6A8D73', '#B07AA1', '#4E79A7']
+
+            fig = go.Figure()
+            for i, serie in enumerate(series):
+                datos = niveles[niveles['Serie'] == serie].set_index('Entidad').reindex(entidades)
+                fig.add_trace(go.Bar(
+                    x=entidades,
+                    y=datos['Puntaje_Ponderado'],
+                    name=serie,
+                    marker_color=paleta[i % len(paleta)],
+                    text=[f"{v:.1%}" if pd.notna(v) else "" for v in datos['Puntaje_Ponderado']],
+                    textposition='auto',
+                    hovertemplate=f'<b>%{{x}}</b><br>{serie}: %{{y:.1%}}<extra></extra>'
+                ))
+
+            fig.update_layout(
+                title="Comparación entre Entidades",
+                barmode='group',
+                height=450,
+                margin=dict(l=20, r=20, t=40, b=20),
+                yaxis=dict(tickformat='.0%', range=[0, 1.1]),
+                xaxis_title="Entidad",
+                yaxis_title="Puntaje Normalizado",
+                legend_title="Nivel"
+            )
+
+            return fig
+
+        except Exception as e:
+            st.error(f"Error en comparación entre entidades: {e}")
+            return ChartGenerator._create_error_chart("Error en comparación entre entidades")
+
     @staticmethod
     def horizontal_bar_chart(df, componente=None, categoria=None, fecha_filtro=None):
         """Crear gráfico de barras horizontales para categorías - CORREGIDO"""
@@ -783,3 +965,19 @@ class MetricsDisplay:
                     
         except Exception as e:
             st.error(f"Error al mostrar métricas del componente: {e}")
+
+_FIGURAS_VERSION = code_fingerprint(ChartGenerator, PeriodMatrixBuilder)
+
+@st.cache_data(persist="disk", show_spinner=False, max_entries=256)
+def _cached_figure(nombre, huella, parametros, version, _construir):
+    return _construir()
+
+def cached_figure(nombre, huella, construir, *parametros):
+    """
+    Figura Plotly memoizada por (nombre, huella del dataset, parámetros): mientras
+    los datos no cambien no se vuelve a construir, ni en otra sesión ni en otro
+    proceso (caché en disco). Sin huella se construye directamente
+    """
+    if huella is None:
+        return construir()
+    return _cached_figure(nombre, huella, parametros, _FIGURAS_VERSION, construir)
@@ -1,9 +1,12 @@
 """"
 Configuración y estilos para el Dashboard ICE - SIN TEMA OSCURO
+Las constantes (*_CONFIG, mapeos, tipos) no dependen de Streamlit: el motor (engine)
+las importa también desde hilos de fondo, CLI y procesos de trabajo. Las funciones de
+interfaz importan Streamlit al usarse
 """
-import streamlit as st
 import base64
 import os
+from functools import lru_cache
 
 # ============================================================
 # PALETA DE COLOR IDECA (manual de marca)
@@ -167,6 +170,7 @@ ICE_COMPONENTS_INFO = [
 
 def configure_page():
     """Configurar la página de Streamlit"""
+    import streamlit as st
     st.set_page_config(
         page_title="Dashboard ICE - Google Sheets",
         page_icon="🏢",
@@ -176,19 +180,21 @@ def configure_page():
 
 
 
+@lru_cache(maxsize=None)
+def img_to_base64(img_path):
+    """Convertir imagen a base64 (cacheado: los logos se codifican una sola vez por proceso)"""
+    try:
+        if os.path.exists(img_path):
+            with open(img_path, "rb") as img_file:
+                return base64.b64encode(img_file.read()).decode()
+    except:
+        pass
+    return None
+
 def create_banner():
     """Crear banner superior + título centrado fuera"""
+    import streamlit as st
     
-    # Función auxiliar para convertir imagen a base64
-    def img_to_base64(img_path):
-        try:
-            if os.path.exists(img_path):
-                with open(img_path, "rb") as img_file:
-                    return base64.b64encode(img_file.read()).decode()
-        except:
-            pass
-        return None
-
     # Intentar cargar las imágenes
     logo_gov = img_to_base64("images/logo_gov.png")
     logo_bogota = img_to_base64("images/logo_bogota.png") 
@@ -314,6 +320,7 @@ def create_banner():
 
 def apply_dark_theme():
     """Aplicar estilos - PALETA IDECA (azul #003A5B) Y FUENTE NUNITO SANS"""
+    import streamlit as st
     st.markdown("""
     <style>
         /* FUENTE INSTITUCIONAL - NUNITO SANS */
@@ -511,7 +518,136 @@ GOOGLE_SHEETS_CONFIG = {
         'COD', 'Nombre de indicador', 'Valor', 'Fecha', 'Tipo'
     ],
     'cache_ttl_seconds': 30,
-    'max_retries': 3
+    'max_retries': 3,
+    # Plazo real por llamada a Google Sheets, plazo de una carga completa (todas sus
+    # llamadas; al agotarse se abre el cortocircuito) y cortocircuito tras fallos seguidos
+    'call_timeout_seconds': 20,
+    'load_timeout_seconds': 45,
+    'circuit_failure_threshold': 3,
+    'circuit_reset_seconds': 60,
+    # Gobernador de cuota (cuotas por minuto de la API de Sheets): las peticiones en
+    # segundo plano dejan libre interactive_reserve de cada presupuesto
+    'read_requests_per_minute': 60,
+    'write_requests_per_minute': 60,
+    'interactive_reserve': 0.25,
+    'rate_limit_backoff_seconds': 2,
+    'rate_limit_max_retries': 3
+}
+
+# Refresco en segundo plano del dataset (ver data_refresh.py)
+# Un hilo por proceso vuelve a leer IndicadoresICE y Fichas cada interval_seconds
+# (± jitter_seconds) y publica la nueva versión ya procesada sin bloquear a los usuarios
+DATA_REFRESH_CONFIG = {
+    'enabled': True,
+    'interval_seconds': 300,
+    'jitter_seconds': 30
+}
+
+# Registro de entidades (ver engine/entities.py): la entidad principal usa la sección
+# [google_sheets] de secrets.toml; cada entidad adicional se declara como
+# [entidades.<NOMBRE>] con su spreadsheet_url (y credenciales propias opcionales).
+# Las hojas se descargan en paralelo con a lo sumo max_workers a la vez
+ENTITIES_CONFIG = {
+    'default_entity': 'IDECA',
+    'secrets_section': 'entidades',
+    'max_workers': 4
+}
+
+# Normalización en paralelo (ver engine/parallel.py): con al menos min_rows filas,
+# los COD se reparten en bloques balanceados por número de filas y se normalizan en
+# un pool de procesos (max_workers=None usa todos los núcleos). Con menos filas, o
+# si el pool falla, se normaliza en el mismo proceso
+NORMALIZATION_CONFIG = {
+    'parallel': True,
+    'min_rows': 20000,
+    'max_workers': None,
+    'chunks_per_worker': 2
+}
+
+# Matriz densa indicador × periodo (engine.matrix): meses por periodo de cada resolución
+# y la que usan por defecto los gráficos y análisis que alinean indicadores
+PERIOD_MATRIX_CONFIG = {
+    'frequencies': {'anual': 12, 'semestral': 6, 'trimestral': 3},
+    'default_frequency': 'semestral'
+}
+
+# Pronóstico de tendencia por indicador (engine.forecast): resolución de la matriz,
+# periodos proyectados, método por defecto ('lineal' o 'robusto', Huber por IRLS),
+# observaciones mínimas para ajustar y horizonte máximo para fechar la Meta
+FORECAST_CONFIG = {
+    'frequency': 'trimestral',
+    'horizon': 8,
+    'method': 'robusto',
+    'min_observations': 3,
+    'huber_k': 1.345,
+    'irls_iterations': 20,
+    'max_periods_to_meta': 40,
+    'interval_z': 1.28
+}
+
+# Detección de registros atípicos (engine.anomalies), en cada carga sobre el histórico
+# de cada indicador: z robusto (mediana y MAD), cercas de Tukey (IQR), residuo robusto
+# frente a la tendencia del indicador y valores a 'magnitude_orders' órdenes de magnitud
+# de su mediana (p. ej. pesos en lugar de millones). Un registro se marca si lo señalan
+# 'min_votes' pruebas o la de magnitud; sin 'min_points' registros no se marca
+ANOMALY_CONFIG = {
+    'robust_z': 3.5,
+    'iqr_factor': 3.0,
+    'trend_z': 3.5,
+    'magnitude_orders': 3,
+    'min_points': 5,
+    'min_votes': 2
+}
+
+# Correlación entre indicadores (engine.correlation): resolución de la matriz indicador ×
+# periodo y periodos mínimos en común (con registro en ambos) para calcular un par
+CORRELATION_CONFIG = {
+    'frequency': 'semestral',
+    'min_periods': 4
+}
+
+# Alertas por umbral (engine.alerts), evaluadas en lote cada vez que se publica una
+# versión del dataset. Cada regla aplica a un 'nivel' ('indicador' o 'componente') y
+# compara una métrica con un umbral; 'componentes' o 'codigos' (opcionales) limitan la
+# regla a esos componentes o COD. Métricas por indicador: 'puntaje' (normalizado
+# vigente), 'meses_sin_reporte', 'cambio_anual_pct' y 'cambio_periodo_pct' (fracción
+# del valor de referencia); por componente: 'puntaje' (ponderado), 'meses_sin_reporte'
+# y 'cambio_anual_norm' (puntos de puntaje normalizado frente a un año antes).
+# El historial (primera y última vez vista) se guarda en 'store'; las alertas resueltas
+# se conservan 'keep_resolved_days' días
+ALERTS_CONFIG = {
+    'rules': (
+        {'id': 'puntaje_critico', 'nivel': 'indicador', 'metrica': 'puntaje', 'operador': '<', 'umbral': 0.4,
+         'severidad': 'alta', 'descripcion': 'Puntaje normalizado en la franja crítica'},
+        {'id': 'sin_reporte', 'nivel': 'indicador', 'metrica': 'meses_sin_reporte', 'operador': '>=', 'umbral': 13,
+         'severidad': 'media', 'descripcion': 'Sin reporte en más de un año'},
+        {'id': 'caida_anual', 'nivel': 'indicador', 'metrica': 'cambio_anual_pct', 'operador': '<=', 'umbral': -0.20,
+         'severidad': 'media', 'descripcion': 'Caída anual superior al 20 %'},
+        {'id': 'componente_critico', 'nivel': 'componente', 'metrica': 'puntaje', 'operador': '<', 'umbral': 0.4,
+         'severidad': 'alta', 'descripcion': 'Puntaje del componente en la franja crítica'}
+    ),
+    'store': os.path.join('artifacts', 'alertas.json'),
+    'keep_resolved_days': 30
+}
+
+# Bandas de incertidumbre de la serie histórica del ICE (ScoreEngine.calculate_ice_uncertainty_bands):
+# en cada corte, los indicadores sin dato se imputan 'simulations' veces con valores de
+# su propio histórico; la semilla fija hace que las bandas sean reproducibles
+UNCERTAINTY_CONFIG = {
+    'simulations': 2000,
+    'percentiles': (5, 25, 50, 75, 95),
+    'seed': 20240601,
+    'max_batch_cells': 2_000_000
+}
+
+# Artefactos precalculados (ver precompute.py): dataset procesado, derivados y PDF
+# de fichas por huella del dataset. Si boot_from_artifacts está activo, el tablero
+# arranca desde el último conjunto (si no supera max_age_hours) y luego refresca
+# desde Google Sheets en segundo plano
+ARTIFACTS_CONFIG = {
+    'directory': 'artifacts',
+    'boot_from_artifacts': True,
+    'max_age_hours': 24
 }
 
 # Tipos de indicadores soportados
@@ -607,6 +743,7 @@ pip install gspread google-auth
 
 def validate_google_sheets_config():
     """Validar configuración de Google Sheets"""
+    import streamlit as st
     try:
         if "google_sheets" not in st.secrets:
             return False, "Sección 'google_sheets' no encontrada en secrets.toml"
@@ -636,6 +773,7 @@ def validate_google_sheets_config():
 
 def show_setup_instructions():
     """Mostrar instrucciones de configuración"""
+    import streamlit as st
     st.markdown(GOOGLE_SHEETS_SETUP_GUIDE)
     
     # Mostrar ejemplo de estructura
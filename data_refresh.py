@@ -0,0 +1,441 @@
+"""
+Refresco en segundo plano del Dashboard ICE
+Mantiene en memoria la última versión procesada del dataset (IndicadoresICE + Fichas)
+y la reemplaza periódicamente desde un hilo del proceso, fuera del ciclo de las peticiones
+"""
+
+import random
+import threading
+import time
+import numpy as np
+import streamlit as st
+from config import ALERTS_CONFIG, ARTIFACTS_CONFIG, DATA_REFRESH_CONFIG, GOOGLE_SHEETS_CONFIG
+from data_utils import (
+    DataLoader, DataEditor, DatasetArtifacts, get_dataset_artifacts, recompute_changed_indicators,
+    seed_dataset_artifacts
+)
+from engine.alerts import AlertLedger
+from engine.artifacts import load_artifacts
+from engine.entities import entity_names
+from engine.errors import SourceUnavailableError
+from engine.messages import collect_messages, logger
+from fingerprint import content_fingerprint
+from google_sheets_manager import background_requests
+from streamlit_adapter import entity_settings, sheets_settings
+
+class DatasetSnapshot:
+    """
+    Versión del dataset ya procesada. Es inmutable: la misma instancia se comparte
+    entre sesiones y entre las esperas de una carga compartida (SingleFlight).
+    fingerprint reúne las huellas de contenido: 'indicadores' y 'fichas' (lectura
+    de Sheets), 'dataset' (clave del procesamiento) y 'derivados' (clave de los
+    derivados, figuras y PDF). error y read_failed son los de la carga (LoadResult)
+    """
+
+    def __init__(self, df, fichas_data, source_info, version, cargado_en, fingerprint=None, messages=(),
+                 error=None, read_failed=False):
+        object.__setattr__(self, 'df', df)
+        object.__setattr__(self, 'fichas_data', fichas_data)
+        object.__setattr__(self, 'source_info', source_info)
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, 'cargado_en', cargado_en)
+        object.__setattr__(self, 'fingerprint', dict(fingerprint or {}))
+        # Mensajes del motor durante la carga (engine.Message); se muestran solo en
+        # la sesión que esperó la carga, nunca desde el hilo de refresco
+        object.__setattr__(self, 'messages', tuple(messages))
+        object.__setattr__(self, 'error', error)
+        object.__setattr__(self, 'read_failed', read_failed)
+
+    def __setattr__(self, nombre, valor):
+        raise AttributeError("DatasetSnapshot es inmutable")
+
+    def with_version(self, version):
+        """La misma versión de los datos con otro número de versión"""
+        return DatasetSnapshot(self.df, self.fichas_data, self.source_info, version, self.cargado_en,
+                               self.fingerprint, self.messages, self.error, self.read_failed)
+
+class _LlamadaEnCurso:
+    """Carga en curso para una clave: resultado o error compartido con quienes esperan"""
+
+    def __init__(self):
+        self.terminada = threading.Event()
+        self.resultado = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Coordinación 'single-flight': si varias sesiones piden la misma clave a la vez,
+    solo la primera ejecuta la carga y las demás esperan y reciben el mismo resultado
+    (o la misma excepción). Evita multiplicar lecturas a Google Sheets cuando muchos
+    usuarios abren el tablero simultáneamente
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_curso = {}
+        self.cargas = 0
+        self.esperas_compartidas = 0
+
+    def do(self, clave, funcion):
+        with self._lock:
+            llamada = self._en_curso.get(clave)
+            es_lider = llamada is None
+            if es_lider:
+                llamada = _LlamadaEnCurso()
+                self._en_curso[clave] = llamada
+                self.cargas += 1
+            else:
+                self.esperas_compartidas += 1
+
+        if not es_lider:
+            llamada.terminada.wait()
+            if llamada.error is not None:
+                raise llamada.error
+            return llamada.resultado
+
+        try:
+            llamada.resultado = funcion()
+            return llamada.resultado
+        except Exception as e:
+            llamada.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._en_curso[clave]
+            llamada.terminada.set()
+
+# Una sola instancia por proceso: el módulo se importa una vez por servidor Streamlit
+_SINGLE_FLIGHT = SingleFlight()
+
+# Historial de alertas del proceso; se actualiza cuando se publica una versión del dataset
+_ALERT_LEDGER = AlertLedger(ALERTS_CONFIG['store'])
+
+def dataset_key():
+    """Clave del dataset: hojas de cálculo de las entidades + pestaña de indicadores"""
+    spreadsheet_urls = tuple(settings.get("spreadsheet_url") for settings in entity_settings().values())
+    if not spreadsheet_urls:
+        spreadsheet_urls = ((sheets_settings() or {}).get("spreadsheet_url"),)
+    return (spreadsheet_urls, GOOGLE_SHEETS_CONFIG['worksheet_name'])
+
+def load_dataset_snapshot(version):
+    """
+    Ejecutar el pipeline completo: lectura de IndicadoresICE y Fichas, normalización,
+    valores recalculados y derivados compartidos (vista de últimos valores y cubo de puntajes)
+    """
+    # Los avisos al conectar (p. ej. una entidad sin credenciales) van con los de la
+    # carga: se muestran en la sesión que la espera, nunca desde el hilo de refresco
+    with collect_messages() as mensajes:
+        data_loader = DataLoader()
+    resultado = data_loader.load_combined_result()
+    df, fichas_data = resultado.df, resultado.fichas_data
+    source_info = data_loader.get_data_source_info()
+
+    fingerprint = dict(resultado.fingerprint)
+    fingerprint['fichas'] = fingerprint.get('fichas') or content_fingerprint(fichas_data)
+
+    if df is not None:
+        fingerprint['derivados'] = content_fingerprint(df)
+    if df is not None and resultado.ok:
+        # Precalcular los derivados que usa la primera pestaña antes de publicar la
+        # versión; una carga fallida no se publica y no se precalcula
+        artifacts = get_dataset_artifacts(df, fingerprint['derivados'])
+        artifacts.get('latest')
+        artifacts.get('score_cube')
+        # Las alertas se evalúan aquí, en el hilo que carga, no en la sesión que publica
+        artifacts.get('alerts')
+
+    return DatasetSnapshot(df, fichas_data, source_info, version, time.time(), fingerprint,
+                           mensajes + resultado.messages, resultado.error, resultado.read_failed)
+
+def load_artifact_snapshot(version, directorio=None):
+    """
+    Versión del dataset desde los artefactos precalculados (precompute.py): dataset
+    procesado y derivados ya calculados, sin leer Google Sheets. None si no hay un
+    conjunto completo y vigente (ARTIFACTS_CONFIG['max_age_hours'])
+    """
+    datos = load_artifacts(directorio or ARTIFACTS_CONFIG['directory'],
+                           max_age_hours=ARTIFACTS_CONFIG['max_age_hours'])
+    if datos is None or datos['df'] is None:
+        return None
+
+    entrada = datos['entry']
+    fingerprint = dict(entrada['fingerprint'])
+    fingerprint['derivados'] = fingerprint.get('derivados') or content_fingerprint(datos['df'])
+
+    artifacts = DatasetArtifacts(datos['df'], fingerprint['derivados'])
+    artifacts.preload(datos['derivados'])
+    seed_dataset_artifacts(artifacts)
+
+    source_info = {
+        'source': 'Artefactos precalculados',
+        'connection_info': {'connected': False},
+        'artifacts': {'huella': entrada['huella'], 'creado_en': entrada['creado_en']}
+    }
+    return DatasetSnapshot(datos['df'], datos['fichas_data'], source_info, version, time.time(), fingerprint)
+
+def load_shared_snapshot(version=0):
+    """Cargar el dataset compartiendo la carga en curso, si la hay, con otras sesiones"""
+    snapshot = _SINGLE_FLIGHT.do(dataset_key(), lambda: load_dataset_snapshot(version))
+    # Sin refresco en segundo plano se carga en cada rerun: solo se registra un dataset distinto
+    record_alerts(snapshot, solo_si_cambia=True)
+    return snapshot
+
+def record_alerts(snapshot, solo_si_cambia=False):
+    """
+    Evaluar las reglas de alerta sobre una versión publicada del dataset y registrar
+    el resultado en el historial (primera y última vez vista de cada alerta). La
+    evaluación es un derivado por día de la versión (DatasetArtifacts 'alerts'): si el
+    hilo de carga ya la calculó, aquí solo se actualiza el historial
+    """
+    if load_failure(snapshot) is not None:
+        # Una carga fallida no resuelve las alertas activas
+        return
+    huella = snapshot.fingerprint.get('derivados')
+    clave = (huella, time.strftime('%Y-%m-%d'))
+    if solo_si_cambia and _ALERT_LEDGER.huella == clave:
+        return
+    try:
+        activas = get_dataset_artifacts(snapshot.df, huella).get('alerts')
+        _ALERT_LEDGER.update(activas, huella=clave, ahora=snapshot.cargado_en)
+    except Exception as e:
+        # Las alertas nunca impiden publicar una versión
+        logger.warning("No se pudieron evaluar las alertas: %s", e)
+
+def current_alerts():
+    """Historial de alertas y su resumen, ya calculados en la última evaluación"""
+    return _ALERT_LEDGER.table(), _ALERT_LEDGER.summary()
+
+def load_failure(snapshot):
+    """
+    Motivo por el que una carga no debe publicarse, o None si es válida. Una lectura
+    fallida de Sheets devuelve un dataset vacío, no None: se descarta si la carga tuvo
+    error o si no se pudo leer IndicadoresICE de alguna entidad (read_failed)
+    """
+    if snapshot is None or snapshot.df is None:
+        return "La carga de datos no devolvió resultados"
+    if snapshot.error is not None:
+        return f"{type(snapshot.error).__name__}: {snapshot.error}"
+    if snapshot.read_failed:
+        return "No se pudo leer IndicadoresICE de Google Sheets"
+    return None
+
+class BackgroundRefresher:
+    """Hilo del proceso que refresca el dataset cada cierto intervalo con jitter"""
+
+    def __init__(self, interval_seconds, jitter_seconds=0, loader=load_dataset_snapshot, key=None):
+        self.interval_seconds = interval_seconds
+        self.jitter_seconds = jitter_seconds
+        self.loader = loader
+        self.key = key
+        self.last_error = None
+        self.last_verification = None
+        self.next_refresh = None
+        self._snapshot = None
+        self._version = 0
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Iniciar el hilo de refresco (idempotente)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="ice-data-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def current(self):
+        """Última versión publicada, o None si aún no se ha cargado ninguna"""
+        return self._snapshot
+
+    def refresh_now(self):
+        """
+        Ejecutar el pipeline y publicar la nueva versión. La publicación es una sola
+        asignación de referencia: los lectores ven la versión anterior completa o la
+        nueva completa, nunca una mezcla. Llamadas simultáneas (hilo de fondo, sesiones
+        que piden actualizar y cargas directas con load_shared_snapshot, que usan la
+        misma clave dataset_key()) comparten una única carga
+        """
+        version = self._version + 1
+        snapshot = _SINGLE_FLIGHT.do(self.key, lambda: self.loader(version))
+        if snapshot.version != version:
+            # Carga compartida con una carga directa: se publica con la versión del refrescador
+            snapshot = snapshot.with_version(version)
+        return self._publish(snapshot)
+
+    def _publish(self, snapshot):
+        # Una carga fallida nunca reemplaza la versión publicada
+        motivo = load_failure(snapshot)
+        if motivo is not None:
+            self.last_error = motivo
+            raise SourceUnavailableError(motivo)
+
+        with self._refresh_lock:
+            publicada = self._snapshot is None or snapshot.version > self._snapshot.version
+            if publicada:
+                self._version = snapshot.version
+                self._snapshot = snapshot
+            self.last_error = None
+            actual = self._snapshot
+
+        if publicada:
+            record_alerts(snapshot)
+        return actual
+
+    def boot_from_artifacts(self):
+        """
+        Arranque rápido: publicar la versión precalculada (si la hay) y refrescar desde
+        Google Sheets en segundo plano. Devuelve la versión publicada o None. El refresco
+        pasa por la misma validación que cualquier otro: si falla, la versión de los
+        artefactos sigue publicada y el error queda en last_error
+        """
+        snapshot = _SINGLE_FLIGHT.do(('artifacts', self.key), lambda: load_artifact_snapshot(self._version + 1))
+        if load_failure(snapshot) is not None:
+            return None
+
+        publicado = self._publish(snapshot)
+        self._refresh_async()
+        return publicado
+
+    def _refresh_async(self):
+        """
+        Refrescar desde Google Sheets en un hilo, cediendo cuota a las peticiones
+        interactivas. Devuelve el hilo iniciado
+        """
+        def refrescar():
+            try:
+                with background_requests():
+                    self.refresh_now()
+            except Exception as e:
+                # Se conserva la versión publicada (la de los artefactos)
+                self.last_error = f"{type(e).__name__}: {e}"
+
+        hilo = threading.Thread(target=refrescar, name="ice-boot-refresh", daemon=True)
+        hilo.start()
+        return hilo
+
+    def apply_write(self, operacion, codigo, fecha, valor=None, registro=None):
+        """
+        Write-through tras una escritura exitosa en Google Sheets: aplicar el cambio
+        a la versión en memoria, recalcular solo los derivados del COD afectado
+        (recompute_changed_indicators) y publicar la nueva versión. La lectura de confirmación desde Sheets se hace
+        después, en segundo plano
+        """
+        with self._refresh_lock:
+            actual = self._snapshot
+            if actual is None:
+                raise RuntimeError("No hay una versión del dataset cargada")
+
+            if len(entity_names(actual.df)) > 1:
+                # Con varias entidades, el COD no identifica la fila: se recarga todo
+                raise ValueError("El dataset une varias entidades")
+
+            df = DataEditor.apply_record_change(actual.df, operacion, codigo, fecha, valor, registro)
+            artifacts = recompute_changed_indicators(actual.df, df, [codigo], actual.fichas_data,
+                                                     actual.fingerprint.get('derivados'))
+
+            # El contenido de IndicadoresICE ya no coincide con ninguna lectura de Sheets
+            fingerprint = dict(actual.fingerprint, indicadores=None, dataset=None, derivados=artifacts.huella)
+            nuevo = DatasetSnapshot(df, actual.fichas_data, actual.source_info, actual.version + 1,
+                                    time.time(), fingerprint)
+            self._version = nuevo.version
+            self._snapshot = nuevo
+
+        record_alerts(nuevo)
+        self._verify_async([codigo], nuevo)
+        return nuevo
+
+    def _verify_async(self, codigos, esperado):
+        """
+        Releer Sheets en segundo plano, publicar la versión real y comparar los COD
+        escritos con lo que se leyó. Solo se compara si la relectura fue válida
+        (_publish la rechaza si no): una lectura fallida deja la verificación sin
+        resultado (coincide None) y la versión local publicada. Devuelve el hilo iniciado
+        """
+        def verificar():
+            try:
+                with background_requests():
+                    leido = self.loader(self._version + 1)
+                    self._publish(leido)
+                # Se compara la lectura, no la versión publicada (otra escritura pudo adelantarse)
+                coincide = _same_indicator_rows(esperado.df, leido.df, codigos)
+                self.last_verification = {'codigos': list(codigos), 'coincide': coincide, 'en': time.time()}
+            except Exception as e:
+                self.last_verification = {'codigos': list(codigos), 'coincide': None, 'en': time.time()}
+                self.last_error = f"Verificación: {type(e).__name__}: {e}"
+
+        hilo = threading.Thread(target=verificar, name="ice-write-verify", daemon=True)
+        hilo.start()
+        return hilo
+
+    def status(self):
+        """Estado del refresco para el panel de información del sistema"""
+        snapshot = self._snapshot
+        return {
+            'activo': self._thread is not None and self._thread.is_alive(),
+            'cargas': _SINGLE_FLIGHT.cargas,
+            'esperas_compartidas': _SINGLE_FLIGHT.esperas_compartidas,
+            'version': snapshot.version if snapshot else None,
+            'cargado_en': snapshot.cargado_en if snapshot else None,
+            'proximo_refresco': self.next_refresh,
+            'ultimo_error': self.last_error,
+            'ultima_verificacion': self.last_verification
+        }
+
+    def _next_delay(self):
+        jitter = random.uniform(-self.jitter_seconds, self.jitter_seconds) if self.jitter_seconds else 0
+        return max(1.0, self.interval_seconds + jitter)
+
+    def _run(self):
+        while True:
+            delay = self._next_delay()
+            self.next_refresh = time.time() + delay
+            if self._stop.wait(delay):
+                break
+            try:
+                # Las lecturas del refresco ceden cuota a las peticiones interactivas
+                with background_requests():
+                    self.refresh_now()
+            except Exception as e:
+                # Se conserva la versión anterior; se reintenta en el siguiente ciclo
+                self.last_error = f"{type(e).__name__}: {e}"
+
+def _same_indicator_rows(df_a, df_b, codigos):
+    """Comparar (Fecha, Valor) de los COD indicados entre dos versiones del dataset"""
+    def filas(df):
+        sub = df.loc[df['COD'].isin(codigos), ['COD', 'Fecha', 'Valor']]
+        return sub.sort_values(['COD', 'Fecha', 'Valor']).reset_index(drop=True)
+
+    a, b = filas(df_a), filas(df_b)
+    if len(a) != len(b):
+        return False
+    return (a['COD'].equals(b['COD'])
+            and a['Fecha'].equals(b['Fecha'])
+            and bool(np.allclose(a['Valor'], b['Valor'], equal_nan=True)))
+
+def apply_local_write(operacion, codigo, fecha, valor=None, registro=None):
+    """
+    Reflejar en la versión compartida una escritura ya confirmada por Google Sheets.
+    Devuelve False si el refresco en segundo plano está desactivado o el cambio no
+    pudo aplicarse localmente (el llamador debe entonces forzar una recarga completa)
+    """
+    if not DATA_REFRESH_CONFIG['enabled']:
+        return False
+    try:
+        get_background_refresher().apply_write(operacion, codigo, fecha, valor, registro)
+        return True
+    except Exception:
+        return False
+
+@st.cache_resource(show_spinner=False)
+def get_background_refresher():
+    """Refrescador único por proceso, compartido por todas las sesiones"""
+    refresher = BackgroundRefresher(
+        DATA_REFRESH_CONFIG['interval_seconds'],
+        DATA_REFRESH_CONFIG['jitter_seconds'],
+        key=dataset_key()
+    )
+    refresher.start()
+    return refresher
@@ -1,13 +1,31 @@
 """
 Utilidades para el manejo de datos del Dashboard ICE - VERSIÓN CON SHEETS FICHAS
 CORRECCIÓN: Cargar fichas metodológicas desde Google Sheets en lugar de Excel
+Adaptador de Streamlit sobre el motor de cálculo (engine): cachés, mensajes como
+widgets y derivados compartidos por las pestañas
 """
 
 import pandas as pd
 import numpy as np
 import streamlit as st
 import os
-from config import COLUMN_MAPPING, DEFAULT_META, INDICATOR_TYPES
+import threading
+import streamlit_adapter
+from config import (
+    ALERTS_CONFIG, ANOMALY_CONFIG, COLUMN_MAPPING, CORRELATION_CONFIG, DEFAULT_META, ENTITIES_CONFIG,
+    FORECAST_CONFIG, INDICATOR_TYPES, NORMALIZATION_CONFIG, PERIOD_MATRIX_CONFIG, UNCERTAINTY_CONFIG
+)
+from engine import (
+    IPC_ANUAL, calcular_factor_inflacion_acumulada, AlertEngine, CorrelationEngine, DatasetPipeline, ForecastEngine, LoadResult,
+    PeriodMatrixBuilder, ScenarioEngine, ScoreEngine, SourceUnavailableError, entity_names, filter_entity,
+    load_entities_dataset, report
+)
+from engine import (
+    alerts as _alerts, anomalies as _anomalies, correlation as _correlation, forecast as _forecast,
+    matrix as _matrix, normalization as _normalization, parallel as _parallel, scenarios as _scenarios,
+    scoring as _scoring
+)
+from fingerprint import content_fingerprint, code_fingerprint
 
 # Importación de Google Sheets
 try:
@@ -16,53 +34,36 @@ try:
 except ImportError:
     GOOGLE_SHEETS_AVAILABLE = False
 
-# Tabla de IPC (Índice de Precios al Consumidor) por año
-IPC_ANUAL = {
-    2019: 3.8,
-    2020: 1.61,
-    2021: 5.625,
-    2022: 13.12,
-    2023: 9.28,
-    2024: 5.2,
-    2025: 5.1
-}
-
-def calcular_factor_inflacion_acumulada(año_base, año_final):
-    """
-    Calcula el factor de inflación acumulada desde año_base hasta año_final
-    Args:
-        año_base: Año del valor original
-        año_final: Año al que se quiere ajustar
-    Returns:
-        Factor de inflación acumulada (ej: 1.377 significa 37.7% de inflación acumulada)
-    """
-    if año_base >= año_final:
-        return 1.0
-
-    factor_acumulado = 1.0
-    for año in range(año_base + 1, año_final + 1):
-        if año in IPC_ANUAL:
-            tasa_ipc = IPC_ANUAL[año] / 100
-            factor_acumulado *= (1 + tasa_ipc)
-
-    return factor_acumulado
-
-class DataLoader:
-    """Clase para cargar datos - VERSIÓN CON FICHAS DESDE SHEETS"""
+class DataLoader(DatasetPipeline):
+    """Clase para cargar datos - VERSIÓN CON FICHAS DESDE SHEETS (procesamiento en engine.pipeline)"""
     
     def __init__(self):
         self.df = None
         self.sheets_manager = None
+        # Un cliente por entidad del registro; sheets_manager es el de la entidad principal
+        self.sheets_managers = {}
+        # Huellas de la última carga combinada: 'indicadores', 'fichas' y 'dataset'
+        self.fingerprint = {}
         
         if not GOOGLE_SHEETS_AVAILABLE:
-            st.error("❌ **Google Sheets no disponible.** Instala: `pip install gspread google-auth`")
+            report('error', "❌ **Google Sheets no disponible.** Instala: `pip install gspread google-auth`")
             return
         
         try:
             self.sheets_manager = GoogleSheetsManager()
         except Exception as e:
-            st.error(f"❌ Error al inicializar Google Sheets: {e}")
+            report('error', f"❌ Error al inicializar Google Sheets: {e}")
             self.sheets_manager = None
+            return
+
+        registro = streamlit_adapter.entity_settings()
+        principal = ENTITIES_CONFIG['default_entity']
+        self.sheets_managers[next(iter(registro), principal)] = self.sheets_manager
+        for entidad, settings in list(registro.items())[1:]:
+            try:
+                self.sheets_managers[entidad] = GoogleSheetsManager(settings)
+            except Exception as e:
+                report('warning', f"⚠️ No se pudo inicializar la entidad {entidad}: {e}")
     
     def load_data(self):
         """Cargar datos desde Google Sheets - SILENCIOSO PARA ENCABEZADO"""
@@ -110,504 +111,43 @@ class DataLoader:
             return fichas_df
 
         except Exception as e:
-            st.error(f"❌ Error al cargar fichas: {e}")
+            report('error', f"❌ Error al cargar fichas: {e}")
             return None
 
-    def load_combined_data(self):
-        """NUEVO: Cargar datos combinados (IndicadoresICE + Fichas con JOIN)"""
-        try:
-            if not GOOGLE_SHEETS_AVAILABLE or not self.sheets_manager:
-                return self._create_empty_dataframe()
-
-            # Cargar datos combinados usando el método del GoogleSheetsManager
-            df = self.sheets_manager.load_combined_data()
-
-            if df is None or df.empty:
-                return self._create_empty_dataframe()
-
-            # Cargar fichas para calcular valores recalculados
-            fichas_data = self.sheets_manager.load_fichas_data()
-
-            # Procesar datos silenciosamente (incluye normalización)
-            self._process_dataframe_silent(df)
-
-            # Calcular valores recalculados DESPUÉS de todo el procesamiento
-            if fichas_data is not None and not fichas_data.empty:
-                self._calculate_recalculated_values(df, fichas_data)
-            else:
-                # Si no hay fichas, Valor_Recalculado = Valor
-                if 'Valor' in df.columns:
-                    df['Valor_Recalculado'] = df['Valor'].copy()
-
-            # Verificar y limpiar silenciosamente
-            if self._verify_dataframe_simple(df):
-                return df
-            else:
-                return self._create_empty_dataframe()
-
-        except Exception as e:
-            st.error(f"❌ Error al cargar datos combinados: {e}")
-            return self._create_empty_dataframe()
-
-    def _create_empty_dataframe(self):
-        """Crear DataFrame vacío"""
-        return pd.DataFrame(columns=[
-            'Componente', 'Categoria',
-            'COD', 'Indicador', 'Valor', 'Fecha', 'Meta', 'Peso', 'Tipo', 'Valor_Normalizado', 'Valor_Recalculado'
-        ])
-    
-    def _process_dataframe_silent(self, df):
-        """Procesar DataFrame silenciosamente (sin mostrar información en pantalla)"""
-        try:
-            # Renombrar columnas
-            for original, nuevo in COLUMN_MAPPING.items():
-                if original in df.columns:
-                    df.rename(columns={original: nuevo}, inplace=True)
-
-            # Procesar fechas silenciosamente
-            self._process_dates_silent(df)
-
-            # Procesar valores silenciosamente
-            self._process_values_silent(df)
-
-            # Añadir columnas por defecto
-            self._add_default_columns_corrected(df)
-
-            # Normalización silenciosa
-            self._normalize_values_silent(df)
-
-        except Exception as e:
-            pass  # Silencioso
-
-    def _process_dataframe_without_normalize(self, df):
-        """Procesar DataFrame SIN normalizar (para procesar antes de calcular Valor_Recalculado)"""
-        try:
-            # Renombrar columnas
-            for original, nuevo in COLUMN_MAPPING.items():
-                if original in df.columns:
-                    df.rename(columns={original: nuevo}, inplace=True)
-
-            # Procesar fechas silenciosamente
-            self._process_dates_silent(df)
-
-            # Procesar valores silenciosamente
-            self._process_values_silent(df)
-
-            # Añadir columnas por defecto
-            self._add_default_columns_corrected(df)
-
-            # NO normalizar aquí - se hará después de calcular Valor_Recalculado
-
-        except Exception as e:
-            pass  # Silencioso
-    
-    def _process_dates_silent(self, df):
-        """Procesar fechas silenciosamente"""
-        try:
-            if 'Fecha' not in df.columns:
-                return
-            
-            # Formatos de fecha comunes
-            date_formats = [
-                '%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d', 
-                '%Y/%m/%d', '%m/%d/%Y', '%d.%m.%Y'
-            ]
-            
-            fechas_convertidas = None
-            
-            for formato in date_formats:
-                try:
-                    temp_fechas = pd.to_datetime(df['Fecha'], format=formato, errors='coerce')
-                    validas = temp_fechas.notna().sum()
-                    
-                    if validas > 0:
-                        if fechas_convertidas is None or validas > fechas_convertidas.notna().sum():
-                            fechas_convertidas = temp_fechas
-                except:
-                    continue
-            
-            if fechas_convertidas is None or fechas_convertidas.notna().sum() == 0:
-                try:
-                    fechas_convertidas = pd.to_datetime(df['Fecha'], errors='coerce', dayfirst=True)
-                except:
-                    fechas_convertidas = pd.to_datetime(df['Fecha'], errors='coerce')
-            
-            df['Fecha'] = fechas_convertidas
-                
-        except Exception as e:
-            pass  # Silencioso
-    
-    def _process_values_silent(self, df):
-        """Procesar valores silenciosamente"""
-        try:
-            if 'Valor' not in df.columns:
-                return
-            
-            # Convertir valores a numérico
-            if df['Valor'].dtype == 'object':
-                df['Valor'] = (df['Valor']
-                              .astype(str)
-                              .str.replace(',', '.')
-                              .str.strip())
-                df['Valor'] = pd.to_numeric(df['Valor'], errors='coerce')
-                
-        except Exception as e:
-            pass  # Silencioso
-    
-    def _normalize_values_silent(self, df):
+    def load_combined_result(self):
         """
-        Normalización de valores entre 0 y 1:
-        - Si Calculo = "promedio": promedio de valores normalizados de últimos 4 años
-        - Si Calculo = "acumulado": suma de valores de últimos 4 años, luego normalizar
-        - Si tiene Meta: valor/Meta (Meta es 1), nunca pasa de 1
-        - Si NO tiene Meta y hay datos históricos: min-max normalization
-        - Si NO tiene Meta y NO hay datos históricos: asigna 0.7
+        Carga combinada (IndicadoresICE + Fichas con JOIN) como resultado estructurado
+        (engine.LoadResult), sin mostrar mensajes. El procesamiento se reutiliza por
+        huella de contenido, también entre procesos (caché en disco)
         """
-        try:
-            if df.empty or 'Valor' not in df.columns or 'Fecha' not in df.columns:
-                return
-
-            # Inicializar valores normalizados como "sin dato" (NaN), no como 0.
-            # Un período sin valor reportado no equivale a un desempeño de 0%;
-            # debe quedar como dato faltante para que las gráficas muestren un vacío, no una caída a cero.
-            df['Valor_Normalizado'] = np.nan
-
-            # Verificar que tenemos datos válidos
-            valores_validos = df['Valor'].notna()
-            if not valores_validos.any():
-                return
-
-            # Usar columna COD
-            if 'COD' not in df.columns:
-                return
-
-            tiene_meta = 'Meta' in df.columns
-            tiene_calculo = 'Calculo' in df.columns
-
-            # Asegurar que Fecha es datetime
-            if not pd.api.types.is_datetime64_any_dtype(df['Fecha']):
-                df['Fecha'] = pd.to_datetime(df['Fecha'], errors='coerce')
-
-            # Agrupar por indicador usando COD
-            for codigo in df['COD'].unique():
-                if pd.isna(codigo):
-                    continue
-
-                mask = df['COD'] == codigo
-                datos_indicador = df[mask].copy()
-                valores = datos_indicador['Valor'].dropna()
-
-                if valores.empty:
-                    continue
-
-                # Obtener información del indicador
-                indicador_info = datos_indicador.iloc[0]
-                meta_valor = indicador_info.get('Meta') if tiene_meta else None
-                calculo = indicador_info.get('Calculo', '').lower().strip() if tiene_calculo else ''
-
-                # === CASO ESPECIAL: PROMEDIO ===
-                if calculo == 'promedio':
-                    self._normalize_promedio(df, datos_indicador, meta_valor)
-
-                # === CASO ESPECIAL: ACUMULADO ===
-                elif calculo == 'acumulado':
-                    self._normalize_acumulado(df, datos_indicador, meta_valor)
-
-                # === CASOS NORMALES ===
-                else:
-                    # Normalización estándar (sin considerar últimos 4 años)
-                    if pd.notna(meta_valor) and meta_valor > 0:
-                        # TIENE META: Meta es 1 (100%), normalizar como valor/Meta
-                        for index in datos_indicador.index:
-                            valor = datos_indicador.loc[index, 'Valor']
-                            if pd.notna(valor):
-                                valor_norm = valor / meta_valor
-                                df.at[index, 'Valor_Normalizado'] = min(1.0, max(0.0, valor_norm))
-
-                    elif len(valores) > 1:
-                        # NO tiene Meta pero SÍ hay datos históricos: min-max normalization
-                        max_valor = valores.max()
-                        min_valor = valores.min()
-                        rango = max_valor - min_valor
-
-                        if rango > 0:
-                            for index in datos_indicador.index:
-                                valor = datos_indicador.loc[index, 'Valor']
-                                if pd.notna(valor):
-                                    valor_norm = (valor - min_valor) / rango
-                                    df.at[index, 'Valor_Normalizado'] = min(1.0, max(0.0, valor_norm))
-                        else:
-                            # Todos los valores históricos son iguales
-                            for index in datos_indicador.index:
-                                if pd.notna(datos_indicador.loc[index, 'Valor']):
-                                    df.at[index, 'Valor_Normalizado'] = 0.7
-
-                    else:
-                        # NO tiene Meta y NO hay datos históricos: asignar 0.7
-                        for index in datos_indicador.index:
-                            if pd.notna(datos_indicador.loc[index, 'Valor']):
-                                df.at[index, 'Valor_Normalizado'] = 0.7
-
-        except Exception as e:
-            # Fallback silencioso
-            pass
-
-    def _normalize_promedio(self, df, datos_indicador, meta_valor):
-        """
-        Normalización tipo PROMEDIO: para cada año, promedio de valores normalizados de ese año y los 3 anteriores
-        """
-        try:
-            # Ordenar por fecha ascendente
-            datos_ordenados = datos_indicador.sort_values('Fecha', ascending=True).copy()
-            datos_ordenados['Año'] = datos_ordenados['Fecha'].dt.year
-
-            # Obtener min y max de TODOS los valores históricos del indicador (para min-max)
-            todos_valores = datos_indicador['Valor'].dropna()
-            min_historico = todos_valores.min()
-            max_historico = todos_valores.max()
-            rango = max_historico - min_historico
-
-            # Para cada registro, calcular promedio con sus 3 años anteriores
-            for index in datos_ordenados.index:
-                año_actual = datos_ordenados.loc[index, 'Año']
-
-                # Obtener datos de este año y los 3 anteriores
-                años_ventana = [año_actual - i for i in range(4)]
-                datos_ventana = datos_ordenados[datos_ordenados['Año'].isin(años_ventana)]
-
-                if datos_ventana.empty:
-                    df.at[index, 'Valor_Normalizado'] = 0.7
-                    continue
-
-                # Normalizar cada valor en la ventana
-                valores_normalizados = []
-                for _, row in datos_ventana.iterrows():
-                    valor = row['Valor']
-                    if pd.notna(valor):
-                        if pd.notna(meta_valor) and meta_valor > 0:
-                            # Con meta: valor/meta
-                            valor_norm = min(1.0, max(0.0, valor / meta_valor))
-                        elif rango > 0:
-                            # Sin meta: min-max
-                            valor_norm = (valor - min_historico) / rango
-                            valor_norm = min(1.0, max(0.0, valor_norm))
-                        elif len(todos_valores) == 1:
-                            valor_norm = 0.7
-                        else:
-                            valor_norm = 0.7
-                        valores_normalizados.append(valor_norm)
-
-                # Calcular promedio para este año
-                if valores_normalizados:
-                    promedio_norm = sum(valores_normalizados) / len(valores_normalizados)
-                else:
-                    promedio_norm = 0.7
-
-                df.at[index, 'Valor_Normalizado'] = promedio_norm
-
-        except Exception as e:
-            # Fallback
-            for index in datos_indicador.index:
-                df.at[index, 'Valor_Normalizado'] = 0.7
-
-    def _normalize_acumulado(self, df, datos_indicador, meta_valor):
-        """
-        Normalización tipo ACUMULADO: para cada año, suma de valores de ese año y los 3 anteriores, luego normalizar
-        """
-        try:
-            # Ordenar por fecha ascendente
-            datos_ordenados = datos_indicador.sort_values('Fecha', ascending=True).copy()
-            datos_ordenados['Año'] = datos_ordenados['Fecha'].dt.year
-
-            # Calcular todas las sumas posibles de ventanas de 4 años para min-max
-            todos_años = sorted(datos_ordenados['Año'].unique())
-            sumas_historicas = []
-
-            for año_ref in todos_años:
-                años_ventana = [año_ref - i for i in range(4)]
-                datos_ventana = datos_ordenados[datos_ordenados['Año'].isin(años_ventana)]
-                if not datos_ventana.empty:
-                    suma_ventana = datos_ventana['Valor'].sum()
-                    sumas_historicas.append(suma_ventana)
-
-            # Min y max de las sumas históricas
-            if len(sumas_historicas) > 1:
-                min_suma = min(sumas_historicas)
-                max_suma = max(sumas_historicas)
-                rango_suma = max_suma - min_suma
-            else:
-                min_suma = 0
-                max_suma = 0
-                rango_suma = 0
-
-            # Para cada registro, calcular suma acumulada con sus 3 años anteriores
-            for index in datos_ordenados.index:
-                año_actual = datos_ordenados.loc[index, 'Año']
-
-                # Obtener datos de este año y los 3 anteriores
-                años_ventana = [año_actual - i for i in range(4)]
-                datos_ventana = datos_ordenados[datos_ordenados['Año'].isin(años_ventana)]
-
-                if datos_ventana.empty:
-                    df.at[index, 'Valor_Normalizado'] = 0.7
-                    continue
-
-                # Sumar valores de la ventana
-                suma_valores = datos_ventana['Valor'].sum()
-
-                # Normalizar la suma
-                if pd.notna(meta_valor) and meta_valor > 0:
-                    # Con meta: normalizar contra meta acumulada (meta * número de años en ventana)
-                    num_años_ventana = len(años_ventana)
-                    meta_acumulada = meta_valor * num_años_ventana
-                    valor_norm = min(1.0, max(0.0, suma_valores / meta_acumulada))
-                elif rango_suma > 0:
-                    # Sin meta: min-max sobre sumas históricas
-                    valor_norm = (suma_valores - min_suma) / rango_suma
-                    valor_norm = min(1.0, max(0.0, valor_norm))
-                else:
-                    # Sin rango o datos insuficientes
-                    valor_norm = 0.7
-
-                df.at[index, 'Valor_Normalizado'] = valor_norm
+        if not GOOGLE_SHEETS_AVAILABLE or not self.sheets_manager:
+            return LoadResult(self._create_empty_dataframe(),
+                              error=SourceUnavailableError("Google Sheets no disponible"))
+
+        # Las hojas de todas las entidades se descargan en paralelo; cada una se
+        # procesa (y se cachea) por su propia huella
+        resultado = load_entities_dataset(
+            self.sheets_managers, self,
+            procesar=lambda huella, df, fichas_data: _process_combined_data(
+                huella, _PIPELINE_VERSION, self, df, fichas_data
+            )
+        )
+        self.fingerprint = resultado.fingerprint
+        return resultado
 
-        except Exception as e:
-            # Fallback
-            for index in datos_indicador.index:
-                df.at[index, 'Valor_Normalizado'] = 0.7
-
-    def _calculate_recalculated_values(self, df, fichas_data):
-        """
-        Calcular valores recalculados ajustados por inflación
-        Si VPN=1 en Fichas, ajustar el valor por inflación acumulada
-        """
-        try:
-            from datetime import datetime
-
-            # Inicializar columna Valor_Recalculado
-            df['Valor_Recalculado'] = df['Valor'].copy()
-
-            # Verificar que tenemos las columnas necesarias
-            if 'COD' not in df.columns or 'Valor' not in df.columns or 'Fecha' not in df.columns:
-                return
-
-            # Año actual como referencia para ajustar
-            año_actual = datetime.now().year
-
-            # Crear diccionario de VPN por código de indicador
-            vpn_dict = {}
-            if 'COD' in fichas_data.columns and 'VPN' in fichas_data.columns:
-                for _, ficha in fichas_data.iterrows():
-                    codigo = ficha.get('COD')
-                    vpn = ficha.get('VPN')
-                    if pd.notna(codigo) and pd.notna(vpn):
-                        try:
-                            vpn_dict[str(codigo).strip()] = int(vpn)
-                        except:
-                            vpn_dict[str(codigo).strip()] = 0
-
-            # Procesar cada registro
-            for index, row in df.iterrows():
-                codigo = str(row.get('COD', '')).strip()
-                valor = row.get('Valor')
-                fecha = row.get('Fecha')
-
-                # Verificar si debe ajustarse por inflación
-                if codigo in vpn_dict and vpn_dict[codigo] == 1:
-                    # VPN=1: Ajustar por inflación
-                    if pd.notna(valor) and pd.notna(fecha):
-                        try:
-                            # Obtener año del registro
-                            if isinstance(fecha, pd.Timestamp):
-                                año_registro = fecha.year
-                            elif isinstance(fecha, str):
-                                año_registro = pd.to_datetime(fecha).year
-                            else:
-                                año_registro = None
-
-                            if año_registro and año_registro <= año_actual:
-                                # Calcular factor de inflación acumulada
-                                factor_inflacion = calcular_factor_inflacion_acumulada(año_registro, año_actual)
-
-                                # Aplicar ajuste
-                                valor_recalculado = valor * factor_inflacion
-                                df.at[index, 'Valor_Recalculado'] = valor_recalculado
-                            else:
-                                # Año inválido: mantener valor original
-                                df.at[index, 'Valor_Recalculado'] = valor
-                        except Exception as e:
-                            # Error al procesar: mantener valor original
-                            df.at[index, 'Valor_Recalculado'] = valor
-                else:
-                    # VPN != 1 o no tiene VPN: mantener valor original
-                    df.at[index, 'Valor_Recalculado'] = valor
-
-        except Exception as e:
-            # Fallback: Valor_Recalculado = Valor
-            try:
-                df['Valor_Recalculado'] = df['Valor']
-            except:
-                pass
-
-    def _add_default_columns_corrected(self, df):
-        """Añadir columnas por defecto - VERSIÓN SILENCIOSA"""
-        try:
-            # Meta - NO establecer valor por defecto, dejar NaN si no existe
-            if 'Meta' not in df.columns:
-                df['Meta'] = pd.NA
-            else:
-                # Solo convertir a numérico, mantener NaN como NaN
-                df['Meta'] = pd.to_numeric(df['Meta'], errors='coerce')
-
-            # Peso por defecto
-            if 'Peso' not in df.columns:
-                df['Peso'] = 1.0
-            else:
-                df['Peso'] = pd.to_numeric(df['Peso'], errors='coerce').fillna(1.0)
-
-            # Tipo por defecto
-            if 'Tipo' not in df.columns:
-                df['Tipo'] = 'porcentaje'
-
-        except Exception as e:
-            pass  # Silencioso
-    
-    def _verify_dataframe_simple(self, df):
-        """Verificar DataFrame"""
-        try:
-            if df.empty:
-                return True
-
-            # Verificar columnas esenciales (permitir variantes de nombres)
-            required_columns = ['COD', 'Fecha', 'Valor']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-
-            if missing_columns:
-                return False
-
-            # Verificar que tenga al menos componente/categoría e indicador (con nombres flexibles)
-            has_componente = any(col in df.columns for col in ['Componente', 'COMPONENTE PROPUESTO'])
-            has_categoria = any(col in df.columns for col in ['Categoria', 'Categoría', 'CATEGORÍA'])
-            has_indicador = any(col in df.columns for col in ['Indicador', 'Nombre de indicador', 'Nombre_Indicador'])
-
-            if not (has_componente and has_categoria and has_indicador):
-                return False
+    def load_combined_data(self):
+        """NUEVO: Cargar datos combinados (IndicadoresICE + Fichas con JOIN)"""
+        resultado = self.load_combined_result()
+        streamlit_adapter.render_messages(resultado.messages)
+        return resultado.df
 
-            # Limpiar registros vacíos
-            initial_count = len(df)
-            df.dropna(subset=['COD'], inplace=True)
-            
-            return True
-            
-        except Exception as e:
-            return False
-    
     def get_data_source_info(self):
         """Obtener información de la fuente"""
         if self.sheets_manager:
             return {
                 'source': 'Google Sheets',
-                'connection_info': self.sheets_manager.get_connection_info()
+                'connection_info': self.sheets_manager.get_connection_info(),
+                'entidades': list(self.sheets_managers)
             }
         else:
             return {
@@ -615,211 +155,439 @@ class DataLoader:
                 'connection_info': {'connected': False}
             }
 
-class DataProcessor:
-    """Clase para procesar datos - VERSIÓN CORREGIDA"""
-    
-    @staticmethod
-    def calculate_scores(df, fecha_filtro=None):
-        """Calcular puntajes usando normalización simple - APLICANDO FILTRO DE FECHA"""
-        try:
-            if df.empty:
-                return pd.DataFrame({'Componente': [], 'Puntaje_Ponderado': []}), \
-                       pd.DataFrame({'Categoria': [], 'Puntaje_Ponderado': []}), 0
-            
-            # ✅ APLICAR FILTRO DE FECHA SI SE PROPORCIONA
-            if fecha_filtro is not None:
-                # Convertir fecha_filtro a datetime si es necesario
-                if not pd.api.types.is_datetime64_any_dtype(pd.Series([fecha_filtro])):
-                    fecha_filtro = pd.to_datetime(fecha_filtro)
-                
-                # Filtrar por la fecha específica
-                df_filtrado = df[df['Fecha'] == fecha_filtro].copy()
-                
-                if df_filtrado.empty:
-                    # Si no hay datos para esa fecha exacta, usar los más cercanos
-                    fechas_disponibles = df['Fecha'].dropna().sort_values()
-                    fecha_mas_cercana = fechas_disponibles[fechas_disponibles <= fecha_filtro]
-                    
-                    if not fecha_mas_cercana.empty:
-                        fecha_usar = fecha_mas_cercana.iloc[-1]  # La más reciente antes o igual
-                        df_filtrado = df[df['Fecha'] == fecha_usar].copy()
-                    else:
-                        # Si no hay fechas anteriores, usar la primera disponible
-                        fecha_usar = fechas_disponibles.iloc[0]
-                        df_filtrado = df[df['Fecha'] == fecha_usar].copy()
-            else:
-                # Sin filtro de fecha, usar valores más recientes por indicador
-                df_filtrado = DataProcessor._get_latest_values_by_indicator(df)
-            
-            if df_filtrado.empty:
-                return pd.DataFrame({'Componente': [], 'Puntaje_Ponderado': []}), \
-                       pd.DataFrame({'Categoria': [], 'Puntaje_Ponderado': []}), 0
-            
-            # Resto del método permanece igual...
-            required_columns = ['Valor_Normalizado', 'Peso', 'Componente', 'Categoria']
-            if not all(col in df_filtrado.columns for col in required_columns):
-                return pd.DataFrame({'Componente': [], 'Puntaje_Ponderado': []}), \
-                       pd.DataFrame({'Categoria': [], 'Puntaje_Ponderado': []}), 0
-            
-            # Calcular puntajes por componente
-            puntajes_componente = df_filtrado.groupby('Componente', group_keys=False).apply(
-                lambda x: (x['Valor_Normalizado'] * x['Peso']).sum() / x['Peso'].sum(),
-                include_groups=False
-            ).reset_index()
-            puntajes_componente.columns = ['Componente', 'Puntaje_Ponderado']
-
-            # Calcular puntajes por categoría
-            puntajes_categoria = df_filtrado.groupby('Categoria', group_keys=False).apply(
-                lambda x: (x['Valor_Normalizado'] * x['Peso']).sum() / x['Peso'].sum(),
-                include_groups=False
-            ).reset_index()
-            puntajes_categoria.columns = ['Categoria', 'Puntaje_Ponderado']
-            
-            # Calcular puntaje general
-            peso_total = df_filtrado['Peso'].sum()
-            if peso_total > 0:
-                puntaje_general = (df_filtrado['Valor_Normalizado'] * df_filtrado['Peso']).sum() / peso_total
-            else:
-                puntaje_general = df_filtrado['Valor_Normalizado'].mean()
-            
-            return puntajes_componente, puntajes_categoria, puntaje_general
-            
-        except Exception as e:
-            st.error(f"Error en cálculo de puntajes: {e}")
-            return pd.DataFrame({'Componente': [], 'Puntaje_Ponderado': []}), \
-                   pd.DataFrame({'Categoria': [], 'Puntaje_Ponderado': []}), 0
-    
-    @staticmethod
-    def _score_as_of(df, fecha_corte):
-        """
-        Puntaje general ICE 'a la fecha de corte': para cada indicador (COD), usa
-        su último valor disponible en o antes de fecha_corte (no el más reciente
-        del dataset completo). Indicadores sin ningún dato hasta esa fecha
-        simplemente no participan del promedio de ese corte.
-        """
-        columnas = ['COD', 'Fecha', 'Valor_Normalizado', 'Peso']
-        if not all(c in df.columns for c in columnas):
-            return None, 0
+# Versión de la lógica de procesamiento: forma parte de la clave de los cachés en
+# disco para que un cambio de código no sirva resultados calculados con la anterior.
+# Los módulos entran completos: kernels de normalización y sus constantes, el pool de
+# procesos y las reglas de anomalías
+_PIPELINE_VERSION = code_fingerprint(
+    DatasetPipeline, calcular_factor_inflacion_acumulada, IPC_ANUAL, COLUMN_MAPPING, DEFAULT_META, INDICATOR_TYPES,
+    _normalization, _parallel, _anomalies, NORMALIZATION_CONFIG, ANOMALY_CONFIG
+)
+
+@st.cache_data(persist="disk", show_spinner=False, max_entries=8)
+def _process_combined_data(huella, version, _loader, _df, _fichas_data):
+    """
+    Dataset procesado por huella de IndicadoresICE + Fichas. Los datos (argumentos
+    con '_') no se vuelven a hashear: la huella ya identifica su contenido
+    """
+    return _loader.process_combined(_df, _fichas_data)
+
+class DataProcessor(ScoreEngine):
+    """Clase para procesar datos - VERSIÓN CORREGIDA (cálculo en engine.scoring)"""
 
-        df_valido = df.dropna(subset=['COD', 'Fecha', 'Valor_Normalizado'])
-        df_valido = df_valido[df_valido['Fecha'] <= fecha_corte]
+class TabPayload:
+    """
+    Vista de solo lectura sobre DatasetArtifacts limitada a las dependencias
+    declaradas por una pestaña. Cada atributo se calcula la primera vez que se
+    lee; pedir uno no declarado es un error de programación (AttributeError).
+    """
 
-        if df_valido.empty:
-            return None, 0
+    def __init__(self, artifacts, dependencias):
+        self._artifacts = artifacts
+        self._dependencias = tuple(dependencias)
 
-        df_ultimo = (df_valido
-                     .sort_values(['COD', 'Fecha'])
-                     .groupby('COD')
-                     .last()
-                     .reset_index())
+    @property
+    def df(self):
+        return self._artifacts.df
 
-        peso = df_ultimo['Peso'].fillna(1.0) if 'Peso' in df_ultimo.columns else pd.Series(1.0, index=df_ultimo.index)
-        peso_total = peso.sum()
+    @property
+    def huella(self):
+        """Huella del dataset: clave de los cachés de figuras de la pestaña"""
+        return self._artifacts.huella
 
-        if peso_total > 0:
-            puntaje = (df_ultimo['Valor_Normalizado'] * peso).sum() / peso_total
-        else:
-            puntaje = df_ultimo['Valor_Normalizado'].mean()
+    def __getattr__(self, nombre):
+        if nombre.startswith('_') or nombre not in self._dependencias:
+            raise AttributeError(f"'{nombre}' no está declarado como dependencia de esta pestaña")
+        return self._artifacts.get(nombre)
 
-        return puntaje, len(df_ultimo)
+class DatasetArtifacts:
+    """
+    Derivados del dataset procesado que comparten las pestañas, evaluados de
+    forma perezosa y memoizados por versión del dataset (una instancia por
+    huella de contenido, ver get_dataset_artifacts):
+    - latest: valores más recientes por indicador
+    - score_cube: cubo de puntajes sobre latest (DataProcessor.calculate_score_cube)
+    - historical: serie histórica semestral del ICE
+    - catalog: catálogo de indicadores
+    - system_stats: estadísticas del panel 'Estado del Sistema'
+    - entity_cube: cubo de puntajes por entidad (comparación entre entidades)
+    - scenario_base: vectores por indicador para evaluar escenarios (ScenarioEngine)
+    - contributions: aporte, sensibilidad y ganancia por alcanzar la Meta de cada indicador
+    - historical_bands: bandas Monte Carlo de la serie histórica ante datos faltantes
+    - matrix_<frecuencia>: matriz indicador × periodo (anual, semestral, trimestral) de
+      Valor_Normalizado, con arrastre hacia adelante y máscara de registros
+    - forecast: tendencia lineal y robusta de cada indicador, proyección y fecha de la Meta
+    - correlations: correlación y covarianza entre indicadores por pares completos
+    - changes: cambios de cada indicador (último periodo, anual y desde la línea base)
+    Con huella, cada derivado se guarda además en el caché en disco, de modo que
+    otro proceso con los mismos datos no lo vuelve a calcular. La misma instancia la
+    comparten todas las sesiones: get entrega copias de las tablas y los arreglos
+    NumPy de los derivados son de solo lectura
+    """
+
+    DERIVADOS = ('latest', 'score_cube', 'historical', 'catalog', 'system_stats', 'entity_cube', 'scenario_base',
+                 'contributions', 'historical_bands', 'forecast', 'correlations', 'changes', 'alerts') + tuple(
+                     f'matrix_{frecuencia}' for frecuencia in PERIOD_MATRIX_CONFIG['frequencies'])
+
+    def __init__(self, df, huella=None):
+        self.df = df
+        self.huella = huella
+        self._valores = {}
+        self._lock = threading.RLock()
+
+    def get(self, nombre):
+        """Obtener un derivado, calculándolo solo la primera vez que se pide"""
+        if nombre not in self.DERIVADOS:
+            raise KeyError(f"Derivado desconocido: {nombre}")
+
+        with self._lock:
+            if nombre not in self._valores:
+                if self.huella is None:
+                    valor = self.build(nombre)
+                else:
+                    valor = _persisted_derivative(
+                        nombre, self.huella, self._vigencia(nombre), _DERIVADOS_VERSION, self
+                    )
+                self._valores[nombre] = _freeze(valor)
+            return _shared_copy(self._valores[nombre])
+
+    def build(self, nombre):
+        """Calcular un derivado (sin pasar por ningún caché)"""
+        if nombre.startswith('matrix_'):
+            return PeriodMatrixBuilder.build(self.df, nombre[len('matrix_'):])
+        return getattr(self, f'_build_{nombre}')()
 
     @staticmethod
-    def calculate_ice_historical_series(df):
+    def _vigencia(nombre):
         """
-        Serie histórica semestral del puntaje general ICE: para cada corte
-        (30-jun y 31-dic de cada año, desde el primer dato disponible hasta hoy),
-        calcula el puntaje usando el último valor de cada indicador en o antes
-        de esa fecha de corte.
+        La serie histórica, sus bandas, las matrices y el pronóstico llegan 'hasta hoy' y
+        las alertas cuentan los meses sin reporte hasta hoy: valen solo por el día
         """
-        try:
-            if df.empty or 'Fecha' not in df.columns:
-                return pd.DataFrame(columns=['Fecha_Corte', 'Puntaje_General', 'N_Indicadores'])
-
-            fechas_validas = df['Fecha'].dropna()
-            if not pd.api.types.is_datetime64_any_dtype(fechas_validas):
-                fechas_validas = pd.to_datetime(fechas_validas, errors='coerce').dropna()
-
-            if fechas_validas.empty:
-                return pd.DataFrame(columns=['Fecha_Corte', 'Puntaje_General', 'N_Indicadores'])
-
-            primera_fecha = fechas_validas.min()
-            hoy = pd.Timestamp.now().normalize()
-
-            # Generar cortes semestrales (30-jun y 31-dic) entre el primer dato y hoy
-            cortes = []
-            for anio in range(primera_fecha.year, hoy.year + 1):
-                for corte in [pd.Timestamp(year=anio, month=6, day=30), pd.Timestamp(year=anio, month=12, day=31)]:
-                    if primera_fecha <= corte <= hoy:
-                        cortes.append(corte)
-            cortes = sorted(set(cortes))
-
-            filas = []
-            for corte in cortes:
-                puntaje, n_indicadores = DataProcessor._score_as_of(df, corte)
-                if puntaje is not None:
-                    filas.append({
-                        'Fecha_Corte': corte,
-                        'Puntaje_General': puntaje,
-                        'N_Indicadores': n_indicadores
-                    })
-
-            return pd.DataFrame(filas)
+        por_dia = nombre in ('historical', 'historical_bands', 'forecast', 'alerts') or nombre.startswith('matrix_')
+        return pd.Timestamp.now().strftime('%Y-%m-%d') if por_dia else None
 
-        except Exception as e:
-            st.warning(f"No se pudo calcular la evolución histórica del ICE: {e}")
-            return pd.DataFrame(columns=['Fecha_Corte', 'Puntaje_General', 'N_Indicadores'])
+    def __getattr__(self, nombre):
+        if nombre in DatasetArtifacts.DERIVADOS:
+            return self.get(nombre)
+        raise AttributeError(nombre)
 
-    @staticmethod
-    def _get_latest_values_by_indicator(df):
-        """Obtener valores más recientes por indicador"""
-        try:
-            if df.empty:
-                return df
-            
-            # Verificar columnas necesarias
-            if not all(col in df.columns for col in ['COD', 'Fecha', 'Valor']):
-                return df
+    def derive_incremental(self, df_nuevo, codigos):
+        """
+        Derivados para una nueva versión del dataset que solo difiere de esta en los
+        COD indicados (cuyas filas ya fueron recalculadas en df_nuevo). Los derivados
+        ya calculados aquí se parchan para esos COD en lugar de recalcularse:
+        - latest: se reemplazan las filas de los COD cambiados
+        - score_cube: se propagan los cambios a categoría, componente y general
+        - catalog: se reconstruyen las filas de los COD cambiados
+        El resto queda perezoso y se calcula completo si alguna pestaña lo pide
+        """
+        codigos = list(codigos)
+        nuevo = DatasetArtifacts(df_nuevo, content_fingerprint(df_nuevo))
+        filas_cambiadas = df_nuevo[df_nuevo['COD'].isin(codigos)]
+
+        if self.is_computed('latest'):
+            latest_anterior = self.get('latest')
+            validas = filas_cambiadas.dropna(subset=['COD', 'Fecha', 'Valor'])
+            latest_cambiado = (DataProcessor._get_latest_values_by_indicator(validas)
+                               if not validas.empty else latest_anterior.iloc[0:0])
+            latest = (pd.concat([latest_anterior[~latest_anterior['COD'].isin(codigos)], latest_cambiado],
+                                ignore_index=True)
+                      .sort_values('COD')
+                      .reset_index(drop=True))
+            nuevo._valores['latest'] = latest
+
+            if self.is_computed('score_cube'):
+                nuevo._valores['score_cube'] = DataProcessor.apply_score_deltas(
+                    self.get('score_cube'),
+                    latest_anterior[latest_anterior['COD'].isin(codigos)],
+                    latest_cambiado,
+                    latest
+                )
+
+        if self.is_computed('catalog'):
+            catalogo_anterior = self.get('catalog')
+            catalogo_cambiado = DataProcessor.build_indicator_catalog(filas_cambiadas)
+            partes = [catalogo_anterior.drop(index=codigos, errors='ignore')]
+            if not catalogo_cambiado.empty:
+                partes.append(catalogo_cambiado)
+            nuevo._valores['catalog'] = pd.concat(partes).sort_index()
+
+        return nuevo
+
+    def payload(self, dependencias):
+        """Vista perezosa con solo las dependencias declaradas por una pestaña"""
+        desconocidas = [d for d in dependencias if d not in self.DERIVADOS]
+        if desconocidas:
+            raise KeyError(f"Derivados desconocidos: {desconocidas}")
+        return TabPayload(self, dependencias)
+
+    def preload(self, valores):
+        """Registrar derivados ya calculados (p. ej. artefactos de precompute.py)"""
+        with self._lock:
+            for nombre, valor in valores.items():
+                if nombre in self.DERIVADOS and valor is not None:
+                    self._valores[nombre] = _freeze(valor)
+
+    def is_computed(self, nombre):
+        """Indica si un derivado ya fue calculado (útil para diagnóstico)"""
+        return nombre in self._valores
+
+    def _build_latest(self):
+        return DataProcessor._get_latest_values_by_indicator(self.df)
+
+    def _build_score_cube(self):
+        return DataProcessor.calculate_score_cube(self.get('latest'))
+
+    def _build_historical(self):
+        return DataProcessor.calculate_ice_historical_series(self.df)
+
+    def _build_historical_bands(self):
+        return DataProcessor.calculate_ice_uncertainty_bands(self.df, matriz=self.get('matrix_semestral'))
+
+    def _build_forecast(self):
+        # Tendencia en las unidades del gráfico de evolución (valor recalculado), no normalizada
+        columna = 'Valor_Recalculado' if 'Valor_Recalculado' in self.df.columns else 'Valor'
+        matriz = PeriodMatrixBuilder.build(self.df, FORECAST_CONFIG['frequency'], columna=columna)
+        return ForecastEngine.forecast(matriz, ForecastEngine.meta_vector(self.df, matriz))
+
+    def _build_correlations(self):
+        # Solo usa los periodos con registro: no depende del día, sí de la huella del dataset
+        return CorrelationEngine.pairwise(self.get(f"matrix_{CORRELATION_CONFIG['frequency']}"))
+
+    def _build_changes(self):
+        return DataProcessor.calculate_change_summary(self.df)
+
+    def _build_alerts(self):
+        return AlertEngine.evaluate(self.get('latest'), self.get('changes'))
+
+    def _build_catalog(self):
+        return DataProcessor.build_indicator_catalog(self.df)
+
+    def _build_entity_cube(self):
+        return DataProcessor.calculate_entity_score_cube(self.get('latest'))
+
+    def _build_contributions(self):
+        return DataProcessor.calculate_contributions(self.get('latest'))
+
+    def _build_scenario_base(self):
+        return ScenarioEngine.prepare(self.df)
+
+    def _build_system_stats(self):
+        df = self.df
+        stats = {
+            'registros': len(df),
+            'indicadores': df['COD'].nunique() if 'COD' in df.columns else 0,
+            'fechas': None,
+            'fecha_min': None,
+            'fecha_max': None,
+            'registros_por_componente': pd.Series(dtype='int64'),
+            'anomalias': 0,
+            'indicadores_con_anomalias': 0
+        }
+
+        if 'Fecha' in df.columns:
+            stats['fechas'] = df['Fecha'].nunique()
+            stats['fecha_min'] = df['Fecha'].min()
+            stats['fecha_max'] = df['Fecha'].max()
+
+        if 'Componente' in df.columns:
+            stats['registros_por_componente'] = df['Componente'].dropna().value_counts().sort_index()
+
+        if 'Anomalia' in df.columns:
+            marcados = df['Anomalia'].fillna(False).astype(bool)
+            stats['anomalias'] = int(marcados.sum())
+            stats['indicadores_con_anomalias'] = int(df.loc[marcados, 'COD'].nunique())
+
+        return stats
+
+def _freeze(valor):
+    """Marcar como de solo lectura los arreglos NumPy de un derivado compartido (en su lugar)"""
+    if isinstance(valor, np.ndarray):
+        valor.flags.writeable = False
+    elif isinstance(valor, dict):
+        for elemento in valor.values():
+            _freeze(elemento)
+    elif not isinstance(valor, (pd.DataFrame, pd.Series)) and hasattr(valor, '__dict__'):
+        # Contenedores de vectores (ScenarioBase, PeriodMatrix)
+        for elemento in vars(valor).values():
+            _freeze(elemento)
+    return valor
+
+def _shared_copy(valor):
+    """Copia de las tablas de un derivado compartido: quien la modifique no afecta a otras sesiones"""
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        return valor.copy()
+    if isinstance(valor, dict):
+        return {clave: _shared_copy(elemento) for clave, elemento in valor.items()}
+    return valor
+
+# Módulos completos (constantes y funciones auxiliares incluidas) y su configuración
+_DERIVADOS_VERSION = code_fingerprint(
+    _scoring, _scenarios, _normalization, _matrix, _forecast, _correlation, _alerts, DatasetArtifacts,
+    _freeze, _shared_copy, UNCERTAINTY_CONFIG, PERIOD_MATRIX_CONFIG, FORECAST_CONFIG, CORRELATION_CONFIG,
+    ALERTS_CONFIG['rules']
+)
+
+@st.cache_data(persist="disk", show_spinner=False, max_entries=64)
+def _persisted_derivative(nombre, huella, vigencia, version, _artifacts):
+    """Derivado por (nombre, huella del dataset): compartido entre procesos vía disco"""
+    return _artifacts.build(nombre)
+
+# Derivados ya parchados (derive_incremental) a la espera de su primera consulta
+_ARTIFACTS_SEMBRADOS = {}
+_ARTIFACTS_SEMBRADOS_LOCK = threading.Lock()
+
+def seed_dataset_artifacts(artifacts):
+    """Registrar derivados precalculados para que get_dataset_artifacts los use con esa huella"""
+    with _ARTIFACTS_SEMBRADOS_LOCK:
+        # Solo se guarda el último: si su huella ya estaba en caché, nunca se consultará
+        _ARTIFACTS_SEMBRADOS.clear()
+        _ARTIFACTS_SEMBRADOS[artifacts.huella] = artifacts
+
+def get_dataset_artifacts(df, huella=None):
+    """
+    Derivados perezosos compartidos por versión del dataset: la huella del
+    contenido de df es la clave, así que mientras los datos no cambien todas las
+    sesiones y reruns reutilizan los mismos resultados ya calculados. Si el
+    llamador ya conoce la huella, se evita volver a calcularla
+    """
+    if huella is None:
+        huella = content_fingerprint(df)
+    return _get_dataset_artifacts(huella, df)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _get_dataset_artifacts(huella, _df):
+    with _ARTIFACTS_SEMBRADOS_LOCK:
+        sembrado = _ARTIFACTS_SEMBRADOS.pop(huella, None)
+    if sembrado is not None:
+        return sembrado
+    return DatasetArtifacts(_df, huella)
+
+def clear_dataset_artifacts():
+    """Vaciar los derivados en memoria y en disco (botón 'Limpiar Cache')"""
+    _get_dataset_artifacts.clear()
+    _persisted_derivative.clear()
+
+def recompute_changed_indicators(df_anterior, df_nuevo, codigos, fichas_data=None, huella_anterior=None):
+    """
+    Entrada incremental del pipeline para un conjunto de COD cambiados: recalcula
+    Valor_Normalizado y Valor_Recalculado solo de sus filas en df_nuevo (lo modifica)
+    y parcha los derivados de la versión anterior (vista de últimos valores, cubo de
+    puntajes y catálogo). Una edición cuesta lo que las filas de esos indicadores,
+    no el dataset completo
+    """
+    DatasetPipeline().rederive_indicators(df_nuevo, codigos, fichas_data)
+    artifacts = get_dataset_artifacts(df_anterior, huella_anterior).derive_incremental(df_nuevo, codigos)
+    seed_dataset_artifacts(artifacts)
+    return artifacts
 
-            # Limpiar datos
-            df_clean = df.dropna(subset=['COD', 'Fecha', 'Valor'])
+def get_entity_view(df, fichas_data, fingerprint, entidad):
+    """
+    Dataset, fichas y huellas de una entidad para las pestañas. Si el dataset tiene
+    una sola entidad (o ninguna), se devuelve tal cual con las mismas huellas: así
+    se reutilizan los derivados ya calculados o precalculados del dataset
+    """
+    fingerprint = dict(fingerprint or {})
+    if len(entity_names(df)) <= 1 or entidad not in entity_names(df):
+        return df, fichas_data, fingerprint
+
+    huella = fingerprint.get('derivados') or content_fingerprint(df)
+    df_entidad, fichas_entidad, huellas = _entity_view(huella, entidad, df, fichas_data)
+    # Fichas e indicadores propios: los PDF y los derivados no se mezclan entre entidades
+    fingerprint.update(huellas, dataset=(fingerprint.get('entidades') or {}).get(entidad))
+    return df_entidad, fichas_entidad, fingerprint
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _entity_view(huella, entidad, _df, _fichas_data):
+    df_entidad = filter_entity(_df, entidad)
+    fichas_entidad = filter_entity(_fichas_data, entidad)
+    return df_entidad, fichas_entidad, {
+        'derivados': content_fingerprint(df_entidad),
+        'fichas': content_fingerprint(fichas_entidad)
+    }
+
+def get_indicator_catalog(df, huella=None):
+    """
+    Catálogo de indicadores cacheado por versión del dataset. Si el llamador ya
+    conoce la huella (fingerprint['derivados'] del snapshot) no se recalcula
+    """
+    return get_dataset_artifacts(df, huella).catalog
 
-            if df_clean.empty:
-                return df
+class DataEditor:
+    """Clase para editar datos - VERSIÓN CORREGIDA"""
 
-            # Obtener valores más recientes
-            df_latest = (df_clean
-                        .sort_values(['COD', 'Fecha'])
-                        .groupby('COD')
-                        .last()
-                        .reset_index())
-            
-            return df_latest
-            
-        except Exception as e:
-            st.error(f"Error al obtener valores recientes: {e}")
+    @staticmethod
+    def apply_record_change(df, operacion, codigo, fecha, valor=None, registro=None):
+        """
+        Aplicar localmente a una copia del DataFrame procesado un cambio ya escrito
+        en Google Sheets ('agregar', 'actualizar' o 'eliminar'), sin recalcular
+        derivados. Para 'agregar', los metadatos se copian del mismo COD o, si es un
+        indicador nuevo, se toman de registro (fila con los nombres de columnas de Sheets)
+        """
+        df = df.copy()
+        fecha = pd.Timestamp(fecha)
+        misma_fecha = df['Fecha'].dt.normalize() == fecha.normalize()
+        coincidencias = df.index[(df['COD'] == codigo) & misma_fecha]
+
+        if operacion == 'actualizar':
+            if coincidencias.empty:
+                raise KeyError(f"No existe registro de {codigo} para {fecha:%d/%m/%Y}")
+            # Google Sheets actualiza la primera fila que coincide
+            df.at[coincidencias[0], 'Valor'] = float(valor)
             return df
 
-class DataEditor:
-    """Clase para editar datos - VERSIÓN CORREGIDA"""
+        if operacion == 'eliminar':
+            if coincidencias.empty:
+                raise KeyError(f"No existe registro de {codigo} para {fecha:%d/%m/%Y}")
+            return df.drop(index=coincidencias[0]).reset_index(drop=True)
+
+        if operacion == 'agregar':
+            existentes = df[df['COD'] == codigo]
+            if not existentes.empty:
+                nueva_fila = existentes.iloc[0].copy()
+            else:
+                registro = registro or {}
+                nueva_fila = pd.Series(np.nan, index=df.columns, dtype=object)
+                nueva_fila['Componente'] = registro.get('COMPONENTE PROPUESTO')
+                nueva_fila['Categoria'] = registro.get('CATEGORÍA')
+                nueva_fila['Indicador'] = registro.get('Nombre de indicador')
+                nueva_fila['Tipo'] = registro.get('Tipo', 'porcentaje')
+                nueva_fila['Peso'] = 1.0
+                if 'Entidad' in df.columns:
+                    # Las ediciones se escriben en la hoja de la entidad principal
+                    nueva_fila['Entidad'] = next(iter(entity_names(df)), ENTITIES_CONFIG['default_entity'])
+                if 'Calculo' in df.columns:
+                    # Sin ficha aún: celda vacía, como la devuelve Google Sheets
+                    nueva_fila['Calculo'] = ''
+
+            nueva_fila['COD'] = codigo
+            nueva_fila['Fecha'] = fecha
+            nueva_fila['Valor'] = float(valor)
+            nueva_fila['Valor_Normalizado'] = np.nan
+            nueva_fila['Valor_Recalculado'] = np.nan
+            nuevo = pd.DataFrame([nueva_fila], columns=df.columns).astype(df.dtypes.to_dict(), errors='ignore')
+            return pd.concat([df, nuevo], ignore_index=True)
+
+        raise ValueError(f"Operación desconocida: {operacion}")
     
     @staticmethod
     def add_new_record(df, codigo, fecha, valor, csv_path=None):
         """Agregar nuevo registro"""
         try:
             if not GOOGLE_SHEETS_AVAILABLE:
-                st.error("❌ Google Sheets no disponible")
+                report('error', "❌ Google Sheets no disponible")
                 return False
             
             sheets_manager = GoogleSheetsManager()
             
             # Buscar información base
             if df.empty:
-                st.error("❌ No hay datos base disponibles")
+                report('error', "❌ No hay datos base disponibles")
                 return False
             
             indicador_existente = df[df['COD'] == codigo]
             if indicador_existente.empty:
-                st.error(f"❌ No se encontró el código {codigo}")
+                report('error', f"❌ No se encontró el código {codigo}")
                 return False
             
             indicador_base = indicador_existente.iloc[0]
@@ -839,7 +607,7 @@ class DataEditor:
             return sheets_manager.add_record(data_dict)
             
         except Exception as e:
-            st.error(f"❌ Error al agregar: {e}")
+            report('error', f"❌ Error al agregar: {e}")
             return False
     
     @staticmethod
@@ -853,7 +621,7 @@ class DataEditor:
             return sheets_manager.update_record(codigo, fecha, nuevo_valor)
             
         except Exception as e:
-            st.error(f"❌ Error al actualizar: {e}")
+            report('error', f"❌ Error al actualizar: {e}")
             return False
     
     @staticmethod
@@ -867,7 +635,7 @@ class DataEditor:
             return sheets_manager.delete_record(codigo, fecha)
             
         except Exception as e:
-            st.error(f"❌ Error al eliminar: {e}")
+            report('error', f"❌ Error al eliminar: {e}")
             return False
 
 class SheetsDataLoader:
@@ -880,7 +648,7 @@ class SheetsDataLoader:
             try:
                 self.sheets_manager = GoogleSheetsManager()
             except Exception as e:
-                st.error(f"❌ Error al inicializar Google Sheets para fichas: {e}")
+                report('error', f"❌ Error al inicializar Google Sheets para fichas: {e}")
     
     def load_fichas_data(self):
         """Cargar datos de fichas metodológicas desde Google Sheets"""
@@ -903,7 +671,7 @@ class SheetsDataLoader:
             return fichas_df
             
         except Exception as e:
-            st.error(f"❌ Error al cargar fichas desde Sheets: {e}")
+            report('error', f"❌ Error al cargar fichas desde Sheets: {e}")
             return None
     
     def add_ficha(self, ficha_data):
@@ -915,7 +683,7 @@ class SheetsDataLoader:
             return self.sheets_manager.add_ficha_record(ficha_data)
             
         except Exception as e:
-            st.error(f"❌ Error al agregar ficha: {e}")
+            report('error', f"❌ Error al agregar ficha: {e}")
             return False
     
     def update_ficha(self, codigo, campo, nuevo_valor):
@@ -927,7 +695,7 @@ class SheetsDataLoader:
             return self.sheets_manager.update_ficha_record(codigo, campo, nuevo_valor)
             
         except Exception as e:
-            st.error(f"❌ Error al actualizar ficha: {e}")
+            report('error', f"❌ Error al actualizar ficha: {e}")
             return False
 
 # Mantener compatibilidad con ExcelDataLoader para transición gradual
@@ -935,11 +703,11 @@ class ExcelDataLoader:
     """CLASE OBSOLETA: Mantenida para compatibilidad pero ya no se usa"""
     
     def __init__(self):
-        st.warning("⚠️ ExcelDataLoader obsoleto. Ahora se usan fichas de Google Sheets.")
+        report('warning', "⚠️ ExcelDataLoader obsoleto. Ahora se usan fichas de Google Sheets.")
     
     def load_excel_data(self):
         """Método obsoleto"""
-        st.info("📋 Cargando fichas desde Google Sheets en lugar de Excel...")
+        report('info', "📋 Cargando fichas desde Google Sheets en lugar de Excel...")
         
         # Redirigir a SheetsDataLoader
         sheets_loader = SheetsDataLoader()
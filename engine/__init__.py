@@ -0,0 +1,24 @@
+"""
+Motor de cálculo del Dashboard ICE, sin dependencia de Streamlit
+Carga desde Google Sheets, procesamiento, normalización y puntajes. Se usa desde
+el tablero (a través del adaptador streamlit_adapter), hilos de refresco,
+procesos de trabajo y jobs programados
+"""
+
+from engine.errors import EngineError, ConfigurationError, SourceUnavailableError, DataValidationError
+from engine.messages import Message, report, collect_messages, set_receiver
+from engine.pipeline import (
+    IPC_ANUAL, calcular_factor_inflacion_acumulada, DatasetPipeline, LoadResult, load_combined_dataset
+)
+from engine.alerts import ALERT_COLUMNS, AlertEngine, AlertLedger
+from engine.anomalies import ANOMALY_COLUMNS, AnomalyDetector
+from engine.matrix import PeriodMatrix, PeriodMatrixBuilder
+from engine.normalization import ESTRATEGIAS, NormalizationEngine, register_strategy
+from engine.forecast import ForecastEngine
+from engine.correlation import CorrelationEngine
+from engine.scoring import ScoreEngine
+from engine.scenarios import ScenarioBase, ScenarioEngine
+from engine.entities import (
+    ENTITY_COLUMN, FICHAS_ENTITY_COLUMN, build_entity_registry, entity_names, filter_entity,
+    load_entities_dataset
+)
@@ -0,0 +1,259 @@
+"""
+Alertas por umbral del Dashboard ICE (sin Streamlit)
+Las reglas de ALERTS_CONFIG se evalúan en lote sobre la vista de valores más
+recientes y la tabla de cambios: cada regla es una comparación vectorizada sobre la
+columna de su métrica, sin recorrer los indicadores uno a uno. El historial
+(AlertLedger) conserva, por alerta, cuándo se vio por primera y por última vez y
+cuándo se resolvió; se actualiza una vez por versión publicada del dataset, no en
+cada rerun
+"""
+
+import json
+import os
+import operator
+import threading
+import time
+import numpy as np
+import pandas as pd
+from config import ALERTS_CONFIG
+from engine.messages import logger
+
+ALERT_COLUMNS = ('Clave', 'Regla', 'Nivel', 'Severidad', 'Entidad', 'COD', 'Indicador', 'Componente',
+                 'Metrica', 'Valor', 'Umbral', 'Descripcion')
+LEDGER_COLUMNS = ALERT_COLUMNS + ('Estado', 'Primera_Vez', 'Ultima_Vez', 'Resuelta_En')
+
+OPERADORES = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge
+}
+
+# Métricas disponibles por nivel (columnas de AlertEngine.metrics)
+METRICAS = {
+    'indicador': ('puntaje', 'meses_sin_reporte', 'cambio_anual_pct', 'cambio_periodo_pct'),
+    'componente': ('puntaje', 'meses_sin_reporte', 'cambio_anual_norm')
+}
+
+_DIAS_POR_MES = 365.25 / 12
+
+class AlertEngine:
+    """Evaluación vectorizada de las reglas de alerta"""
+
+    @staticmethod
+    def metrics(df_latest, cambios, hoy=None):
+        """
+        Métricas de las reglas por nivel: {'indicador': DataFrame, 'componente': DataFrame}.
+        Por indicador (una fila por COD, o por Entidad y COD): puntaje normalizado y
+        meses desde el último registro (vista de valores más recientes) y cambios
+        anual y del periodo en fracción del valor de referencia (tabla de cambios).
+        Por componente: puntaje ponderado (como el cubo de puntajes), meses desde el
+        registro más reciente del componente y cambio anual ponderado del puntaje
+        normalizado
+        """
+        hoy = pd.Timestamp(hoy) if hoy is not None else pd.Timestamp.now().normalize()
+        vacio = {nivel: pd.DataFrame(columns=['Entidad', 'COD', 'Indicador', 'Componente'] + list(metricas))
+                 for nivel, metricas in METRICAS.items()}
+        if df_latest is None or df_latest.empty or not all(c in df_latest.columns for c in ('COD', 'Fecha')):
+            return vacio
+
+        claves = ['Entidad', 'COD'] if 'Entidad' in df_latest.columns else ['COD']
+        fechas = pd.to_datetime(df_latest['Fecha'], errors='coerce')
+        indicadores = pd.DataFrame({
+            'Entidad': df_latest['Entidad'] if 'Entidad' in df_latest.columns else None,
+            'COD': df_latest['COD'],
+            'Indicador': df_latest.get('Indicador'),
+            'Componente': df_latest.get('Componente'),
+            'Peso': pd.to_numeric(df_latest.get('Peso', 1.0), errors='coerce'),
+            'puntaje': pd.to_numeric(df_latest.get('Valor_Normalizado', np.nan), errors='coerce'),
+            'meses_sin_reporte': (hoy - fechas).dt.days / _DIAS_POR_MES,
+            'Fecha': fechas
+        }).reset_index(drop=True)
+
+        # Cambios: mismo orden de claves que la vista de últimos valores
+        columnas_cambio = {'Cambio_Anual_Pct': 'cambio_anual_pct', 'Cambio_Periodo_Pct': 'cambio_periodo_pct',
+                           'Cambio_Anual_Norm': 'cambio_anual_norm'}
+        if cambios is not None and not cambios.empty and all(c in cambios.columns for c in claves):
+            tabla = cambios.set_index(claves)[list(columnas_cambio)].rename(columns=columnas_cambio)
+            posicion = tabla.index.get_indexer(pd.MultiIndex.from_frame(indicadores[claves])
+                                               if len(claves) > 1 else pd.Index(indicadores['COD']))
+            for columna in columnas_cambio.values():
+                valores = pd.to_numeric(tabla[columna], errors='coerce').to_numpy(dtype=float)
+                indicadores[columna] = np.where(posicion >= 0, valores[np.maximum(posicion, 0)], np.nan)
+        else:
+            for columna in columnas_cambio.values():
+                indicadores[columna] = np.nan
+
+        componentes = vacio['componente']
+        if indicadores['Componente'].notna().any():
+            base = indicadores.assign(
+                Entidad=indicadores['Entidad'].fillna(''),
+                Ponderado=indicadores['puntaje'] * indicadores['Peso'],
+                Ponderado_Cambio=indicadores['cambio_anual_norm'] * indicadores['Peso'],
+                Peso_Cambio=indicadores['Peso'].where(indicadores['cambio_anual_norm'].notna())
+            )
+            grupos = base.dropna(subset=['Componente']).groupby(['Entidad', 'Componente'], sort=True)
+            agregado = grupos.agg(Suma=('Ponderado', 'sum'), Peso=('Peso', 'sum'), Fecha=('Fecha', 'max'),
+                                  Suma_Cambio=('Ponderado_Cambio', 'sum'), Peso_Cambio=('Peso_Cambio', 'sum'))
+            agregado = agregado.reset_index()
+            componentes = pd.DataFrame({
+                'Entidad': agregado['Entidad'].where(agregado['Entidad'] != '', None),
+                'COD': None,
+                'Indicador': None,
+                'Componente': agregado['Componente'],
+                'puntaje': agregado['Suma'] / agregado['Peso'].where(agregado['Peso'] > 0),
+                'meses_sin_reporte': (hoy - agregado['Fecha']).dt.days / _DIAS_POR_MES,
+                'cambio_anual_norm': agregado['Suma_Cambio'] / agregado['Peso_Cambio'].where(agregado['Peso_Cambio'] > 0)
+            })
+
+        return {'indicador': indicadores.drop(columns=['Peso', 'Fecha']), 'componente': componentes}
+
+    @staticmethod
+    def evaluate(df_latest, cambios, reglas=None, hoy=None):
+        """
+        Alertas activas: una fila por regla y elemento (indicador o componente) que
+        cumple la condición, con las columnas ALERT_COLUMNS. La Clave identifica la
+        alerta entre evaluaciones (regla, entidad y COD o componente). Las reglas con
+        nivel, métrica u operador desconocidos se omiten con un aviso en el log
+        """
+        reglas = ALERTS_CONFIG['rules'] if reglas is None else reglas
+        metricas = AlertEngine.metrics(df_latest, cambios, hoy)
+
+        partes = []
+        for regla in reglas:
+            nivel, metrica = regla.get('nivel'), regla.get('metrica')
+            comparar = OPERADORES.get(regla.get('operador'))
+            if metrica not in METRICAS.get(nivel, ()) or comparar is None:
+                logger.warning("Regla de alerta inválida: %s", regla.get('id'))
+                continue
+
+            tabla = metricas[nivel]
+            valores = pd.to_numeric(tabla[metrica], errors='coerce')
+            cumple = valores.notna() & comparar(valores, regla['umbral'])
+            if regla.get('componentes'):
+                cumple &= tabla['Componente'].isin(regla['componentes'])
+            if regla.get('codigos'):
+                cumple &= tabla['COD'].isin(regla['codigos'])
+            if not cumple.any():
+                continue
+
+            filas = tabla.loc[cumple, ['Entidad', 'COD', 'Indicador', 'Componente']].copy()
+            filas['Valor'] = valores[cumple]
+            elemento = filas['COD'] if nivel == 'indicador' else filas['Componente']
+            filas['Clave'] = (regla['id'] + '|' + filas['Entidad'].fillna('').astype(str)
+                              + '|' + elemento.astype(str))
+            filas['Regla'] = regla['id']
+            filas['Nivel'] = nivel
+            filas['Severidad'] = regla.get('severidad', 'media')
+            filas['Metrica'] = metrica
+            filas['Umbral'] = regla['umbral']
+            filas['Descripcion'] = regla.get('descripcion', regla['id'])
+            partes.append(filas)
+
+        if not partes:
+            return pd.DataFrame(columns=list(ALERT_COLUMNS))
+        return pd.concat(partes, ignore_index=True)[list(ALERT_COLUMNS)]
+
+class AlertLedger:
+    """
+    Historial de alertas compartido por el proceso: por Clave, la última evaluación
+    de la alerta, su Estado ('Activa' o 'Resuelta'), Primera_Vez y Ultima_Vez en que
+    se vio activa y Resuelta_En (marcas de tiempo en segundos). Una alerta resuelta que
+    vuelve a cumplirse empieza un nuevo episodio. Si se indica una ruta, el historial se
+    lee al crearlo y se guarda en JSON tras cada actualización. La tabla y el resumen se
+    arman al actualizar: leerlos en cada rerun no recalcula nada
+    """
+
+    def __init__(self, ruta=None, conservar_dias=None):
+        self.ruta = ruta
+        self.conservar_dias = ALERTS_CONFIG['keep_resolved_days'] if conservar_dias is None else conservar_dias
+        self.huella = None
+        self.evaluada_en = None
+        self._lock = threading.Lock()
+        self._registros = {}
+        self._load()
+        self._tabla, self._resumen = self._build_views()
+
+    def update(self, activas, huella=None, ahora=None):
+        """Registrar una evaluación: activas es el resultado de AlertEngine.evaluate"""
+        ahora = time.time() if ahora is None else float(ahora)
+        filas = activas.astype(object).where(activas.notna(), None).to_dict('records')
+
+        with self._lock:
+            vistas = set()
+            for fila in filas:
+                clave = fila['Clave']
+                vistas.add(clave)
+                previo = self._registros.get(clave)
+                nuevo_episodio = previo is None or previo['Estado'] != 'Activa'
+                fila.update(Estado='Activa', Ultima_Vez=ahora, Resuelta_En=None,
+                            Primera_Vez=ahora if nuevo_episodio else previo['Primera_Vez'])
+                self._registros[clave] = fila
+
+            limite = ahora - self.conservar_dias * 86400
+            for clave, registro in list(self._registros.items()):
+                if clave in vistas:
+                    continue
+                if registro['Estado'] == 'Activa':
+                    registro.update(Estado='Resuelta', Resuelta_En=ahora)
+                elif (registro['Resuelta_En'] or 0) < limite:
+                    del self._registros[clave]
+
+            self.huella, self.evaluada_en = huella, ahora
+            self._tabla, self._resumen = self._build_views()
+            self._save()
+
+    def table(self):
+        """Historial como DataFrame (activas primero, luego por severidad y antigüedad)"""
+        return self._tabla
+
+    def summary(self):
+        """Conteos para el indicador de la barra lateral"""
+        return self._resumen
+
+    def _build_views(self):
+        tabla = pd.DataFrame(list(self._registros.values()), columns=list(LEDGER_COLUMNS))
+        if not tabla.empty:
+            tabla['_activa'] = tabla['Estado'] != 'Activa'
+            tabla['_severidad'] = tabla['Severidad'].map({'alta': 0, 'media': 1}).fillna(2)
+            tabla = (tabla.sort_values(['_activa', '_severidad', 'Primera_Vez'])
+                     .drop(columns=['_activa', '_severidad']).reset_index(drop=True))
+
+        activas = tabla[tabla['Estado'] == 'Activa']
+        resumen = {
+            'activas': len(activas),
+            'nuevas': int((activas['Primera_Vez'] == self.evaluada_en).sum()) if self.evaluada_en else 0,
+            'por_severidad': activas['Severidad'].value_counts().to_dict(),
+            'resueltas': int((tabla['Estado'] == 'Resuelta').sum()),
+            'evaluada_en': self.evaluada_en
+        }
+        return tabla, resumen
+
+    def _load(self):
+        if not self.ruta:
+            return
+        try:
+            with open(self.ruta, encoding='utf-8') as archivo:
+                contenido = json.load(archivo)
+            self._registros = {r['Clave']: r for r in contenido.get('alertas', [])}
+            self.evaluada_en = contenido.get('evaluada_en')
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Historial de alertas ilegible (%s): se empieza vacío", e)
+
+    def _save(self):
+        if not self.ruta:
+            return
+        try:
+            carpeta = os.path.dirname(self.ruta)
+            if carpeta:
+                os.makedirs(carpeta, exist_ok=True)
+            # Escribir en un temporal y reemplazar: un lector nunca ve el archivo a medias
+            temporal = f"{self.ruta}.tmp"
+            with open(temporal, 'w', encoding='utf-8') as archivo:
+                json.dump({'evaluada_en': self.evaluada_en, 'alertas': list(self._registros.values())},
+                          archivo, ensure_ascii=False, default=str)
+            os.replace(temporal, self.ruta)
+        except OSError as e:
+            logger.warning("No se pudo guardar el historial de alertas: %s", e)
@@ -0,0 +1,123 @@
+"""
+Detección de registros atípicos del Dashboard ICE (sin Streamlit)
+Un dato mal digitado (pesos en lugar de millones, una coma corrida) desplaza el
+mínimo o el máximo de la normalización min-max de su indicador sin que nada lo
+advierta. En cada carga se revisa el histórico de cada COD con pruebas robustas
+calculadas en lote con groupby/transform (sin recorrer los indicadores uno a uno) y
+se marcan los registros en las columnas Anomalia y Motivo_Anomalia del dataset.
+Solo se marcan: los valores no se modifican ni se excluyen
+"""
+
+import numpy as np
+import pandas as pd
+from config import ANOMALY_CONFIG
+
+ANOMALY_COLUMNS = ('Anomalia', 'Motivo_Anomalia')
+
+# Desviación estándar de datos normales a partir de la MAD y de la desviación media absoluta
+_MAD_NORMAL = 1.4826
+_MEANAD_NORMAL = 1.2533
+
+class AnomalyDetector:
+    """Pruebas vectorizadas de registros atípicos por indicador"""
+
+    @staticmethod
+    def detect(df, config=None):
+        """
+        DataFrame (mismo índice que df) con una columna booleana por prueba:
+        'z robusto', 'IQR', 'salto vs tendencia' y 'magnitud'. Cada prueba compara el
+        Valor de un registro con el histórico de su indicador (por Entidad y COD si el
+        dataset tiene esa dimensión); los indicadores con menos de min_points
+        registros no se marcan
+        """
+        config = config or ANOMALY_CONFIG
+        pruebas = ['z robusto', 'IQR', 'salto vs tendencia', 'magnitud']
+        resultado = pd.DataFrame(False, index=df.index, columns=pruebas)
+        if df.empty or not all(c in df.columns for c in ('COD', 'Fecha', 'Valor')):
+            return resultado
+
+        claves = ['Entidad', 'COD'] if 'Entidad' in df.columns else ['COD']
+        valor = pd.to_numeric(df['Valor'], errors='coerce')
+        fecha = pd.to_datetime(df['Fecha'], errors='coerce')
+        validos = valor.notna() & fecha.notna() & df['COD'].notna()
+        if not validos.any():
+            return resultado
+
+        datos = pd.DataFrame({
+            'grupo': df.loc[validos].groupby(claves, sort=False, dropna=False).ngroup(),
+            'x': valor[validos],
+            # Tiempo en años: pendiente de la tendencia por año
+            't': (fecha[validos] - pd.Timestamp('2000-01-01')).dt.days / 365.25
+        })
+        grupos = datos.groupby('grupo')
+        suficientes = grupos['x'].transform('size') >= config['min_points']
+
+        # z robusto: distancia a la mediana en unidades de MAD escalada
+        z = AnomalyDetector._robust_z(datos['x'], datos['grupo'])
+        resultado.loc[datos.index, 'z robusto'] = (suficientes & (z > config['robust_z'])).to_numpy()
+
+        # Cercas de Tukey: fuera de [Q1 - k·IQR, Q3 + k·IQR]
+        q1 = grupos['x'].transform('quantile', 0.25)
+        q3 = grupos['x'].transform('quantile', 0.75)
+        rango = config['iqr_factor'] * (q3 - q1)
+        fuera = ((datos['x'] < q1 - rango) | (datos['x'] > q3 + rango)) & (q3 > q1)
+        resultado.loc[datos.index, 'IQR'] = (suficientes & fuera).to_numpy()
+
+        # Salto frente a la tendencia: residuo de la recta del indicador con z robusto
+        t_media = grupos['t'].transform('mean')
+        x_media = grupos['x'].transform('mean')
+        dt = datos['t'] - t_media
+        s_tt = (dt * dt).groupby(datos['grupo']).transform('sum')
+        s_tx = (dt * (datos['x'] - x_media)).groupby(datos['grupo']).transform('sum')
+        pendiente = (s_tx / s_tt.where(s_tt > 0)).fillna(0.0)
+        residuo = datos['x'] - (x_media + pendiente * dt)
+        z_tendencia = AnomalyDetector._robust_z(residuo, datos['grupo'])
+        resultado.loc[datos.index, 'salto vs tendencia'] = (
+            suficientes & (z_tendencia > config['trend_z'])).to_numpy()
+
+        # Magnitud: varios órdenes de magnitud por encima o por debajo de la mediana
+        mediana = grupos['x'].transform('median')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ordenes = np.abs(np.log10(datos['x'] / mediana))
+        escala = (datos['x'] > 0) & (mediana > 0) & (ordenes >= config['magnitude_orders'])
+        resultado.loc[datos.index, 'magnitud'] = (suficientes & escala).to_numpy()
+
+        return resultado
+
+    @staticmethod
+    def _robust_z(x, grupo):
+        # |x - mediana| / (1.4826·MAD); con MAD 0 (mayoría de valores iguales) se usa la
+        # desviación media absoluta, y si también es 0 ningún registro se marca
+        desviacion = (x - x.groupby(grupo).transform('median')).abs()
+        por_grupo = desviacion.groupby(grupo)
+        escala = _MAD_NORMAL * por_grupo.transform('median')
+        escala = escala.where(escala > 0, _MEANAD_NORMAL * por_grupo.transform('mean'))
+        return (desviacion / escala.where(escala > 0)).fillna(0.0)
+
+    @staticmethod
+    def flag(df, config=None):
+        """
+        Escribir en df (lo modifica) Anomalia (bool) y Motivo_Anomalia (pruebas que
+        señalaron el registro, separadas por coma; vacío si no es atípico). Una sola
+        prueba estadística no basta en históricos cortos: hacen falta min_votes, salvo
+        la de magnitud, que basta por sí sola
+        """
+        config = config or ANOMALY_CONFIG
+        pruebas = AnomalyDetector.detect(df, config)
+        anomalia = (pruebas.sum(axis=1) >= config['min_votes']) | pruebas['magnitud']
+        df['Anomalia'] = anomalia.to_numpy()
+        motivo = pd.Series('', index=df.index, dtype=object)
+        for prueba in pruebas.columns:
+            marcadas = (pruebas[prueba] & anomalia).to_numpy()
+            motivo[marcadas] = np.where(motivo[marcadas] == '', prueba, motivo[marcadas] + ', ' + prueba)
+        df['Motivo_Anomalia'] = motivo.to_numpy()
+        return df
+
+    @staticmethod
+    def summary(df):
+        """Registros marcados (COD, Indicador, Fecha, Valor, Motivo_Anomalia), los más recientes primero"""
+        if 'Anomalia' not in df.columns:
+            return df.iloc[0:0]
+        columnas = [c for c in ('Entidad', 'COD', 'Indicador', 'Fecha', 'Valor', 'Motivo_Anomalia') if c in df.columns]
+        marcados = df[df['Anomalia'].fillna(False).astype(bool)]
+        return marcados[columnas].sort_values('Fecha', ascending=False).reset_index(drop=True)
@@ -0,0 +1,176 @@
+"""
+Artefactos precalculados del Dashboard ICE (sin Streamlit)
+Un conjunto por huella del dataset (IndicadoresICE + Fichas), descrito en manifest.json:
+
+    <directorio>/manifest.json
+    <directorio>/<huella>/dataset.pkl, fichas.pkl, latest.pkl, score_cube.pkl,
+                          historical.pkl, historical_bands.pkl, matrix_semestral.pkl,
+                          catalog.pkl, entity_cube.pkl
+    <directorio>/<huella>/fichas/<COD>.pdf
+
+Los escribe precompute.py; el tablero puede arrancar desde el último conjunto
+"""
+
+import json
+import os
+import re
+import time
+import pandas as pd
+from engine.matrix import PeriodMatrixBuilder
+from engine.scoring import ScoreEngine
+
+MANIFEST = 'manifest.json'
+DERIVADOS = ('latest', 'score_cube', 'historical', 'historical_bands', 'matrix_semestral', 'catalog', 'entity_cube')
+
+def build_derived(df):
+    """Derivados que usan las pestañas, calculados con el motor de puntajes"""
+    latest = ScoreEngine._get_latest_values_by_indicator(df)
+    matriz = PeriodMatrixBuilder.build(df, 'semestral')
+    return {
+        'latest': latest,
+        'score_cube': ScoreEngine.calculate_score_cube(latest),
+        'historical': ScoreEngine.calculate_ice_historical_series(df),
+        'historical_bands': ScoreEngine.calculate_ice_uncertainty_bands(df, matriz=matriz),
+        'matrix_semestral': matriz,
+        'catalog': ScoreEngine.build_indicator_catalog(df),
+        'entity_cube': ScoreEngine.calculate_entity_score_cube(latest)
+    }
+
+def read_manifest(directorio):
+    """Manifiesto del directorio de artefactos (vacío si aún no existe o está dañado)"""
+    ruta = os.path.join(directorio, MANIFEST)
+    try:
+        with open(ruta, encoding='utf-8') as archivo:
+            manifest = json.load(archivo)
+        if isinstance(manifest.get('conjuntos'), dict):
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {'version': 1, 'actual': None, 'conjuntos': {}}
+
+def _write_json_atomic(ruta, contenido):
+    # Escribir en un temporal y reemplazar: un lector nunca ve un manifiesto a medias
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(contenido, archivo, ensure_ascii=False, indent=2, default=str)
+    os.replace(temporal, ruta)
+
+def _pdf_filename(codigo):
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', str(codigo)) + '.pdf'
+
+def is_complete(directorio, huella):
+    """Indica si el conjunto de esa huella está en el manifiesto y todos sus archivos existen"""
+    entrada = read_manifest(directorio)['conjuntos'].get(huella)
+    if not entrada:
+        return False
+    carpeta = os.path.join(directorio, huella)
+    rutas = list(entrada['archivos'].values()) + list(entrada.get('pdfs', {}).values())
+    return all(os.path.exists(os.path.join(carpeta, ruta)) for ruta in rutas)
+
+def write_artifacts(directorio, huella, df, fichas_data, derivados, pdfs=None, fingerprint=None, conservar=3):
+    """
+    Escribir un conjunto de artefactos y registrarlo como el actual en el manifiesto.
+    Se conservan los 'conservar' conjuntos más recientes; los demás se eliminan
+    """
+    carpeta = os.path.join(directorio, huella)
+    os.makedirs(os.path.join(carpeta, 'fichas'), exist_ok=True)
+
+    archivos = {}
+    tablas = [('dataset', df), ('fichas', fichas_data)] + [(n, derivados.get(n)) for n in DERIVADOS]
+    for nombre, valor in tablas:
+        if valor is None:
+            continue
+        archivos[nombre] = f"{nombre}.pkl"
+        pd.to_pickle(valor, os.path.join(carpeta, archivos[nombre]))
+
+    archivos_pdf = {}
+    for codigo, contenido in (pdfs or {}).items():
+        archivos_pdf[str(codigo)] = os.path.join('fichas', _pdf_filename(codigo))
+        with open(os.path.join(carpeta, archivos_pdf[str(codigo)]), 'wb') as archivo:
+            archivo.write(contenido)
+
+    entrada = {
+        'huella': huella,
+        'fingerprint': dict(fingerprint or {}),
+        'creado_en': time.time(),
+        # La serie histórica llega "hasta hoy": solo vale el día en que se calculó
+        'fecha': pd.Timestamp.now().strftime('%Y-%m-%d'),
+        'registros': int(len(df)),
+        'indicadores': int(df['COD'].nunique()) if 'COD' in df.columns else 0,
+        'archivos': archivos,
+        'pdfs': archivos_pdf
+    }
+
+    manifest = read_manifest(directorio)
+    manifest['conjuntos'][huella] = entrada
+    manifest['actual'] = huella
+
+    recientes = sorted(manifest['conjuntos'].values(), key=lambda e: e['creado_en'], reverse=True)
+    for vieja in recientes[max(conservar, 1):]:
+        del manifest['conjuntos'][vieja['huella']]
+
+    _write_json_atomic(os.path.join(directorio, MANIFEST), manifest)
+
+    for vieja in recientes[max(conservar, 1):]:
+        _remove_set(os.path.join(directorio, vieja['huella']), vieja)
+
+    return entrada
+
+def _remove_set(carpeta, entrada):
+    rutas = list(entrada.get('archivos', {}).values()) + list(entrada.get('pdfs', {}).values())
+    for ruta in rutas:
+        try:
+            os.remove(os.path.join(carpeta, ruta))
+        except OSError:
+            pass
+    for sub in (os.path.join(carpeta, 'fichas'), carpeta):
+        try:
+            os.rmdir(sub)
+        except OSError:
+            pass
+
+def set_current(directorio, huella):
+    """Marcar un conjunto ya escrito como el actual (p. ej. si los datos volvieron a esa versión)"""
+    manifest = read_manifest(directorio)
+    if huella in manifest['conjuntos'] and manifest.get('actual') != huella:
+        manifest['actual'] = huella
+        _write_json_atomic(os.path.join(directorio, MANIFEST), manifest)
+
+def load_artifacts(directorio, huella=None, max_age_hours=None):
+    """
+    Cargar un conjunto (por defecto el actual del manifiesto). Devuelve un dict con
+    entry, df, fichas_data y derivados, o None si no hay un conjunto completo y
+    vigente. Los derivados que llegan 'hasta hoy' (serie histórica, bandas y matriz) se
+    omiten si no se calcularon hoy
+    """
+    manifest = read_manifest(directorio)
+    huella = huella or manifest.get('actual')
+    entrada = manifest['conjuntos'].get(huella) if huella else None
+    if not entrada or not is_complete(directorio, huella):
+        return None
+    if max_age_hours is not None and time.time() - entrada['creado_en'] > max_age_hours * 3600:
+        return None
+
+    carpeta = os.path.join(directorio, huella)
+    leer = lambda nombre: (pd.read_pickle(os.path.join(carpeta, entrada['archivos'][nombre]))
+                           if nombre in entrada['archivos'] else None)
+
+    derivados = {nombre: leer(nombre) for nombre in DERIVADOS if nombre in entrada['archivos']}
+    if entrada['fecha'] != pd.Timestamp.now().strftime('%Y-%m-%d'):
+        derivados.pop('historical', None)
+        derivados.pop('historical_bands', None)
+        derivados.pop('matrix_semestral', None)
+
+    return {'entry': entrada, 'df': leer('dataset'), 'fichas_data': leer('fichas'), 'derivados': derivados}
+
+def read_ficha_pdf(directorio, huella_fichas, codigo):
+    """PDF precalculado de la ficha de un COD para esa huella de Fichas, o None"""
+    for entrada in read_manifest(directorio)['conjuntos'].values():
+        ruta = entrada.get('pdfs', {}).get(str(codigo))
+        if ruta and entrada['fingerprint'].get('fichas') == huella_fichas:
+            try:
+                with open(os.path.join(directorio, entrada['huella'], ruta), 'rb') as archivo:
+                    return archivo.read()
+            except OSError:
+                return None
+    return None
@@ -0,0 +1,95 @@
+"""
+Correlación entre indicadores del Dashboard ICE (sin Streamlit)
+Covarianza y correlación de Pearson de todos los pares de indicadores sobre la
+matriz indicador × periodo, con observaciones completas por par: cada par usa solo
+los periodos en que ambos tienen registro. En lugar de recorrer los pares, las
+sumas por par (conteos, sumas, sumas de cuadrados y de productos) salen de
+productos de matrices entre los valores enmascarados y la máscara
+"""
+
+import numpy as np
+import pandas as pd
+from config import CORRELATION_CONFIG
+
+class CorrelationEngine:
+    """Covarianza y correlación por pares completos, vectorizadas"""
+
+    @staticmethod
+    def pairwise(matriz, min_periodos=None):
+        """
+        Covarianza y correlación (DataFrames indicador × indicador, etiquetados por
+        COD) usando solo los periodos con registro en ambos indicadores de cada par;
+        NaN si el par comparte menos de min_periodos periodos o uno de los dos no varía
+        en ellos. Devuelve un dict con 'correlacion', 'covarianza', 'periodos' (periodos
+        en común de cada par) y 'indicadores' (COD, Indicador, Componente por etiqueta)
+        """
+        min_periodos = max(min_periodos or CORRELATION_CONFIG['min_periods'], 2)
+        etiquetas = CorrelationEngine._labels(matriz)
+
+        mascara = matriz.observado.astype(float)
+        x = np.where(matriz.observado, matriz.valores, 0.0)
+
+        # Sumas de cada par (i, j) sobre los periodos con registro en ambos
+        n = mascara @ mascara.T
+        s_x = x @ mascara.T              # Σ x_i donde también hay x_j
+        s_xx = (x * x) @ mascara.T       # Σ x_i² donde también hay x_j
+        s_xy = x @ x.T                   # Σ x_i·x_j
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            covarianza = (s_xy - s_x * s_x.T / n) / (n - 1)
+            var_i = (s_xx - s_x * s_x / n) / (n - 1)
+            var_j = var_i.T
+            correlacion = covarianza / np.sqrt(var_i * var_j)
+
+        # Varianzas nulas o negativas por redondeo: el par no tiene correlación definida
+        insuficiente = (n < min_periodos) | ~(var_i > 1e-12) | ~(var_j > 1e-12)
+        covarianza = np.where(n < min_periodos, np.nan, covarianza)
+        correlacion = np.clip(np.where(insuficiente, np.nan, correlacion), -1.0, 1.0)
+
+        indicadores = pd.DataFrame({
+            'COD': matriz.codigos, 'Indicador': matriz.indicadores, 'Componente': matriz.componentes
+        }, index=etiquetas)
+        return {
+            'correlacion': pd.DataFrame(correlacion, index=etiquetas, columns=etiquetas),
+            'covarianza': pd.DataFrame(covarianza, index=etiquetas, columns=etiquetas),
+            'periodos': pd.DataFrame(n.astype(int), index=etiquetas, columns=etiquetas),
+            'indicadores': indicadores
+        }
+
+    @staticmethod
+    def _labels(matriz):
+        # Con varias entidades un mismo COD aparece una vez por entidad
+        if matriz.entidades is None:
+            return pd.Index(matriz.codigos.astype(str), name='Etiqueta')
+        return pd.Index([f"{e} · {c}" for e, c in zip(matriz.entidades, matriz.codigos)], name='Etiqueta')
+
+    @staticmethod
+    def top_pairs(resultado, etiquetas=None, n=10):
+        """
+        Pares con mayor correlación absoluta (cada par una vez), opcionalmente solo
+        entre las etiquetas dadas: Indicador_A, Indicador_B, Componente_A,
+        Componente_B, Correlacion y Periodos
+        """
+        correlacion = resultado['correlacion']
+        if etiquetas is not None:
+            correlacion = correlacion.loc[etiquetas, etiquetas]
+        if correlacion.empty:
+            return pd.DataFrame(columns=['Indicador_A', 'Indicador_B', 'Componente_A', 'Componente_B',
+                                         'Correlacion', 'Periodos'])
+
+        valores = correlacion.to_numpy()
+        i, j = np.triu_indices(len(valores), k=1)
+        definidos = ~np.isnan(valores[i, j])
+        i, j = i[definidos], j[definidos]
+        orden = np.argsort(-np.abs(valores[i, j]), kind='stable')[:n]
+        i, j = i[orden], j[orden]
+
+        nombres = resultado['indicadores'].loc[correlacion.index]
+        return pd.DataFrame({
+            'Indicador_A': nombres['Indicador'].to_numpy()[i],
+            'Indicador_B': nombres['Indicador'].to_numpy()[j],
+            'Componente_A': nombres['Componente'].to_numpy()[i],
+            'Componente_B': nombres['Componente'].to_numpy()[j],
+            'Correlacion': valores[i, j],
+            'Periodos': resultado['periodos'].loc[correlacion.index, correlacion.index].to_numpy()[i, j]
+        })
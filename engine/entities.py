@@ -0,0 +1,152 @@
+"""
+Registro de entidades del Dashboard ICE (sin Streamlit)
+Cada entidad publica sus propias hojas IndicadoresICE + Fichas. Las hojas se
+descargan en paralelo con un pool acotado, cada entidad se normaliza por separado
+(las metas y los cálculos son de cada una) y los resultados se unen en un solo
+DataFrame con la dimensión 'Entidad'
+"""
+
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+import pandas as pd
+from config import ENTITIES_CONFIG
+from engine.errors import SourceUnavailableError
+from engine.messages import Message
+from engine.pipeline import DatasetPipeline, LoadResult, load_combined_dataset
+from engine.sheets import background_requests, is_background_request
+from fingerprint import combine_fingerprints, content_fingerprint
+
+ENTITY_COLUMN = 'Entidad'
+
+# Las Fichas ya tienen una columna 'Entidad' (la entidad responsable del indicador):
+# con varias entidades, la de origen de cada ficha va en una columna aparte
+FICHAS_ENTITY_COLUMN = 'Entidad_Origen'
+
+def build_entity_registry(secretos, default_entity=None, section=None):
+    """
+    Registro ordenado {nombre: settings} a partir de los secretos: la entidad
+    principal con la sección [google_sheets] y cada [entidades.<NOMBRE>]. Lo que una
+    entidad no declare (credenciales, timeout...) se toma de [google_sheets]
+    """
+    default_entity = default_entity or ENTITIES_CONFIG['default_entity']
+    section = section or ENTITIES_CONFIG['secrets_section']
+
+    principal = dict(secretos.get('google_sheets') or {})
+    registro = {default_entity: principal} if principal else {}
+    comunes = {clave: valor for clave, valor in principal.items() if clave != 'spreadsheet_url'}
+    for nombre, settings in dict(secretos.get(section) or {}).items():
+        registro[str(nombre)] = dict(comunes, **dict(settings))
+    return registro
+
+def entity_names(df):
+    """Entidades presentes en el dataset, en orden de registro"""
+    if df is None or ENTITY_COLUMN not in df.columns:
+        return []
+    return list(pd.unique(df[ENTITY_COLUMN].dropna()))
+
+def filter_entity(tabla, entidad):
+    """
+    Filas de una entidad (dataset o fichas); la tabla completa si no tiene la
+    dimensión. Las fichas se filtran por su entidad de origen, que se quita: quedan
+    como las de una sola entidad
+    """
+    if tabla is None or entidad is None:
+        return tabla
+    if FICHAS_ENTITY_COLUMN in tabla.columns:
+        filas = tabla[tabla[FICHAS_ENTITY_COLUMN] == entidad]
+        return filas.drop(columns=FICHAS_ENTITY_COLUMN).reset_index(drop=True)
+    if ENTITY_COLUMN not in tabla.columns:
+        return tabla
+    return tabla[tabla[ENTITY_COLUMN] == entidad].reset_index(drop=True)
+
+def load_entities_dataset(clientes, pipeline=None, procesar=None, max_workers=None):
+    """
+    Cargar y procesar las hojas de varias entidades ({nombre: cliente}) en paralelo,
+    con a lo sumo max_workers descargas a la vez. Cada entidad pasa por
+    load_combined_dataset por separado (mismo procesar por huella) y el resultado es un
+    LoadResult unido con la columna 'Entidad' (con una sola entidad, su resultado tal
+    cual). Solo es un error si fallan todas
+    """
+    pipeline = pipeline if pipeline is not None else DatasetPipeline()
+    if not clientes:
+        return LoadResult(pipeline._create_empty_dataframe(),
+                          error=SourceUnavailableError("No hay entidades configuradas"))
+
+    # Una carga en segundo plano sigue siéndolo en los hilos del pool (cuotas de la API)
+    en_segundo_plano = is_background_request()
+
+    def cargar(cliente):
+        with background_requests() if en_segundo_plano else nullcontext():
+            return load_combined_dataset(cliente, pipeline, procesar)
+
+    if len(clientes) == 1:
+        resultados = {nombre: cargar(cliente) for nombre, cliente in clientes.items()}
+    else:
+        workers = max(1, min(max_workers or ENTITIES_CONFIG['max_workers'], len(clientes)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ice-entidad") as pool:
+            futuros = {nombre: pool.submit(cargar, cliente) for nombre, cliente in clientes.items()}
+            resultados = {nombre: futuro.result() for nombre, futuro in futuros.items()}
+
+    return merge_entity_results(resultados, pipeline)
+
+def merge_entity_results(resultados, pipeline=None):
+    """
+    Unir los LoadResult por entidad ({nombre: resultado}, en orden de registro) en uno
+    solo con la columna 'Entidad' al inicio del dataset. Las fichas conservan su propia
+    columna 'Entidad' y llevan además 'Entidad_Origen'. Con una sola entidad configurada
+    se devuelve su resultado sin cambios: sin dimensión 'Entidad' y con sus huellas
+    """
+    if len(resultados) == 1:
+        return next(iter(resultados.values()))
+    pipeline = pipeline if pipeline is not None else DatasetPipeline()
+
+    datasets, fichas, mensajes, huellas, errores = [], [], [], {}, []
+    # Si alguna entidad no pudo leer IndicadoresICE, la unión no es el contenido de las hojas
+    read_failed = any(resultado.read_failed for resultado in resultados.values())
+    for nombre, resultado in resultados.items():
+        # Cada mensaje indica de qué entidad viene
+        mensajes.extend(Message(m.nivel, f"[{nombre}] {m.texto}") for m in resultado.messages)
+        if not resultado.ok:
+            errores.append((nombre, resultado.error))
+            continue
+
+        huellas[nombre] = resultado.fingerprint.get('dataset')
+        if resultado.df is not None and not resultado.df.empty:
+            datasets.append(_with_entity(resultado.df, nombre))
+        if resultado.fichas_data is not None and not resultado.fichas_data.empty:
+            fichas.append(_with_entity(resultado.fichas_data, nombre, FICHAS_ENTITY_COLUMN))
+
+    error = None
+    if errores and not huellas:
+        error = errores[0][1] if len(errores) == 1 else SourceUnavailableError(
+            "No se pudo cargar ninguna entidad: " + ", ".join(nombre for nombre, _ in errores))
+
+    df = (pd.concat(datasets, ignore_index=True) if datasets
+          else _with_entity(pipeline._create_empty_dataframe(), None))
+    fichas_data = pd.concat(fichas, ignore_index=True) if fichas else None
+
+    fingerprint = {}
+    if huellas:
+        fingerprint = {
+            'indicadores': None if read_failed else combine_fingerprints(
+                *(resultados[n].fingerprint.get('indicadores') for n in huellas)),
+            # Huella de las fichas unidas: la misma que calculan los PDF a partir de ellas
+            'fichas': content_fingerprint(fichas_data),
+            'entidades': huellas
+        }
+        # El nombre de la entidad es parte del contenido: mismo dato en otra entidad, otra huella
+        fingerprint['dataset'] = hashlib.sha256(
+            "|".join(f"{n}={h}" for n, h in huellas.items()).encode("utf-8")
+        ).hexdigest()[:20]
+
+    return LoadResult(df, fichas_data, fingerprint, mensajes, error, read_failed)
+
+def _with_entity(tabla, nombre, columna=ENTITY_COLUMN):
+    tabla = tabla.copy()
+    if columna in tabla.columns:
+        # La hoja ya trae la columna: la dimensión la reemplaza
+        tabla[columna] = nombre
+    else:
+        tabla.insert(0, columna, nombre)
+    return tabla
@@ -0,0 +1,15 @@
+"""
+Errores del motor de cálculo del Dashboard ICE
+"""
+
+class EngineError(Exception):
+    """Error del motor de cálculo (carga, procesamiento o puntajes)"""
+
+class ConfigurationError(EngineError):
+    """Falta configuración necesaria (credenciales, URL de la hoja de cálculo)"""
+
+class SourceUnavailableError(EngineError):
+    """La fuente de datos no está disponible (sin gspread, sin conexión o sin datos)"""
+
+class DataValidationError(EngineError):
+    """Los datos leídos no tienen la estructura mínima esperada"""
@@ -0,0 +1,192 @@
+"""
+Pronóstico de tendencia de los indicadores del Dashboard ICE (sin Streamlit)
+Ajusta una recta por indicador sobre la matriz indicador × periodo, para todos a la
+vez: las ecuaciones normales de mínimos cuadrados ponderados de cada fila forman un
+lote de sistemas 2×2 que se resuelve en una sola llamada de NumPy. La variante
+robusta repite esa solución con pesos de Huber (IRLS), de modo que un dato atípico
+no arrastra la tendencia. Con la recta se proyectan los próximos periodos y la
+fecha esperada de alcanzar la Meta
+"""
+
+import numpy as np
+import pandas as pd
+from config import FORECAST_CONFIG
+from engine.matrix import PeriodMatrixBuilder
+
+METODOS = ('lineal', 'robusto')
+
+# Constante de la MAD para estimar la desviación estándar de residuos normales
+_MAD_NORMAL = 1.4826
+
+class ForecastEngine:
+    """Ajuste y proyección vectorizados de tendencias por indicador"""
+
+    @staticmethod
+    def fit(matriz, metodo=None, config=None):
+        """
+        Recta valor = intercepto + pendiente × periodo de cada fila de la matriz,
+        usando solo los periodos con registro. Devuelve arreglos por fila
+        (intercepto, pendiente, error, observaciones); NaN en las filas con menos de
+        'min_observations' periodos con registro o sin variación en el tiempo. error es
+        la desviación estándar de los residuos
+        """
+        config = config or FORECAST_CONFIG
+        metodo = metodo or config['method']
+        if metodo not in METODOS:
+            raise ValueError(f"Método de pronóstico desconocido: {metodo}")
+
+        observado = matriz.observado
+        x = np.arange(observado.shape[1], dtype=float)[None, :]
+        y = np.where(observado, matriz.valores, 0.0)
+        base = observado.astype(float)
+        observaciones = observado.sum(axis=1)
+
+        pesos = base
+        iteraciones = config['irls_iterations'] if metodo == 'robusto' else 1
+        for _ in range(iteraciones):
+            intercepto, pendiente = ForecastEngine._solve(x, y, pesos)
+            if metodo != 'robusto':
+                break
+            residuo = np.abs(y - (intercepto[:, None] + pendiente[:, None] * x))
+            ajustadas = ~np.isnan(pendiente)
+            escala = np.full(len(pendiente), np.nan)
+            escala[ajustadas] = _MAD_NORMAL * np.nanmedian(
+                np.where(observado[ajustadas], residuo[ajustadas], np.nan), axis=1)
+            # Huber: peso 1 dentro de k escalas, k·escala/|residuo| fuera
+            with np.errstate(invalid='ignore', divide='ignore'):
+                u = residuo / (config['huber_k'] * escala[:, None])
+                nuevos = base * np.where(u > 1, 1.0 / u, 1.0)
+            nuevos = np.where(np.isfinite(nuevos), nuevos, base)
+            if np.allclose(nuevos, pesos):
+                break
+            pesos = nuevos
+
+        residuo = np.where(observado, y - (intercepto[:, None] + pendiente[:, None] * x), 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            error = np.sqrt((residuo ** 2).sum(axis=1) / np.maximum(observaciones - 2, 1))
+
+        insuficiente = observaciones < max(config['min_observations'], 2)
+        for arreglo in (intercepto, pendiente, error):
+            arreglo[insuficiente] = np.nan
+        return intercepto, pendiente, error, observaciones
+
+    @staticmethod
+    def _solve(x, y, pesos):
+        # Ecuaciones normales (XᵀWX)β = XᵀWy de todas las filas, resueltas en lote
+        s_w = pesos.sum(axis=1)
+        s_x = (pesos * x).sum(axis=1)
+        s_xx = (pesos * x * x).sum(axis=1)
+        s_y = (pesos * y).sum(axis=1)
+        s_xy = (pesos * x * y).sum(axis=1)
+
+        a = np.stack([np.stack([s_w, s_x], axis=-1), np.stack([s_x, s_xx], axis=-1)], axis=-2)
+        b = np.stack([s_y, s_xy], axis=-1)
+        # Filas singulares (un solo periodo con peso): se resuelven con la identidad y se descartan
+        singular = np.abs(s_w * s_xx - s_x * s_x) <= 1e-12 * np.maximum(s_w * s_xx, 1.0)
+        a[singular] = np.eye(2)
+        beta = np.linalg.solve(a, b[..., None])[..., 0]
+        beta[singular] = np.nan
+        return beta[:, 0], beta[:, 1]
+
+    @staticmethod
+    def meta_vector(df, matriz):
+        """Meta de cada fila de la matriz (primera Meta positiva del COD, como el gráfico de evolución)"""
+        if 'Meta' not in df.columns or len(matriz) == 0:
+            return np.full(len(matriz), np.nan)
+        claves = ['Entidad', 'COD'] if matriz.entidades is not None else ['COD']
+        metas = pd.to_numeric(df['Meta'], errors='coerce')
+        primera = (df.assign(Meta=metas.where(metas > 0))
+                   .dropna(subset=['Meta'])
+                   .groupby(claves)['Meta'].first())
+        filas = (pd.MultiIndex.from_arrays([matriz.entidades, matriz.codigos]) if matriz.entidades is not None
+                 else pd.Index(matriz.codigos))
+        return primera.reindex(filas).to_numpy(dtype=float)
+
+    @staticmethod
+    def forecast(matriz, metas=None, metodos=METODOS, horizonte=None, config=None):
+        """
+        Ajustar todas las filas con cada método y proyectar 'horizonte' periodos
+        después del último de la matriz (el que contiene hoy). Devuelve un dict con:
+        - 'resumen': una fila por indicador y método con la pendiente por periodo, el
+          error, el último valor registrado, la Meta, Estado_Meta ('Alcanzada',
+          'Proyectada', 'Fuera de horizonte', 'Sin tendencia favorable', 'Sin Meta' o
+          'Datos insuficientes') y Fecha_Meta (fin del periodo en que la recta la cruza)
+        - 'proyecciones': la recta desde el último periodo con registro hasta el fin
+          del horizonte, con un intervalo de ±interval_z errores
+        """
+        config = config or FORECAST_CONFIG
+        horizonte = horizonte or config['horizon']
+        n, t = matriz.shape
+        metas = np.full(n, np.nan) if metas is None else np.asarray(metas, dtype=float)
+
+        resumenes, proyecciones = [], []
+        if n == 0:
+            return {'resumen': pd.DataFrame(), 'proyecciones': pd.DataFrame()}
+
+        # Último periodo con registro de cada fila y su valor
+        ultimo = t - 1 - np.argmax(matriz.observado[:, ::-1], axis=1)
+        ultimo_valor = matriz.valores[np.arange(n), ultimo]
+        identidad = {'COD': matriz.codigos, 'Indicador': matriz.indicadores, 'Componente': matriz.componentes}
+        if matriz.entidades is not None:
+            identidad = {'Entidad': matriz.entidades, **identidad}
+
+        for metodo in metodos:
+            intercepto, pendiente, error, observaciones = ForecastEngine.fit(matriz, metodo, config)
+            valido = ~np.isnan(pendiente)
+
+            # Periodo (posición) en que la recta alcanza la Meta; nunca antes del primero futuro
+            with np.errstate(invalid='ignore', divide='ignore'):
+                cruce = np.ceil((metas - intercepto) / pendiente)
+            cruce = np.maximum(cruce, t)
+            alcanzada = ultimo_valor >= metas
+            favorable = valido & (pendiente > 0)
+            dentro = cruce <= t - 1 + config['max_periods_to_meta']
+
+            estado = np.select(
+                [np.isnan(metas), alcanzada, ~valido, ~favorable, dentro],
+                ['Sin Meta', 'Alcanzada', 'Datos insuficientes', 'Sin tendencia favorable', 'Proyectada'],
+                'Fuera de horizonte'
+            )
+            proyectada = estado == 'Proyectada'
+            fechas_meta = pd.Series(pd.NaT, index=range(n), dtype='datetime64[ns]')
+            if proyectada.any():
+                fechas_meta[proyectada] = PeriodMatrixBuilder.period_dates(
+                    matriz, cruce[proyectada].astype(np.int64))
+
+            resumenes.append(pd.DataFrame({
+                **identidad,
+                'Metodo': metodo,
+                'Observaciones': observaciones,
+                'Pendiente': pendiente,
+                'Error': error,
+                'Ultimo_Periodo': matriz.periodos[ultimo],
+                'Ultimo_Valor': ultimo_valor,
+                'Meta': metas,
+                'Estado_Meta': estado,
+                'Fecha_Meta': fechas_meta.to_numpy()
+            }))
+
+            # Recta de cada fila válida desde su último periodo con registro
+            filas = np.flatnonzero(valido)
+            if len(filas) == 0:
+                continue
+            pasos = (t - 1 + horizonte) - ultimo[filas] + 1
+            fila = np.repeat(filas, pasos)
+            posicion = ultimo[fila] + (np.arange(pasos.sum()) - np.repeat(np.cumsum(pasos) - pasos, pasos))
+            valor = intercepto[fila] + pendiente[fila] * posicion
+            margen = config['interval_z'] * error[fila]
+            proyeccion = pd.DataFrame({
+                **{clave: valores[fila] for clave, valores in identidad.items() if clave != 'Indicador'},
+                'Metodo': metodo,
+                'Fecha': PeriodMatrixBuilder.period_dates(matriz, posicion),
+                'Proyeccion': valor,
+                'Inferior': valor - margen,
+                'Superior': valor + margen
+            })
+            proyecciones.append(proyeccion)
+
+        return {
+            'resumen': pd.concat(resumenes, ignore_index=True),
+            'proyecciones': (pd.concat(proyecciones, ignore_index=True) if proyecciones
+                             else pd.DataFrame(columns=['COD', 'Metodo', 'Fecha', 'Proyeccion', 'Inferior', 'Superior']))
+        }
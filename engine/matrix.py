@@ -0,0 +1,172 @@
+"""
+Matriz densa indicador × periodo del Dashboard ICE (sin Streamlit)
+Alinea los indicadores en periodos comunes (anuales, semestrales o trimestrales,
+que terminan el 31-dic, 30-jun... como los cortes de la serie histórica). Cada
+celda tiene el último valor del indicador en o antes del fin del periodo (se
+arrastra hacia adelante mientras no haya uno nuevo) y una máscara indica en qué
+periodos hubo efectivamente un registro. La usan los gráficos de evolución, las
+bandas de incertidumbre, las correlaciones y los pronósticos
+"""
+
+import numpy as np
+import pandas as pd
+from config import PERIOD_MATRIX_CONFIG
+
+class PeriodMatrix:
+    """
+    Matriz (indicadores × periodos) de una columna del dataset procesado. Una fila
+    por COD (por Entidad y COD si el dataset tiene esa dimensión); periodos es la
+    fecha de fin de cada periodo. valores es NaN antes del primer registro de la fila
+    """
+
+    def __init__(self, frecuencia, columna, codigos, entidades, indicadores, componentes, categorias,
+                 pesos, periodos, valores, observado):
+        self.frecuencia = frecuencia
+        self.columna = columna
+        self.codigos = codigos
+        self.entidades = entidades
+        self.indicadores = indicadores
+        self.componentes = componentes
+        self.categorias = categorias
+        self.pesos = pesos
+        self.periodos = periodos
+        self.valores = valores
+        self.observado = observado
+
+    def __len__(self):
+        return len(self.codigos)
+
+    @property
+    def shape(self):
+        return self.valores.shape
+
+class PeriodMatrixBuilder:
+    """Construcción y agregación vectorizada de la matriz indicador × periodo"""
+
+    @staticmethod
+    def build(df, frecuencia=None, columna='Valor_Normalizado', hasta=None):
+        """
+        Matriz de 'columna' a la resolución 'frecuencia' (clave de
+        PERIOD_MATRIX_CONFIG['frequencies']). Los periodos van del que contiene el
+        primer registro hasta el que contiene 'hasta' (hoy por defecto) o el último
+        registro, lo que sea posterior. Componente, Categoria, Indicador y Peso (sin
+        Peso cuenta 1.0) de cada fila son los de su registro más reciente
+        """
+        frecuencia = frecuencia or PERIOD_MATRIX_CONFIG['default_frequency']
+        meses = PERIOD_MATRIX_CONFIG['frequencies'].get(frecuencia)
+        if meses is None:
+            raise ValueError(f"Frecuencia desconocida: {frecuencia}")
+
+        claves = ['Entidad', 'COD'] if 'Entidad' in df.columns else ['COD']
+        requeridas = claves + ['Fecha', columna]
+        if df.empty or not all(c in df.columns for c in requeridas):
+            return PeriodMatrixBuilder._empty(frecuencia, columna)
+
+        validos = df.dropna(subset=requeridas)
+        if validos.empty:
+            return PeriodMatrixBuilder._empty(frecuencia, columna)
+        validos = validos.sort_values(claves + ['Fecha'], kind='stable')
+
+        # Filas ordenadas por clave: el número de grupo crece con la posición
+        fila = validos.groupby(claves, sort=True).ngroup().to_numpy()
+        n = int(fila.max()) + 1
+        fin = np.searchsorted(fila, np.arange(n), side='right')
+
+        # Periodo de cada registro: meses desde 1970 divididos por los meses del periodo
+        hasta = pd.Timestamp(hasta) if hasta is not None else pd.Timestamp.now().normalize()
+        periodo = PeriodMatrixBuilder._period_number(validos['Fecha'].to_numpy(dtype='datetime64[ns]'), meses)
+        primero = int(periodo.min())
+        ultimo = max(int(periodo.max()), int(PeriodMatrixBuilder._period_number(
+            np.asarray([hasta], dtype='datetime64[ns]'), meses)[0]))
+        t = ultimo - primero + 1
+        columna_periodo = periodo - primero
+
+        # Último registro de cada (fila, periodo): el siguiente es de otra celda
+        celda = fila.astype(np.int64) * t + columna_periodo
+        ultimo_de_celda = np.r_[celda[1:] != celda[:-1], True]
+        registrado = np.full((n, t), np.nan)
+        registrado[fila[ultimo_de_celda], columna_periodo[ultimo_de_celda]] = (
+            validos[columna].to_numpy(dtype=float)[ultimo_de_celda])
+        observado = ~np.isnan(registrado)
+
+        # Arrastre hacia adelante: cada celda toma el último periodo observado de su fila
+        fuente = np.maximum.accumulate(np.where(observado, np.arange(t)[None, :], 0), axis=1)
+        valores = registrado[np.arange(n)[:, None], fuente]
+
+        recientes = validos.iloc[fin - 1]
+        texto = lambda nombre: (recientes[nombre].to_numpy(dtype=object) if nombre in recientes.columns
+                                else np.full(n, None, dtype=object))
+        pesos = (pd.to_numeric(recientes['Peso'], errors='coerce').fillna(1.0).to_numpy(dtype=float)
+                 if 'Peso' in recientes.columns else np.ones(n))
+
+        return PeriodMatrix(
+            frecuencia=frecuencia,
+            columna=columna,
+            codigos=recientes['COD'].to_numpy(dtype=object),
+            entidades=texto('Entidad') if 'Entidad' in claves else None,
+            indicadores=texto('Indicador'),
+            componentes=texto('Componente'),
+            categorias=texto('Categoria'),
+            pesos=pesos,
+            periodos=PeriodMatrixBuilder._period_ends(np.arange(primero, ultimo + 1), meses),
+            valores=valores,
+            observado=observado
+        )
+
+    @staticmethod
+    def period_dates(matriz, posiciones):
+        """Fin de periodo de posiciones de columna de la matriz (también posteriores a la última)"""
+        meses = PERIOD_MATRIX_CONFIG['frequencies'][matriz.frecuencia]
+        primero = PeriodMatrixBuilder._period_number(np.asarray(matriz.periodos[:1], dtype='datetime64[ns]'), meses)
+        return PeriodMatrixBuilder._period_ends(primero + np.asarray(posiciones, dtype=np.int64), meses)
+
+    @staticmethod
+    def _period_number(fechas, meses):
+        return fechas.astype('datetime64[M]').astype(np.int64) // meses
+
+    @staticmethod
+    def _period_ends(numeros, meses):
+        # Primer día del periodo siguiente menos un día
+        siguiente = ((numeros + 1) * meses).astype('datetime64[M]').astype('datetime64[D]')
+        return pd.DatetimeIndex(siguiente - np.timedelta64(1, 'D'))
+
+    @staticmethod
+    def _empty(frecuencia, columna):
+        vacio = np.array([], dtype=object)
+        return PeriodMatrix(frecuencia, columna, vacio, None, vacio, vacio, vacio, np.array([]),
+                            pd.DatetimeIndex([]), np.empty((0, 0)), np.empty((0, 0), dtype=bool))
+
+    @staticmethod
+    def rows(matriz, componente=None, codigos=None):
+        """Máscara de filas de un componente y/o de una lista de COD"""
+        miembros = np.ones(len(matriz), dtype=bool)
+        if componente is not None:
+            miembros &= matriz.componentes == componente
+        if codigos is not None:
+            miembros &= np.isin(matriz.codigos, list(codigos))
+        return miembros
+
+    @staticmethod
+    def group_mean(matriz, miembros=None, ponderado=False):
+        """
+        Promedio por periodo de las filas seleccionadas (simple o ponderado por Peso),
+        solo entre las que ya tienen valor en ese periodo. DataFrame con Fecha
+        (fin del periodo), Valor, N_Indicadores y N_Observados (con registro en el periodo)
+        """
+        miembros = np.ones(len(matriz), dtype=bool) if miembros is None else miembros
+        valores = matriz.valores[miembros]
+        con_valor = ~np.isnan(valores)
+        pesos = matriz.pesos[miembros][:, None] if ponderado else np.ones((int(miembros.sum()), 1))
+
+        peso_total = (con_valor * pesos).sum(axis=0)
+        suma = (np.where(con_valor, valores, 0.0) * pesos).sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            promedio = np.where(peso_total > 0, suma / peso_total, np.nan)
+
+        resultado = pd.DataFrame({
+            'Fecha': matriz.periodos,
+            'Valor': promedio,
+            'N_Indicadores': con_valor.sum(axis=0),
+            'N_Observados': matriz.observado[miembros].sum(axis=0)
+        })
+        return resultado[resultado['N_Indicadores'] > 0].reset_index(drop=True)
@@ -0,0 +1,77 @@
+"""
+Mensajes del motor de cálculo del Dashboard ICE
+El motor no dibuja nada: reporta mensajes estructurados (nivel + texto) que quien
+lo use decide cómo mostrar (widgets de Streamlit, consola, registro de un job)
+"""
+
+import logging
+import threading
+from contextlib import contextmanager
+
+NIVELES = ('error', 'warning', 'info', 'success')
+
+_LOG_LEVELS = {
+    'error': logging.ERROR,
+    'warning': logging.WARNING,
+    'info': logging.INFO,
+    'success': logging.INFO
+}
+
+logger = logging.getLogger("ice.engine")
+# Quien ejecute el motor (CLI, job) decide si configura logging para ver los mensajes
+logger.addHandler(logging.NullHandler())
+
+class Message:
+    """Mensaje del motor: nivel ('error', 'warning', 'info', 'success') y texto"""
+
+    __slots__ = ('nivel', 'texto')
+
+    def __init__(self, nivel, texto):
+        if nivel not in NIVELES:
+            raise ValueError(f"Nivel de mensaje desconocido: {nivel}")
+        self.nivel = nivel
+        self.texto = texto
+
+    def __repr__(self):
+        return f"Message({self.nivel!r}, {self.texto!r})"
+
+# Colectores activos por hilo (collect_messages) y receptor por defecto del proceso
+_LOCAL = threading.local()
+_RECEPTOR = None
+
+def set_receiver(receptor):
+    """
+    Registrar la función que recibe los mensajes reportados fuera de un
+    collect_messages (p. ej. el adaptador de Streamlit). None la desactiva
+    """
+    global _RECEPTOR
+    _RECEPTOR = receptor
+
+def report(nivel, texto):
+    """
+    Reportar un mensaje: se agrega al colector activo del hilo si lo hay; si no,
+    se entrega al receptor registrado. Siempre queda en el log 'ice.engine'
+    """
+    mensaje = Message(nivel, texto)
+    logger.log(_LOG_LEVELS[nivel], texto)
+
+    colectores = getattr(_LOCAL, 'colectores', None)
+    if colectores:
+        colectores[-1].append(mensaje)
+    elif _RECEPTOR is not None:
+        _RECEPTOR(mensaje)
+    return mensaje
+
+@contextmanager
+def collect_messages():
+    """Capturar en una lista los mensajes reportados por este hilo dentro del bloque"""
+    colectores = getattr(_LOCAL, 'colectores', None)
+    if colectores is None:
+        colectores = _LOCAL.colectores = []
+
+    mensajes = []
+    colectores.append(mensajes)
+    try:
+        yield mensajes
+    finally:
+        colectores.pop()
@@ -0,0 +1,293 @@
+"""
+Estrategias de normalización del Dashboard ICE (sin Streamlit)
+El Calculo de cada indicador (el de la primera fila de su COD) elige una estrategia
+del registro ESTRATEGIAS; un Calculo vacío o desconocido usa la estándar. Cada
+estrategia es un kernel vectorizado: recibe en un IndicatorFrame las filas de todos
+los COD que la usan, ordenadas por COD y Fecha y agrupadas por COD y por año, y
+devuelve el Valor_Normalizado de cada fila con reducciones por grupo de NumPy
+(reduceat, búsquedas ordenadas), sin recorrer indicadores ni filas. Una semántica
+nueva se añade registrando otro kernel con register_strategy
+"""
+
+import numpy as np
+import pandas as pd
+
+# Ventana de las estrategias por años: el año del registro y los 3 anteriores
+AÑOS_VENTANA = 4
+
+# Valor asignado cuando no hay Meta ni rango histórico con el que normalizar
+VALOR_SIN_RANGO = 0.7
+
+ESTRATEGIA_ESTANDAR = 'estandar'
+
+# Registro de estrategias: nombre (valor de Calculo en minúsculas) -> kernel(marco)
+ESTRATEGIAS = {}
+
+# Celdas (ventanas × registros) por lote al calcular las medianas de ventana
+_CELDAS_POR_LOTE = 1_000_000
+
+# Desplazamiento del COD en la clave de cubeta (COD y año)
+_BITS_AÑO = 16
+
+def register_strategy(nombre):
+    """
+    Decorador: registrar kernel(marco) como la estrategia 'nombre'. El kernel recibe
+    un IndicatorFrame y devuelve un arreglo con el Valor_Normalizado de cada fila del
+    marco, en su orden (NaN si la fila queda sin normalizar)
+    """
+    def registrar(kernel):
+        ESTRATEGIAS[nombre] = kernel
+        return kernel
+    return registrar
+
+def strategy_name(calculo):
+    """Estrategia de un valor de Calculo (sin distinguir mayúsculas ni espacios)"""
+    texto = calculo.lower().strip() if isinstance(calculo, str) else ''
+    return texto if texto in ESTRATEGIAS else ESTRATEGIA_ESTANDAR
+
+class IndicatorFrame:
+    """
+    Filas de los COD de una estrategia, ordenadas por COD y Fecha (sin fecha primero).
+    Por fila: cod (posición del COD, 0..n-1), valor, con_valor y cubeta. Por COD:
+    meta, minimo, maximo y n_valores de sus valores con dato. Por cubeta (un COD y un
+    año con registros; las filas sin fecha de un COD forman su propia cubeta): clave,
+    cod_cubeta, sin_fecha, inicio y fin (rango contiguo de filas)
+    """
+
+    def __init__(self, cod, valor, meta, minimo, maximo, n_valores, cubeta, clave, sin_fecha, inicio, fin):
+        self.cod = cod
+        self.valor = valor
+        self.con_valor = ~np.isnan(valor)
+        self.meta = meta
+        self.minimo = minimo
+        self.maximo = maximo
+        self.n_valores = n_valores
+        self.cubeta = cubeta
+        self.clave = clave
+        self.cod_cubeta = clave >> _BITS_AÑO
+        self.sin_fecha = sin_fecha
+        self.inicio = inicio
+        self.fin = fin
+
+    def __len__(self):
+        return len(self.valor)
+
+class NormalizationEngine:
+    """Normalización de todos los COD con los kernels del registro de estrategias"""
+
+    @staticmethod
+    def normalize(df, tiene_meta=True, tiene_calculo=True):
+        """
+        Valor_Normalizado de cada fila de df (arreglo en el orden de df). Meta y
+        Calculo son los de la primera fila de cada COD; las filas sin COD y los COD
+        sin ningún valor quedan en NaN. Se ejecuta un kernel por estrategia presente,
+        cada uno sobre todos sus COD a la vez
+        """
+        resultado = np.full(len(df), np.nan)
+        filas = np.flatnonzero(df['COD'].notna().to_numpy())
+        if not len(filas):
+            return resultado
+
+        datos = df.iloc[filas]
+        cod, codigos = pd.factorize(datos['COD'], sort=False)
+        valor = pd.to_numeric(datos['Valor'], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        fechas = pd.to_datetime(datos['Fecha'], errors='coerce').to_numpy(dtype='datetime64[ns]')
+        primeras = np.unique(cod, return_index=True)[1]
+
+        meta = (pd.to_numeric(datos['Meta'].iloc[primeras], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+                if tiene_meta and 'Meta' in datos.columns else np.full(len(codigos), np.nan))
+        estrategia = (datos['Calculo'].iloc[primeras].map(strategy_name).to_numpy(dtype=object)
+                      if tiene_calculo and 'Calculo' in datos.columns
+                      else np.full(len(codigos), ESTRATEGIA_ESTANDAR, dtype=object))
+
+        con_datos = np.bincount(cod, weights=~np.isnan(valor), minlength=len(codigos)) > 0
+        for nombre in pd.unique(estrategia[con_datos]):
+            en_estrategia = (con_datos & (estrategia == nombre))[cod]
+            marco, orden = NormalizationEngine.build_frame(cod[en_estrategia], fechas[en_estrategia],
+                                                           valor[en_estrategia], meta)
+            resultado[filas[en_estrategia][orden]] = ESTRATEGIAS[nombre](marco)
+        return resultado
+
+    @staticmethod
+    def build_frame(cod, fechas, valor, meta):
+        """
+        IndicatorFrame de unas filas (cod indexa meta) y el orden aplicado: marco
+        fila k = fila orden[k] de la entrada
+        """
+        usados, cod = np.unique(cod, return_inverse=True)
+        sin_fecha = np.isnat(fechas)
+        orden = np.lexsort((fechas.view(np.int64), cod))
+        cod, valor, sin_fecha = cod[orden], valor[orden], sin_fecha[orden]
+
+        # Por COD: filas contiguas desde inicio_cod
+        inicio_cod = np.searchsorted(cod, np.arange(len(usados)))
+        n_valores = np.add.reduceat((~np.isnan(valor)).astype(np.int64), inicio_cod)
+        minimo = np.fmin.reduceat(valor, inicio_cod)
+        maximo = np.fmax.reduceat(valor, inicio_cod)
+
+        # Cubetas por COD y año (año 0: sin fecha, antes que cualquier año)
+        años = fechas[orden].astype('datetime64[Y]').astype(np.int64) + 1970
+        clave_fila = (cod.astype(np.int64) << _BITS_AÑO) + np.where(sin_fecha, 0, años)
+        nueva = np.r_[True, clave_fila[1:] != clave_fila[:-1]]
+        inicio = np.flatnonzero(nueva)
+        fin = np.r_[inicio[1:], len(cod)]
+
+        marco = IndicatorFrame(cod, valor, meta[usados], minimo, maximo, n_valores,
+                               np.cumsum(nueva) - 1, clave_fila[inicio], sin_fecha[inicio], inicio, fin)
+        return marco, orden
+
+    @staticmethod
+    def scale(marco, x, cod=None):
+        """
+        Regla común de normalización de x (valores de los COD en cod; por defecto,
+        uno por fila del marco): x/Meta con tope 1 si hay Meta positiva; si no,
+        min-max del histórico del COD; 0.7 si el histórico no tiene rango. NaN donde x es NaN
+        """
+        cod = marco.cod if cod is None else cod
+        meta, minimo = marco.meta[cod], marco.minimo[cod]
+        rango = marco.maximo[cod] - minimo
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sin_meta = np.where(rango > 0, np.clip((x - minimo) / rango, 0.0, 1.0), VALOR_SIN_RANGO)
+            escalado = np.where(meta > 0, np.clip(x / meta, 0.0, 1.0), sin_meta)
+        return np.where(np.isnan(x), np.nan, escalado)
+
+    @staticmethod
+    def window_reduce(marco, por_cubeta, ufunc):
+        """
+        Combinar con ufunc (en orden cronológico) el valor de cada cubeta con los de
+        las cubetas del mismo COD en los AÑOS_VENTANA - 1 años anteriores. Las filas
+        sin fecha no tienen ventana: su cubeta queda en NaN
+        """
+        resultado = np.full(len(por_cubeta), np.nan)
+        ultima = len(marco.clave) - 1
+        for atras in range(AÑOS_VENTANA - 1, -1, -1):
+            objetivo = marco.clave - atras
+            posicion = np.minimum(np.searchsorted(marco.clave, objetivo), ultima)
+            existe = (marco.clave[posicion] == objetivo) & ~marco.sin_fecha
+            termino = por_cubeta[posicion]
+            combinado = np.where(np.isnan(resultado), termino, ufunc(resultado, termino))
+            resultado = np.where(existe, combinado, resultado)
+        return resultado
+
+    @staticmethod
+    def window_rows(marco):
+        """Rango contiguo de filas [desde, hasta) de la ventana de años de cada cubeta (vacío sin fecha)"""
+        primera = np.searchsorted(marco.clave, marco.clave - (AÑOS_VENTANA - 1))
+        desde = np.where(marco.sin_fecha, marco.fin, marco.inicio[primera])
+        return desde, marco.fin
+
+    @staticmethod
+    def window_median(marco, x):
+        """
+        Mediana de los valores con dato de x en la ventana de años de cada cubeta (NaN
+        si no hay ninguno). Las ventanas se alinean en una matriz con relleno NaN y se
+        ordenan por filas, en lotes de a lo sumo _CELDAS_POR_LOTE celdas
+        """
+        desde, hasta = NormalizationEngine.window_rows(marco)
+        largo = hasta - desde
+        medianas = np.full(len(desde), np.nan)
+        ancho = int(largo.max()) if len(largo) else 0
+        if ancho == 0:
+            return medianas
+
+        relleno = np.r_[x, np.nan]
+        paso = max(1, _CELDAS_POR_LOTE // ancho)
+        columnas = np.arange(ancho)
+        for lote in range(0, len(desde), paso):
+            d, l = desde[lote:lote + paso], largo[lote:lote + paso]
+            indices = np.where(columnas[None, :] < l[:, None], d[:, None] + columnas[None, :], len(x))
+            ordenados = np.sort(relleno[indices], axis=1)
+            n = (~np.isnan(ordenados)).sum(axis=1)
+            filas = np.arange(len(d))
+            bajo = ordenados[filas, np.maximum(n - 1, 0) // 2]
+            alto = ordenados[filas, n // 2]
+            medianas[lote:lote + paso] = np.where(n > 0, (bajo + alto) / 2, np.nan)
+        return medianas
+
+    @staticmethod
+    def per_cod(marco, por_cubeta, ufunc):
+        """Reducir con ufunc los valores por cubeta de cada COD (un valor por COD)"""
+        return ufunc.reduceat(por_cubeta, np.searchsorted(marco.cod_cubeta, np.arange(len(marco.meta))))
+
+@register_strategy(ESTRATEGIA_ESTANDAR)
+def _kernel_estandar(marco):
+    """Cada registro con la regla común: valor/Meta o min-max del histórico"""
+    return np.where(marco.con_valor, NormalizationEngine.scale(marco, marco.valor), np.nan)
+
+@register_strategy('promedio')
+def _kernel_promedio(marco):
+    """
+    Promedio de los valores normalizados (regla común) de la ventana de años de cada
+    registro; también reciben el promedio los registros sin valor. 0.7 si la ventana
+    no tiene valores o el registro no tiene fecha
+    """
+    normalizados = np.where(marco.con_valor, NormalizationEngine.scale(marco, marco.valor), 0.0)
+    suma = NormalizationEngine.window_reduce(marco, np.add.reduceat(normalizados, marco.inicio), np.add)
+    n = NormalizationEngine.window_reduce(marco, np.add.reduceat(marco.con_valor.astype(float), marco.inicio),
+                                          np.add)
+    with np.errstate(invalid='ignore'):
+        promedio = np.where(n > 0, suma / np.maximum(n, 1), VALOR_SIN_RANGO)
+    return promedio[marco.cubeta]
+
+@register_strategy('acumulado')
+def _kernel_acumulado(marco):
+    """
+    Suma de los valores de la ventana de años de cada registro, contra la Meta
+    acumulada (AÑOS_VENTANA × Meta) o min-max de las sumas de ventana de todos los
+    años con fecha del COD; 0.7 con un solo año, sin rango o sin fecha. También
+    reciben la suma los registros sin valor
+    """
+    sumas = NormalizationEngine.window_reduce(marco, np.add.reduceat(np.nan_to_num(marco.valor), marco.inicio),
+                                              np.add)
+    cod = marco.cod_cubeta
+    minimo = NormalizationEngine.per_cod(marco, np.where(marco.sin_fecha, np.inf, sumas), np.minimum)[cod]
+    rango = NormalizationEngine.per_cod(marco, np.where(marco.sin_fecha, -np.inf, sumas), np.maximum)[cod] - minimo
+    n_años = np.bincount(cod, weights=~marco.sin_fecha, minlength=len(marco.meta))[cod]
+    meta = marco.meta[cod]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sin_meta = np.where((n_años > 1) & (rango > 0), np.clip((sumas - minimo) / rango, 0.0, 1.0), VALOR_SIN_RANGO)
+        acumulado = np.where(meta > 0, np.clip(sumas / (meta * AÑOS_VENTANA), 0.0, 1.0), sin_meta)
+    return np.where(marco.sin_fecha, VALOR_SIN_RANGO, acumulado)[marco.cubeta]
+
+@register_strategy('ultimo')
+def _kernel_ultimo(marco):
+    """
+    Indicadores de saldo: cada registro toma el último valor reportado en su año
+    (el cierre del año), normalizado con la regla común. Sin fecha no hay año: NaN
+    """
+    posicion = np.where(marco.con_valor, np.arange(len(marco)), -1)
+    ultima = np.maximum.reduceat(posicion, marco.inicio)
+    cierre = np.where((ultima >= 0) & ~marco.sin_fecha, marco.valor[np.maximum(ultima, 0)], np.nan)
+    return np.where(marco.con_valor, NormalizationEngine.scale(marco, cierre[marco.cubeta]), np.nan)
+
+@register_strategy('maximo')
+def _kernel_maximo(marco):
+    """Mejor valor (máximo) de la ventana de años de cada registro, normalizado con la regla común (NaN sin fecha)"""
+    maximos = NormalizationEngine.window_reduce(marco, np.fmax.reduceat(marco.valor, marco.inicio), np.fmax)
+    return np.where(marco.con_valor, NormalizationEngine.scale(marco, maximos[marco.cubeta]), np.nan)
+
+@register_strategy('mediana_movil')
+def _kernel_mediana_movil(marco):
+    """
+    Mediana de los valores de la ventana de años de cada registro, normalizada con
+    la regla común: suaviza registros aislados sin desplazar el resultado como el
+    promedio. NaN sin fecha
+    """
+    medianas = NormalizationEngine.window_median(marco, marco.valor)
+    return np.where(marco.con_valor, NormalizationEngine.scale(marco, medianas[marco.cubeta]), np.nan)
+
+@register_strategy('inverso')
+def _kernel_inverso(marco):
+    """
+    Indicadores en los que un valor menor es mejor: Meta/valor con tope 1 (un valor
+    en o por debajo de la Meta puntúa 1); sin Meta, min-max invertido del histórico
+    del COD; 0.7 si el histórico no tiene rango
+    """
+    cod, valor = marco.cod, marco.valor
+    meta, maximo = marco.meta[cod], marco.maximo[cod]
+    rango = maximo - marco.minimo[cod]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        con_meta = np.where(valor > 0, np.clip(meta / valor, 0.0, 1.0), 1.0)
+        sin_meta = np.where(rango > 0, np.clip((maximo - valor) / rango, 0.0, 1.0), VALOR_SIN_RANGO)
+    return np.where(marco.con_valor, np.where(meta > 0, con_meta, sin_meta), np.nan)
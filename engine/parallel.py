@@ -0,0 +1,172 @@
+"""
+Normalización en paralelo del Dashboard ICE (sin Streamlit)
+Con miles de indicadores y series mensuales largas, la normalización por COD es
+trabajo de CPU. Los COD se reparten en bloques balanceados por número de filas y
+cada bloque se normaliza en un pool de procesos. A los procesos solo viajan
+arreglos NumPy compactos (código de COD, fecha, valor y, por COD, Meta y Calculo),
+no DataFrames; cada proceso ejecuta la misma normalización por indicador del
+pipeline y devuelve un arreglo de resultados que se escribe por posición
+"""
+
+import heapq
+import multiprocessing
+import os
+import threading
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from config import NORMALIZATION_CONFIG
+from engine.messages import logger
+
+# Pool de procesos compartido por el proceso (se crea con el primer dataset grande)
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+def _get_pool(max_workers):
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            # 'spawn': el servidor de Streamlit tiene hilos vivos, no es seguro hacer fork
+            _POOL = ProcessPoolExecutor(max_workers=max_workers,
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _POOL
+
+def _available_cpus():
+    # Núcleos asignados al proceso (contenedores con afinidad limitada), no los del equipo
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def _reset_pool():
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def partition_codes(filas_por_cod, n_bloques):
+    """
+    Repartir COD en n_bloques con un número de filas lo más parejo posible
+    (greedy: el COD con más filas va al bloque con menos filas). filas_por_cod es un
+    arreglo con las filas de cada COD; devuelve una lista de arreglos de posiciones
+    de COD, cada uno en orden ascendente. El reparto es determinista
+    """
+    filas_por_cod = np.asarray(filas_por_cod)
+    n_bloques = max(1, min(int(n_bloques), len(filas_por_cod)))
+    # Desempate por posición: mismo dataset, mismos bloques
+    orden = np.lexsort((np.arange(len(filas_por_cod)), -filas_por_cod))
+
+    carga = [(0, bloque) for bloque in range(n_bloques)]
+    asignados = [[] for _ in range(n_bloques)]
+    for cod in orden:
+        filas, bloque = heapq.heappop(carga)
+        asignados[bloque].append(cod)
+        heapq.heappush(carga, (filas + int(filas_por_cod[cod]), bloque))
+
+    return [np.sort(np.asarray(bloque, dtype=np.int64)) for bloque in asignados if bloque]
+
+def normalize_in_pool(df, tiene_meta, tiene_calculo, config=None):
+    """
+    Normalizar df (escribe Valor_Normalizado) en el pool de procesos si es lo bastante
+    grande. Devuelve False si no se usó el pool (dataset pequeño, modo desactivado,
+    datos que la normalización por indicador no admite o fallo del pool): el llamador
+    normaliza entonces en el mismo proceso
+    """
+    config = config or NORMALIZATION_CONFIG
+    if not config['parallel'] or len(df) < config['min_rows']:
+        return False
+
+    max_workers = config['max_workers'] or _available_cpus()
+    if max_workers < 2:
+        return False
+
+    try:
+        buffers = _encode(df, tiene_meta, tiene_calculo)
+    except (TypeError, ValueError) as e:
+        logger.info("Normalización en el mismo proceso: %s", e)
+        return False
+    if buffers is None:
+        return False
+
+    posiciones_cod, fechas, valores, metas, calculos, nombres_calculo = buffers
+    filas_por_cod = np.bincount(posiciones_cod, minlength=len(metas))
+    bloques = partition_codes(filas_por_cod, max_workers * config['chunks_per_worker'])
+
+    # Filas de cada bloque, en el orden original del DataFrame
+    bloque_de_cod = np.empty(len(metas), dtype=np.int64)
+    for numero, cods in enumerate(bloques):
+        bloque_de_cod[cods] = numero
+    bloque_de_fila = bloque_de_cod[posiciones_cod]
+    filas_validas = np.flatnonzero(df['COD'].notna().to_numpy())
+    orden = np.argsort(bloque_de_fila, kind='stable')
+    limites = np.searchsorted(bloque_de_fila[orden], np.arange(len(bloques) + 1))
+
+    tareas = []
+    for numero, cods in enumerate(bloques):
+        filas = orden[limites[numero]:limites[numero + 1]]
+        tareas.append((posiciones_cod[filas], fechas[filas], valores[filas],
+                       metas, calculos, nombres_calculo))
+
+    try:
+        resultados = list(_get_pool(max_workers).map(_normalize_chunk, tareas))
+    except BrokenExecutor as e:
+        # Un proceso murió (memoria, señal): el pool se descarta y se recrea en la próxima carga
+        logger.warning("Pool de normalización roto (%s): normalización en el mismo proceso", e)
+        _reset_pool()
+        return False
+    except Exception as e:
+        logger.warning("Normalización en paralelo fallida (%s): normalización en el mismo proceso", e)
+        return False
+
+    # Unión determinista: cada bloque escribe sus filas por posición
+    normalizado = np.full(len(df), np.nan)
+    for numero, resultado in enumerate(resultados):
+        normalizado[filas_validas[orden[limites[numero]:limites[numero + 1]]]] = resultado
+    df['Valor_Normalizado'] = normalizado
+    return True
+
+def _encode(df, tiene_meta, tiene_calculo):
+    """
+    Arreglos compactos del dataset para los procesos: por fila (con COD) la
+    posición del COD, la fecha en ns y el valor; por COD la Meta y el Calculo de su
+    primera fila (los mismos que usa la normalización por indicador)
+    """
+    con_cod = df[df['COD'].notna()]
+    if con_cod.empty:
+        return None
+
+    posiciones_cod, codigos = pd.factorize(con_cod['COD'], sort=False)
+    primeras = con_cod.groupby(posiciones_cod, sort=True).head(1)
+
+    metas = (pd.to_numeric(primeras['Meta'], errors='raise').to_numpy(dtype=np.float64, na_value=np.nan)
+             if tiene_meta else np.full(len(codigos), np.nan))
+
+    if tiene_calculo:
+        # Un Calculo no textual (celda vacía) usa la estrategia estándar
+        calculo = primeras['Calculo'].where(primeras['Calculo'].map(lambda c: isinstance(c, str)), '')
+        calculos, nombres_calculo = pd.factorize(calculo, sort=False)
+        nombres_calculo = list(nombres_calculo)
+    else:
+        calculos, nombres_calculo = np.zeros(len(codigos), dtype=np.int64), ['']
+
+    fechas = con_cod['Fecha'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    valores = pd.to_numeric(con_cod['Valor'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+    return (posiciones_cod.astype(np.int32), fechas, valores, metas,
+            calculos.astype(np.int16), nombres_calculo)
+
+def _normalize_chunk(tarea):
+    """Proceso de trabajo: normalizar un bloque de COD con el pipeline y devolver los valores"""
+    from engine.pipeline import DatasetPipeline
+
+    posiciones_cod, fechas, valores, metas, calculos, nombres_calculo = tarea
+    bloque = pd.DataFrame({
+        'COD': posiciones_cod,
+        'Fecha': fechas.view('datetime64[ns]'),
+        'Valor': valores,
+        'Meta': metas[posiciones_cod],
+        'Calculo': np.asarray(nombres_calculo, dtype=object)[calculos[posiciones_cod]],
+        'Valor_Normalizado': np.nan
+    })
+    DatasetPipeline()._normalize_indicators(bloque, True, True)
+    return bloque['Valor_Normalizado'].to_numpy(dtype=np.float64)
@@ -0,0 +1,459 @@
+"""
+Pipeline de procesamiento del Dashboard ICE (sin Streamlit)
+Columnas, fechas, valores, normalización por indicador y valores recalculados
+sobre los datos combinados de IndicadoresICE + Fichas. Se puede ejecutar desde
+hilos, procesos de trabajo o jobs programados
+"""
+
+import pandas as pd
+import numpy as np
+from config import COLUMN_MAPPING, DEFAULT_META, INDICATOR_TYPES
+from fingerprint import combine_fingerprints
+from engine.anomalies import ANOMALY_COLUMNS, AnomalyDetector
+from engine.errors import SourceUnavailableError
+from engine.messages import collect_messages, report
+from engine.normalization import NormalizationEngine
+from engine.parallel import normalize_in_pool
+from engine.sheets import load_deadline
+
+# Tabla de IPC (Índice de Precios al Consumidor) por año
+IPC_ANUAL = {
+    2019: 3.8,
+    2020: 1.61,
+    2021: 5.625,
+    2022: 13.12,
+    2023: 9.28,
+    2024: 5.2,
+    2025: 5.1
+}
+
+def calcular_factor_inflacion_acumulada(año_base, año_final):
+    """
+    Calcula el factor de inflación acumulada desde año_base hasta año_final
+    Args:
+        año_base: Año del valor original
+        año_final: Año al que se quiere ajustar
+    Returns:
+        Factor de inflación acumulada (ej: 1.377 significa 37.7% de inflación acumulada)
+    """
+    if año_base >= año_final:
+        return 1.0
+
+    factor_acumulado = 1.0
+    for año in range(año_base + 1, año_final + 1):
+        if año in IPC_ANUAL:
+            tasa_ipc = IPC_ANUAL[año] / 100
+            factor_acumulado *= (1 + tasa_ipc)
+
+    return factor_acumulado
+
+class DatasetPipeline:
+    """Procesamiento del dataset combinado: opera en sitio sobre el DataFrame recibido"""
+
+    def process_combined(self, df, fichas_data=None):
+        """
+        Pipeline de procesamiento sobre los datos combinados (modifica df): columnas,
+        fechas, valores, normalización y valores recalculados. Devuelve None si el
+        resultado no supera la verificación
+        """
+        # Procesar datos silenciosamente (incluye normalización)
+        self._process_dataframe_silent(df)
+
+        # Calcular valores recalculados DESPUÉS de todo el procesamiento
+        if fichas_data is not None and not fichas_data.empty:
+            self._calculate_recalculated_values(df, fichas_data)
+        else:
+            # Si no hay fichas, Valor_Recalculado = Valor
+            if 'Valor' in df.columns:
+                df['Valor_Recalculado'] = df['Valor'].copy()
+
+        # Marcar registros atípicos sobre el histórico completo de cada indicador
+        AnomalyDetector.flag(df)
+
+        # Verificar y limpiar silenciosamente
+        if self._verify_dataframe_simple(df):
+            return df
+        return None
+
+    def rederive_indicators(self, df, codigos, fichas_data=None):
+        """
+        Recalcular Valor_Normalizado, Valor_Recalculado y las marcas de atípicos solo
+        para los COD indicados (modifica df). La normalización se define por
+        indicador, así que basta con reprocesar las filas de esos códigos en lugar de
+        todo el dataset
+        """
+        mask = df['COD'].isin(list(codigos))
+        if not mask.any():
+            return df
+
+        subset = df.loc[mask].copy()
+        self._normalize_values_silent(subset)
+
+        if fichas_data is not None and not fichas_data.empty:
+            self._calculate_recalculated_values(subset, fichas_data)
+        else:
+            subset['Valor_Recalculado'] = subset['Valor'].copy()
+
+        # Las pruebas de atípicos son por indicador: basta con el histórico de esos COD
+        AnomalyDetector.flag(subset)
+
+        df.loc[mask, 'Valor_Normalizado'] = subset['Valor_Normalizado']
+        df.loc[mask, 'Valor_Recalculado'] = subset['Valor_Recalculado']
+        for columna in ANOMALY_COLUMNS:
+            df.loc[mask, columna] = subset[columna]
+        return df
+
+    def _create_empty_dataframe(self):
+        """Crear DataFrame vacío"""
+        return pd.DataFrame(columns=[
+            'Componente', 'Categoria',
+            'COD', 'Indicador', 'Valor', 'Fecha', 'Meta', 'Peso', 'Tipo', 'Valor_Normalizado', 'Valor_Recalculado'
+        ])
+    
+    def _process_dataframe_silent(self, df):
+        """Procesar DataFrame silenciosamente (sin mostrar información en pantalla)"""
+        try:
+            # Renombrar columnas
+            for original, nuevo in COLUMN_MAPPING.items():
+                if original in df.columns:
+                    df.rename(columns={original: nuevo}, inplace=True)
+
+            # Procesar fechas silenciosamente
+            self._process_dates_silent(df)
+
+            # Procesar valores silenciosamente
+            self._process_values_silent(df)
+
+            # Añadir columnas por defecto
+            self._add_default_columns_corrected(df)
+
+            # Normalización silenciosa
+            self._normalize_values_silent(df)
+
+        except Exception as e:
+            pass  # Silencioso
+
+    def _process_dataframe_without_normalize(self, df):
+        """Procesar DataFrame SIN normalizar (para procesar antes de calcular Valor_Recalculado)"""
+        try:
+            # Renombrar columnas
+            for original, nuevo in COLUMN_MAPPING.items():
+                if original in df.columns:
+                    df.rename(columns={original: nuevo}, inplace=True)
+
+            # Procesar fechas silenciosamente
+            self._process_dates_silent(df)
+
+            # Procesar valores silenciosamente
+            self._process_values_silent(df)
+
+            # Añadir columnas por defecto
+            self._add_default_columns_corrected(df)
+
+            # NO normalizar aquí - se hará después de calcular Valor_Recalculado
+
+        except Exception as e:
+            pass  # Silencioso
+    
+    def _process_dates_silent(self, df):
+        """Procesar fechas silenciosamente"""
+        try:
+            if 'Fecha' not in df.columns:
+                return
+            
+            # Formatos de fecha comunes
+            date_formats = [
+                '%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d', 
+                '%Y/%m/%d', '%m/%d/%Y', '%d.%m.%Y'
+            ]
+            
+            fechas_convertidas = None
+            
+            for formato in date_formats:
+                try:
+                    temp_fechas = pd.to_datetime(df['Fecha'], format=formato, errors='coerce')
+                    validas = temp_fechas.notna().sum()
+                    
+                    if validas > 0:
+                        if fechas_convertidas is None or validas > fechas_convertidas.notna().sum():
+                            fechas_convertidas = temp_fechas
+                except:
+                    continue
+            
+            if fechas_convertidas is None or fechas_convertidas.notna().sum() == 0:
+                try:
+                    fechas_convertidas = pd.to_datetime(df['Fecha'], errors='coerce', dayfirst=True)
+                except:
+                    fechas_convertidas = pd.to_datetime(df['Fecha'], errors='coerce')
+            
+            df['Fecha'] = fechas_convertidas
+                
+        except Exception as e:
+            pass  # Silencioso
+    
+    def _process_values_silent(self, df):
+        """Procesar valores silenciosamente"""
+        try:
+            if 'Valor' not in df.columns:
+                return
+            
+            # Convertir valores a numérico
+            if df['Valor'].dtype == 'object':
+                df['Valor'] = (df['Valor']
+                              .astype(str)
+                              .str.replace(',', '.')
+                              .str.strip())
+                df['Valor'] = pd.to_numeric(df['Valor'], errors='coerce')
+                
+        except Exception as e:
+            pass  # Silencioso
+    
+    def _normalize_values_silent(self, df):
+        """
+        Normalización de valores entre 0 y 1 según el Calculo del indicador
+        (estrategias de engine.normalization):
+        - Si Calculo = "promedio": promedio de valores normalizados de últimos 4 años
+        - Si Calculo = "acumulado": suma de valores de últimos 4 años, luego normalizar
+        - Si Calculo = "ultimo", "maximo" o "mediana_movil": último valor del año, máximo
+          o mediana de los últimos 4 años, luego normalizar
+        - Si Calculo = "inverso": un valor menor es mejor (Meta/valor o min-max invertido)
+        - Estándar (Calculo vacío u otro):
+          - Si tiene Meta: valor/Meta (Meta es 1), nunca pasa de 1
+          - Si NO tiene Meta y hay datos históricos: min-max normalization
+          - Si NO tiene Meta y NO hay datos históricos: asigna 0.7
+        """
+        try:
+            if df.empty or 'Valor' not in df.columns or 'Fecha' not in df.columns:
+                return
+
+            # Inicializar valores normalizados como "sin dato" (NaN), no como 0.
+            # Un período sin valor reportado no equivale a un desempeño de 0%;
+            # debe quedar como dato faltante para que las gráficas muestren un vacío, no una caída a cero.
+            df['Valor_Normalizado'] = np.nan
+
+            # Verificar que tenemos datos válidos
+            valores_validos = df['Valor'].notna()
+            if not valores_validos.any():
+                return
+
+            # Usar columna COD
+            if 'COD' not in df.columns:
+                return
+
+            tiene_meta = 'Meta' in df.columns
+            tiene_calculo = 'Calculo' in df.columns
+
+            # Asegurar que Fecha es datetime
+            if not pd.api.types.is_datetime64_any_dtype(df['Fecha']):
+                df['Fecha'] = pd.to_datetime(df['Fecha'], errors='coerce')
+
+            # Muchas filas: los COD se normalizan por bloques en un pool de procesos
+            if normalize_in_pool(df, tiene_meta, tiene_calculo):
+                return
+
+            self._normalize_indicators(df, tiene_meta, tiene_calculo)
+
+        except Exception as e:
+            # Fallback silencioso
+            pass
+
+    def _normalize_indicators(self, df, tiene_meta, tiene_calculo):
+        """
+        Normalización de todos los COD de df en este proceso: un kernel vectorizado por
+        estrategia de Calculo (engine.normalization), cada uno sobre todos sus COD a la vez
+        """
+        df['Valor_Normalizado'] = NormalizationEngine.normalize(df, tiene_meta, tiene_calculo)
+
+    def _calculate_recalculated_values(self, df, fichas_data):
+        """
+        Calcular valores recalculados ajustados por inflación
+        Si VPN=1 en Fichas, ajustar el valor por inflación acumulada
+        """
+        try:
+            from datetime import datetime
+
+            # Inicializar columna Valor_Recalculado
+            df['Valor_Recalculado'] = df['Valor'].copy()
+
+            # Verificar que tenemos las columnas necesarias
+            if 'COD' not in df.columns or 'Valor' not in df.columns or 'Fecha' not in df.columns:
+                return
+
+            # Año actual como referencia para ajustar
+            año_actual = datetime.now().year
+
+            # Crear diccionario de VPN por código de indicador
+            vpn_dict = {}
+            if 'COD' in fichas_data.columns and 'VPN' in fichas_data.columns:
+                for _, ficha in fichas_data.iterrows():
+                    codigo = ficha.get('COD')
+                    vpn = ficha.get('VPN')
+                    if pd.notna(codigo) and pd.notna(vpn):
+                        try:
+                            vpn_dict[str(codigo).strip()] = int(vpn)
+                        except:
+                            vpn_dict[str(codigo).strip()] = 0
+
+            # Procesar cada registro
+            for index, row in df.iterrows():
+                codigo = str(row.get('COD', '')).strip()
+                valor = row.get('Valor')
+                fecha = row.get('Fecha')
+
+                # Verificar si debe ajustarse por inflación
+                if codigo in vpn_dict and vpn_dict[codigo] == 1:
+                    # VPN=1: Ajustar por inflación
+                    if pd.notna(valor) and pd.notna(fecha):
+                        try:
+                            # Obtener año del registro
+                            if isinstance(fecha, pd.Timestamp):
+                                año_registro = fecha.year
+                            elif isinstance(fecha, str):
+                                año_registro = pd.to_datetime(fecha).year
+                            else:
+                                año_registro = None
+
+                            if año_registro and año_registro <= año_actual:
+                                # Calcular factor de inflación acumulada
+                                factor_inflacion = calcular_factor_inflacion_acumulada(año_registro, año_actual)
+
+                                # Aplicar ajuste
+                                valor_recalculado = valor * factor_inflacion
+                                df.at[index, 'Valor_Recalculado'] = valor_recalculado
+                            else:
+                                # Año inválido: mantener valor original
+                                df.at[index, 'Valor_Recalculado'] = valor
+                        except Exception as e:
+                            # Error al procesar: mantener valor original
+                            df.at[index, 'Valor_Recalculado'] = valor
+                else:
+                    # VPN != 1 o no tiene VPN: mantener valor original
+                    df.at[index, 'Valor_Recalculado'] = valor
+
+        except Exception as e:
+            # Fallback: Valor_Recalculado = Valor
+            try:
+                df['Valor_Recalculado'] = df['Valor']
+            except:
+                pass
+
+    def _add_default_columns_corrected(self, df):
+        """Añadir columnas por defecto - VERSIÓN SILENCIOSA"""
+        try:
+            # Meta - NO establecer valor por defecto, dejar NaN si no existe
+            if 'Meta' not in df.columns:
+                df['Meta'] = pd.NA
+            else:
+                # Solo convertir a numérico, mantener NaN como NaN
+                df['Meta'] = pd.to_numeric(df['Meta'], errors='coerce')
+
+            # Peso por defecto
+            if 'Peso' not in df.columns:
+                df['Peso'] = 1.0
+            else:
+                df['Peso'] = pd.to_numeric(df['Peso'], errors='coerce').fillna(1.0)
+
+            # Tipo por defecto
+            if 'Tipo' not in df.columns:
+                df['Tipo'] = 'porcentaje'
+
+        except Exception as e:
+            pass  # Silencioso
+    
+    def _verify_dataframe_simple(self, df):
+        """Verificar DataFrame"""
+        try:
+            if df.empty:
+                return True
+
+            # Verificar columnas esenciales (permitir variantes de nombres)
+            required_columns = ['COD', 'Fecha', 'Valor']
+            missing_columns = [col for col in required_columns if col not in df.columns]
+
+            if missing_columns:
+                return False
+
+            # Verificar que tenga al menos componente/categoría e indicador (con nombres flexibles)
+            has_componente = any(col in df.columns for col in ['Componente', 'COMPONENTE PROPUESTO'])
+            has_categoria = any(col in df.columns for col in ['Categoria', 'Categoría', 'CATEGORÍA'])
+            has_indicador = any(col in df.columns for col in ['Indicador', 'Nombre de indicador', 'Nombre_Indicador'])
+
+            if not (has_componente and has_categoria and has_indicador):
+                return False
+
+            # Limpiar registros vacíos
+            initial_count = len(df)
+            df.dropna(subset=['COD'], inplace=True)
+            
+            return True
+            
+        except Exception as e:
+            return False
+
+class LoadResult:
+    """
+    Resultado estructurado de una carga: dataset procesado, fichas, huellas de
+    contenido, mensajes reportados durante la carga y el error, si lo hubo.
+    read_failed indica que no se obtuvo IndicadoresICE (ni de Sheets ni de la última
+    lectura correcta): el dataset vacío no es el contenido de la hoja
+    """
+
+    def __init__(self, df, fichas_data=None, fingerprint=None, messages=None, error=None, read_failed=False):
+        self.df = df
+        self.fichas_data = fichas_data
+        self.fingerprint = dict(fingerprint or {})
+        self.messages = list(messages or [])
+        self.error = error
+        self.read_failed = read_failed or error is not None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def errors(self):
+        return [m for m in self.messages if m.nivel == 'error']
+
+def load_combined_dataset(client, pipeline=None, procesar=None):
+    """
+    Cargar y procesar IndicadoresICE + Fichas con un cliente de Google Sheets
+    (engine.sheets.GoogleSheetsManager). Los mensajes no se muestran: quedan en el
+    resultado. procesar(huella, df, fichas_data) permite al llamador cachear el
+    procesamiento por huella de contenido; por defecto se procesa directamente
+    """
+    pipeline = pipeline if pipeline is not None else DatasetPipeline()
+    if procesar is None:
+        procesar = lambda huella, df, fichas_data: pipeline.process_combined(df, fichas_data)
+
+    df, fichas_data, fingerprint, error, read_failed = None, None, {}, None, True
+    with collect_messages() as mensajes:
+        try:
+            if client is None:
+                raise SourceUnavailableError("Google Sheets no disponible")
+
+            # Un solo plazo para todas las lecturas de la carga (engine.sheets.load_deadline)
+            with load_deadline():
+                # Fichas se leen una vez: para el JOIN, los valores recalculados y las pestañas
+                fichas_data = client.load_fichas_data()
+                df = client.load_combined_data(fichas_data)
+
+            # Huellas del contenido leído: si IndicadoresICE y Fichas no cambiaron,
+            # el llamador puede reutilizar el procesamiento
+            huellas = client.fingerprints
+            fingerprint = {
+                'indicadores': huellas.get('indicadores'),
+                'fichas': huellas.get('fichas')
+            }
+            fingerprint['dataset'] = combine_fingerprints(fingerprint['indicadores'], fingerprint['fichas'])
+            read_failed = fingerprint['indicadores'] is None
+
+            if df is not None and not df.empty:
+                df = procesar(fingerprint['dataset'], df, fichas_data)
+
+        except Exception as e:
+            report('error', f"❌ Error al cargar datos combinados: {e}")
+            df, error = None, e
+
+    if df is None or df.empty:
+        df = pipeline._create_empty_dataframe()
+    return LoadResult(df, fichas_data, fingerprint, mensajes, error, read_failed)
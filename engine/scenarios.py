@@ -0,0 +1,368 @@
+"""
+Escenarios "qué pasaría si" del Dashboard ICE (sin Streamlit)
+Evalúa en lote cambios de Meta, Peso y Calculo sobre la vista de últimos valores,
+sin tocar la hoja de cálculo: cada escenario es una fila de matrices
+(escenarios × indicadores) que se combinan por broadcasting de NumPy con los
+vectores de valores de cada indicador. Devuelve los puntajes general, por
+componente y por categoría de cada escenario. plan_target busca además las
+mejoras de menor esfuerzo para llevar el ICE a un objetivo
+"""
+
+import numpy as np
+import pandas as pd
+from engine.normalization import AÑOS_VENTANA, ESTRATEGIA_ESTANDAR, strategy_name
+from engine.scoring import ScoreEngine
+
+# Tipos de cálculo que los escenarios saben volver a normalizar (el registro completo
+# está en engine.normalization). Un Calculo vacío o desconocido es el estándar ('')
+CALCULOS = ('', 'promedio', 'acumulado')
+
+# Código de los indicadores con otra estrategia del registro: su valor normalizado
+# queda fijo (no se admiten cambios de Meta ni de Calculo) y no se despeja su valor
+CALCULO_FIJO = -1
+
+class ScenarioBase:
+    """
+    Vectores por indicador (un COD por posición, en el orden de la vista de últimos
+    valores) con lo necesario para volver a normalizar su último valor con otra
+    Meta u otro Calculo: valor, estadísticas del histórico y ventana de años
+    """
+
+    def __init__(self, codigos, componentes, categorias, valor, normalizado, meta, peso, calculo,
+                 hist_min, hist_max, hist_n, ventana, suma_ventana, sumas_min, sumas_max, sumas_n):
+        self.codigos = codigos
+        self.componentes = componentes
+        self.categorias = categorias
+        self.valor = valor
+        self.normalizado = normalizado
+        self.meta = meta
+        self.peso = peso
+        self.calculo = calculo
+        self.hist_min = hist_min
+        self.hist_max = hist_max
+        self.hist_n = hist_n
+        self.ventana = ventana
+        self.suma_ventana = suma_ventana
+        self.sumas_min = sumas_min
+        self.sumas_max = sumas_max
+        self.sumas_n = sumas_n
+        self.posiciones = {codigo: i for i, codigo in enumerate(codigos)}
+
+    def __len__(self):
+        return len(self.codigos)
+
+class ScenarioEngine:
+    """Evaluación vectorizada de escenarios de Meta, Peso y Calculo"""
+
+    @staticmethod
+    def prepare(df):
+        """
+        Base de escenarios de un dataset procesado (de una sola entidad). Meta y
+        Calculo son los de la primera fila de cada COD, como en la normalización;
+        Peso, Componente y Categoria los de la vista de últimos valores, como en el
+        cubo de puntajes
+        """
+        latest = ScoreEngine._get_latest_values_by_indicator(df)
+        columnas = ['COD', 'Fecha', 'Valor', 'Valor_Normalizado', 'Peso', 'Componente', 'Categoria']
+        if df.empty or latest.empty or not all(c in latest.columns for c in columnas):
+            return ScenarioEngine._empty_base()
+
+        codigos = latest['COD'].to_numpy()
+        n = len(codigos)
+        posicion = pd.Series(np.arange(n), index=codigos)
+
+        primeras = df[df['COD'].notna()].groupby('COD', sort=False).head(1).set_index('COD')
+        meta = (pd.to_numeric(primeras['Meta'], errors='coerce').reindex(codigos).to_numpy(dtype=float)
+                if 'Meta' in primeras.columns else np.full(n, np.nan))
+        calculo = (primeras['Calculo'].reindex(codigos).map(ScenarioEngine._calculo_code).to_numpy(dtype=np.int8)
+                   if 'Calculo' in primeras.columns else np.zeros(n, dtype=np.int8))
+
+        con_valor = df[df['Valor'].notna() & df['COD'].isin(codigos)]
+        hist = con_valor.groupby('COD')['Valor'].agg(['min', 'max', 'count']).reindex(codigos)
+
+        # Ventana del último valor: filas con valor del año del último registro y los 3 anteriores
+        año_ultimo = latest['Fecha'].dt.year.to_numpy(dtype=float)
+        filas = con_valor[con_valor['Fecha'].notna()]
+        i = posicion.reindex(filas['COD']).to_numpy()
+        años = filas['Fecha'].dt.year.to_numpy(dtype=float)
+        en_ventana = (años <= año_ultimo[i]) & (años > año_ultimo[i] - AÑOS_VENTANA)
+        i_ventana = i[en_ventana]
+        columna = pd.Series(i_ventana).groupby(i_ventana).cumcount().to_numpy()
+        ventana = np.full((n, int(columna.max()) + 1 if len(columna) else 1), np.nan)
+        ventana[i_ventana, columna] = filas['Valor'].to_numpy(dtype=float)[en_ventana]
+
+        # Sumas de ventana de cada año con registros (normalización 'acumulado')
+        con_fecha = df[df['Fecha'].notna() & df['COD'].isin(codigos)]
+        por_año = con_fecha.groupby([con_fecha['COD'], con_fecha['Fecha'].dt.year.astype(float)])['Valor'].sum()
+        claves, años_suma = por_año.index.get_level_values(0), por_año.index.get_level_values(1)
+        sumas = sum(
+            por_año.reindex(pd.MultiIndex.from_arrays([claves, años_suma - k])).fillna(0).to_numpy()
+            for k in range(AÑOS_VENTANA)
+        )
+        sumas = pd.Series(sumas, index=por_año.index)
+        stats_sumas = sumas.groupby(level=0).agg(['min', 'max', 'count']).reindex(codigos)
+        suma_ventana = sumas.reindex(pd.MultiIndex.from_arrays([codigos, año_ultimo])).to_numpy(dtype=float)
+
+        return ScenarioBase(
+            codigos=codigos,
+            componentes=latest['Componente'].to_numpy(dtype=object),
+            categorias=latest['Categoria'].to_numpy(dtype=object),
+            valor=latest['Valor'].to_numpy(dtype=float),
+            normalizado=latest['Valor_Normalizado'].to_numpy(dtype=float),
+            meta=meta,
+            peso=latest['Peso'].to_numpy(dtype=float),
+            calculo=calculo,
+            hist_min=hist['min'].to_numpy(dtype=float),
+            hist_max=hist['max'].to_numpy(dtype=float),
+            hist_n=hist['count'].fillna(0).to_numpy(dtype=float),
+            ventana=ventana,
+            suma_ventana=np.nan_to_num(suma_ventana),
+            sumas_min=stats_sumas['min'].to_numpy(dtype=float),
+            sumas_max=stats_sumas['max'].to_numpy(dtype=float),
+            sumas_n=stats_sumas['count'].fillna(0).to_numpy(dtype=float)
+        )
+
+    @staticmethod
+    def _empty_base():
+        vacio = np.array([], dtype=float)
+        return ScenarioBase(np.array([], dtype=object), np.array([], dtype=object), np.array([], dtype=object),
+                            vacio, vacio, vacio, vacio, np.array([], dtype=np.int8), vacio, vacio, vacio,
+                            np.full((0, 1), np.nan), vacio, vacio, vacio, vacio)
+
+    @staticmethod
+    def _calculo_code(calculo):
+        estrategia = strategy_name(calculo)
+        if estrategia == ESTRATEGIA_ESTANDAR:
+            return 0
+        return CALCULOS.index(estrategia) if estrategia in CALCULOS else CALCULO_FIJO
+
+    @staticmethod
+    def build_overrides(base, escenarios):
+        """
+        Matrices (escenarios × indicadores) de Meta, Peso y Calculo a partir de la
+        base y de una lista de escenarios. Cada escenario es un dict con, opcionales:
+        - 'Meta': {COD: meta} (None o NaN quita la meta)
+        - 'Peso': {COD: peso}
+        - 'Factor_Peso': {Componente o Categoria: factor} (multiplica el peso de sus indicadores)
+        - 'Calculo': {COD: '' | 'promedio' | 'acumulado'}
+        Devuelve (meta, peso, calculo, renormalizar); renormalizar marca las celdas
+        cuya Meta o Calculo cambió. Cambiar la Meta o el Calculo de un indicador con
+        otra estrategia (CALCULO_FIJO) es un ValueError
+        """
+        s = len(escenarios)
+        meta = np.repeat(base.meta[None, :], s, axis=0)
+        peso = np.repeat(base.peso[None, :], s, axis=0)
+        calculo = np.repeat(base.calculo[None, :], s, axis=0)
+
+        for fila, escenario in enumerate(escenarios):
+            for codigo, valor in (escenario.get('Meta') or {}).items():
+                meta[fila, ScenarioEngine._adjustable_position(base, codigo)] = (
+                    np.nan if valor is None else float(valor))
+            for codigo, valor in (escenario.get('Peso') or {}).items():
+                peso[fila, ScenarioEngine._position(base, codigo)] = float(valor)
+            for grupo, factor in (escenario.get('Factor_Peso') or {}).items():
+                miembros = (base.componentes == grupo) | (base.categorias == grupo)
+                if not miembros.any():
+                    raise ValueError(f"No existe el componente o categoría: {grupo}")
+                peso[fila, miembros] *= float(factor)
+            for codigo, valor in (escenario.get('Calculo') or {}).items():
+                texto = (valor or '').lower().strip()
+                if texto not in CALCULOS:
+                    raise ValueError(f"Calculo desconocido para {codigo}: {valor}")
+                calculo[fila, ScenarioEngine._adjustable_position(base, codigo)] = CALCULOS.index(texto)
+
+        mismo_meta = (meta == base.meta[None, :]) | (np.isnan(meta) & np.isnan(base.meta)[None, :])
+        renormalizar = ~mismo_meta | (calculo != base.calculo[None, :])
+        return meta, peso, calculo, renormalizar
+
+    @staticmethod
+    def _position(base, codigo):
+        if codigo not in base.posiciones:
+            raise ValueError(f"No existe el indicador: {codigo}")
+        return base.posiciones[codigo]
+
+    @staticmethod
+    def _adjustable_position(base, codigo):
+        posicion = ScenarioEngine._position(base, codigo)
+        if base.calculo[posicion] == CALCULO_FIJO:
+            raise ValueError(f"El cálculo de {codigo} no se puede simular: su Meta y su Calculo son fijos")
+        return posicion
+
+    @staticmethod
+    def normalize(base, meta, calculo):
+        """
+        Valor normalizado del último registro de cada indicador para matrices de Meta
+        y Calculo (escenarios × indicadores), con las mismas reglas del pipeline:
+        estándar (valor/Meta o min-max del histórico), 'promedio' de la ventana de 4
+        años y 'acumulado' (suma de la ventana contra 4 × Meta o min-max de las sumas)
+        """
+        con_meta = meta > 0
+        meta_segura = np.where(con_meta, meta, 1.0)
+        rango = base.hist_max - base.hist_min
+        rango_seguro = np.where(rango > 0, rango, 1.0)
+
+        # Estándar
+        minmax = np.where(rango > 0, np.clip((base.valor - base.hist_min) / rango_seguro, 0, 1), 0.7)
+        sin_meta = np.where(base.hist_n > 1, minmax, 0.7)
+        estandar = np.where(con_meta, np.clip(base.valor[None, :] / meta_segura, 0, 1), sin_meta[None, :])
+
+        # Promedio: media de los valores de la ventana normalizados uno a uno
+        ventana = base.ventana[None, :, :]
+        presentes = ~np.isnan(base.ventana)
+        n_ventana = presentes.sum(axis=1)
+        divisor = np.maximum(n_ventana, 1)
+        ventana_meta = np.clip(np.nan_to_num(ventana) / meta_segura[:, :, None], 0, 1)
+        promedio_meta = np.where(presentes[None, :, :], ventana_meta, 0).sum(axis=2) / divisor
+        ventana_minmax = np.where(
+            rango[:, None] > 0,
+            np.clip((np.nan_to_num(base.ventana) - base.hist_min[:, None]) / rango_seguro[:, None], 0, 1),
+            0.7
+        )
+        promedio_sin_meta = np.where(presentes, ventana_minmax, 0).sum(axis=1) / divisor
+        promedio = np.where(con_meta, promedio_meta, promedio_sin_meta[None, :])
+        promedio = np.where(n_ventana[None, :] > 0, promedio, 0.7)
+
+        # Acumulado: suma de la ventana contra la meta acumulada o min-max de las sumas
+        rango_sumas = base.sumas_max - base.sumas_min
+        minmax_sumas = np.where(
+            (base.sumas_n > 1) & (rango_sumas > 0),
+            np.clip((base.suma_ventana - base.sumas_min) / np.where(rango_sumas > 0, rango_sumas, 1.0), 0, 1),
+            0.7
+        )
+        acumulado = np.where(con_meta, np.clip(base.suma_ventana[None, :] / (meta_segura * AÑOS_VENTANA), 0, 1),
+                             minmax_sumas[None, :])
+
+        return np.select([calculo == 1, calculo == 2], [promedio, acumulado], estandar)
+
+    @staticmethod
+    def evaluate(base, escenarios, nombres=None):
+        """
+        Puntajes de una lista de escenarios en un solo lote. Devuelve un dict con
+        'general' (Serie por escenario), 'componentes' y 'categorias' (DataFrames
+        escenario × grupo). Un escenario vacío ({}) reproduce los puntajes actuales
+        """
+        escenarios = list(escenarios)
+        nombres = list(nombres) if nombres is not None else [
+            e.get('nombre', f"Escenario {i + 1}") for i, e in enumerate(escenarios)
+        ]
+        if len(base) == 0 or not escenarios:
+            vacio = pd.DataFrame(index=pd.Index(nombres, name='Escenario'))
+            return {'general': pd.Series(np.nan, index=vacio.index, name='Puntaje_General'),
+                    'componentes': vacio, 'categorias': vacio}
+
+        meta, peso, calculo, renormalizar = ScenarioEngine.build_overrides(base, escenarios)
+        normalizado = np.repeat(base.normalizado[None, :], len(escenarios), axis=0)
+        if renormalizar.any():
+            normalizado = np.where(renormalizar, ScenarioEngine.normalize(base, meta, calculo), normalizado)
+
+        return ScenarioEngine.aggregate(base, normalizado, peso, nombres)
+
+    @staticmethod
+    def aggregate(base, normalizado, peso, nombres):
+        """
+        Puntajes general, por componente y por categoría de matrices de valores
+        normalizados y pesos (escenarios × indicadores), con las reglas del cubo de
+        puntajes: Σ valor × peso / Σ peso, y promedio simple si no hay pesos válidos
+        """
+        indice = pd.Index(nombres, name='Escenario')
+        ponderado = np.where(np.isnan(normalizado), 0.0, normalizado * peso)
+
+        peso_total = peso.sum(axis=1)
+        con_valor = ~np.isnan(normalizado)
+        promedio_simple = (np.where(con_valor, normalizado, 0).sum(axis=1)
+                           / np.maximum(con_valor.sum(axis=1), 1))
+        general = np.where(peso_total > 0, ponderado.sum(axis=1) / np.where(peso_total > 0, peso_total, 1),
+                           promedio_simple)
+
+        resultado = {'general': pd.Series(general, index=indice, name='Puntaje_General')}
+        for clave, grupos in (('componentes', base.componentes), ('categorias', base.categorias)):
+            codigos, nombres_grupo = pd.factorize(pd.Series(grupos), sort=True)
+            pertenece = np.zeros((len(base), len(nombres_grupo)))
+            validos = codigos >= 0
+            pertenece[np.flatnonzero(validos), codigos[validos]] = 1.0
+            suma = ponderado @ pertenece
+            pesos = peso @ pertenece
+            puntajes = np.where(pesos > 0, suma / np.where(pesos > 0, pesos, 1), np.nan)
+            resultado[clave] = pd.DataFrame(puntajes, index=indice, columns=list(nombres_grupo))
+        return resultado
+
+    @staticmethod
+    def plan_target(base, objetivo, tope=1.0, codigos=None):
+        """
+        Conjunto de mejoras de menor esfuerzo total (Σ de puntos normalizados que sube
+        cada indicador) que lleva el ICE general a 'objetivo'. Como el ICE es lineal en
+        los valores normalizados (Σ Peso × valor / Σ Peso) y cada indicador puede subir
+        hasta 1.0 (o hasta 'tope' puntos), es una mochila fraccionaria: el greedy por
+        peso descendente es óptimo. codigos limita los indicadores que se pueden mejorar.
+        Devuelve (plan, resumen): plan con una fila por indicador a mejorar, incluido
+        el valor que tendría que reportar cuando se puede despejar (cálculo estándar)
+        """
+        columnas = ['COD', 'Componente', 'Categoria', 'Peso', 'Valor', 'Valor_Normalizado',
+                    'Mejora', 'Normalizado_Objetivo', 'Valor_Objetivo', 'Ganancia_General']
+        normalizado = np.nan_to_num(base.normalizado)
+        peso_total = base.peso.sum()
+        actual = float(ScenarioEngine.aggregate(base, base.normalizado[None, :], base.peso[None, :], ['Actual'])
+                       ['general'].iloc[0]) if len(base) else 0.0
+        resumen = {'actual': actual, 'objetivo': float(objetivo), 'alcanzable': True,
+                   'esfuerzo': 0.0, 'indicadores': 0, 'resultado': actual}
+
+        if len(base) == 0 or not peso_total > 0 or actual >= objetivo:
+            return pd.DataFrame(columns=columnas), resumen
+
+        margen = np.clip(np.minimum(1.0 - normalizado, tope), 0.0, None)
+        if codigos is not None:
+            margen = np.where(np.isin(base.codigos, list(codigos)), margen, 0.0)
+
+        # Mayor peso primero (más ICE por punto de esfuerzo); desempate estable por COD
+        orden = np.lexsort((base.codigos.astype(str), -base.peso))
+        orden = orden[(margen[orden] > 0) & (base.peso[orden] > 0)]
+        aporte = base.peso[orden] * margen[orden] / peso_total
+        necesario = objetivo - actual
+        acumulado = np.cumsum(aporte)
+
+        corte = int(np.searchsorted(acumulado, necesario - 1e-12))
+        mejora = np.zeros(len(orden))
+        if corte >= len(orden):
+            resumen['alcanzable'] = False
+            mejora[:] = margen[orden]
+        else:
+            mejora[:corte] = margen[orden][:corte]
+            previo = acumulado[corte - 1] if corte > 0 else 0.0
+            mejora[corte] = (necesario - previo) * peso_total / base.peso[orden][corte]
+
+        usados = orden[mejora > 0]
+        mejora = mejora[mejora > 0]
+        destino = normalizado[usados] + mejora
+
+        plan = pd.DataFrame({
+            'COD': base.codigos[usados],
+            'Componente': base.componentes[usados],
+            'Categoria': base.categorias[usados],
+            'Peso': base.peso[usados],
+            'Valor': base.valor[usados],
+            'Valor_Normalizado': base.normalizado[usados],
+            'Mejora': mejora,
+            'Normalizado_Objetivo': destino,
+            'Valor_Objetivo': ScenarioEngine._invert_standard(base, usados, destino),
+            'Ganancia_General': base.peso[usados] * mejora / peso_total
+        }, columns=columnas)
+
+        resumen.update(esfuerzo=float(mejora.sum()), indicadores=int(len(usados)),
+                       resultado=actual + float(plan['Ganancia_General'].sum()))
+        return plan, resumen
+
+    @staticmethod
+    def _invert_standard(base, posiciones, destino):
+        """
+        Valor a reportar para obtener 'destino' con la normalización estándar (NaN si no
+        se puede despejar: otros cálculos, incluidos los fijos, o sin Meta ni rango)
+        """
+        meta = base.meta[posiciones]
+        rango = base.hist_max[posiciones] - base.hist_min[posiciones]
+        estandar = base.calculo[posiciones] == 0
+        con_meta = estandar & (meta > 0)
+        con_rango = estandar & ~(meta > 0) & (base.hist_n[posiciones] > 1) & (rango > 0)
+        valor = np.full(len(posiciones), np.nan)
+        valor[con_meta] = destino[con_meta] * meta[con_meta]
+        valor[con_rango] = base.hist_min[posiciones][con_rango] + destino[con_rango] * rango[con_rango]
+        return valor
@@ -0,0 +1,575 @@
+"""
+Motor de puntajes del Dashboard ICE (sin Streamlit)
+Cubo de puntajes, serie histórica, catálogo de indicadores y vista de últimos
+valores. Los errores se reportan como mensajes (engine.messages) y cada función
+devuelve un resultado vacío coherente en lugar de interrumpir la ejecución
+"""
+
+import pandas as pd
+import numpy as np
+from config import UNCERTAINTY_CONFIG
+from engine.matrix import PeriodMatrixBuilder
+from engine.messages import report
+
+class ScoreEngine:
+    """Puntajes del ICE sobre el dataset procesado (sin Streamlit)"""
+    
+    @staticmethod
+    def calculate_scores(df, fecha_filtro=None):
+        """Calcular puntajes usando normalización simple - APLICANDO FILTRO DE FECHA"""
+        try:
+            if df.empty:
+                return pd.DataFrame({'Componente': [], 'Puntaje_Ponderado': []}), \
+                       pd.DataFrame({'Categoria': [], 'Puntaje_Ponderado': []}), 0
+            
+            # ✅ APLICAR FILTRO DE FECHA SI SE PROPORCIONA
+            if fecha_filtro is not None:
+                # Convertir fecha_filtro a datetime si es necesario
+                if not pd.api.types.is_datetime64_any_dtype(pd.Series([fecha_filtro])):
+                    fecha_filtro = pd.to_datetime(fecha_filtro)
+                
+                # Filtrar por la fecha específica
+                df_filtrado = df[df['Fecha'] == fecha_filtro].copy()
+                
+                if df_filtrado.empty:
+                    # Si no hay datos para esa fecha exacta, usar los más cercanos
+                    fechas_disponibles = df['Fecha'].dropna().sort_values()
+                    fecha_mas_cercana = fechas_disponibles[fechas_disponibles <= fecha_filtro]
+                    
+                    if not fecha_mas_cercana.empty:
+                        fecha_usar = fecha_mas_cercana.iloc[-1]  # La más reciente antes o igual
+                        df_filtrado = df[df['Fecha'] == fecha_usar].copy()
+                    else:
+                        # Si no hay fechas anteriores, usar la primera disponible
+                        fecha_usar = fechas_disponibles.iloc[0]
+                        df_filtrado = df[df['Fecha'] == fecha_usar].copy()
+            else:
+                # Sin filtro de fecha, usar valores más recientes por indicador
+                df_filtrado = ScoreEngine._get_latest_values_by_indicator(df)
+            
+            if df_filtrado.empty:
+                return pd.DataFrame({'Componente': [], 'Puntaje_Ponderado': []}), \
+                       pd.DataFrame({'Categoria': [], 'Puntaje_Ponderado': []}), 0
+            
+            # Resto del método permanece igual...
+            required_columns = ['Valor_Normalizado', 'Peso', 'Componente', 'Categoria']
+            if not all(col in df_filtrado.columns for col in required_columns):
+                return pd.DataFrame({'Componente': [], 'Puntaje_Ponderado': []}), \
+                       pd.DataFrame({'Categoria': [], 'Puntaje_Ponderado': []}), 0
+            
+            # Puntajes por componente, categoría y general desde el cubo de puntajes
+            score_cube = ScoreEngine.calculate_score_cube(df_filtrado)
+            return ScoreEngine.scores_from_cube(score_cube)
+            
+        except Exception as e:
+            report('error', f"Error en cálculo de puntajes: {e}")
+            return pd.DataFrame({'Componente': [], 'Puntaje_Ponderado': []}), \
+                   pd.DataFrame({'Categoria': [], 'Puntaje_Ponderado': []}), 0
+    
+    @staticmethod
+    def calculate_score_cube(df_latest):
+        """
+        Cubo de puntajes en formato largo a partir de una fila por indicador
+        (normalmente la vista de valores más recientes). Columnas:
+        Nivel ('General', 'Componente', 'Categoria'), Componente, Categoria,
+        Suma_Ponderada (Σ Valor_Normalizado × Peso), Peso_Total, N_Indicadores
+        y Puntaje_Ponderado (Suma_Ponderada / Peso_Total).
+        Guardar suma y peso por separado permite combinar o ajustar niveles sin
+        volver a recorrer los indicadores.
+        """
+        columnas = ['Nivel', 'Componente', 'Categoria', 'Suma_Ponderada',
+                    'Peso_Total', 'N_Indicadores', 'Puntaje_Ponderado']
+
+        required_columns = ['Valor_Normalizado', 'Peso', 'Componente', 'Categoria']
+        if df_latest.empty or not all(col in df_latest.columns for col in required_columns):
+            return pd.DataFrame(columns=columnas)
+
+        base = pd.DataFrame({
+            'Componente': df_latest['Componente'],
+            'Categoria': df_latest['Categoria'],
+            'Ponderado': df_latest['Valor_Normalizado'] * df_latest['Peso'],
+            'Peso': df_latest['Peso'],
+            'Valor_Normalizado': df_latest['Valor_Normalizado']
+        })
+
+        niveles = []
+        for nivel in ['Componente', 'Categoria']:
+            agregado = base.groupby(nivel).agg(
+                Suma_Ponderada=('Ponderado', 'sum'),
+                Peso_Total=('Peso', 'sum'),
+                N_Indicadores=('Peso', 'size')
+            ).reset_index()
+            agregado['Nivel'] = nivel
+            niveles.append(agregado)
+
+        general = pd.DataFrame({
+            'Nivel': ['General'],
+            'Suma_Ponderada': [base['Ponderado'].sum()],
+            'Peso_Total': [base['Peso'].sum()],
+            'N_Indicadores': [len(base)]
+        })
+
+        cube = pd.concat([general] + niveles, ignore_index=True)
+        cube['Puntaje_Ponderado'] = cube['Suma_Ponderada'] / cube['Peso_Total'].where(cube['Peso_Total'] > 0)
+
+        # Sin pesos válidos, el puntaje general es el promedio simple (como en calculate_scores)
+        if not cube.at[0, 'Peso_Total'] > 0:
+            cube.at[0, 'Puntaje_Ponderado'] = base['Valor_Normalizado'].mean()
+
+        return cube[columnas]
+
+    @staticmethod
+    def calculate_entity_score_cube(df_latest):
+        """
+        Cubo de puntajes por entidad: el mismo cubo de calculate_score_cube para las
+        filas de cada valor de 'Entidad', con esa columna al inicio. Sin la dimensión
+        'Entidad', el cubo se devuelve para todo el dataset con Entidad vacía
+        """
+        if 'Entidad' not in df_latest.columns:
+            cube = ScoreEngine.calculate_score_cube(df_latest)
+            cube.insert(0, 'Entidad', None)
+            return cube
+
+        cubos = []
+        for entidad, filas in df_latest.groupby('Entidad', sort=False):
+            cube = ScoreEngine.calculate_score_cube(filas)
+            cube.insert(0, 'Entidad', entidad)
+            cubos.append(cube)
+        if not cubos:
+            cube = ScoreEngine.calculate_score_cube(df_latest)
+            cube.insert(0, 'Entidad', None)
+            return cube
+        return pd.concat(cubos, ignore_index=True)
+
+    @staticmethod
+    def calculate_contributions(df_latest):
+        """
+        Aporte y sensibilidad de cada indicador sobre la vista de últimos valores, en
+        una sola pasada vectorizada (mismas reglas del cubo de puntajes). Por COD:
+        - Sensibilidad_General: Peso / Σ Peso (cuánto sube el ICE por punto normalizado)
+        - Aporte_General / Participacion_General: Valor_Normalizado × Peso / Σ Peso y su
+          fracción del puntaje general (los aportes suman el puntaje general)
+        - Aporte_Componente / Participacion_Componente: lo mismo dentro de su componente
+        - Ganancia_Meta_General / Ganancia_Meta_Componente: lo que subiría el puntaje si
+          el indicador alcanzara su Meta (valor normalizado 1.0)
+        Ordenado de mayor a menor ganancia en el ICE
+        """
+        columnas = ['COD', 'Indicador', 'Componente', 'Categoria', 'Valor_Normalizado', 'Peso', 'Tiene_Meta',
+                    'Sensibilidad_General', 'Aporte_General', 'Participacion_General',
+                    'Aporte_Componente', 'Participacion_Componente',
+                    'Ganancia_Meta_General', 'Ganancia_Meta_Componente']
+
+        required_columns = ['COD', 'Valor_Normalizado', 'Peso', 'Componente']
+        if df_latest.empty or not all(col in df_latest.columns for col in required_columns):
+            return pd.DataFrame(columns=columnas)
+
+        # Con varias entidades, cada una es su propio ICE
+        claves = ['Entidad'] if 'Entidad' in df_latest.columns else []
+        base = df_latest[claves + [c for c in columnas[:6] if c in df_latest.columns]].copy()
+        if 'Indicador' not in base.columns:
+            base['Indicador'] = base['COD']
+        if 'Categoria' not in base.columns:
+            base['Categoria'] = None
+        base['Tiene_Meta'] = (pd.to_numeric(df_latest['Meta'], errors='coerce') > 0
+                              if 'Meta' in df_latest.columns else False)
+
+        normalizado = base['Valor_Normalizado'].fillna(0.0)
+        ponderado = normalizado * base['Peso']
+        faltante = (1.0 - normalizado).clip(lower=0.0) * base['Peso']
+
+        grupo_general = [base[c] for c in claves] or np.zeros(len(base))
+        peso_general = base['Peso'].groupby(grupo_general).transform('sum')
+        peso_componente = base['Peso'].groupby([base[c] for c in claves] + [base['Componente']]).transform('sum')
+        peso_general = peso_general.where(peso_general > 0)
+        peso_componente = peso_componente.where(peso_componente > 0)
+
+        base['Sensibilidad_General'] = base['Peso'] / peso_general
+        base['Aporte_General'] = ponderado / peso_general
+        base['Aporte_Componente'] = ponderado / peso_componente
+        base['Ganancia_Meta_General'] = faltante / peso_general
+        base['Ganancia_Meta_Componente'] = faltante / peso_componente
+
+        total_general = base['Aporte_General'].groupby(grupo_general).transform('sum')
+        total_componente = base['Aporte_Componente'].groupby(
+            [base[c] for c in claves] + [base['Componente']]).transform('sum')
+        base['Participacion_General'] = base['Aporte_General'] / total_general.where(total_general > 0)
+        base['Participacion_Componente'] = base['Aporte_Componente'] / total_componente.where(total_componente > 0)
+
+        return (base[claves + columnas]
+                .sort_values(['Ganancia_Meta_General', 'COD'], ascending=[False, True])
+                .reset_index(drop=True))
+
+    @staticmethod
+    def apply_score_deltas(score_cube, filas_salen, filas_entran, df_latest=None):
+        """
+        Actualizar el cubo de puntajes cuando cambian algunos indicadores: se restan
+        los aportes de sus filas anteriores de la vista de últimos valores, se suman
+        los de las nuevas y se recalculan los puntajes de las categorías, componentes
+        y nivel general afectados. El costo depende de las filas cambiadas, no del dataset
+        """
+        columnas = ['Nivel', 'Componente', 'Categoria', 'Suma_Ponderada',
+                    'Peso_Total', 'N_Indicadores', 'Puntaje_Ponderado']
+        sumables = ['Suma_Ponderada', 'Peso_Total', 'N_Indicadores']
+
+        delta_sale = ScoreEngine.calculate_score_cube(filas_salen)
+        delta_entra = ScoreEngine.calculate_score_cube(filas_entran)
+        delta_sale[sumables] = -delta_sale[sumables]
+
+        partes = [c for c in [score_cube, delta_entra, delta_sale] if not c.empty]
+        if not partes:
+            return pd.DataFrame(columns=columnas)
+
+        combinado = pd.concat(partes, ignore_index=True)
+        combinado['Clave'] = np.select(
+            [combinado['Nivel'] == 'Componente', combinado['Nivel'] == 'Categoria'],
+            [combinado['Componente'], combinado['Categoria']],
+            default='General'
+        )
+        combinado['Orden'] = combinado['Nivel'].map({'General': 0, 'Componente': 1, 'Categoria': 2})
+
+        cube = (combinado
+                .groupby(['Orden', 'Nivel', 'Clave'], sort=True)[sumables]
+                .sum()
+                .reset_index())
+        cube = cube[cube['N_Indicadores'] > 0].reset_index(drop=True)
+
+        cube['Componente'] = cube['Clave'].where(cube['Nivel'] == 'Componente')
+        cube['Categoria'] = cube['Clave'].where(cube['Nivel'] == 'Categoria')
+        cube['N_Indicadores'] = cube['N_Indicadores'].astype(int)
+        cube['Puntaje_Ponderado'] = cube['Suma_Ponderada'] / cube['Peso_Total'].where(cube['Peso_Total'] > 0)
+
+        es_general = cube['Nivel'] == 'General'
+        if es_general.any() and not cube.loc[es_general, 'Peso_Total'].iloc[0] > 0 and df_latest is not None:
+            # Sin pesos válidos, el puntaje general es el promedio simple (como en calculate_score_cube)
+            cube.loc[es_general, 'Puntaje_Ponderado'] = df_latest['Valor_Normalizado'].mean()
+
+        return cube[columnas]
+
+    @staticmethod
+    def scores_from_cube(score_cube):
+        """Convertir el cubo de puntajes a la tupla (puntajes_componente, puntajes_categoria, puntaje_general)"""
+        if score_cube.empty:
+            return pd.DataFrame({'Componente': [], 'Puntaje_Ponderado': []}), \
+                   pd.DataFrame({'Categoria': [], 'Puntaje_Ponderado': []}), 0
+
+        puntajes_componente = (score_cube[score_cube['Nivel'] == 'Componente']
+                               [['Componente', 'Puntaje_Ponderado']]
+                               .reset_index(drop=True))
+        puntajes_categoria = (score_cube[score_cube['Nivel'] == 'Categoria']
+                              [['Categoria', 'Puntaje_Ponderado']]
+                              .reset_index(drop=True))
+        puntaje_general = score_cube.loc[score_cube['Nivel'] == 'General', 'Puntaje_Ponderado'].iloc[0]
+
+        return puntajes_componente, puntajes_categoria, puntaje_general
+    
+    @staticmethod
+    def _score_as_of(df, fecha_corte):
+        """
+        Puntaje general ICE 'a la fecha de corte': para cada indicador (COD), usa
+        su último valor disponible en o antes de fecha_corte (no el más reciente
+        del dataset completo). Indicadores sin ningún dato hasta esa fecha
+        simplemente no participan del promedio de ese corte.
+        """
+        columnas = ['COD', 'Fecha', 'Valor_Normalizado', 'Peso']
+        if not all(c in df.columns for c in columnas):
+            return None, 0
+
+        df_valido = df.dropna(subset=['COD', 'Fecha', 'Valor_Normalizado'])
+        df_valido = df_valido[df_valido['Fecha'] <= fecha_corte]
+
+        if df_valido.empty:
+            return None, 0
+
+        df_ultimo = (df_valido
+                     .sort_values(['COD', 'Fecha'])
+                     .groupby('COD')
+                     .last()
+                     .reset_index())
+
+        peso = df_ultimo['Peso'].fillna(1.0) if 'Peso' in df_ultimo.columns else pd.Series(1.0, index=df_ultimo.index)
+        peso_total = peso.sum()
+
+        if peso_total > 0:
+            puntaje = (df_ultimo['Valor_Normalizado'] * peso).sum() / peso_total
+        else:
+            puntaje = df_ultimo['Valor_Normalizado'].mean()
+
+        return puntaje, len(df_ultimo)
+
+    @staticmethod
+    def calculate_ice_historical_series(df):
+        """
+        Serie histórica semestral del puntaje general ICE: para cada corte
+        (30-jun y 31-dic de cada año, desde el primer dato disponible hasta hoy),
+        calcula el puntaje usando el último valor de cada indicador en o antes
+        de esa fecha de corte.
+        """
+        try:
+            if df.empty or 'Fecha' not in df.columns:
+                return pd.DataFrame(columns=['Fecha_Corte', 'Puntaje_General', 'N_Indicadores'])
+
+            cortes = ScoreEngine._semester_cuts(df)
+            if not cortes:
+                return pd.DataFrame(columns=['Fecha_Corte', 'Puntaje_General', 'N_Indicadores'])
+
+            filas = []
+            for corte in cortes:
+                puntaje, n_indicadores = ScoreEngine._score_as_of(df, corte)
+                if puntaje is not None:
+                    filas.append({
+                        'Fecha_Corte': corte,
+                        'Puntaje_General': puntaje,
+                        'N_Indicadores': n_indicadores
+                    })
+
+            return pd.DataFrame(filas)
+
+        except Exception as e:
+            report('warning', f"No se pudo calcular la evolución histórica del ICE: {e}")
+            return pd.DataFrame(columns=['Fecha_Corte', 'Puntaje_General', 'N_Indicadores'])
+
+    @staticmethod
+    def _semester_cuts(df):
+        """Cortes semestrales (30-jun y 31-dic) entre el primer dato del dataset y hoy"""
+        fechas_validas = df['Fecha'].dropna()
+        if not pd.api.types.is_datetime64_any_dtype(fechas_validas):
+            fechas_validas = pd.to_datetime(fechas_validas, errors='coerce').dropna()
+
+        if fechas_validas.empty:
+            return []
+
+        primera_fecha = fechas_validas.min()
+        hoy = pd.Timestamp.now().normalize()
+
+        cortes = []
+        for anio in range(primera_fecha.year, hoy.year + 1):
+            for corte in [pd.Timestamp(year=anio, month=6, day=30), pd.Timestamp(year=anio, month=12, day=31)]:
+                if primera_fecha <= corte <= hoy:
+                    cortes.append(corte)
+        return sorted(set(cortes))
+
+    @staticmethod
+    def calculate_ice_uncertainty_bands(df, simulaciones=None, percentiles=None, semilla=None, matriz=None):
+        """
+        Bandas de incertidumbre de la serie histórica del ICE por imputación Monte
+        Carlo. En cada corte semestral, cada indicador usa su último valor normalizado
+        en o antes del corte (la matriz semestral indicador × periodo, que se construye
+        si no se pasa); los que aún no tienen dato, en lugar de salir del promedio, se
+        imputan con valores sorteados de su propio histórico (los periodos en que tuvo
+        registro). Todas las simulaciones se evalúan en lote con NumPy (por bloques
+        para acotar la memoria). Devuelve un DataFrame largo con Fecha_Corte, Nivel
+        ('General' o 'Componente'), Componente, Cobertura (fracción del peso con dato)
+        y una columna P<n> por percentil
+        """
+        simulaciones = simulaciones or UNCERTAINTY_CONFIG['simulations']
+        percentiles = list(percentiles or UNCERTAINTY_CONFIG['percentiles'])
+        semilla = UNCERTAINTY_CONFIG['seed'] if semilla is None else semilla
+        columnas = ['Fecha_Corte', 'Nivel', 'Componente', 'Cobertura'] + [f'P{p:g}' for p in percentiles]
+
+        try:
+            if matriz is None:
+                matriz = PeriodMatrixBuilder.build(df, 'semestral')
+
+            # Cortes hasta hoy, como en la serie histórica
+            vigentes = np.asarray(matriz.periodos <= pd.Timestamp.now().normalize())
+            if len(matriz) == 0 or not vigentes.any():
+                return pd.DataFrame(columns=columnas)
+
+            cortes = matriz.periodos[vigentes]
+            valores = matriz.valores[:, vigentes]
+            observado = ~np.isnan(valores)
+            peso = matriz.pesos
+            componentes = matriz.componentes
+            n, t = valores.shape
+
+            # Histórico de cada indicador (valores de los periodos con registro, relleno a la derecha)
+            largo = matriz.observado.sum(axis=1)
+            orden = np.argsort(~matriz.observado, axis=1, kind='stable')
+            historia = np.take_along_axis(matriz.valores, orden, axis=1)[:, :int(largo.max())]
+
+            filas_faltantes, cortes_faltantes = np.nonzero(~observado)
+            aporte_observado = np.where(observado, valores * peso[:, None], 0.0)
+
+            grupos = [('General', None, np.ones(n, dtype=bool))] + [
+                ('Componente', c, componentes == c) for c in pd.unique(componentes[pd.notna(componentes)])
+            ]
+
+            # Matriz (celda faltante × corte) que suma los aportes imputados de cada corte
+            a_corte = np.zeros((len(filas_faltantes), t))
+            a_corte[np.arange(len(filas_faltantes)), cortes_faltantes] = 1.0
+
+            rng = np.random.default_rng(semilla)
+            bloque = max(1, int(UNCERTAINTY_CONFIG['max_batch_cells'] // max(len(filas_faltantes), 1)))
+            sumas = {i: [] for i in range(len(grupos))}
+            for desde in range(0, simulaciones, bloque):
+                s = min(bloque, simulaciones - desde)
+                # Un sorteo uniforme por simulación y celda entre los valores del propio COD
+                sorteo = (rng.random((s, len(filas_faltantes))) * largo[filas_faltantes]).astype(np.int64)
+                imputado = historia[filas_faltantes[None, :], sorteo] * peso[filas_faltantes]
+                for i, (_, _, miembros) in enumerate(grupos):
+                    en_grupo = miembros[filas_faltantes]
+                    sumas[i].append(imputado[:, en_grupo] @ a_corte[en_grupo])
+
+            filas = []
+            for i, (nivel, componente, miembros) in enumerate(grupos):
+                peso_total = peso[miembros].sum()
+                if not peso_total > 0:
+                    continue
+                fijo = aporte_observado[miembros].sum(axis=0)
+                puntajes = (np.concatenate(sumas[i]) + fijo[None, :]) / peso_total
+                bandas = np.percentile(puntajes, percentiles, axis=0)
+                cobertura = (observado[miembros] * peso[miembros, None]).sum(axis=0) / peso_total
+                for j, corte in enumerate(cortes):
+                    fila = {'Fecha_Corte': corte, 'Nivel': nivel, 'Componente': componente,
+                            'Cobertura': cobertura[j]}
+                    fila.update({f'P{p:g}': bandas[k, j] for k, p in enumerate(percentiles)})
+                    filas.append(fila)
+
+            return pd.DataFrame(filas, columns=columnas)
+
+        except Exception as e:
+            report('warning', f"No se pudieron calcular las bandas de incertidumbre del ICE: {e}")
+            return pd.DataFrame(columns=columnas)
+
+    @staticmethod
+    def build_indicator_catalog(df):
+        """
+        Catálogo de indicadores: una fila por COD (índice) con nombre, componente,
+        categoría, tipo, meta y número de registros. Se construye con un único
+        groupby sobre el DataFrame procesado, en lugar de filtrar df por cada código.
+        """
+        columnas = ['Indicador', 'Componente', 'Categoria', 'Tipo', 'Meta']
+        catalogo_vacio = pd.DataFrame(columns=columnas + ['Registros']).rename_axis('COD')
+
+        try:
+            if df.empty or 'COD' not in df.columns:
+                return catalogo_vacio
+
+            df_cod = df[df['COD'].notna() & (df['COD'].astype(str).str.strip() != '')]
+            if df_cod.empty:
+                return catalogo_vacio
+
+            grupos = df_cod.groupby('COD', sort=True)
+
+            # Primera fila de cada COD (como iloc[0]): first() mezclaría valores no
+            # nulos de filas distintas
+            disponibles = [col for col in columnas if col in df_cod.columns]
+            catalogo = df_cod.drop_duplicates('COD').set_index('COD')[disponibles].sort_index()
+            for col in columnas:
+                if col not in catalogo.columns:
+                    catalogo[col] = np.nan
+
+            catalogo['Registros'] = grupos.size()
+
+            return catalogo[columnas + ['Registros']]
+
+        except Exception as e:
+            report('error', f"Error al construir el catálogo de indicadores: {e}")
+            return catalogo_vacio
+
+    @staticmethod
+    def calculate_change_summary(df):
+        """
+        Cambios de todos los indicadores a la vez: una fila por COD (por Entidad y
+        COD si el dataset tiene esa dimensión) con su primer registro (línea base), el
+        anterior al último, el vigente un año antes del último y el último, y los
+        cambios entre ellos en valor recalculado (absoluto y %) y en valor normalizado
+        (puntos). Los registros sin valor no cuentan. Los indicadores se agrupan en una
+        sola pasada y los registros de referencia se toman por posición con NumPy
+        """
+        referencias = [('Inicial', 'Total'), ('Anterior', 'Periodo'), ('Anio_Anterior', 'Anual')]
+        columnas = (['COD', 'Indicador', 'Componente', 'Categoria', 'Registros', 'Fecha_Actual', 'Valor_Actual',
+                     'Normalizado_Actual']
+                    + [f'{c}_{r}' for r, _ in referencias for c in ('Fecha', 'Valor')]
+                    + [f'Cambio_{n}{sufijo}' for _, n in referencias for sufijo in ('', '_Pct', '_Norm')])
+
+        valor_col = 'Valor_Recalculado' if 'Valor_Recalculado' in df.columns else 'Valor'
+        claves = ['Entidad', 'COD'] if 'Entidad' in df.columns else ['COD']
+        if df.empty or not all(c in df.columns for c in claves + ['Fecha', valor_col]):
+            return pd.DataFrame(columns=columnas)
+
+        validos = df.dropna(subset=claves + ['Fecha', valor_col])
+        if validos.empty:
+            return pd.DataFrame(columns=columnas)
+        validos = validos.sort_values(claves + ['Fecha'], kind='stable')
+
+        # Una sola agrupación: número de indicador de cada registro (creciente en el orden)
+        grupo = validos.groupby(claves, sort=True).ngroup().to_numpy()
+        n = int(grupo.max()) + 1
+        inicio = np.searchsorted(grupo, np.arange(n))
+        ultimo = np.searchsorted(grupo, np.arange(n), side='right') - 1
+
+        fechas = validos['Fecha'].to_numpy(dtype='datetime64[ns]')
+        valores = pd.to_numeric(validos[valor_col], errors='coerce').to_numpy(dtype=float)
+        normalizados = (pd.to_numeric(validos['Valor_Normalizado'], errors='coerce').to_numpy(dtype=float)
+                        if 'Valor_Normalizado' in validos.columns else np.full(len(validos), np.nan))
+
+        # Registro vigente un año antes del último: último con fecha <= última - 1 año
+        dias = fechas.astype('datetime64[D]').astype(np.int64)
+        clave_fecha = grupo.astype(np.int64) * (1 << 32) + dias
+        limite = np.asarray(pd.DatetimeIndex(fechas[ultimo]) - pd.DateOffset(years=1), dtype='datetime64[D]')
+        anio_anterior = np.searchsorted(clave_fecha, np.arange(n) * (1 << 32) + limite.astype(np.int64),
+                                        side='right') - 1
+
+        posiciones = {
+            'Inicial': (inicio, np.ones(n, dtype=bool)),
+            'Anterior': (ultimo - 1, ultimo > inicio),
+            'Anio_Anterior': (anio_anterior, anio_anterior >= inicio)
+        }
+
+        recientes = validos.iloc[ultimo]
+        resumen = {columna: recientes[columna].to_numpy() for columna in claves}
+        for columna in ('Indicador', 'Componente', 'Categoria'):
+            resumen[columna] = recientes[columna].to_numpy() if columna in recientes.columns else None
+        resumen.update({
+            'Registros': ultimo - inicio + 1,
+            'Fecha_Actual': fechas[ultimo],
+            'Valor_Actual': valores[ultimo],
+            'Normalizado_Actual': normalizados[ultimo]
+        })
+
+        for referencia, nombre in referencias:
+            posicion, existe = posiciones[referencia]
+            posicion = np.clip(posicion, 0, len(validos) - 1)
+            base = np.where(existe, valores[posicion], np.nan)
+            base_norm = np.where(existe, normalizados[posicion], np.nan)
+            resumen[f'Fecha_{referencia}'] = np.where(existe, fechas[posicion], np.datetime64('NaT'))
+            resumen[f'Valor_{referencia}'] = base
+            resumen[f'Cambio_{nombre}'] = valores[ultimo] - base
+            with np.errstate(divide='ignore', invalid='ignore'):
+                resumen[f'Cambio_{nombre}_Pct'] = np.where(base != 0, (valores[ultimo] - base) / np.abs(base), np.nan)
+            resumen[f'Cambio_{nombre}_Norm'] = normalizados[ultimo] - base_norm
+
+        orden = claves[:-1] + [c for c in columnas if c in resumen]
+        return pd.DataFrame(resumen)[orden]
+
+    @staticmethod
+    def _get_latest_values_by_indicator(df):
+        """Obtener valores más recientes por indicador"""
+        try:
+            if df.empty:
+                return df
+            
+            # Verificar columnas necesarias
+            if not all(col in df.columns for col in ['COD', 'Fecha', 'Valor']):
+                return df
+
+            # Limpiar datos
+            df_clean = df.dropna(subset=['COD', 'Fecha', 'Valor'])
+
+            if df_clean.empty:
+                return df
+
+            # Obtener valores más recientes (por entidad si el dataset une varias)
+            claves = ['Entidad', 'COD'] if 'Entidad' in df_clean.columns else ['COD']
+            df_latest = (df_clean
+                        .sort_values(claves + ['Fecha'])
+                        .groupby(claves, sort=False)
+                        .last()
+                        .reset_index())
+            
+            return df_latest
+            
+        except Exception as e:
+            report('error', f"Error al obtener valores recientes: {e}")
+            return df
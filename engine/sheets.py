@@ -0,0 +1,1117 @@
+"""
+Gestor de Google Sheets - VERSIÓN CON PESTAÑA FICHAS METODOLÓGICAS
+NUEVA FUNCIONALIDAD: Cargar fichas metodológicas desde Google Sheets
+Sin Streamlit: la configuración se recibe al construir el gestor y los avisos se
+reportan como mensajes del motor (engine.messages)
+"""
+
+import pandas as pd
+from datetime import datetime
+import random
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from config import GOOGLE_SHEETS_CONFIG
+from fingerprint import content_fingerprint
+from engine.messages import report
+
+try:
+    import gspread
+    from google.oauth2.service_account import Credentials
+    GSPREAD_AVAILABLE = True
+    _WORKSHEET_NOT_FOUND = gspread.WorksheetNotFound
+except ImportError:
+    GSPREAD_AVAILABLE = False
+    _WORKSHEET_NOT_FOUND = ()
+
+class SheetsDeadlineExceeded(TimeoutError):
+    """La llamada a Google Sheets no terminó dentro del plazo configurado"""
+
+class SheetsCircuitOpen(RuntimeError):
+    """El circuito está abierto: se evita llamar a Google Sheets tras fallos repetidos"""
+
+class CircuitBreaker:
+    """
+    Cortocircuito para Google Sheets: tras failure_threshold fallos seguidos se abre
+    y rechaza las llamadas de inmediato durante reset_seconds; luego deja pasar una
+    llamada de prueba (semiabierto) y se cierra de nuevo si tiene éxito
+    """
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'cerrado'
+        if time.time() - self.opened_at >= self.reset_seconds:
+            return 'semiabierto'
+        return 'abierto'
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'abierto':
+                return False
+            if self.state == 'semiabierto':
+                # Solo una llamada de prueba: reabrir hasta conocer su resultado
+                self.opened_at = time.time()
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.time()
+
+    def trip(self):
+        """Abrir el circuito de inmediato (p. ej. al agotarse el plazo de una carga)"""
+        with self._lock:
+            self.failures = max(self.failures, self.failure_threshold)
+            self.opened_at = time.time()
+
+class TokenBucket:
+    """Cubeta de fichas: capacidad máxima y recarga continua a una tasa por minuto"""
+
+    def __init__(self, por_minuto):
+        self.capacidad = float(por_minuto)
+        self.tasa = por_minuto / 60.0
+        self.tokens = float(por_minuto)
+        self.actualizado = time.monotonic()
+
+    def _recargar(self):
+        ahora = time.monotonic()
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self.actualizado) * self.tasa)
+        self.actualizado = ahora
+
+    def try_take(self, reserva=0.0):
+        """Tomar una ficha dejando al menos 'reserva' fichas en la cubeta"""
+        self._recargar()
+        if self.tokens - 1 >= reserva:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self, reserva=0.0):
+        """Segundos hasta que try_take(reserva) pueda tener éxito"""
+        self._recargar()
+        return max(0.0, (1 + reserva - self.tokens) / self.tasa)
+
+class RequestGovernor:
+    """
+    Gobernador de cuota para todo el tráfico a Google Sheets del proceso. Lleva
+    presupuestos separados de lectura y escritura (cuotas por minuto de la API);
+    las peticiones en segundo plano dejan una reserva para las interactivas, y
+    ante un 429 todas las peticiones se pausan con backoff exponencial y jitter
+    """
+
+    def __init__(self, lecturas_por_minuto, escrituras_por_minuto, reserva_interactiva):
+        self._buckets = {
+            'lectura': TokenBucket(lecturas_por_minuto),
+            'escritura': TokenBucket(escrituras_por_minuto)
+        }
+        self.reserva_interactiva = reserva_interactiva
+        self.pausa_hasta = 0.0
+        self._cond = threading.Condition()
+        self.contadores = {
+            'lectura': 0, 'escritura': 0, 'en_segundo_plano': 0,
+            'esperas': 0, 'segundos_espera': 0.0, 'limite_429': 0, 'rechazadas': 0
+        }
+
+    def acquire(self, tipo, interactiva, plazo):
+        """Esperar una ficha del presupuesto 'tipo'; SheetsDeadlineExceeded si no llega a tiempo"""
+        bucket = self._buckets[tipo]
+        reserva = 0.0 if interactiva else bucket.capacidad * self.reserva_interactiva
+        inicio = time.monotonic()
+        limite = inicio + plazo
+        espero = False
+
+        with self._cond:
+            while True:
+                ahora = time.monotonic()
+                if ahora >= self.pausa_hasta and bucket.try_take(reserva):
+                    self.contadores[tipo] += 1
+                    if not interactiva:
+                        self.contadores['en_segundo_plano'] += 1
+                    if espero:
+                        self.contadores['esperas'] += 1
+                        self.contadores['segundos_espera'] += ahora - inicio
+                    return
+
+                espera = max(self.pausa_hasta - ahora, bucket.wait_time(reserva))
+                if ahora + espera > limite:
+                    self.contadores['rechazadas'] += 1
+                    raise SheetsDeadlineExceeded(f"Cuota de {tipo} de Google Sheets agotada")
+                self._cond.wait(espera)
+                espero = True
+
+    def back_off(self, intento):
+        """Registrar un 429 y pausar todo el tráfico (backoff exponencial con jitter)"""
+        pausa = GOOGLE_SHEETS_CONFIG['rate_limit_backoff_seconds'] * (2 ** intento) * random.uniform(0.5, 1.5)
+        with self._cond:
+            self.contadores['limite_429'] += 1
+            self.pausa_hasta = max(self.pausa_hasta, time.monotonic() + pausa)
+            self._cond.notify_all()
+        return pausa
+
+    def stats(self):
+        """Contadores y fichas disponibles, para el panel de información del sistema"""
+        with self._cond:
+            datos = dict(self.contadores)
+            for tipo, bucket in self._buckets.items():
+                bucket._recargar()
+                datos[f'disponibles_{tipo}'] = int(bucket.tokens)
+            datos['en_pausa'] = max(0.0, self.pausa_hasta - time.monotonic())
+        return datos
+
+# Marca de hilo para peticiones en segundo plano (p. ej. el refresco periódico)
+_CONTEXTO_PETICIONES = threading.local()
+
+@contextmanager
+def background_requests():
+    """Marcar las llamadas a Sheets del bloque como de segundo plano (menor prioridad)"""
+    anterior = getattr(_CONTEXTO_PETICIONES, 'en_segundo_plano', False)
+    _CONTEXTO_PETICIONES.en_segundo_plano = True
+    try:
+        yield
+    finally:
+        _CONTEXTO_PETICIONES.en_segundo_plano = anterior
+
+def is_background_request():
+    """Indica si el hilo actual está dentro de background_requests()"""
+    return getattr(_CONTEXTO_PETICIONES, 'en_segundo_plano', False)
+
+@contextmanager
+def load_deadline(segundos=None):
+    """
+    Plazo único para todas las llamadas a Sheets del bloque (una carga completa): cada
+    llamada termina a más tardar en él, aunque su propio plazo sea mayor. Un plazo
+    exterior más corto se conserva
+    """
+    segundos = GOOGLE_SHEETS_CONFIG['load_timeout_seconds'] if segundos is None else segundos
+    anterior = getattr(_CONTEXTO_PETICIONES, 'plazo_carga', None)
+    limite = time.monotonic() + segundos
+    _CONTEXTO_PETICIONES.plazo_carga = limite if anterior is None else min(anterior, limite)
+    try:
+        yield
+    finally:
+        _CONTEXTO_PETICIONES.plazo_carga = anterior
+
+def current_load_deadline():
+    """Límite (time.monotonic) de la carga en curso en este hilo, o None"""
+    return getattr(_CONTEXTO_PETICIONES, 'plazo_carga', None)
+
+def _is_rate_limited(error):
+    """Indica si el error de la API corresponde a un 429 (cuota excedida)"""
+    respuesta = getattr(error, 'response', None)
+    if getattr(respuesta, 'status_code', None) == 429:
+        return True
+    texto = str(error)
+    return '429' in texto or 'RATE_LIMIT_EXCEEDED' in texto
+
+# Métodos de gspread que consumen cuota de escritura; el resto cuenta como lectura
+_METODOS_ESCRITURA = {
+    'append_row', 'update_cell', 'update_cells', 'delete_rows', 'add_worksheet', 'update'
+}
+
+# Las llamadas a gspread se ejecutan en este pool para poder abandonarlas al vencer
+# el plazo; un hilo colgado no bloquea el hilo de Streamlit que atiende al usuario
+_SHEETS_WORKERS = 4
+_SHEETS_EXECUTOR = ThreadPoolExecutor(max_workers=_SHEETS_WORKERS, thread_name_prefix="ice-sheets")
+
+# Hilos libres del pool. Una llamada abandonada sigue ocupando el suyo hasta que
+# gspread vuelva: no se encola trabajo detrás de llamadas colgadas
+_SHEETS_LIBRES = threading.BoundedSemaphore(_SHEETS_WORKERS)
+
+def _run_in_worker(funcion, args, kwargs):
+    try:
+        return funcion(*args, **kwargs)
+    finally:
+        _SHEETS_LIBRES.release()
+
+# Estado compartido por proceso, por URL de hoja de cálculo
+_BREAKERS = {}
+_ULTIMA_LECTURA_OK = {}
+_HEADERS_CACHE = {}
+_GOVERNOR = None
+_ESTADO_LOCK = threading.Lock()
+
+def get_request_governor():
+    """Gobernador de cuota único por proceso"""
+    global _GOVERNOR
+    with _ESTADO_LOCK:
+        if _GOVERNOR is None:
+            _GOVERNOR = RequestGovernor(
+                GOOGLE_SHEETS_CONFIG['read_requests_per_minute'],
+                GOOGLE_SHEETS_CONFIG['write_requests_per_minute'],
+                GOOGLE_SHEETS_CONFIG['interactive_reserve']
+            )
+        return _GOVERNOR
+
+def get_circuit_breaker(spreadsheet_url):
+    """Cortocircuito compartido por todas las sesiones para una hoja de cálculo"""
+    with _ESTADO_LOCK:
+        if spreadsheet_url not in _BREAKERS:
+            _BREAKERS[spreadsheet_url] = CircuitBreaker(
+                GOOGLE_SHEETS_CONFIG['circuit_failure_threshold'],
+                GOOGLE_SHEETS_CONFIG['circuit_reset_seconds']
+            )
+        return _BREAKERS[spreadsheet_url]
+
+# Valor por defecto de load_combined_data: leer Fichas (None es 'no se pudieron leer')
+_LEER_FICHAS = object()
+
+class GoogleSheetsManager:
+    """Gestor de Google Sheets - CON PESTAÑA FICHAS"""
+    
+    def __init__(self, settings=None):
+        # Sección 'google_sheets' de la configuración: credenciales del Service
+        # Account + spreadsheet_url (en el tablero viene de secrets.toml)
+        self.settings = settings
+        self.gc = None
+        self.sheet = None
+        self.worksheet = None
+        self.fichas_worksheet = None  # NUEVA: Worksheet para fichas metodológicas
+        self.spreadsheet_url = None
+        self.worksheet_name = "IndicadoresICE"
+        self.fichas_worksheet_name = "Fichas"  # NUEVA: Nombre de la pestaña de fichas
+        self.connected = False
+        self.timeout = GOOGLE_SHEETS_CONFIG['call_timeout_seconds']
+        # Huella del contenido leído de cada pestaña ('indicadores', 'fichas')
+        self.fingerprints = {}
+
+    def _call(self, funcion, *args, **kwargs):
+        """
+        Ejecutar una llamada a Google Sheets con plazo real (self.timeout, acotado por
+        el de la carga en curso: load_deadline), a través del cortocircuito de la hoja
+        y del gobernador de cuota del proceso. Lanza SheetsCircuitOpen si el circuito
+        está abierto y SheetsDeadlineExceeded si la llamada (incluida la espera de
+        cuota, de un hilo libre y los reintentos por 429) no termina a tiempo. Si se
+        agota el plazo de la carga, el circuito se abre: el resto de la carga sirve de
+        inmediato la última lectura correcta
+        """
+        breaker = get_circuit_breaker(self.spreadsheet_url)
+        plazo_carga = current_load_deadline()
+        if plazo_carga is not None and time.monotonic() >= plazo_carga:
+            breaker.trip()
+            raise SheetsDeadlineExceeded("Se agotó el plazo de la carga de Google Sheets")
+        if not breaker.allow():
+            raise SheetsCircuitOpen("Google Sheets no responde; se reintentará en unos segundos")
+
+        governor = get_request_governor()
+        tipo = 'escritura' if getattr(funcion, '__name__', '') in _METODOS_ESCRITURA else 'lectura'
+        interactiva = not is_background_request()
+        limite = time.monotonic() + self.timeout
+        por_carga = plazo_carga is not None and plazo_carga < limite
+        if por_carga:
+            limite = plazo_carga
+        intento = 0
+
+        while True:
+            governor.acquire(tipo, interactiva, limite - time.monotonic())
+
+            # Sin hilos libres (llamadas colgadas) no se envía más trabajo al pool
+            if not _SHEETS_LIBRES.acquire(timeout=max(0.0, limite - time.monotonic())):
+                if por_carga:
+                    breaker.trip()
+                else:
+                    breaker.record_failure()
+                raise SheetsDeadlineExceeded("Todas las conexiones a Google Sheets están ocupadas")
+            try:
+                future = _SHEETS_EXECUTOR.submit(_run_in_worker, funcion, args, kwargs)
+            except Exception:
+                _SHEETS_LIBRES.release()
+                raise
+
+            try:
+                resultado = future.result(timeout=max(0.0, limite - time.monotonic()))
+            except FutureTimeoutError:
+                if por_carga:
+                    breaker.trip()
+                    raise SheetsDeadlineExceeded("Se agotó el plazo de la carga de Google Sheets")
+                breaker.record_failure()
+                raise SheetsDeadlineExceeded(f"Google Sheets no respondió en {self.timeout}s")
+            except _WORKSHEET_NOT_FOUND:
+                # Respuesta válida de la API (la pestaña no existe), no un fallo del servicio
+                breaker.record_success()
+                raise
+            except Exception as e:
+                if _is_rate_limited(e) and intento < GOOGLE_SHEETS_CONFIG['rate_limit_max_retries']:
+                    # Cuota excedida: el servicio está sano, esperar y reintentar
+                    governor.back_off(intento)
+                    intento += 1
+                    continue
+                breaker.record_failure()
+                raise
+
+            breaker.record_success()
+            return resultado
+
+    def _get_headers(self, worksheet):
+        """
+        Encabezados (fila 1) de una pestaña, cacheados por proceso durante
+        cache_ttl_seconds para no gastar una lectura de cuota en cada operación
+        """
+        clave = (self.spreadsheet_url, worksheet.title)
+        with _ESTADO_LOCK:
+            entrada = _HEADERS_CACHE.get(clave)
+        if entrada is not None and time.time() - entrada[0] < GOOGLE_SHEETS_CONFIG['cache_ttl_seconds']:
+            return list(entrada[1])
+
+        headers = self._call(worksheet.row_values, 1)
+        with _ESTADO_LOCK:
+            _HEADERS_CACHE[clave] = (time.time(), list(headers))
+        return headers
+
+    def _invalidate_headers(self, worksheet):
+        with _ESTADO_LOCK:
+            _HEADERS_CACHE.pop((self.spreadsheet_url, worksheet.title), None)
+
+    def _remember_good_read(self, nombre, df):
+        """Guardar la última lectura correcta de una pestaña (para servirla si Sheets falla)"""
+        with _ESTADO_LOCK:
+            _ULTIMA_LECTURA_OK[(self.spreadsheet_url, nombre)] = df.copy()
+
+    def _last_good_read(self, nombre):
+        with _ESTADO_LOCK:
+            df = _ULTIMA_LECTURA_OK.get((self.spreadsheet_url, nombre))
+        return df.copy() if df is not None else None
+        
+    def setup_credentials(self):
+        """Configurar credenciales - CON TIMEOUT"""
+        try:
+            if not GSPREAD_AVAILABLE:
+                report('error', "📦 **Instalar:** `pip install gspread google-auth`")
+                return False
+            
+            # Verificar configuración
+            if not self.settings:
+                report('error', "❌ Configuración de Google Sheets no encontrada en secrets.toml")
+                return False
+            
+            # Crear credenciales
+            scope = [
+                "https://www.googleapis.com/auth/spreadsheets",
+                "https://www.googleapis.com/auth/drive"
+            ]
+            
+            credentials_info = dict(self.settings)
+            self.spreadsheet_url = credentials_info.pop("spreadsheet_url", None)
+            
+            if not self.spreadsheet_url:
+                report('error', "❌ Falta 'spreadsheet_url' en la configuración")
+                return False
+            
+            # NUEVO: Timeout en creación de credenciales
+            credentials = Credentials.from_service_account_info(
+                credentials_info, scopes=scope
+            )
+            
+            # NUEVO: Timeout en autorización
+            self.gc = gspread.authorize(credentials)
+            
+            return True
+            
+        except Exception as e:
+            report('error', f"❌ Error en credenciales: {e}")
+            return False
+    
+    def connect_to_sheet(self):
+        """Conectar a Google Sheets - CON TIMEOUT Y FICHAS"""
+        try:
+            if not self.gc and not self.setup_credentials():
+                return False
+            
+            # Abrir hoja (con plazo real)
+            self.sheet = self._call(self.gc.open_by_url, self.spreadsheet_url)
+            
+            # Obtener o crear worksheet principal
+            try:
+                self.worksheet = self._call(self.sheet.worksheet, self.worksheet_name)
+            except gspread.WorksheetNotFound:
+                # Crear worksheet si no existe
+                self.worksheet = self._call(self.sheet.add_worksheet, 
+                    title=self.worksheet_name, rows=1000, cols=10
+                )
+                # Agregar headers
+                headers = [
+                    "COMPONENTE PROPUESTO", "CATEGORÍA", 
+                    "COD", "Nombre de indicador", "Valor", "Fecha", "Tipo"
+                ]
+                self._call(self.worksheet.append_row, headers)
+            
+            # NUEVO: Obtener o crear worksheet de fichas metodológicas
+            try:
+                self.fichas_worksheet = self._call(self.sheet.worksheet, self.fichas_worksheet_name)
+                
+            except gspread.WorksheetNotFound:
+                report('warning', "⚠️ Pestaña 'Fichas' no encontrada. Creando...")
+                # Crear worksheet de fichas
+                self.fichas_worksheet = self._call(self.sheet.add_worksheet, 
+                    title=self.fichas_worksheet_name, rows=1000, cols=50
+                )
+                # Agregar headers de fichas metodológicas
+                fichas_headers = [
+                    'Codigo', 'Nombre_Indicador', 'Definicion', 'Objetivo', 'Area_Tematica', 
+                    'Tema', 'Sector', 'Entidad', 'Dependencia', 'Formula_Calculo', 
+                    'Variables', 'Unidad_Medida', 'Metodologia_Calculo', 'Tipo_Acumulacion',
+                    'Fuente_Informacion', 'Tipo_Indicador', 'Periodicidad', 'Desagregacion_Geografica',
+                    'Desagregacion_Poblacional', 'Clasificacion_Calidad', 'Clasificacion_Intervencion',
+                    'Observaciones', 'Limitaciones', 'Interpretacion', 'Directivo_Responsable',
+                    'Correo_Directivo', 'Telefono_Contacto', 'Enlaces_Web', 'Soporte_Legal'
+                ]
+                self._call(self.fichas_worksheet.append_row, fichas_headers)
+                report('info', "✅ Pestaña 'Fichas' creada con estructura metodológica")
+            
+            self.connected = True
+            return True
+            
+        except Exception as e:
+            report('error', f"❌ Error de conexión: {e}")
+            # NUEVO: Información adicional sobre el error
+            if isinstance(e, SheetsCircuitOpen):
+                pass
+            elif isinstance(e, SheetsDeadlineExceeded) or "timeout" in str(e).lower():
+                report('error', "⏰ **Timeout:** Conexión muy lenta. Verifica tu internet.")
+            elif "permission" in str(e).lower():
+                report('error', "🔒 **Permisos:** Verifica que el Service Account tenga acceso.")
+            elif "not found" in str(e).lower():
+                report('error', "📋 **Hoja no encontrada:** Verifica la URL de Google Sheets.")
+            
+            self.connected = False
+            return False
+    
+    def load_data(self):
+        """
+        Cargar datos con plazo real. Si Google Sheets falla, no responde a tiempo o
+        el cortocircuito está abierto, se sirve la última lectura correcta (si existe)
+        """
+        try:
+            if not self.connected and not self.connect_to_sheet():
+                return self._fallback_read(self.worksheet_name, 'indicadores')
+            
+            data = self._call(self.worksheet.get_all_records)
+            
+            if not data:
+                report('info', "📋 Google Sheets está vacío")
+                return self._fingerprinted('indicadores', pd.DataFrame(columns=[
+                    "COMPONENTE PROPUESTO", "CATEGORÍA", 
+                    "COD", "Nombre de indicador", "Valor", "Fecha", "Tipo"
+                ]))
+            
+            df = pd.DataFrame(data)
+            self._remember_good_read(self.worksheet_name, df)
+            return self._fingerprinted('indicadores', df)
+            
+        except Exception as e:
+            report('error', f"❌ Error al leer datos de Google Sheets: {e}")
+            return self._fallback_read(self.worksheet_name, 'indicadores')
+
+    def _fallback_read(self, nombre, clave):
+        """Última lectura correcta de la pestaña, avisando que puede estar desactualizada"""
+        df = self._last_good_read(nombre)
+        if df is not None:
+            report('warning', f"⚠️ Mostrando la última copia disponible de '{nombre}' (Google Sheets no responde)")
+        return self._fingerprinted(clave, df)
+
+    def _fingerprinted(self, clave, df):
+        """Registrar la huella del contenido leído (antes de cualquier transformación)"""
+        self.fingerprints[clave] = content_fingerprint(df)
+        return df
+    
+    def load_fichas_data(self):
+        """NUEVO: Cargar datos de fichas metodológicas desde Google Sheets (con plazo real)"""
+        try:
+            if not self.connected and not self.connect_to_sheet():
+                return self._fallback_read(self.fichas_worksheet_name, 'fichas')
+            
+            if not self.fichas_worksheet:
+                report('warning', "⚠️ No hay pestaña 'Fichas' disponible")
+                return self._fingerprinted('fichas', pd.DataFrame())
+            
+            # Obtener datos de fichas
+            fichas_data = self._call(self.fichas_worksheet.get_all_records)
+            
+            if not fichas_data:
+                report('info', "📋 Pestaña 'Fichas' está vacía")
+                return self._fingerprinted('fichas', pd.DataFrame())
+            
+            fichas_df = pd.DataFrame(fichas_data)
+
+            # Limpiar datos vacíos usando COD
+            if not fichas_df.empty and 'COD' in fichas_df.columns:
+                fichas_df = fichas_df.dropna(subset=['COD'], how='all')
+
+            self._remember_good_read(self.fichas_worksheet_name, fichas_df)
+            return self._fingerprinted('fichas', fichas_df)
+            
+        except Exception as e:
+            report('error', f"❌ Error al cargar fichas: {e}")
+            return self._fallback_read(self.fichas_worksheet_name, 'fichas')
+
+    def load_combined_data(self, df_fichas=_LEER_FICHAS):
+        """
+        NUEVO: Cargar datos combinados de IndicadoresICE y Fichas
+        Hace JOIN entre ambas tablas usando COD/Codigo
+        Los metadatos (componente, categoría, tipo) vienen de Fichas
+        Los valores y fechas vienen de IndicadoresICE
+        df_fichas: resultado de load_fichas_data ya obtenido por el llamador (también
+        None), para no leer Fichas dos veces en la misma carga; no se modifica
+        """
+        try:
+            # Cargar ambas tablas
+            df_indicadores = self.load_data()
+            if df_fichas is _LEER_FICHAS:
+                df_fichas = self.load_fichas_data()
+            elif df_fichas is not None:
+                df_fichas = df_fichas.copy()
+
+            if df_indicadores is None:
+                report('error', "❌ No se pudieron cargar los datos de IndicadoresICE")
+                return None
+
+            if df_fichas is None or df_fichas.empty:
+                report('warning', "⚠️ No hay datos en Fichas. Usando datos de IndicadoresICE tal cual.")
+                return df_indicadores
+
+            # Limpiar nombres de columnas
+            df_indicadores.columns = df_indicadores.columns.str.strip()
+            df_fichas.columns = df_fichas.columns.str.strip()
+
+
+            # Verificar que existen las columnas necesarias
+            if 'COD' not in df_indicadores.columns:
+                report('error', "❌ Columna 'COD' no encontrada en IndicadoresICE")
+                return df_indicadores
+
+            if 'COD' not in df_fichas.columns:
+                report('error', "❌ Columna 'COD' no encontrada en Fichas")
+                return df_indicadores
+
+            # Limpiar códigos para el JOIN (ambas tablas usan COD)
+            df_indicadores['COD_clean'] = df_indicadores['COD'].astype(str).str.strip()
+            df_fichas['COD_clean'] = df_fichas['COD'].astype(str).str.strip()
+
+            # Seleccionar columnas relevantes de Fichas
+            fichas_cols = ['COD_clean', 'Componente', 'Categoría',
+                          'Tipo_Indicador', 'Nombre_Indicador', 'Meta', 'Peso', 'VPN',
+                          'Definicion', 'Unidad_Medida', 'Metodologia_Calculo', 'Calculo']
+
+            # Verificar qué columnas existen en Fichas
+            available_fichas_cols = ['COD_clean']
+            for col in fichas_cols[1:]:
+                if col in df_fichas.columns:
+                    available_fichas_cols.append(col)
+
+            df_fichas_subset = df_fichas[available_fichas_cols].copy()
+
+            # Renombrar columnas de Fichas para que coincidan con el formato esperado
+            rename_dict = {
+                'Componente': 'COMPONENTE PROPUESTO',
+                'Categoría': 'CATEGORÍA',
+                'Tipo_Indicador': 'Tipo',
+                'Nombre_Indicador': 'Nombre_Indicador_Ficha'
+            }
+            df_fichas_subset = df_fichas_subset.rename(columns=rename_dict)
+
+            # Hacer LEFT JOIN usando COD en ambas tablas
+            df_combined = df_indicadores.merge(
+                df_fichas_subset,
+                left_on='COD_clean',
+                right_on='COD_clean',
+                how='left',
+                suffixes=('_ind', '_ficha')
+            )
+
+            # Normalizar nombres de columnas después del merge
+            rename_map = {
+                'Componente': 'COMPONENTE PROPUESTO',
+                'Categoria': 'Categoría',
+                'Código': 'COD',
+                'Codigo': 'COD'  # También sin acento
+            }
+            for old_name, new_name in rename_map.items():
+                if old_name in df_combined.columns:
+                    df_combined = df_combined.rename(columns={old_name: new_name})
+
+            # Priorizar metadatos de Fichas sobre IndicadoresICE
+            # Si existe el valor en Fichas, usarlo; si no, mantener el de IndicadoresICE
+
+            for col in ['COMPONENTE PROPUESTO', 'Categoría', 'Tipo']:
+                if col in df_combined.columns:
+                    # Si tenemos columna duplicada (_ind y _ficha), usar _ficha cuando esté disponible
+                    col_ind = f"{col}_ind"
+                    col_ficha = f"{col}_ficha"
+
+                    if col_ind in df_combined.columns and col_ficha in df_combined.columns:
+                        # Usar valor de Fichas si está disponible, sino usar el de Indicadores
+                        df_combined[col] = df_combined[col_ficha].fillna(df_combined[col_ind])
+                        # Eliminar columnas duplicadas
+                        df_combined = df_combined.drop(columns=[col_ind, col_ficha])
+                    elif col_ficha in df_combined.columns:
+                        # Solo existe _ficha (no había en indicadores)
+                        df_combined[col] = df_combined[col_ficha]
+                        df_combined = df_combined.drop(columns=[col_ficha])
+
+            # Renombrar Nombre_Indicador_Ficha a "Nombre de indicador" y luego a "Indicador"
+            if 'Nombre_Indicador_Ficha' in df_combined.columns:
+                df_combined = df_combined.rename(columns={'Nombre_Indicador_Ficha': 'Indicador'})
+            elif 'Nombre_Indicador' in df_combined.columns:
+                df_combined = df_combined.rename(columns={'Nombre_Indicador': 'Indicador'})
+
+            # Eliminar COD_clean si existe COD
+            if 'COD_clean' in df_combined.columns:
+                df_combined = df_combined.drop(columns=['COD_clean'], errors='ignore')
+
+            # Verificar que no haya duplicados en los nombres de columnas
+            if df_combined.columns.duplicated().any():
+                df_combined = df_combined.loc[:, ~df_combined.columns.duplicated(keep='first')]
+
+            # Asegurar que CATEGORÍA tiene el nombre correcto
+            if 'Categoría' in df_combined.columns and 'CATEGORÍA' not in df_combined.columns:
+                df_combined = df_combined.rename(columns={'Categoría': 'CATEGORÍA'})
+
+            # Reordenar columnas al formato esperado
+            expected_cols = ['COMPONENTE PROPUESTO', 'CATEGORÍA',
+                           'COD', 'Indicador', 'Tipo', 'Valor', 'Fecha']
+
+            # Mantener solo las columnas que existen
+            final_cols = [col for col in expected_cols if col in df_combined.columns]
+
+            # Agregar columnas adicionales que no estén en expected_cols
+            extra_cols = [col for col in df_combined.columns if col not in final_cols]
+            final_cols.extend(extra_cols)
+
+            df_combined = df_combined[final_cols]
+
+            # ✅ NORMALIZAR nombres de columnas para compatibilidad con calculate_scores
+            column_standardization = {
+                'COMPONENTE PROPUESTO': 'Componente',
+                'CATEGORÍA': 'Categoria'
+            }
+
+            for original, standard in column_standardization.items():
+                if original in df_combined.columns:
+                    df_combined = df_combined.rename(columns={original: standard})
+
+            report('success', f"✅ Datos combinados: {len(df_combined)} registros de IndicadoresICE con metadatos de Fichas")
+
+            return df_combined
+
+        except Exception as e:
+            report('error', f"❌ Error al combinar datos: {e}")
+            import traceback
+            report('error', traceback.format_exc())
+            # En caso de error, devolver datos de IndicadoresICE sin combinar
+            return self.load_data()
+
+    def add_ficha_record(self, ficha_data_dict):
+        """NUEVO: Agregar ficha metodológica"""
+        try:
+            if not self.connected and not self.connect_to_sheet():
+                report('error', "❌ No se pudo conectar a Google Sheets")
+                return False
+            
+            if not self.fichas_worksheet:
+                report('error', "❌ No hay pestaña 'Fichas' disponible")
+                return False
+            
+            if not ficha_data_dict:
+                report('error', "❌ No hay datos de ficha para agregar")
+                return False
+            
+            # Timeout en operación
+            start_time = time.time()
+            
+            # Obtener headers de fichas
+            fichas_headers = self._get_headers(self.fichas_worksheet)
+            if not fichas_headers:
+                report('error', "❌ No hay headers en la pestaña 'Fichas'")
+                return False
+            
+            # Crear fila con orden correcto
+            nueva_fila_ficha = []
+            for header in fichas_headers:
+                valor = ""
+                if header in ficha_data_dict:
+                    valor = str(ficha_data_dict[header])
+                nueva_fila_ficha.append(valor)
+            
+            # Verificar timeout antes de agregar
+            if time.time() - start_time > self.timeout:
+                report('error', "❌ Timeout al preparar datos de ficha")
+                return False
+            
+            # Agregar fila
+            self._call(self.fichas_worksheet.append_row, nueva_fila_ficha)
+            
+            # Verificar que se completó en tiempo
+            if time.time() - start_time > self.timeout:
+                report('warning', "⚠️ Operación lenta, pero posiblemente exitosa")
+            
+            time.sleep(0.5)
+            return True
+            
+        except Exception as e:
+            report('error', f"❌ Error al agregar ficha: {e}")
+            return False
+    
+    def update_ficha_record(self, codigo, campo, nuevo_valor):
+        """NUEVO: Actualizar campo de ficha metodológica"""
+        try:
+            if not self.connected and not self.connect_to_sheet():
+                return False
+            
+            if not self.fichas_worksheet:
+                report('error', "❌ No hay pestaña 'Fichas' disponible")
+                return False
+            
+            # Timeout en operación
+            start_time = time.time()
+            
+            # Obtener datos de fichas
+            fichas_data = self._call(self.fichas_worksheet.get_all_records)
+            
+            # Verificar timeout
+            if time.time() - start_time > self.timeout / 2:
+                report('warning', "⚠️ Operación lenta...")
+            
+            # Buscar ficha por código
+            row_to_update = None
+            for i, row in enumerate(fichas_data, start=2):
+                if str(row.get('Codigo', '')).strip() == str(codigo).strip():
+                    row_to_update = i
+                    break
+            
+            if row_to_update is None:
+                report('error', "❌ Ficha no encontrada")
+                return False
+            
+            # Encontrar columna del campo
+            headers = self._get_headers(self.fichas_worksheet)
+            campo_col = None
+            for j, header in enumerate(headers, start=1):
+                if header.lower() == campo.lower():
+                    campo_col = j
+                    break
+            
+            if campo_col is None:
+                report('error', f"❌ Campo '{campo}' no encontrado")
+                return False
+            
+            # Actualizar
+            self._call(self.fichas_worksheet.update_cell, row_to_update, campo_col, nuevo_valor)
+            
+            # Verificar timeout final
+            if time.time() - start_time > self.timeout:
+                report('warning', "⚠️ Operación completada pero lenta")
+            
+            time.sleep(0.5)
+            return True
+            
+        except Exception as e:
+            report('error', f"❌ Error al actualizar ficha: {e}")
+            return False
+    
+    def add_record(self, data_dict):
+        """Agregar registro - CON TIMEOUT"""
+        try:
+            if not self.connected and not self.connect_to_sheet():
+                report('error', "❌ No se pudo conectar a Google Sheets")
+                return False
+            
+            if not data_dict:
+                report('error', "❌ No hay datos para agregar")
+                return False
+            
+            # NUEVO: Timeout en operación
+            start_time = time.time()
+            
+            # Obtener headers
+            headers = self._get_headers(self.worksheet)
+            if not headers:
+                headers = [
+                    "COMPONENTE PROPUESTO", "CATEGORÍA", 
+                    "COD", "Nombre de indicador", "Valor", "Fecha", "Tipo"
+                ]
+                self._call(self.worksheet.append_row, headers)
+                self._invalidate_headers(self.worksheet)
+            
+            # Crear fila con orden correcto
+            nueva_fila = []
+            for header in headers:
+                valor = ""
+                if header in data_dict:
+                    valor = str(data_dict[header])
+                nueva_fila.append(valor)
+            
+            # Verificar timeout antes de agregar
+            if time.time() - start_time > self.timeout:
+                report('error', "❌ Timeout al preparar datos")
+                return False
+            
+            # Agregar fila
+            self._call(self.worksheet.append_row, nueva_fila)
+            
+            # Verificar que se completó en tiempo
+            if time.time() - start_time > self.timeout:
+                report('warning', "⚠️ Operación lenta, pero posiblemente exitosa")
+            
+            # Pausa breve
+            time.sleep(0.5)
+            
+            return True
+            
+        except Exception as e:
+            report('error', f"❌ Error al agregar: {e}")
+            return False
+    
+    def update_record(self, codigo, fecha, nuevo_valor):
+        """Actualizar registro - CON TIMEOUT"""
+        try:
+            if not self.connected and not self.connect_to_sheet():
+                return False
+            
+            # NUEVO: Timeout en operación
+            start_time = time.time()
+            
+            # Obtener datos
+            data = self._call(self.worksheet.get_all_records)
+            
+            # Verificar timeout
+            if time.time() - start_time > self.timeout / 2:
+                report('warning', "⚠️ Operación lenta...")
+            
+            # Buscar registro
+            row_to_update = None
+            for i, row in enumerate(data, start=2):
+                if str(row.get('COD', '')).strip() == str(codigo).strip():
+                    if self._compare_dates(row.get('Fecha', ''), fecha):
+                        row_to_update = i
+                        break
+            
+            if row_to_update is None:
+                report('error', "❌ Registro no encontrado")
+                return False
+            
+            # Encontrar columna de valor
+            headers = self._get_headers(self.worksheet)
+            valor_col = None
+            for j, header in enumerate(headers, start=1):
+                if header.lower() in ['valor', 'value']:
+                    valor_col = j
+                    break
+            
+            if valor_col is None:
+                report('error', "❌ Columna 'Valor' no encontrada")
+                return False
+            
+            # Actualizar
+            self._call(self.worksheet.update_cell, row_to_update, valor_col, nuevo_valor)
+            
+            # Verificar timeout final
+            if time.time() - start_time > self.timeout:
+                report('warning', "⚠️ Operación lenta, verificar resultado")
+            
+            time.sleep(0.5)
+            return True
+            
+        except Exception as e:
+            report('error', f"❌ Error al actualizar: {e}")
+            return False
+    
+    def delete_record(self, codigo, fecha):
+        """Eliminar registro - CON TIMEOUT"""
+        try:
+            if not self.connected and not self.connect_to_sheet():
+                return False
+            
+            # NUEVO: Timeout en operación
+            start_time = time.time()
+            
+            # Obtener datos
+            data = self._call(self.worksheet.get_all_records)
+            
+            # Buscar registro
+            row_to_delete = None
+            for i, row in enumerate(data, start=2):
+                if str(row.get('COD', '')).strip() == str(codigo).strip():
+                    if self._compare_dates(row.get('Fecha', ''), fecha):
+                        row_to_delete = i
+                        break
+            
+            if row_to_delete is None:
+                report('error', "❌ Registro no encontrado")
+                return False
+            
+            # Verificar timeout
+            if time.time() - start_time > self.timeout / 2:
+                report('warning', "⚠️ Buscando registro...")
+            
+            # Eliminar fila
+            self._call(self.worksheet.delete_rows, row_to_delete)
+            
+            # Verificar timeout final
+            if time.time() - start_time > self.timeout:
+                report('warning', "⚠️ Operación completada pero lenta")
+            
+            time.sleep(0.5)
+            return True
+            
+        except Exception as e:
+            report('error', f"❌ Error al eliminar: {e}")
+            return False
+    
+    def _compare_dates(self, sheet_date_str, target_date):
+        """Comparar fechas de forma segura"""
+        try:
+            if not sheet_date_str:
+                return False
+            
+            # Convertir fecha de sheets
+            sheet_date = pd.to_datetime(str(sheet_date_str).strip(), dayfirst=True, errors='coerce')
+            
+            # Convertir fecha objetivo
+            if isinstance(target_date, str):
+                target_date = pd.to_datetime(target_date, dayfirst=True, errors='coerce')
+            elif hasattr(target_date, 'date'):
+                target_date = pd.to_datetime(target_date.date())
+            
+            # Comparar fechas
+            if pd.notna(sheet_date) and pd.notna(target_date):
+                return sheet_date.date() == target_date.date()
+            
+            return False
+            
+        except Exception:
+            return False
+    
+    def get_connection_info(self):
+        """Obtener información de conexión"""
+        return {
+            'connected': self.connected,
+            'spreadsheet_url': self.spreadsheet_url,
+            'worksheet_name': self.worksheet_name,
+            'fichas_worksheet_name': self.fichas_worksheet_name,  # NUEVO
+            'gspread_available': GSPREAD_AVAILABLE,
+            'timeout': self.timeout,
+            'circuit_state': get_circuit_breaker(self.spreadsheet_url).state,
+            'fichas_available': self.fichas_worksheet is not None  # NUEVO
+        }
+    
+    def test_connection(self):
+        """Probar conexión - MÉTODO MEJORADO"""
+        try:
+            start_time = time.time()
+            
+            if not self.connect_to_sheet():
+                return False, "No se pudo conectar"
+            
+            # Probar lectura rápida de datos principales
+            try:
+                headers = self._call(self.worksheet.row_values, 1)
+                connection_time = time.time() - start_time
+                
+                if connection_time > self.timeout:
+                    return False, f"Timeout ({connection_time:.1f}s > {self.timeout}s)"
+                
+                # Probar lectura de fichas también
+                fichas_status = ""
+                if self.fichas_worksheet:
+                    try:
+                        fichas_headers = self._call(self.fichas_worksheet.row_values, 1)
+                        fichas_status = f" + Fichas OK"
+                    except:
+                        fichas_status = f" + Fichas ERROR"
+                else:
+                    fichas_status = f" + Sin Fichas"
+                
+                return True, f"Conexión exitosa ({connection_time:.1f}s){fichas_status}"
+
+            except Exception as e:
+                return False, f"Error al leer: {e}"
+
+        except Exception as e:
+            return False, f"Error de conexión: {e}"
+
+    def update_valores_recalculados(self, df_with_recalculated):
+        """
+        Actualizar la columna Valor_Recalculado en Google Sheets
+        Args:
+            df_with_recalculated: DataFrame con columnas COD, Fecha, Valor_Recalculado
+        """
+        try:
+            if not self.connected and not self.connect_to_sheet():
+                return False
+
+            # Verificar que el DataFrame tiene las columnas necesarias
+            if 'Codigo' not in df_with_recalculated.columns or 'Valor_Recalculado' not in df_with_recalculated.columns:
+                return False
+
+            # Obtener headers actuales
+            headers = self._get_headers(self.worksheet)
+
+            # Verificar si existe columna Valor_Recalculado
+            if 'Valor_Recalculado' not in headers:
+                # Agregar columna Valor_Recalculado
+                headers.append('Valor_Recalculado')
+                col_recalc = len(headers)
+                # Actualizar header
+                self._call(self.worksheet.update_cell, 1, col_recalc, 'Valor_Recalculado')
+                self._invalidate_headers(self.worksheet)
+            else:
+                col_recalc = headers.index('Valor_Recalculado') + 1
+
+            # Obtener todos los datos
+            all_data = self._call(self.worksheet.get_all_records)
+
+            # Reunir las celdas a actualizar y escribirlas en una sola petición
+            # (una escritura de cuota en lugar de una por fila)
+            celdas = []
+            for i, row in enumerate(all_data, start=2):
+                try:
+                    codigo = str(row.get('COD', '')).strip()
+                    fecha = row.get('Fecha', '')
+
+                    # Buscar el valor recalculado correspondiente en el DataFrame
+                    matching_rows = df_with_recalculated[
+                        (df_with_recalculated['Codigo'].astype(str).str.strip() == codigo)
+                    ]
+
+                    if not matching_rows.empty:
+                        # Si hay fecha, intentar hacer match más preciso
+                        if fecha and 'Fecha' in df_with_recalculated.columns:
+                            import pandas as pd
+                            fecha_row = pd.to_datetime(fecha, errors='coerce')
+                            matching_with_date = matching_rows[
+                                pd.to_datetime(matching_rows['Fecha'], errors='coerce') == fecha_row
+                            ]
+                            if not matching_with_date.empty:
+                                valor_recalc = matching_with_date.iloc[0]['Valor_Recalculado']
+                            else:
+                                valor_recalc = matching_rows.iloc[0]['Valor_Recalculado']
+                        else:
+                            valor_recalc = matching_rows.iloc[0]['Valor_Recalculado']
+
+                        celdas.append(gspread.Cell(i, col_recalc, float(valor_recalc)))
+                except Exception as e:
+                    # Si falla una fila, continuar con la siguiente
+                    continue
+
+            if celdas:
+                self._call(self.worksheet.update_cells, celdas)
+
+            return True
+
+        except Exception as e:
+            report('error', f"Error al actualizar valores recalculados: {e}")
+            return False
@@ -4,6 +4,7 @@ Sistema de filtros para el Dashboard ICE - VERSIÓN ESTABLE
 
 import streamlit as st
 import pandas as pd
+from data_utils import get_indicator_catalog
 
 class FilterManager:
     """Clase para manejar todos los filtros del dashboard"""
@@ -110,8 +111,14 @@ class EvolutionFilters:
     """Filtros específicos para la pestaña de evolución - VERSIÓN ESTABLE"""
     
     @staticmethod
-    def create_evolution_filters_stable(df):
-        """Crear filtros para la pestaña de evolución SIN causar rerun"""
+    def create_evolution_filters_stable(df, incluir_opciones_grafico=True, catalogo=None):
+        """
+        Crear filtros para la pestaña de evolución SIN causar rerun.
+        Con incluir_opciones_grafico=False las opciones del gráfico no se dibujan
+        aquí (el llamador las crea junto al gráfico con create_chart_options) y se
+        devuelven los últimos valores guardados en session_state. Si el llamador ya
+        tiene el catálogo de la versión del dataset (payload.catalog), se usa ese.
+        """
         st.markdown("### Configuración de Visualización")
 
         col1, col2 = st.columns(2)
@@ -126,44 +133,32 @@ class EvolutionFilters:
                 if 'evolution_selected_indicador' not in st.session_state:
                     st.session_state.evolution_selected_indicador = None
                 
-                # Obtener códigos únicos disponibles
-                if 'COD' in df.columns:
-                    codigos_disponibles = sorted([c for c in df['COD'].dropna().unique() if str(c).strip()])
-                else:
+                # Obtener códigos únicos disponibles desde el catálogo (una fila por COD)
+                if 'COD' not in df.columns:
                     st.error("No se encontró la columna 'COD' en los datos")
                     return {'codigo': None, 'indicador': None, 'mostrar_meta': True, 'tipo_grafico': "Línea"}
-                
-                if not codigos_disponibles:
+
+                if catalogo is None:
+                    catalogo = get_indicator_catalog(df)
+
+                if catalogo.empty:
                     st.warning("No hay códigos de indicadores disponibles")
                     return {'codigo': None, 'indicador': None, 'mostrar_meta': True, 'tipo_grafico': "Línea"}
-                
+
                 # Crear opciones con información adicional
                 opciones_display = []
                 codigo_map = {}
 
-                for codigo in codigos_disponibles:
-                    try:
-                        indicador_info = df[df['COD'] == codigo].iloc[0]
-                        nombre = indicador_info['Indicador'] if 'Indicador' in indicador_info else 'Sin nombre'
-                        componente = indicador_info['Componente'] if 'Componente' in indicador_info else 'Sin componente'
-
-                        # Celdas vacías llegan como NaN (float); usar texto por defecto
-                        if pd.isna(nombre):
-                            nombre = 'Sin nombre'
-                        if pd.isna(componente):
-                            componente = 'Sin componente'
-
+                for codigo, nombre in catalogo['Indicador'].items():
+                    # Celdas vacías llegan como NaN (float); usar texto por defecto
+                    nombre = 'Sin nombre' if pd.isna(nombre) else str(nombre)
 
-                        # Limitar longitud para mejor visualización
-                        nombre_corto = nombre[:50] + "..." if len(nombre) > 50 else nombre
-                        display_text = f"{codigo} - {nombre_corto}"
+                    # Limitar longitud para mejor visualización
+                    nombre_corto = nombre[:50] + "..." if len(nombre) > 50 else nombre
+                    display_text = f"{codigo} - {nombre_corto}"
 
-                        opciones_display.append(display_text)
-                        codigo_map[display_text] = codigo
-                        
-                    except Exception as e:
-                        st.warning(f"Error procesando código {codigo}: {e}")
-                        continue
+                    opciones_display.append(display_text)
+                    codigo_map[display_text] = codigo
                 
                 # ✅ DETERMINAR índice actual basado en session_state
                 index_actual = 0
@@ -190,8 +185,7 @@ class EvolutionFilters:
                 # Obtener nombre del indicador si se seleccionó uno específico
                 if codigo_seleccionado:
                     try:
-                        indicador_data = df[df['COD'] == codigo_seleccionado].iloc[0]
-                        indicador_seleccionado = indicador_data['Indicador']
+                        indicador_seleccionado = catalogo.at[codigo_seleccionado, 'Indicador']
                         st.session_state.evolution_selected_indicador = indicador_seleccionado
                         
                     except Exception as e:
@@ -209,40 +203,22 @@ class EvolutionFilters:
                 return {'codigo': None, 'indicador': None, 'mostrar_meta': True, 'tipo_grafico': "Línea"}
         
         with col2:
-            st.markdown("**Opciones de Visualización**")
-            
-            # ✅ INICIALIZAR estado para opciones de visualización
-            if 'evolution_mostrar_meta' not in st.session_state:
-                st.session_state.evolution_mostrar_meta = True
-            if 'evolution_tipo_grafico' not in st.session_state:
-                st.session_state.evolution_tipo_grafico = "Línea"
-            
-            # Opción para mostrar línea de meta con KEY ÚNICO
-            mostrar_meta = st.checkbox(
-                "📏 Mostrar línea de referencia (Meta = 1.0)", 
-                value=st.session_state.evolution_mostrar_meta,
-                key="evolution_mostrar_meta_stable",
-                help="Muestra una línea horizontal en 100% como referencia"
-            )
-            st.session_state.evolution_mostrar_meta = mostrar_meta
-            
-            # Seleccionar tipo de gráfico con KEY ÚNICO
-            tipo_grafico = st.radio(
-                "📊 Tipo de gráfico:",
-                options=["Línea", "Barras"],
-                index=0 if st.session_state.evolution_tipo_grafico == "Línea" else 1,
-                horizontal=True,
-                key="evolution_tipo_grafico_stable",
-                help="Línea: mejor para ver tendencias / Barras: mejor para comparar valores puntuales"
-            )
-            st.session_state.evolution_tipo_grafico = tipo_grafico
+            if incluir_opciones_grafico:
+                opciones = EvolutionFilters.create_chart_options()
+            else:
+                opciones = {
+                    'mostrar_meta': st.session_state.get('evolution_mostrar_meta', True),
+                    'tipo_grafico': st.session_state.get('evolution_tipo_grafico', "Línea")
+                }
+            mostrar_meta = opciones['mostrar_meta']
+            tipo_grafico = opciones['tipo_grafico']
             
             # Mostrar estadísticas si hay un indicador seleccionado
             if codigo_seleccionado:
                 datos_indicador = df[df['COD'] == codigo_seleccionado]
                 if not datos_indicador.empty:
                     st.markdown("**📊 Estadísticas:**")
-                    st.write(f"• **Registros:** {len(datos_indicador)}")
+                    st.write(f"• **Registros:** {catalogo.at[codigo_seleccionado, 'Registros']}")
                     st.write(f"• **Rango:** {datos_indicador['Valor'].min():.3f} - {datos_indicador['Valor'].max():.3f}")
                     st.write(f"• **Promedio:** {datos_indicador['Valor'].mean():.3f}")
         
@@ -253,6 +229,48 @@ class EvolutionFilters:
             'tipo_grafico': tipo_grafico
         }
     
+    @staticmethod
+    def create_chart_options():
+        """Crear las opciones de visualización del gráfico de evolución (línea de meta y tipo de gráfico)"""
+        st.markdown("**Opciones de Visualización**")
+        
+        # ✅ INICIALIZAR estado para opciones de visualización
+        if 'evolution_mostrar_meta' not in st.session_state:
+            st.session_state.evolution_mostrar_meta = True
+        if 'evolution_tipo_grafico' not in st.session_state:
+            st.session_state.evolution_tipo_grafico = "Línea"
+        
+        # Opción para mostrar línea de meta con KEY ÚNICO
+        mostrar_meta = st.checkbox(
+            "📏 Mostrar línea de referencia (Meta = 1.0)", 
+            value=st.session_state.evolution_mostrar_meta,
+            key="evolution_mostrar_meta_stable",
+            help="Muestra una línea horizontal en 100% como referencia"
+        )
+        st.session_state.evolution_mostrar_meta = mostrar_meta
+        
+        # Seleccionar tipo de gráfico con KEY ÚNICO
+        tipo_grafico = st.radio(
+            "📊 Tipo de gráfico:",
+            options=["Línea", "Barras"],
+            index=0 if st.session_state.evolution_tipo_grafico == "Línea" else 1,
+            horizontal=True,
+            key="evolution_tipo_grafico_stable",
+            help="Línea: mejor para ver tendencias / Barras: mejor para comparar valores puntuales"
+        )
+        st.session_state.evolution_tipo_grafico = tipo_grafico
+
+        # Tendencia proyectada (precalculada para todos los indicadores por versión del dataset)
+        tendencia = st.radio(
+            "📈 Proyección de tendencia:",
+            options=["Sin proyección", "Lineal", "Robusta"],
+            horizontal=True,
+            key="evolution_tendencia",
+            help="Lineal: mínimos cuadrados / Robusta: resta peso a los datos atípicos"
+        )
+        
+        return {'mostrar_meta': mostrar_meta, 'tipo_grafico': tipo_grafico, 'tendencia': tendencia}
+    
     @staticmethod
     def create_evolution_filters(df):
         """Método de compatibilidad - redirige a la versión estable"""
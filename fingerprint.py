@@ -0,0 +1,42 @@
+"""
+Huella de contenido (fingerprint) de los datos del Dashboard ICE
+Clave estable para los cachés: no depende del proceso ni del momento de la carga,
+solo del contenido de la tabla
+"""
+
+import hashlib
+import inspect
+import pandas as pd
+
+def content_fingerprint(df):
+    """
+    Huella estable del contenido de un DataFrame (valores, índice y nombres de
+    columnas) calculada con pd.util.hash_pandas_object. None si no hay datos
+    """
+    if df is None:
+        return None
+
+    digest = hashlib.sha256()
+    digest.update("\x1f".join(map(str, df.columns)).encode("utf-8"))
+    if not df.empty:
+        digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()[:20]
+
+def combine_fingerprints(*huellas):
+    """Huella compuesta a partir de varias huellas (p. ej. IndicadoresICE + Fichas)"""
+    return "-".join(str(h) if h is not None else "0" for h in huellas)
+
+def code_fingerprint(*objetos):
+    """
+    Huella del código fuente de las clases o funciones que producen un resultado
+    cacheado: los cachés persistidos en disco se invalidan cuando cambia la lógica,
+    no solo cuando cambian los datos
+    """
+    digest = hashlib.sha256()
+    for objeto in objetos:
+        try:
+            fuente = inspect.getsource(objeto)
+        except (OSError, TypeError):
+            fuente = getattr(objeto, '__qualname__', repr(objeto))
+        digest.update(fuente.encode("utf-8"))
+    return digest.hexdigest()[:12]
@@ -9,9 +9,12 @@ import os
 import time
 from config import (
     configure_page, create_banner, apply_dark_theme, validate_google_sheets_config,
-    show_setup_instructions
+    show_setup_instructions, ARTIFACTS_CONFIG, DATA_REFRESH_CONFIG
 )
-from data_utils import DataLoader, SheetsDataLoader
+from data_refresh import get_background_refresher, load_shared_snapshot
+from data_utils import get_entity_view
+from engine import entity_names
+from streamlit_adapter import render_messages
 from tabs import TabManager
 from datetime import datetime, timezone, timedelta
 
@@ -35,6 +38,8 @@ def main():
         st.session_state.last_load_time = 0
     if 'data_timestamp' not in st.session_state:
         st.session_state.data_timestamp = 0
+    if 'refresh_data_timestamp' not in st.session_state:
+        st.session_state.refresh_data_timestamp = st.session_state.data_timestamp
     
     # Verificar configuración de Google Sheets
     config_valid, config_message = validate_google_sheets_config()
@@ -73,7 +78,10 @@ def main():
     # CARGA DE DATOS ACTUALIZADA
     try:
         # Cargar datos con información de estado
-        df, source_info, fichas_data = load_data_with_status_sheets()
+        if DATA_REFRESH_CONFIG['enabled']:
+            df, source_info, fichas_data, fingerprint = load_data_with_background_refresh()
+        else:
+            df, source_info, fichas_data, fingerprint = load_data_with_status_sheets()
         
         # Verificar si la carga fue exitosa
         if df is None:
@@ -88,8 +96,17 @@ def main():
         # ✅ SIN FILTROS - Solo pasar datos directamente
         # Las pestañas siempre usarán los valores más recientes
         
+        # Con varias entidades, las pestañas muestran la seleccionada y el Resumen
+        # General las compara a partir del dataset completo
+        df_entidades, huella_entidades = df, (fingerprint or {}).get('derivados')
+        entidades = entity_names(df)
+        if len(entidades) > 1:
+            entidad = st.sidebar.selectbox("🏛️ Entidad", entidades, key="entidad_seleccionada")
+            df, fichas_data, fingerprint = get_entity_view(df, fichas_data, fingerprint, entidad)
+
         # Renderizar pestañas CON FICHAS DESDE SHEETS
-        tab_manager = TabManager(df, None, fichas_data)
+        tab_manager = TabManager(df, None, fichas_data, source_info, fingerprint,
+                                 df_entidades, huella_entidades)
         tab_manager.render_tabs(df, {})  # Pasar diccionario vacío como filtros
         
         # INFORMACIÓN DE ESTADO AL FINAL
@@ -97,7 +114,7 @@ def main():
         
         # Información del sistema en expander
         with st.expander("Información del Sistema", expanded=False):
-            show_system_info_complete_sheets(df, source_info, fichas_data)
+            show_system_info_complete_sheets(df, source_info, fichas_data, fingerprint)
         
     except Exception as e:
         st.error(f"❌ Error crítico en la aplicación: {e}")
@@ -122,22 +139,59 @@ def main():
                 st.session_state.data_timestamp = time.time()
                 st.rerun()
 
+def load_data_with_background_refresh():
+    """
+    Obtener la última versión publicada por el refrescador en segundo plano.
+    Solo se espera (con spinner) en la primera carga del proceso o cuando el
+    usuario pidió actualizar los datos (data_timestamp cambió, p. ej. tras editar)
+    """
+    try:
+        refresher = get_background_refresher()
+        snapshot = refresher.current()
+        if snapshot is None and ARTIFACTS_CONFIG['boot_from_artifacts']:
+            # Arranque desde artefactos precalculados; Sheets se lee en segundo plano
+            snapshot = refresher.boot_from_artifacts()
+        actualizacion_solicitada = st.session_state.data_timestamp != st.session_state.refresh_data_timestamp
+
+        if snapshot is None or actualizacion_solicitada:
+            try:
+                with st.spinner("🔄 Conectando con Google Sheets y combinando datos..."):
+                    snapshot = refresher.refresh_now()
+                render_messages(snapshot.messages)
+            except Exception as e:
+                if snapshot is None:
+                    raise
+                # La versión publicada se conserva; se muestra en lugar de una vacía
+                st.warning(f"⚠️ No se pudieron actualizar los datos ({e}); se muestra la última versión cargada")
+            st.session_state.refresh_data_timestamp = st.session_state.data_timestamp
+
+        if snapshot.df.empty:
+            st.info("📋 Google Sheets está vacío o no se pudo conectar")
+
+        if snapshot.fichas_data is None:
+            st.warning("⚠️ No se pudieron cargar las fichas metodológicas desde Google Sheets")
+            st.info("💡 Verifica que existe la pestaña 'Fichas' en tu Google Sheets")
+        elif snapshot.fichas_data.empty:
+            st.info("📋 La pestaña 'Fichas' está vacía")
+
+        return snapshot.df, snapshot.source_info, snapshot.fichas_data, snapshot.fingerprint
+
+    except Exception as e:
+        st.warning(f"⚠️ Refresco en segundo plano no disponible ({e}); cargando directamente")
+        return load_data_with_status_sheets()
+
 def load_data_with_status_sheets():
     """ACTUALIZADO: Cargar datos combinados desde Google Sheets"""
     try:
-        # Mostrar estado de carga
+        # Cargar datos combinados y fichas desde Google Sheets; si otra sesión ya
+        # está cargando el mismo dataset, se espera y se comparte su resultado
         with st.spinner("🔄 Conectando con Google Sheets y combinando datos..."):
-            # Cargar datos combinados desde Google Sheets
-            data_loader = DataLoader()
-            df_loaded = data_loader.load_combined_data()
-
-        # NUEVO: Cargar fichas desde Google Sheets (para la pestaña de fichas)
-        with st.spinner("📋 Cargando fichas metodológicas desde Google Sheets..."):
-            fichas_loader = SheetsDataLoader()
-            fichas_data = fichas_loader.load_fichas_data()
+            snapshot = load_shared_snapshot()
+        render_messages(snapshot.messages)
 
-        # Obtener información de la fuente
-        source_info = data_loader.get_data_source_info()
+        df_loaded = snapshot.df
+        fichas_data = snapshot.fichas_data
+        source_info = snapshot.source_info
 
         # Mostrar resultados de carga solo si hay problemas
         if df_loaded is None or df_loaded.empty:
@@ -152,7 +206,7 @@ def load_data_with_status_sheets():
             # Solo mostrar éxito si hay datos
             pass
         
-        return df_loaded, source_info, fichas_data
+        return df_loaded, source_info, fichas_data, snapshot.fingerprint
         
     except Exception as e:
         st.error(f"❌ Error al cargar datos: {e}")
@@ -161,7 +215,7 @@ def load_data_with_status_sheets():
             'COMPONENTE PROPUESTO', 'CATEGORÍA',
             'COD', 'Indicador', 'Valor', 'Fecha', 'Meta', 'Peso', 'Tipo', 'Valor_Normalizado'
         ])
-        return empty_df, {'source': 'Google Sheets (Error)', 'connection_info': {'connected': False}}, None
+        return empty_df, {'source': 'Google Sheets (Error)', 'connection_info': {'connected': False}}, None, {}
 
 def get_last_update_date(df):
     """Obtener la fecha de la última actualización (el indicador más recientemente actualizado)"""
@@ -263,7 +317,28 @@ def verify_data_structure_complete(df):
     
     return True
 
-def show_system_info_complete_sheets(df, source_info, fichas_data):
+@st.fragment(run_every=5)
+def show_sheets_traffic():
+    """Contadores en vivo del gobernador de cuota de Google Sheets (se actualizan cada 5 s)"""
+    try:
+        from google_sheets_manager import get_request_governor
+        trafico = get_request_governor().stats()
+    except Exception:
+        return
+
+    st.info(
+        f"**Peticiones a Sheets:** {trafico['lectura']} lecturas · {trafico['escritura']} escrituras "
+        f"({trafico['en_segundo_plano']} en segundo plano)"
+    )
+    st.caption(
+        f"Cuota disponible: {trafico['disponibles_lectura']} lecturas / {trafico['disponibles_escritura']} escrituras · "
+        f"Esperas: {trafico['esperas']} ({trafico['segundos_espera']:.1f}s) · "
+        f"429: {trafico['limite_429']} · Rechazadas: {trafico['rechazadas']}"
+    )
+    if trafico['en_pausa'] > 0:
+        st.warning(f"⏳ Tráfico en pausa {trafico['en_pausa']:.0f}s por límite de cuota")
+
+def show_system_info_complete_sheets(df, source_info, fichas_data, fingerprint=None):
     """ACTUALIZADO: Mostrar información completa del sistema con fichas de Sheets"""
     
     # Información de datos principales
@@ -337,6 +412,25 @@ def show_system_info_complete_sheets(df, source_info, fichas_data):
         
         # Información de cache
         st.info(f"**Cache timestamp:** {get_colombia_time().strftime('%d/%m/%Y %H:%M:%S COT')}")
+        if fingerprint:
+            huellas = ' · '.join(f"{nombre}: `{(fingerprint.get(nombre) or '-')[:10]}`"
+                                 for nombre in ('indicadores', 'fichas', 'derivados'))
+            st.caption(f"Huellas de contenido — {huellas}")
+
+        # Estado del refresco en segundo plano
+        if DATA_REFRESH_CONFIG['enabled']:
+            estado = get_background_refresher().status()
+            if estado['cargado_en']:
+                cargado = datetime.fromtimestamp(estado['cargado_en'], COLOMBIA_TZ).strftime('%d/%m/%Y %H:%M:%S COT')
+                st.info(f"**Datos (versión {estado['version']}):** cargados {cargado}")
+            st.info(f"**Cargas desde Sheets:** {estado['cargas']} · compartidas: {estado['esperas_compartidas']}")
+            if estado['ultimo_error']:
+                st.warning(f"**Último refresco fallido:** {estado['ultimo_error']}")
+            verificacion = estado['ultima_verificacion']
+            if verificacion and verificacion['coincide'] is False:
+                st.warning(f"**Última edición no coincidió con Google Sheets** ({', '.join(verificacion['codigos'])}); se usó la versión de Sheets")
+
+        show_sheets_traffic()
     
     # Controles de gestión
     st.markdown("#### ⚙️ Controles de Sistema")
@@ -349,6 +443,7 @@ def show_system_info_complete_sheets(df, source_info, fichas_data):
                     width='stretch'):
             current_tab = st.session_state.get('active_tab_index', 0)
             st.session_state.last_load_time = time.time()
+            st.session_state.data_timestamp = time.time()
             st.session_state.active_tab_index = current_tab
             st.rerun()
     
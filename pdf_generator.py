@@ -12,6 +12,9 @@ import os
 from io import BytesIO
 from datetime import datetime
 import pytz
+from config import ARTIFACTS_CONFIG
+from engine.artifacts import read_ficha_pdf
+from fingerprint import content_fingerprint, code_fingerprint
 
 def get_colombia_time():
     """Obtener fecha y hora actual de Colombia"""
@@ -432,3 +435,29 @@ class PDFGenerator:
         generator = PDFGenerator()
         codigo = ficha_row.get('COD', 'UNKNOWN')
         return generator.generate_metodological_sheet(codigo, fichas_df_temp)
+
+_PDF_VERSION = code_fingerprint(PDFGenerator, PDF_FONT)
+
+@st.cache_data(persist="disk", show_spinner=False, max_entries=128)
+def _cached_metodological_sheet(codigo, huella_fichas, version, _fichas_data):
+    # Primero el PDF precalculado por precompute.py para estas mismas fichas, si existe
+    pdf_bytes = read_ficha_pdf(ARTIFACTS_CONFIG['directory'], huella_fichas, codigo)
+    if pdf_bytes is not None:
+        return pdf_bytes
+    return PDFGenerator().generate_metodological_sheet(codigo, _fichas_data)
+
+def get_metodological_sheet_pdf(codigo, fichas_data, huella_fichas=None):
+    """
+    PDF de la ficha metodológica de un COD memoizado por (código, huella de la
+    pestaña Fichas): mientras las fichas no cambien se entrega el mismo documento
+    (con su fecha de generación original), también desde el caché en disco
+    """
+    if not PDF_AVAILABLE:
+        raise ImportError("reportlab no está disponible. Instala con: pip install reportlab")
+
+    if fichas_data is None or fichas_data.empty:
+        return PDFGenerator().generate_metodological_sheet(codigo, fichas_data)
+
+    if huella_fichas is None:
+        huella_fichas = content_fingerprint(fichas_data)
+    return _cached_metodological_sheet(codigo, huella_fichas, _PDF_VERSION, fichas_data)
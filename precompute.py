@@ -0,0 +1,161 @@
+"""
+Precálculo de artefactos del Dashboard ICE
+Carga IndicadoresICE + Fichas de cada entidad del registro (en paralelo) una sola vez
+desde Google Sheets, ejecuta el pipeline completo y escribe en el directorio de artefactos el dataset procesado, los derivados
+(últimos valores, cubo de puntajes, serie histórica, catálogo) y el PDF de cada ficha,
+con un manifiesto por huella del dataset. Pensado para jobs programados (p. ej. nocturnos):
+
+    python precompute.py
+    python precompute.py --output artifacts --secrets .streamlit/secrets.toml --force
+"""
+
+import argparse
+import os
+import sys
+import time
+import tomllib
+from config import ARTIFACTS_CONFIG
+from engine import DatasetPipeline, ENTITY_COLUMN, build_entity_registry, filter_entity, load_entities_dataset
+from engine.artifacts import (
+    build_derived, is_complete, load_artifacts, read_ficha_pdf, read_manifest, set_current, write_artifacts
+)
+from engine.sheets import GoogleSheetsManager
+from fingerprint import content_fingerprint
+
+def load_settings(secrets_path):
+    """
+    Registro de entidades del archivo de secretos del tablero: [google_sheets] y
+    [entidades.<NOMBRE>] ({entidad: settings}, la principal primero)
+    """
+    print(f"🔐 Leyendo configuración: {secrets_path}")
+    try:
+        with open(secrets_path, 'rb') as archivo:
+            secretos = tomllib.load(archivo)
+    except (OSError, tomllib.TOMLDecodeError) as e:
+        print(f"❌ No se pudo leer el archivo de secretos: {e}")
+        return None
+
+    if not secretos.get('google_sheets'):
+        print("❌ Falta la sección [google_sheets] en el archivo de secretos")
+        return None
+    registro = build_entity_registry(secretos)
+    print(f"🏛️ Entidades: {', '.join(registro)}")
+    return registro
+
+def processed_entity(directorio, huella):
+    """Dataset ya procesado de una entidad con esa huella en algún conjunto escrito, o None"""
+    for entrada in read_manifest(directorio)['conjuntos'].values():
+        # Conjunto de una sola entidad: su dataset es el de la entidad, sin columna 'Entidad'
+        huellas = entrada['fingerprint'].get('entidades') or {None: entrada['fingerprint'].get('dataset')}
+        for entidad, huella_entidad in huellas.items():
+            if huella_entidad == huella and is_complete(directorio, entrada['huella']):
+                df = load_artifacts(directorio, entrada['huella'])['df']
+                return df if entidad is None else filter_entity(df, entidad).drop(columns=ENTITY_COLUMN)
+    return None
+
+def generate_pdfs(directorio, fichas_data, huella_fichas):
+    """PDF de cada ficha; se reutilizan los ya generados para la misma huella de Fichas"""
+    if fichas_data is None or fichas_data.empty or 'COD' not in fichas_data.columns:
+        print("📭 Sin fichas metodológicas: no se generan PDF")
+        return {}
+
+    from pdf_generator import PDFGenerator
+    generador = PDFGenerator()
+    if not generador.is_available():
+        print("⚠️ reportlab no está instalado: no se generan PDF")
+        return {}
+
+    pdfs, reutilizados = {}, 0
+    for codigo in fichas_data['COD'].dropna().astype(str).unique():
+        contenido = read_ficha_pdf(directorio, huella_fichas, codigo)
+        if contenido is not None:
+            reutilizados += 1
+        else:
+            contenido = generador.generate_metodological_sheet(codigo, fichas_data)
+        if contenido:
+            pdfs[codigo] = contenido
+        else:
+            print(f"   - ⚠️ No se pudo generar la ficha {codigo}")
+
+    print(f"📄 Fichas PDF: {len(pdfs)} ({reutilizados} reutilizadas)")
+    return pdfs
+
+def precompute(directorio, registro, force=False, with_pdfs=True, conservar=3):
+    """
+    Ejecutar el precálculo completo para el registro de entidades ({entidad: settings}).
+    Devuelve el código de salida del proceso
+    """
+    pipeline = DatasetPipeline()
+    sin_cambios = []
+
+    def procesar(huella, df, fichas_data):
+        # Entidad con los mismos datos que un conjunto ya escrito: se reutiliza su procesamiento
+        if not force:
+            previo = processed_entity(directorio, huella)
+            if previo is not None:
+                sin_cambios.append(huella)
+                return previo
+        return pipeline.process_combined(df, fichas_data)
+
+    print("📥 Cargando IndicadoresICE y Fichas desde Google Sheets...")
+    inicio = time.time()
+    clientes = {entidad: GoogleSheetsManager(settings) for entidad, settings in registro.items()}
+    resultado = load_entities_dataset(clientes, pipeline, procesar)
+    for mensaje in resultado.messages:
+        print(f"   {mensaje.texto}")
+
+    if not resultado.ok or resultado.df.empty:
+        print("❌ No hay datos para precalcular")
+        return 1
+
+    df, fichas_data = resultado.df, resultado.fichas_data
+    fingerprint = dict(resultado.fingerprint, derivados=content_fingerprint(df))
+    huella = fingerprint['dataset']
+    print(f"✅ {len(df)} registros, {df['COD'].nunique()} indicadores ({time.time() - inicio:.1f} s) · huella {huella}")
+
+    entrada = read_manifest(directorio)['conjuntos'].get(huella)
+    todas_sin_cambios = len(sin_cambios) == len(registro)
+    if todas_sin_cambios and entrada and entrada['fecha'] == time.strftime('%Y-%m-%d') and (entrada['pdfs'] or not with_pdfs):
+        set_current(directorio, huella)
+        print("✅ Sin cambios desde el último precálculo: los artefactos siguen vigentes")
+        return 0
+
+    print("🧮 Calculando derivados (últimos valores, cubo de puntajes, serie histórica, catálogo)...")
+    derivados = build_derived(df)
+
+    pdfs = generate_pdfs(directorio, fichas_data, fingerprint.get('fichas')) if with_pdfs else {}
+
+    entrada = write_artifacts(directorio, huella, df, fichas_data, derivados, pdfs, fingerprint, conservar)
+    print(f"💾 Artefactos escritos en {os.path.join(directorio, huella)} ({len(entrada['archivos'])} tablas, {len(pdfs)} PDF)")
+    return 0
+
+def main(argv=None):
+    """Punto de entrada de línea de comandos"""
+    parser = argparse.ArgumentParser(description="Precalcular los artefactos del Dashboard ICE")
+    parser.add_argument('--output', default=ARTIFACTS_CONFIG['directory'],
+                        help="Directorio de artefactos (por defecto: %(default)s)")
+    parser.add_argument('--secrets', default=os.path.join('.streamlit', 'secrets.toml'),
+                        help="Archivo de secretos con la sección [google_sheets] (por defecto: %(default)s)")
+    parser.add_argument('--force', action='store_true',
+                        help="Recalcular aunque los datos no hayan cambiado")
+    parser.add_argument('--sin-pdf', action='store_true', help="No generar los PDF de las fichas")
+    parser.add_argument('--conservar', type=int, default=3,
+                        help="Conjuntos de artefactos a conservar (por defecto: %(default)s)")
+    args = parser.parse_args(argv)
+
+    print("🚀 Precálculo de artefactos del Dashboard ICE")
+    print("=" * 50)
+
+    registro = load_settings(args.secrets)
+    if not registro:
+        return 1
+
+    codigo = precompute(args.output, registro, force=args.force, with_pdfs=not args.sin_pdf,
+                        conservar=args.conservar)
+
+    print("=" * 50)
+    print("🏁 Precálculo completado" if codigo == 0 else "🏁 Precálculo con errores")
+    return codigo
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+"""
+Adaptador de Streamlit para el motor de cálculo (engine)
+Muestra como widgets los mensajes que reporta el motor y le entrega la
+configuración de Google Sheets desde st.secrets. Es la única pieza del pipeline
+de datos que conoce Streamlit
+"""
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from engine.entities import build_entity_registry
+from engine.messages import set_receiver
+
+def render_message(mensaje):
+    """
+    Mostrar un mensaje del motor con el widget de su nivel (st.error, st.warning,
+    st.info, st.success). Fuera del hilo de una sesión (refresco en segundo plano,
+    procesos de trabajo) no se dibuja nada: el mensaje queda solo en el log
+    """
+    if get_script_run_ctx() is None:
+        return
+    getattr(st, mensaje.nivel)(mensaje.texto)
+
+def render_messages(mensajes):
+    for mensaje in mensajes:
+        render_message(mensaje)
+
+def sheets_settings():
+    """Sección 'google_sheets' de secrets.toml, o None si no está configurada"""
+    try:
+        if "google_sheets" not in st.secrets:
+            return None
+        return dict(st.secrets["google_sheets"])
+    except Exception:
+        return None
+
+def entity_settings():
+    """
+    Registro {entidad: settings} de secrets.toml: la entidad principal
+    ([google_sheets]) y las de [entidades.<NOMBRE>]. Vacío si no hay configuración
+    """
+    try:
+        return build_entity_registry(st.secrets)
+    except Exception:
+        return {}
+
+# Los mensajes reportados desde una sesión sin colector activo se muestran en ella
+set_receiver(render_message)
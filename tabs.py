@@ -8,10 +8,13 @@ import pandas as pd
 import time
 import os
 import plotly.express as px
-from charts import ChartGenerator, MetricsDisplay
-from data_utils import DataProcessor, DataEditor
+from charts import ChartGenerator, MetricsDisplay, cached_figure
+from data_utils import DataProcessor, DataEditor, get_dataset_artifacts, clear_dataset_artifacts
+from data_refresh import apply_local_write, current_alerts
+from engine import AnomalyDetector, CorrelationEngine, ScenarioEngine, entity_names
+from engine.scenarios import CALCULO_FIJO, CALCULOS
 from filters import EvolutionFilters
-from config import ICE_QUE_ES, ICE_COMO_SE_MIDE, ICE_COMPONENTS_INFO
+from config import CORRELATION_CONFIG, FORECAST_CONFIG, ICE_QUE_ES, ICE_COMO_SE_MIDE, ICE_COMPONENTS_INFO, PERIOD_MATRIX_CONFIG
 from datetime import datetime
 
 # Importar el sistema de autenticación
@@ -34,9 +37,14 @@ except ImportError:
 class IceInfoTab:
     """Pestaña informativa: qué es la ICE, sus componentes/categorías e indicadores medidos"""
 
+    DEPENDENCIAS = ('catalog',)
+
     @staticmethod
-    def render(df):
+    def render(df, payload=None):
         """Renderizar la pestaña informativa de la ICE"""
+        if payload is None:
+            payload = get_dataset_artifacts(df).payload(IceInfoTab.DEPENDENCIAS)
+
         st.header("¿Qué es la ICE?")
 
         st.markdown(ICE_QUE_ES)
@@ -55,24 +63,24 @@ class IceInfoTab:
 
         st.markdown("---")
         st.subheader("Indicadores medidos por componente y categoría")
-        IceInfoTab._render_indicator_breakdown(df)
+        IceInfoTab._render_indicator_breakdown(payload.catalog)
 
         st.markdown("---")
         IceInfoTab._render_pdf_download()
 
     @staticmethod
-    def _render_indicator_breakdown(df):
+    def _render_indicator_breakdown(catalogo):
         """Treemap interactivo del número de indicadores por componente/categoría"""
         try:
-            if df.empty or not all(c in df.columns for c in ['COD', 'Componente', 'Categoria']):
+            if catalogo.empty:
                 st.info("Aún no hay datos suficientes para construir esta visualización.")
                 return
 
-            df_cod = df.dropna(subset=['COD'])
+            # El catálogo ya tiene una fila por COD: contar filas equivale a contar códigos únicos
             conteo = (
-                df_cod.dropna(subset=['Componente', 'Categoria'])
-                .groupby(['Componente', 'Categoria'])['COD']
-                .nunique()
+                catalogo.dropna(subset=['Componente', 'Categoria'])
+                .groupby(['Componente', 'Categoria'])
+                .size()
                 .reset_index()
             )
             conteo.columns = ['Componente', 'Categoría', 'N° de indicadores']
@@ -107,7 +115,7 @@ class IceInfoTab:
             )
             st.plotly_chart(fig, width='stretch')
             st.caption(
-                f"Total de indicadores únicos medidos: **{df_cod['COD'].nunique()}** · "
+                f"Total de indicadores únicos medidos: **{len(catalogo)}** · "
                 "Haz clic en un componente para explorar sus categorías."
             )
 
@@ -146,12 +154,20 @@ class IceInfoTab:
 
 class GeneralSummaryTab:
     """Pestaña de resumen general"""
+
+    DEPENDENCIAS = ('latest', 'score_cube', 'historical', 'historical_bands', 'scenario_base', 'contributions')
     
     @staticmethod
-    def render(df, fecha_seleccionada=None):
-        """Renderizar la pestaña de resumen general"""
+    def render(df, fecha_seleccionada=None, payload=None, comparacion=None):
+        """
+        Renderizar la pestaña de resumen general. comparacion (derivado 'entity_cube'
+        del dataset con todas las entidades) agrega la comparación entre entidades
+        """
         st.header("Resumen General")
 
+        if payload is None:
+            payload = get_dataset_artifacts(df).payload(GeneralSummaryTab.DEPENDENCIAS)
+
         try:
             if df.empty:
                 st.info("Google Sheets está vacío. Puedes agregar datos en la pestaña 'Gestión de Datos'")
@@ -181,17 +197,21 @@ class GeneralSummaryTab:
             # Obtener fecha de última actualización
             ultima_actualizacion = GeneralSummaryTab._get_last_update_info(df)
             
-            # Calcular puntajes
-            puntajes_componente, puntajes_categoria, puntaje_general = DataProcessor.calculate_scores(df)
+            # Puntajes sobre los valores más recientes (cubo de puntajes compartido)
+            puntajes_componente, puntajes_categoria, puntaje_general = DataProcessor.scores_from_cube(payload.score_cube)
             
             if puntajes_componente.empty and puntaje_general == 0:
                 st.info("Agregando más datos podrás ver los puntajes y análisis")
                 return
             
             st.info("**Puntajes calculados usando valores más recientes**")
+
+            # Las figuras se reutilizan mientras no cambie la huella del dataset
+            huella = payload.huella
             
             # Mostrar métricas generales
             MetricsDisplay.show_general_metrics(puntaje_general, puntajes_componente, ultima_actualizacion)
+            GeneralSummaryTab._render_contributions(payload)
             
             # Layout con velocímetro y radar
             col1, col2 = st.columns([1, 2])
@@ -199,7 +219,7 @@ class GeneralSummaryTab:
             with col1:
                 try:
                     st.plotly_chart(
-                        ChartGenerator.gauge_chart(puntaje_general), 
+                        cached_figure('gauge', huella, lambda: ChartGenerator.gauge_chart(puntaje_general)),
                         width='stretch'
                     )
                 except Exception as e:
@@ -208,7 +228,7 @@ class GeneralSummaryTab:
             with col2:
                 try:
                     st.plotly_chart(
-                        ChartGenerator.radar_chart(df, None),
+                        cached_figure('radar', huella, lambda: ChartGenerator.radar_chart(df, None)),
                         width='stretch'
                     )
                 except Exception as e:
@@ -217,9 +237,21 @@ class GeneralSummaryTab:
             # Evolución histórica del ICE (semestral, con el último valor de cada
             # indicador disponible en o antes de cada fecha de corte)
             st.subheader("Evolución Histórica del ICE")
+            mostrar_bandas = st.toggle(
+                "Mostrar bandas de incertidumbre (Monte Carlo)",
+                key="ice_bandas",
+                help="Simula los indicadores sin dato en cada corte con valores de su propio histórico "
+                     "y muestra el rango en que cae el puntaje general"
+            )
             try:
-                df_ice_historico = DataProcessor.calculate_ice_historical_series(df)
-                fig_ice_hist = ChartGenerator.ice_historical_evolution_chart(df_ice_historico)
+                # Las bandas solo se calculan (o leen del caché) si se piden
+                fig_ice_hist = cached_figure(
+                    'ice_historico', huella,
+                    lambda: ChartGenerator.ice_historical_evolution_chart(
+                        payload.historical, payload.historical_bands if mostrar_bandas else None
+                    ),
+                    pd.Timestamp.now().strftime('%Y-%m-%d'), mostrar_bandas
+                )
                 st.plotly_chart(fig_ice_hist, width='stretch')
             except Exception as e:
                 st.error(f"Error en evolución histórica del ICE: {e}")
@@ -228,16 +260,23 @@ class GeneralSummaryTab:
             st.subheader("Puntajes por Componente")
             if not puntajes_componente.empty:
                 try:
-                    fig_comp = ChartGenerator.component_bar_chart(puntajes_componente)
+                    fig_comp = cached_figure('componentes', huella,
+                                             lambda: ChartGenerator.component_bar_chart(puntajes_componente))
                     st.plotly_chart(fig_comp, width='stretch')
                 except Exception as e:
                     st.error(f"Error en gráfico: {e}")
                     st.dataframe(puntajes_componente, width='stretch')
+
+            GeneralSummaryTab._render_what_if(payload)
+            GeneralSummaryTab._render_planning(payload)
+
+            if comparacion is not None:
+                GeneralSummaryTab._render_entity_comparison(comparacion)
             
             # Tabla de datos recientes
             with st.expander("Ver datos más recientes por indicador"):
                 try:
-                    df_latest = DataProcessor._get_latest_values_by_indicator(df)
+                    df_latest = payload.latest
                     if not df_latest.empty:
                         columns_to_show = ['COD', 'Indicador', 'Componente', 'Categoria', 'Valor', 'Tipo', 'Valor_Normalizado', 'Fecha']
                         available_columns = [col for col in columns_to_show if col in df_latest.columns]
@@ -248,6 +287,186 @@ class GeneralSummaryTab:
         except Exception as e:
             st.error(f"Error en resumen general: {e}")
     
+    @staticmethod
+    def _render_contributions(payload):
+        """Ranking de indicadores por lo que aportan al ICE y lo que sumarían al alcanzar su Meta"""
+        with st.expander("🎯 Aporte de cada indicador y ganancia por alcanzar la Meta", expanded=False):
+            try:
+                aportes = payload.contributions
+                if aportes.empty:
+                    st.info("No hay indicadores con valores normalizados")
+                    return
+
+                top = aportes.iloc[0]
+                st.caption(
+                    f"Mayor oportunidad: **{top['COD']}** ({top['Indicador']}) sumaría "
+                    f"**{top['Ganancia_Meta_General'] * 100:+.2f} pp** al ICE al alcanzar su meta. "
+                    "Haz clic en una columna para ordenar"
+                )
+                tabla = aportes[['COD', 'Indicador', 'Componente', 'Valor_Normalizado', 'Peso',
+                                 'Aporte_General', 'Participacion_General', 'Ganancia_Meta_General',
+                                 'Ganancia_Meta_Componente', 'Tiene_Meta']].copy()
+                puntos = ['Aporte_General', 'Ganancia_Meta_General', 'Ganancia_Meta_Componente']
+                tabla[puntos] = tabla[puntos] * 100
+                st.dataframe(
+                    tabla,
+                    width='stretch',
+                    hide_index=True,
+                    height=min(420, 45 + 35 * len(tabla)),
+                    column_config={
+                        "Valor_Normalizado": st.column_config.NumberColumn("Normalizado", format="percent"),
+                        "Aporte_General": st.column_config.NumberColumn("Aporte al ICE (pp)", format="%.2f"),
+                        "Participacion_General": st.column_config.ProgressColumn(
+                            "Participación en el ICE", min_value=0.0,
+                            max_value=float(max(tabla['Participacion_General'].max(), 0.01)), format="percent"
+                        ),
+                        "Ganancia_Meta_General": st.column_config.NumberColumn("Ganancia en el ICE (pp)", format="%.2f"),
+                        "Ganancia_Meta_Componente": st.column_config.NumberColumn(
+                            "Ganancia en su componente (pp)", format="%.2f"),
+                        "Tiene_Meta": st.column_config.CheckboxColumn("Con meta")
+                    }
+                )
+            except Exception as e:
+                st.error(f"Error en aporte por indicador: {e}")
+
+    @staticmethod
+    @st.fragment
+    def _render_what_if(payload):
+        """
+        Simulación 'qué pasaría si' con metas, cálculo y pesos (fragmento: mover un
+        control solo recalcula esta sección). Nada se escribe en Google Sheets
+        """
+        with st.expander("🧪 Simulación de escenarios", expanded=False):
+            if not st.toggle("Activar simulación", key="what_if_activo"):
+                st.caption("Cambia metas, tipo de cálculo o pesos y compara el ICE resultante sin modificar los datos")
+                return
+
+            try:
+                base = payload.scenario_base
+                if len(base) == 0:
+                    st.info("No hay indicadores para simular")
+                    return
+
+                escenario = {'Meta': {}, 'Calculo': {}, 'Factor_Peso': {}}
+                col1, col2 = st.columns(2)
+
+                with col1:
+                    st.markdown("**Indicadores**")
+                    ajustables = base.calculo != CALCULO_FIJO
+                    codigos = st.multiselect("Indicadores a ajustar", list(base.codigos[ajustables]),
+                                             max_selections=5, key="what_if_codigos")
+                    if not ajustables.all():
+                        st.caption(f"{int((~ajustables).sum())} indicadores usan un cálculo que la "
+                                   "simulación no reproduce: su meta y su cálculo quedan fijos")
+                    for codigo in codigos:
+                        i = base.posiciones[codigo]
+                        meta = st.number_input(
+                            f"Meta de {codigo} (0 = sin meta)", min_value=0.0,
+                            value=float(base.meta[i]) if base.meta[i] > 0 else 0.0,
+                            key=f"what_if_meta_{codigo}"
+                        )
+                        calculo = st.selectbox(
+                            f"Cálculo de {codigo}", CALCULOS, index=int(base.calculo[i]),
+                            format_func=lambda c: c or 'estándar', key=f"what_if_calculo_{codigo}"
+                        )
+                        escenario['Meta'][codigo] = meta if meta > 0 else None
+                        escenario['Calculo'][codigo] = calculo
+
+                with col2:
+                    st.markdown("**Peso por componente**")
+                    for componente in sorted(pd.Series(base.componentes).dropna().unique()):
+                        factor = st.slider(f"{componente}", 0.0, 3.0, 1.0, 0.25, format="×%.2f",
+                                           key=f"what_if_peso_{componente}")
+                        if factor != 1.0:
+                            escenario['Factor_Peso'][componente] = factor
+
+                resultado = ScenarioEngine.evaluate(base, [{}, escenario], nombres=['Actual', 'Escenario'])
+                actual, simulado = resultado['general'].tolist()
+                st.metric("ICE del escenario", f"{simulado:.1%}", delta=f"{(simulado - actual) * 100:+.1f} pp")
+
+                tabla = resultado['componentes'].T
+                tabla['Diferencia'] = tabla['Escenario'] - tabla['Actual']
+                st.dataframe(tabla.style.format('{:.1%}', na_rep='-'), width='stretch')
+
+            except Exception as e:
+                st.error(f"Error en simulación de escenarios: {e}")
+
+    @staticmethod
+    @st.fragment
+    def _render_planning(payload):
+        """
+        Planeación hacia un ICE objetivo: mejoras de menor esfuerzo total (puntos
+        normalizados) para alcanzarlo (fragmento: mover el objetivo solo recalcula esta sección)
+        """
+        with st.expander("🗺️ Planeación: ruta hacia un ICE objetivo", expanded=False):
+            try:
+                base = payload.scenario_base
+                if len(base) == 0:
+                    st.info("No hay indicadores para planear")
+                    return
+
+                col1, col2 = st.columns(2)
+                with col1:
+                    objetivo = st.slider("ICE objetivo", 0.0, 1.0, 0.8, 0.01, format="%.2f", key="plan_objetivo")
+                with col2:
+                    tope = st.slider("Mejora máxima por indicador (puntos normalizados)", 0.05, 1.0, 1.0, 0.05,
+                                     format="%.2f", key="plan_tope")
+
+                plan, resumen = ScenarioEngine.plan_target(base, objetivo, tope)
+
+                m1, m2, m3 = st.columns(3)
+                m1.metric("ICE actual", f"{resumen['actual']:.1%}")
+                m2.metric("ICE con el plan", f"{resumen['resultado']:.1%}",
+                          delta=f"{(resumen['resultado'] - resumen['actual']) * 100:+.1f} pp")
+                m3.metric("Indicadores a mejorar", resumen['indicadores'],
+                          help=f"Esfuerzo total: {resumen['esfuerzo']:.2f} puntos normalizados")
+
+                if plan.empty:
+                    st.success("El ICE actual ya alcanza el objetivo")
+                    return
+                if not resumen['alcanzable']:
+                    st.warning("Ni mejorando todos los indicadores hasta el tope se alcanza el objetivo: "
+                               "se muestra la mejora máxima posible")
+
+                st.caption("Se priorizan los indicadores de mayor peso: cada punto normalizado que suben "
+                           "mueve más el ICE. 'Valor a reportar' aplica a indicadores de cálculo estándar")
+                st.dataframe(
+                    plan.drop(columns=['Categoria']),
+                    width='stretch',
+                    hide_index=True,
+                    column_config={
+                        "Valor": st.column_config.NumberColumn("Valor actual", format="%.3f"),
+                        "Valor_Normalizado": st.column_config.NumberColumn("Normalizado", format="percent"),
+                        "Mejora": st.column_config.NumberColumn("Mejora (puntos)", format="%.3f"),
+                        "Normalizado_Objetivo": st.column_config.NumberColumn("Normalizado objetivo", format="percent"),
+                        "Valor_Objetivo": st.column_config.NumberColumn("Valor a reportar", format="%.3f"),
+                        "Ganancia_General": st.column_config.NumberColumn("Ganancia en el ICE", format="percent")
+                    }
+                )
+            except Exception as e:
+                st.error(f"Error en planeación: {e}")
+
+    @staticmethod
+    def _render_entity_comparison(comparacion):
+        """Puntaje general y por componente de cada entidad, lado a lado"""
+        st.subheader("Comparación entre Entidades")
+        try:
+            entity_cube = comparacion.entity_cube
+            st.plotly_chart(
+                cached_figure('entidades', comparacion.huella,
+                              lambda: ChartGenerator.entity_comparison_chart(entity_cube)),
+                width='stretch'
+            )
+
+            with st.expander("Ver puntajes por entidad"):
+                niveles = entity_cube[entity_cube['Nivel'].isin(['General', 'Componente'])]
+                tabla = (niveles
+                         .assign(Nivel=niveles['Componente'].where(niveles['Nivel'] == 'Componente', 'General'))
+                         .pivot_table(index='Entidad', columns='Nivel', values='Puntaje_Ponderado', sort=False))
+                st.dataframe(tabla.style.format('{:.1%}'), width='stretch')
+        except Exception as e:
+            st.error(f"Error en comparación entre entidades: {e}")
+
     @staticmethod
     def _get_last_update_info(df):
         """Obtener información de la última actualización"""
@@ -279,17 +498,32 @@ class GeneralSummaryTab:
 
 class ComponentSummaryTab:
     """Pestaña de resumen por componente"""
+
+    DEPENDENCIAS = ('latest', 'correlations') + tuple(
+        f'matrix_{frecuencia}' for frecuencia in PERIOD_MATRIX_CONFIG['frequencies'])
     
     @staticmethod
-    def render(df, filters=None):
+    def render(df, filters=None, payload=None):
         """Renderizar resumen por componente"""
         st.header("Resumen por Componente")
         
         if df.empty:
             st.info("No hay datos disponibles")
             return
+
+        if payload is None:
+            payload = get_dataset_artifacts(df).payload(ComponentSummaryTab.DEPENDENCIAS)
         
-        df_latest = DataProcessor._get_latest_values_by_indicator(df)
+        ComponentSummaryTab._render_component_analysis(df, payload)
+    
+    @staticmethod
+    @st.fragment
+    def _render_component_analysis(df, payload):
+        """
+        Área interactiva del resumen por componente. Es un fragmento: cambiar el
+        componente seleccionado solo re-ejecuta esta sección, no toda la app.
+        """
+        df_latest = payload.latest
         componentes = sorted(df_latest['Componente'].dropna().unique()) if not df_latest.empty else []
         
         if not componentes:
@@ -334,12 +568,27 @@ class ComponentSummaryTab:
             col_izq, col_der = st.columns(2)
             
             with col_izq:
-                df_componente_historico = df[df['Componente'] == componente_analisis]
-                fig_evol = ChartGenerator.evolution_chart(df_componente_historico, componente=componente_analisis)
+                frecuencias = list(PERIOD_MATRIX_CONFIG['frequencies'])
+                frecuencia = st.radio(
+                    "Periodo",
+                    frecuencias,
+                    index=frecuencias.index(PERIOD_MATRIX_CONFIG['default_frequency']),
+                    format_func=str.capitalize,
+                    horizontal=True,
+                    key="comp_frecuencia"
+                )
+                # Indicadores alineados por periodo (matriz del dataset, una por resolución)
+                fig_evol = cached_figure(
+                    'evolucion_componente', payload.huella,
+                    lambda: ChartGenerator.evolution_chart(df[df['Componente'] == componente_analisis],
+                                                           componente=componente_analisis,
+                                                           matriz=getattr(payload, f'matrix_{frecuencia}')),
+                    componente_analisis, frecuencia, pd.Timestamp.now().strftime('%Y-%m-%d')
+                )
                 st.plotly_chart(fig_evol, width='stretch')
             
             with col_der:
-                ComponentSummaryTab._render_category_visualization(df, componente_analisis)
+                ComponentSummaryTab._render_category_visualization(df, componente_analisis, df_latest, payload.huella)
             
             # Tabla de indicadores
             st.subheader(f"Indicadores de {componente_analisis}")
@@ -353,11 +602,61 @@ class ComponentSummaryTab:
                 ),
                 width='stretch'
             )
+
+        ComponentSummaryTab._render_correlations(payload, componente_analisis)
+
+    @staticmethod
+    @st.fragment
+    def _render_correlations(payload, componente):
+        """
+        Correlación entre indicadores (fragmento). Se calcula una vez por huella del
+        dataset sobre los periodos en que cada par de indicadores tiene registro
+        """
+        st.subheader("Correlación entre Indicadores")
+        alcance = st.radio(
+            "Indicadores",
+            [f"Solo {componente}", "Todos los componentes"],
+            horizontal=True,
+            key="correlacion_alcance",
+            help="Pearson por pares, con los periodos en que ambos indicadores tienen registro "
+                 f"(mínimo {CORRELATION_CONFIG['min_periods']}, resolución {CORRELATION_CONFIG['frequency']})"
+        )
+        solo_componente = alcance != "Todos los componentes"
+
+        try:
+            correlaciones = payload.correlations
+            indicadores = correlaciones['indicadores']
+            etiquetas = (list(indicadores.index[indicadores['Componente'] == componente]) if solo_componente
+                         else list(indicadores.index))
+
+            fig = cached_figure(
+                'correlacion', payload.huella,
+                lambda: ChartGenerator.correlation_heatmap(correlaciones, etiquetas),
+                componente if solo_componente else None
+            )
+            st.plotly_chart(fig, width='stretch')
+
+            pares = CorrelationEngine.top_pairs(correlaciones, etiquetas)
+            if pares.empty:
+                st.info("No hay pares de indicadores con suficientes periodos en común")
+            else:
+                st.markdown("**Pares con mayor correlación**")
+                st.dataframe(
+                    pares,
+                    width='stretch',
+                    hide_index=True,
+                    column_config={
+                        'Correlacion': st.column_config.NumberColumn('Correlación', format="%.2f"),
+                        'Periodos': st.column_config.NumberColumn('Periodos en común')
+                    }
+                )
+        except Exception as e:
+            st.error(f"Error en correlación entre indicadores: {e}")
     
     @staticmethod
-    def _render_category_visualization(df, componente):
-        """Renderizar visualización de categorías"""
-        df_latest = DataProcessor._get_latest_values_by_indicator(df)
+    @st.fragment
+    def _render_category_visualization(df, componente, df_latest, huella=None):
+        """Renderizar visualización de categorías (fragmento: el selector de tipo solo redibuja este gráfico)"""
         df_componente = df_latest[df_latest['Componente'] == componente]
         
         num_categorias = df_componente['Categoria'].nunique()
@@ -377,10 +676,12 @@ class ComponentSummaryTab:
         )
         
         if "Barras" in tipo_viz:
-            fig_bar = ChartGenerator.horizontal_bar_chart(df, componente, None)
+            fig_bar = cached_figure('categorias_barras', huella,
+                                    lambda: ChartGenerator.horizontal_bar_chart(df, componente, None), componente)
             st.plotly_chart(fig_bar, width='stretch')
         elif "Radar" in tipo_viz and num_categorias >= 3:
-            fig_radar_cat = ChartGenerator.radar_chart_categories(df, componente, None)
+            fig_radar_cat = cached_figure('categorias_radar', huella,
+                                          lambda: ChartGenerator.radar_chart_categories(df, componente, None), componente)
             st.plotly_chart(fig_radar_cat, width='stretch')
         else:
             st.warning(f"Se requieren 3+ categorías para radar. {componente} tiene {num_categorias}.")
@@ -388,18 +689,111 @@ class ComponentSummaryTab:
 class EvolutionTab:
     """Pestaña de evolución"""
 
+    DEPENDENCIAS = ('catalog', 'forecast', 'changes')
+
+    # Opciones del ranking de cambios: etiqueta -> sufijo de las columnas Cambio_<n>
+    PERIODOS_CAMBIO = {
+        "Último periodo": 'Periodo',
+        "Anual (vs. hace un año)": 'Anual',
+        "Desde la línea base": 'Total'
+    }
+
     @staticmethod
-    def render(df, filters=None, fichas_data=None):
+    def render(df, filters=None, fichas_data=None, payload=None):
         """Renderizar evolución temporal con información de fichas"""
         st.header("Evolución Temporal de Indicadores")
 
-        try:
-            if df.empty:
-                st.info("No hay datos para mostrar evolución")
-                return
+        if df.empty:
+            st.info("No hay datos para mostrar evolución")
+            return
+
+        if payload is None:
+            payload = get_dataset_artifacts(df).payload(EvolutionTab.DEPENDENCIAS)
+
+        EvolutionTab._render_change_leaderboard(payload)
+        EvolutionTab._render_evolution_content(df, payload, fichas_data)
+
+    @staticmethod
+    @st.fragment
+    def _render_change_leaderboard(payload):
+        """
+        Ranking de cambios de todos los indicadores (fragmento). La tabla se calcula
+        una vez por versión del dataset; aquí solo se elige la columna y el orden
+        """
+        with st.expander("🏁 Ranking de cambios (todos los indicadores)"):
+            try:
+                cambios = payload.changes
+                if cambios.empty:
+                    st.info("No hay registros para calcular cambios")
+                    return
+
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    periodo = st.selectbox("Cambio", list(EvolutionTab.PERIODOS_CAMBIO), key="cambios_periodo")
+                with col2:
+                    termino = st.radio("Medido en", ["Normalizado", "Valor recalculado (%)"],
+                                       horizontal=True, key="cambios_termino")
+                with col3:
+                    orden = st.radio("Orden", ["Mayores alzas", "Mayores caídas"],
+                                     horizontal=True, key="cambios_orden")
+
+                nombre = EvolutionTab.PERIODOS_CAMBIO[periodo]
+                columna = f'Cambio_{nombre}_Norm' if termino == "Normalizado" else f'Cambio_{nombre}_Pct'
+                referencia = {'Periodo': 'Anterior', 'Anual': 'Anio_Anterior', 'Total': 'Inicial'}[nombre]
+
+                columnas = [c for c in ('Entidad', 'COD', 'Indicador', 'Componente') if c in cambios.columns] + [
+                    f'Fecha_{referencia}', f'Valor_{referencia}', 'Fecha_Actual', 'Valor_Actual',
+                    'Normalizado_Actual', columna
+                ]
+                ranking = (cambios.dropna(subset=[columna])
+                           .sort_values(columna, ascending=orden == "Mayores caídas")[columnas])
+
+                st.caption(f"{len(ranking)} de {len(cambios)} indicadores tienen este cambio. "
+                           "Haga clic en un encabezado para ordenar por otra columna.")
+                st.dataframe(
+                    ranking,
+                    width='stretch',
+                    hide_index=True,
+                    height=350,
+                    column_config={
+                        f'Fecha_{referencia}': st.column_config.DateColumn('Fecha referencia', format='DD/MM/YYYY'),
+                        f'Valor_{referencia}': st.column_config.NumberColumn('Valor referencia', format="%.2f"),
+                        'Fecha_Actual': st.column_config.DateColumn('Fecha actual', format='DD/MM/YYYY'),
+                        'Valor_Actual': st.column_config.NumberColumn('Valor actual', format="%.2f"),
+                        'Normalizado_Actual': st.column_config.ProgressColumn(
+                            'Normalizado actual', min_value=0.0, max_value=1.0, format="percent"),
+                        columna: st.column_config.NumberColumn(
+                            'Cambio (p.p.)' if termino == "Normalizado" else 'Cambio %', format="percent")
+                    }
+                )
+
+                # Exportar la tabla completa (todos los cambios, no solo la columna elegida)
+                import io
+                output = io.BytesIO()
+                with pd.ExcelWriter(output, engine='openpyxl') as writer:
+                    cambios.to_excel(writer, index=False, sheet_name='Cambios')
+                st.download_button(
+                    label="Descargar cambios Excel",
+                    data=output.getvalue(),
+                    file_name=f"cambios_indicadores_{pd.Timestamp.now():%Y%m%d}.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    key="download_cambios"
+                )
+            except Exception as e:
+                st.error(f"Error en ranking de cambios: {e}")
 
-            # Crear filtros
-            evolution_filters = EvolutionFilters.create_evolution_filters_stable(df)
+    @staticmethod
+    @st.fragment
+    def _render_evolution_content(df, payload, fichas_data=None):
+        """
+        Contenido interactivo de la pestaña de evolución. Es un fragmento: cambiar
+        de indicador solo re-ejecuta esta sección, no toda la app.
+        """
+        try:
+            # Crear filtros (las opciones del gráfico viven en su propio fragmento)
+            evolution_filters = EvolutionFilters.create_evolution_filters_stable(
+                df, incluir_opciones_grafico=False, catalogo=payload.catalog
+            )
 
             # Solo mostrar si hay indicador seleccionado
             if not evolution_filters['indicador'] or not evolution_filters['codigo']:
@@ -436,11 +830,11 @@ class EvolutionTab:
                 else:
                     st.info("No hay ficha metodológica disponible para este indicador")
 
-                # Información adicional
-                indicador_data = datos_indicador.iloc[0]
+                # Información adicional (desde el catálogo de indicadores)
+                indicador_data = payload.catalog.loc[evolution_filters['codigo']]
                 st.markdown(f"**Componente:** {indicador_data.get('Componente', 'N/A')}")
                 st.markdown(f"**Categoría:** {indicador_data.get('Categoria', 'N/A')}")
-                st.markdown(f"**Registros históricos:** {len(datos_indicador)}")
+                st.markdown(f"**Registros históricos:** {indicador_data['Registros']}")
 
             with col2:
                 st.markdown("### Descargas")
@@ -448,8 +842,8 @@ class EvolutionTab:
                 # Descargar ficha en PDF
                 if ficha_info is not None:
                     try:
-                        from pdf_generator import PDFGenerator
-                        pdf_bytes = PDFGenerator.generate_ficha_pdf(ficha_info)
+                        from pdf_generator import get_metodological_sheet_pdf
+                        pdf_bytes = get_metodological_sheet_pdf(evolution_filters['codigo'], fichas_data)
                         if pdf_bytes:
                             st.download_button(
                                 label="Descargar Ficha PDF",
@@ -491,17 +885,8 @@ class EvolutionTab:
             
             # === GRÁFICO DE EVOLUCIÓN ===
             st.subheader("Gráfico de Evolución")
-            try:
-                fig = ChartGenerator.evolution_chart(
-                    df,
-                    indicador=evolution_filters['indicador'],
-                    componente=None,
-                    tipo_grafico=evolution_filters['tipo_grafico'],
-                    mostrar_meta=evolution_filters['mostrar_meta']
-                )
-                st.plotly_chart(fig, width='stretch')
-            except Exception as e:
-                st.error(f"Error en gráfico: {e}")
+            EvolutionTab._render_evolution_chart(df, evolution_filters['indicador'], payload.huella,
+                                                 evolution_filters['codigo'], payload)
 
             # === ANÁLISIS ESTADÍSTICO ===
             st.subheader("Análisis Estadístico")
@@ -509,30 +894,26 @@ class EvolutionTab:
             if len(datos_indicador) > 1:
                 col1, col2, col3, col4 = st.columns(4)
 
-                valor_col = 'Valor_Recalculado' if 'Valor_Recalculado' in datos_indicador.columns else 'Valor'
+                # Primer y último período con dato real (tabla de cambios de todos los
+                # indicadores): los períodos sin reporte no cuentan como "Valor Inicial"/"Actual" = 0
+                cambios = payload.changes
+                fila = cambios[cambios['COD'] == evolution_filters['codigo']] if not cambios.empty else cambios
 
-                # Usar el primer y último período con dato real; los períodos sin
-                # reporte quedan como NaN y no deben tomarse como "Valor Inicial"/"Actual" = 0.
-                valores_validos = datos_indicador[valor_col].dropna()
-
-                if not valores_validos.empty:
-                    valor_inicial = valores_validos.iloc[0]
-                    valor_actual = valores_validos.iloc[-1]
+                if not fila.empty:
+                    fila = fila.iloc[0]
 
                     with col1:
-                        st.metric("Valor Inicial", f"{valor_inicial:,.2f}")
+                        st.metric("Valor Inicial", f"{fila['Valor_Inicial']:,.2f}")
 
                     with col2:
-                        st.metric("Valor Actual", f"{valor_actual:,.2f}")
+                        st.metric("Valor Actual", f"{fila['Valor_Actual']:,.2f}")
 
                     with col3:
-                        cambio = valor_actual - valor_inicial
-                        st.metric("Cambio Total", f"{cambio:+,.2f}")
+                        st.metric("Cambio Total", f"{fila['Cambio_Total']:+,.2f}")
 
                     with col4:
-                        if valor_inicial != 0:
-                            cambio_pct = (cambio / valor_inicial) * 100
-                            st.metric("Cambio %", f"{cambio_pct:+.1f}%")
+                        if pd.notna(fila['Cambio_Total_Pct']):
+                            st.metric("Cambio %", f"{fila['Cambio_Total_Pct'] * 100:+.1f}%")
                         else:
                             st.metric("Cambio %", "N/A")
                 else:
@@ -570,6 +951,26 @@ class EvolutionTab:
                         "**\\*\\*** *Valor Normalizado*: Para este indicador, el valor normalizado corresponde a la **suma acumulada** "
                         "de los valores de los últimos 4 años disponibles, normalizada posteriormente."
                     )
+                elif calculo_tipo == 'ultimo':
+                    notas.append(
+                        "**\\*\\*** *Valor Normalizado*: Para este indicador, cada registro toma el **último valor "
+                        "reportado en su año** (cierre del año), normalizado posteriormente."
+                    )
+                elif calculo_tipo == 'maximo':
+                    notas.append(
+                        "**\\*\\*** *Valor Normalizado*: Para este indicador, el valor normalizado corresponde al **máximo** "
+                        "de los valores de los últimos 4 años disponibles, normalizado posteriormente."
+                    )
+                elif calculo_tipo == 'mediana_movil':
+                    notas.append(
+                        "**\\*\\*** *Valor Normalizado*: Para este indicador, el valor normalizado corresponde a la **mediana** "
+                        "de los valores de los últimos 4 años disponibles, normalizada posteriormente."
+                    )
+                elif calculo_tipo == 'inverso':
+                    notas.append(
+                        "**\\*\\*** *Valor Normalizado*: Para este indicador **un valor menor es mejor**: con Meta, "
+                        "el valor normalizado es Meta / Valor (máximo 1); sin Meta, la normalización min-max se invierte."
+                    )
 
             # Mostrar notas si existen
             if notas:
@@ -580,14 +981,95 @@ class EvolutionTab:
         except Exception as e:
             st.error(f"Error en evolución: {e}")
 
+    @staticmethod
+    @st.fragment
+    def _render_evolution_chart(df, indicador, huella=None, codigo=None, payload=None):
+        """Gráfico de evolución con sus opciones (fragmento: cambiar el tipo de gráfico solo redibuja el gráfico)"""
+        opciones = EvolutionFilters.create_chart_options()
+        metodo = {'Lineal': 'lineal', 'Robusta': 'robusto'}.get(opciones['tendencia'])
+
+        # Tendencia del indicador: se lee del pronóstico precalculado, no se ajusta aquí
+        proyeccion, resumen = None, None
+        if metodo and codigo is not None and payload is not None:
+            try:
+                pronostico = payload.forecast
+                proyeccion = pronostico['proyecciones']
+                proyeccion = proyeccion[(proyeccion['COD'] == codigo) & (proyeccion['Metodo'] == metodo)]
+                filas = pronostico['resumen']
+                filas = filas[(filas['COD'] == codigo) & (filas['Metodo'] == metodo)]
+                resumen = filas.iloc[0] if not filas.empty else None
+            except Exception as e:
+                st.error(f"Error al obtener la proyección: {e}")
+
+        try:
+            fig = cached_figure(
+                'evolucion_indicador', huella,
+                lambda: ChartGenerator.evolution_chart(
+                    df,
+                    indicador=indicador,
+                    componente=None,
+                    tipo_grafico=opciones['tipo_grafico'],
+                    mostrar_meta=opciones['mostrar_meta'],
+                    proyeccion=proyeccion
+                ),
+                indicador, opciones['tipo_grafico'], opciones['mostrar_meta'], metodo,
+                pd.Timestamp.now().strftime('%Y-%m-%d') if metodo else None
+            )
+            st.plotly_chart(fig, width='stretch')
+        except Exception as e:
+            st.error(f"Error en gráfico: {e}")
+
+        if resumen is not None:
+            EvolutionTab._render_forecast_caption(resumen)
+
+    @staticmethod
+    def _render_forecast_caption(resumen):
+        """Resumen de la tendencia del indicador y de la fecha esperada de la Meta"""
+        estado = resumen['Estado_Meta']
+        if estado == 'Datos insuficientes':
+            st.caption(f"📈 No hay suficientes periodos con registro para estimar una tendencia "
+                       f"({int(resumen['Observaciones'])}).")
+            return
+
+        periodo = {'anual': 'año', 'semestral': 'semestre', 'trimestral': 'trimestre'}.get(
+            FORECAST_CONFIG['frequency'], 'periodo')
+        if pd.notna(resumen['Meta']):
+            texto = f"📈 Tendencia: {resumen['Pendiente'] / resumen['Meta']:+.1%} de la Meta por {periodo}"
+        else:
+            texto = f"📈 Tendencia: {resumen['Pendiente']:+.3f} por {periodo}"
+        if estado == 'Proyectada':
+            texto += f" · Meta proyectada para {pd.Timestamp(resumen['Fecha_Meta']).strftime('%m/%Y')}"
+        elif estado == 'Alcanzada':
+            texto += " · Meta ya alcanzada en el último registro"
+        elif estado == 'Sin tendencia favorable':
+            texto += " · Con esta tendencia la Meta no se alcanza"
+        elif estado == 'Fuera de horizonte':
+            texto += " · La Meta se alcanzaría después del horizonte de proyección"
+        st.caption(texto)
+
 class EditTab:
     """Pestaña de gestión con autenticación - ACTUALIZADA PARA FICHAS DESDE GOOGLE SHEETS"""
     
+    DEPENDENCIAS = ('catalog',)
+
     @staticmethod
-    def render(df, csv_path, fichas_data=None):
+    def render(df, csv_path, fichas_data=None, payload=None):
         """Renderizar gestión de indicadores - ACTUALIZADO PARA FICHAS DESDE SHEETS"""
         st.header("Gestión de Indicadores")
-        
+
+        if payload is None:
+            payload = get_dataset_artifacts(df).payload(EditTab.DEPENDENCIAS)
+
+        EditTab._render_management_content(df, payload, fichas_data)
+    
+    @staticmethod
+    @st.fragment
+    def _render_management_content(df, payload, fichas_data=None):
+        """
+        Contenido interactivo de la gestión. Es un fragmento: cambiar de indicador
+        solo re-ejecuta esta sección; tras escribir en Google Sheets se usa
+        st.rerun() (alcance de toda la app) para recargar los datos.
+        """
         try:
             # Verificar Google Sheets
             from data_utils import GOOGLE_SHEETS_AVAILABLE
@@ -602,8 +1084,13 @@ class EditTab:
             if 'selected_codigo_edit' not in st.session_state:
                 st.session_state.selected_codigo_edit = None
             
+            # Catálogo de indicadores (una fila por COD, cacheado por versión del dataset)
+            catalogo = payload.catalog
+
+            EditTab._render_anomalies_overview(df)
+
             # Selector de código
-            codigo_editar = EditTab._render_codigo_selector(df)
+            codigo_editar = EditTab._render_codigo_selector(catalogo)
             
             # MODO CONSULTA
             st.markdown("### 📖 Modo Consulta")
@@ -612,7 +1099,7 @@ class EditTab:
                 datos_indicador = df[df['COD'] == codigo_editar] if not df.empty else pd.DataFrame()
                 
                 if not datos_indicador.empty:
-                    EditTab._render_indicator_info_card(datos_indicador, codigo_editar)
+                    EditTab._render_indicator_info_card(catalogo.loc[codigo_editar], codigo_editar)
                     EditTab._render_metodological_expander(codigo_editar, fichas_data)
                     
                     registros_indicador = datos_indicador.sort_values('Fecha', ascending=False)
@@ -645,12 +1132,12 @@ class EditTab:
                 st.success("✅ Modo Administrador Activo")
                 
                 if codigo_editar == "CREAR_NUEVO":
-                    EditTab._render_new_indicator_form_auth(df)
+                    EditTab._render_new_indicator_form_auth(catalogo)
                 elif codigo_editar and not df.empty:
                     datos_indicador = df[df['COD'] == codigo_editar]
                     if not datos_indicador.empty:
                         registros_indicador = datos_indicador.sort_values('Fecha', ascending=False)
-                        EditTab._render_admin_management_tabs(df, codigo_editar, registros_indicador, fichas_data)
+                        EditTab._render_admin_management_tabs(df, catalogo, codigo_editar, registros_indicador, fichas_data)
                     else:
                         st.warning("Selecciona un indicador válido")
                 else:
@@ -660,13 +1147,34 @@ class EditTab:
             st.error(f"Error en gestión: {e}")
     
     @staticmethod
-    def _render_codigo_selector(df):
-        """Selector de código"""
-        if df.empty:
+    def _render_anomalies_overview(df):
+        """Registros marcados como atípicos en la última carga (todos los indicadores)"""
+        atipicos = AnomalyDetector.summary(df)
+        if atipicos.empty:
+            return
+
+        with st.expander(f"🚩 Registros atípicos ({len(atipicos)})"):
+            st.caption("Valores muy alejados del histórico de su indicador (z robusto, IQR, salto frente "
+                       "a la tendencia u orden de magnitud). No se excluyen del cálculo: revíselos en la "
+                       "hoja, pues distorsionan la normalización min-max del indicador.")
+            st.dataframe(
+                atipicos,
+                width='stretch',
+                hide_index=True,
+                column_config={
+                    'Fecha': st.column_config.DateColumn('Fecha', format='DD/MM/YYYY'),
+                    'Motivo_Anomalia': st.column_config.TextColumn('Motivo')
+                }
+            )
+
+    @staticmethod
+    def _render_codigo_selector(catalogo):
+        """Selector de código (opciones tomadas del catálogo de indicadores)"""
+        if catalogo.empty:
             st.info("Base de datos vacía")
             return "CREAR_NUEVO" if auth_manager.is_authenticated() else None
         
-        codigos_disponibles = sorted(df['COD'].dropna().unique())
+        codigos_disponibles = list(catalogo.index)
         
         if auth_manager.is_authenticated():
             opciones_codigo = ["[Crear nuevo código]"] + list(codigos_disponibles)
@@ -719,21 +1227,33 @@ class EditTab:
                     fecha_str = pd.to_datetime(fecha_mas_reciente).strftime('%d/%m/%Y')
                     st.metric("Última Medición", fecha_str)
             
+            if 'Anomalia' in registros_indicador.columns and registros_indicador['Anomalia'].fillna(False).any():
+                st.warning(f"🚩 {int(registros_indicador['Anomalia'].fillna(False).sum())} registro(s) atípico(s) "
+                           "respecto al histórico del indicador (columna Atípico)")
+
             # Tabla de datos
-            columns_to_show = ['Fecha', 'Valor', 'Tipo', 'Valor_Normalizado', 'Componente', 'Categoria']
+            columns_to_show = ['Fecha', 'Valor', 'Tipo', 'Valor_Normalizado', 'Componente', 'Categoria',
+                               'Anomalia', 'Motivo_Anomalia']
             available_columns = [col for col in columns_to_show if col in registros_indicador.columns]
-            st.dataframe(registros_indicador[available_columns], width='stretch')
+            st.dataframe(
+                registros_indicador[available_columns],
+                width='stretch',
+                column_config={
+                    'Anomalia': st.column_config.CheckboxColumn('Atípico'),
+                    'Motivo_Anomalia': st.column_config.TextColumn('Motivo')
+                }
+            )
         else:
             st.info("No hay registros para este indicador")
     
     @staticmethod
-    def _render_indicator_info_card(datos_indicador, codigo_editar):
-        """Card con información del indicador"""
+    def _render_indicator_info_card(info_indicador, codigo_editar):
+        """Card con información del indicador (fila del catálogo de indicadores)"""
         try:
-            nombre_indicador = datos_indicador['Indicador'].iloc[0]
-            componente_indicador = datos_indicador['Componente'].iloc[0]
-            categoria_indicador = datos_indicador['Categoria'].iloc[0]
-            tipo_indicador = datos_indicador.get('Tipo', pd.Series(['porcentaje'])).iloc[0]
+            nombre_indicador = info_indicador['Indicador']
+            componente_indicador = info_indicador['Componente']
+            categoria_indicador = info_indicador['Categoria']
+            tipo_indicador = info_indicador['Tipo'] if pd.notna(info_indicador['Tipo']) else 'porcentaje'
             
             st.markdown(f"""
             <div style="background: linear-gradient(45deg, #003A5B 0%, #7A97A8 100%);
@@ -748,7 +1268,7 @@ class EditTab:
             </div>
             """, unsafe_allow_html=True)
             
-        except IndexError:
+        except KeyError:
             st.error(f"Error al obtener información del indicador {codigo_editar}")
     
     @staticmethod
@@ -900,7 +1420,7 @@ class EditTab:
             st.info("💡 Asegúrate de tener la pestaña 'Fichas' en tu Google Sheets")
     
     @staticmethod
-    def _render_new_indicator_form_auth(df):
+    def _render_new_indicator_form_auth(catalogo):
         """Formulario para crear nuevo indicador"""
         st.subheader("➕ Crear Nuevo Indicador")
         
@@ -957,7 +1477,7 @@ class EditTab:
             
             if submitted:
                 if EditTab._validate_and_create_indicator(
-                    df, nuevo_codigo, nuevo_indicador, nueva_categoria,
+                    catalogo, nuevo_codigo, nuevo_indicador, nueva_categoria,
                     nuevo_componente, nuevo_tipo, primer_valor, primera_fecha
                 ):
                     st.success("✅ Indicador creado exitosamente")
@@ -965,7 +1485,7 @@ class EditTab:
                     st.rerun()
     
     @staticmethod
-    def _validate_and_create_indicator(df, codigo, indicador, categoria, componente, tipo, valor, fecha):
+    def _validate_and_create_indicator(catalogo, codigo, indicador, categoria, componente, tipo, valor, fecha):
         """Validar y crear indicador"""
         if not codigo.strip():
             st.error("El código es obligatorio")
@@ -979,7 +1499,7 @@ class EditTab:
             st.error("La categoría es obligatoria")
             return False
         
-        if not df.empty and codigo in df['COD'].values:
+        if codigo in catalogo.index:
             st.error(f"El código '{codigo}' ya existe")
             return False
         
@@ -1001,8 +1521,7 @@ class EditTab:
             
             if success:
                 st.session_state.selected_codigo_edit = codigo
-                st.cache_data.clear()
-                st.session_state.data_timestamp = st.session_state.get('data_timestamp', 0) + 1
+                EditTab._reflect_write('agregar', codigo.strip(), fecha, valor, registro=data_dict)
                 return True
             else:
                 st.error("Error al crear el indicador")
@@ -1013,7 +1532,7 @@ class EditTab:
             return False
     
     @staticmethod
-    def _render_admin_management_tabs(df, codigo_editar, registros_indicador, fichas_data):
+    def _render_admin_management_tabs(df, catalogo, codigo_editar, registros_indicador, fichas_data):
         """Pestañas de gestión para administradores - ACTUALIZADO PARA FICHAS SHEETS"""
         st.subheader("🛠️ Herramientas de Administración")
         
@@ -1028,7 +1547,7 @@ class EditTab:
             EditTab._render_detailed_view(registros_indicador, fichas_data, codigo_editar)
         
         with tab2:
-            EditTab._render_add_form_auth(df, codigo_editar)
+            EditTab._render_add_form_auth(df, catalogo, codigo_editar)
         
         with tab3:
             EditTab._render_edit_form_auth(df, codigo_editar, registros_indicador)
@@ -1086,7 +1605,7 @@ class EditTab:
             st.info("No hay registros para mostrar")
     
     @staticmethod
-    def _render_add_form_auth(df, codigo_editar):
+    def _render_add_form_auth(df, catalogo, codigo_editar):
         """Formulario para agregar registros"""
         st.write("**Agregar nuevo registro al indicador**")
         
@@ -1094,11 +1613,11 @@ class EditTab:
             return
         
         # Obtener tipo del indicador
-        if not df.empty:
-            datos_indicador = df[df['COD'] == codigo_editar]
-            if not datos_indicador.empty:
-                tipo_indicador = datos_indicador.get('Tipo', pd.Series(['porcentaje'])).iloc[0]
-                st.info(f"**Tipo de indicador:** {tipo_indicador}")
+        if codigo_editar in catalogo.index:
+            tipo_indicador = catalogo.at[codigo_editar, 'Tipo']
+            if pd.isna(tipo_indicador):
+                tipo_indicador = 'porcentaje'
+            st.info(f"**Tipo de indicador:** {tipo_indicador}")
         
         with st.form("form_agregar_auth"):
             col1, col2 = st.columns(2)
@@ -1126,8 +1645,7 @@ class EditTab:
                 
                 if success:
                     st.success("✅ Registro agregado correctamente")
-                    st.cache_data.clear()
-                    st.session_state.data_timestamp = st.session_state.get('data_timestamp', 0) + 1
+                    EditTab._reflect_write('agregar', codigo_editar, fecha_dt, nuevo_valor)
                     time.sleep(1)
                     st.rerun()
                 else:
@@ -1187,8 +1705,7 @@ class EditTab:
                             
                             if success:
                                 st.success(f"✅ Registro actualizado: {valor_edit_actual:.3f} → {nuevo_valor_edit:.3f}")
-                                st.cache_data.clear()
-                                st.session_state.data_timestamp = st.session_state.get('data_timestamp', 0) + 1
+                                EditTab._reflect_write('actualizar', codigo_editar, fecha_edit_real, nuevo_valor_edit)
                                 time.sleep(1)
                                 st.rerun()
                             else:
@@ -1261,8 +1778,7 @@ class EditTab:
                                 
                                 if success:
                                     st.success("✅ Registro eliminado correctamente")
-                                    st.cache_data.clear()
-                                    st.session_state.data_timestamp = st.session_state.get('data_timestamp', 0) + 1
+                                    EditTab._reflect_write('eliminar', codigo_editar, fecha_delete_real)
                                     time.sleep(2)
                                     st.rerun()
                                 else:
@@ -1277,11 +1793,23 @@ class EditTab:
         except Exception as e:
             st.error(f"Error en formulario de eliminación: {e}")
     
+    @staticmethod
+    def _reflect_write(operacion, codigo, fecha, valor=None, registro=None):
+        """
+        Reflejar una escritura exitosa en Google Sheets: se aplica sobre la versión
+        del dataset en memoria recalculando solo el COD afectado (la confirmación
+        contra Sheets corre en segundo plano). Si no es posible, se fuerza la
+        recarga completa como antes
+        """
+        if not apply_local_write(operacion, codigo, fecha, valor, registro):
+            st.cache_data.clear()
+            st.session_state.data_timestamp = st.session_state.get('data_timestamp', 0) + 1
+
     @staticmethod
     def _generate_and_download_pdf(codigo_editar, fichas_data):
         """Generar y descargar PDF - ACTUALIZADO PARA FICHAS DE GOOGLE SHEETS"""
         try:
-            from pdf_generator import PDFGenerator
+            from pdf_generator import PDFGenerator, get_metodological_sheet_pdf
             
             pdf_generator = PDFGenerator()
             
@@ -1290,7 +1818,7 @@ class EditTab:
                 return
             
             with st.spinner("Generando ficha metodológica desde Google Sheets..."):
-                pdf_bytes = pdf_generator.generate_metodological_sheet(codigo_editar, fichas_data)
+                pdf_bytes = get_metodological_sheet_pdf(codigo_editar, fichas_data)
                 
                 if pdf_bytes and len(pdf_bytes) > 0:
                     st.success("✅ PDF generado correctamente desde Google Sheets")
@@ -1316,12 +1844,31 @@ class EditTab:
 
 class TabManager:
     """Gestor de pestañas del dashboard - ACTUALIZADO PARA FICHAS DESDE GOOGLE SHEETS"""
+
+    # Derivados que necesita el panel 'Estado del Sistema' de la barra lateral
+    SIDEBAR_DEPENDENCIAS = ('system_stats',)
     
-    def __init__(self, df, csv_path, fichas_data=None):
+    def __init__(self, df, csv_path, fichas_data=None, source_info=None, fingerprint=None,
+                 df_entidades=None, huella_entidades=None):
         self.df = df
         self.csv_path = None
         self.fichas_data = fichas_data
+        self.source_info = source_info
+        self.fingerprint = fingerprint or {}
+        # Derivados compartidos por versión del dataset; cada pestaña solo
+        # calcula los que declara en DEPENDENCIAS, y solo cuando se muestra
+        self.artifacts = get_dataset_artifacts(df, self.fingerprint.get('derivados'))
+        # Dataset con todas las entidades (si une varias): comparación en el Resumen General
+        self.entity_artifacts = None
+        if df_entidades is not None and len(entity_names(df_entidades)) > 1:
+            self.entity_artifacts = get_dataset_artifacts(df_entidades, huella_entidades)
     
+    def _is_secondary_entity(self):
+        """Indica si el dataset mostrado es de una entidad distinta a la principal"""
+        entidades = entity_names(self.df)
+        principal = next(iter((self.source_info or {}).get('entidades') or []), None)
+        return bool(entidades) and principal is not None and entidades[0] != principal
+
     def render_tabs(self, df_filtrado, filters):
         """Renderizar todas las pestañas con control manual de estado"""
 
@@ -1350,44 +1897,55 @@ class TabManager:
 
         # Renderizar contenido según pestaña seleccionada
         if selected_tab == "Resumen General":
-            GeneralSummaryTab.render(self.df)
+            comparacion = (self.entity_artifacts.payload(('entity_cube',))
+                           if self.entity_artifacts is not None else None)
+            GeneralSummaryTab.render(self.df, payload=self.artifacts.payload(GeneralSummaryTab.DEPENDENCIAS),
+                                     comparacion=comparacion)
 
         elif selected_tab == "¿Qué es la ICE?":
-            IceInfoTab.render(self.df)
+            IceInfoTab.render(self.df, payload=self.artifacts.payload(IceInfoTab.DEPENDENCIAS))
 
         elif selected_tab == "Resumen por Componente":
-            ComponentSummaryTab.render(self.df)
+            ComponentSummaryTab.render(self.df, payload=self.artifacts.payload(ComponentSummaryTab.DEPENDENCIAS))
 
         elif selected_tab == "Evolución":
-            EvolutionTab.render(self.df, fichas_data=self.fichas_data)
+            EvolutionTab.render(self.df, fichas_data=self.fichas_data,
+                                payload=self.artifacts.payload(EvolutionTab.DEPENDENCIAS))
 
         elif selected_tab == "Gestión de Datos":
-            EditTab.render(self.df, None, self.fichas_data)
+            if self._is_secondary_entity():
+                st.info("Las ediciones se escriben en la hoja de la entidad principal: "
+                        "selecciónala en la barra lateral para gestionar sus datos")
+            else:
+                EditTab.render(self.df, None, self.fichas_data,
+                               payload=self.artifacts.payload(EditTab.DEPENDENCIAS))
         
         # Sidebar con información del sistema
         with st.sidebar:
             st.markdown("### 📊 Estado del Sistema")
             
             if not self.df.empty:
-                st.success(f"**{len(self.df)}** registros cargados")
-                st.success(f"**{self.df['COD'].nunique()}** indicadores únicos")
+                stats = self.artifacts.payload(self.SIDEBAR_DEPENDENCIAS).system_stats
+                st.success(f"**{stats['registros']}** registros cargados")
+                st.success(f"**{stats['indicadores']}** indicadores únicos")
                 
-                if 'Fecha' in self.df.columns:
-                    fechas_count = self.df['Fecha'].nunique()
-                    fecha_min = self.df['Fecha'].min()
-                    fecha_max = self.df['Fecha'].max()
-                    st.info(f"**Fechas:** {fechas_count} diferentes")
-                    st.info(f"**Rango:** {pd.to_datetime(fecha_min).strftime('%d/%m/%Y')} - {pd.to_datetime(fecha_max).strftime('%d/%m/%Y')}")
+                if stats['fechas'] is not None:
+                    st.info(f"**Fechas:** {stats['fechas']} diferentes")
+                    st.info(f"**Rango:** {pd.to_datetime(stats['fecha_min']).strftime('%d/%m/%Y')} - {pd.to_datetime(stats['fecha_max']).strftime('%d/%m/%Y')}")
                 
                 if 'Componente' in self.df.columns:
-                    componentes_count = self.df['Componente'].nunique()
-                    st.info(f"**Componentes:** {componentes_count}")
+                    registros_por_componente = stats['registros_por_componente']
+                    st.info(f"**Componentes:** {len(registros_por_componente)}")
                     
                     with st.expander("Ver componentes"):
-                        componentes_list = sorted(self.df['Componente'].dropna().unique())
-                        for comp in componentes_list:
-                            count = len(self.df[self.df['Componente'] == comp])
+                        for comp, count in registros_por_componente.items():
                             st.write(f"• **{comp}:** {count} registros")
+
+                if stats.get('anomalias'):
+                    st.warning(f"🚩 **{stats['anomalias']}** registros atípicos en "
+                               f"{stats['indicadores_con_anomalias']} indicadores (ver Gestión de Datos)")
+
+                self._render_alerts()
             else:
                 st.warning("📋 Google Sheets vacío")
             
@@ -1414,22 +1972,7 @@ class TabManager:
                     fichas_ok = False
                 
                 # Google Sheets
-                try:
-                    from google_sheets_manager import GoogleSheetsManager
-                    sheets_manager = GoogleSheetsManager()
-                    connection_info = sheets_manager.get_connection_info()
-                    
-                    if connection_info.get('connected', False):
-                        st.success("📝 Google Sheets: Conectado")
-                        if connection_info.get('fichas_available', False):
-                            st.success("📋 Pestaña 'Fichas': Disponible")
-                        else:
-                            st.warning("📋 Pestaña 'Fichas': No disponible")
-                    else:
-                        st.error("📝 Google Sheets: Desconectado")
-                        
-                except Exception:
-                    st.error("📝 Google Sheets: Error")
+                TabManager._render_sheets_status(self.source_info)
             
             # Controles
             st.markdown("### 🎛️ Controles")
@@ -1441,7 +1984,86 @@ class TabManager:
             
             if st.button("🧹 Limpiar Cache", key="sidebar_cache", width='stretch'):
                 st.cache_data.clear()
+                clear_dataset_artifacts()
                 st.session_state.clear()
                 st.success("Cache limpiado")
                 time.sleep(1)
                 st.rerun()
+
+    def _render_alerts(self):
+        """
+        Indicador de alertas por umbral: lee el historial que se actualiza al publicar
+        cada versión del dataset (data_refresh.record_alerts), sin evaluar las reglas aquí
+        """
+        historial, resumen = current_alerts()
+        if resumen['evaluada_en'] is None:
+            return
+
+        # Con varias entidades solo se muestran las de la entidad seleccionada
+        entidades = entity_names(self.df)
+        if entidades and not historial.empty:
+            historial = historial[historial['Entidad'].isin(entidades) | historial['Entidad'].isna()]
+        activas = historial[historial['Estado'] == 'Activa']
+
+        if activas.empty:
+            st.success("🔔 Sin alertas activas")
+            return
+
+        nuevas = int((activas['Primera_Vez'] == resumen['evaluada_en']).sum())
+        etiqueta = f"🔔 **{len(activas)}** alertas activas"
+        if nuevas:
+            etiqueta += f" ({nuevas} nuevas)"
+        if (activas['Severidad'] == 'alta').any():
+            st.error(etiqueta)
+        else:
+            st.warning(etiqueta)
+
+        with st.expander("Ver alertas"):
+            tabla = historial.copy()
+            for columna in ('Primera_Vez', 'Ultima_Vez', 'Resuelta_En'):
+                tabla[columna] = (pd.to_datetime(tabla[columna].astype(float), unit='s', utc=True)
+                                  .dt.tz_convert('America/Bogota').dt.tz_localize(None))
+            tabla['Elemento'] = tabla['Indicador'].fillna(tabla['Componente'])
+            st.dataframe(
+                tabla[['Estado', 'Descripcion', 'Elemento', 'Valor', 'Umbral', 'Primera_Vez', 'Ultima_Vez']],
+                column_config={
+                    'Descripcion': st.column_config.TextColumn("Alerta"),
+                    'Valor': st.column_config.NumberColumn("Valor", format="%.2f"),
+                    'Umbral': st.column_config.NumberColumn("Umbral", format="%.2f"),
+                    'Primera_Vez': st.column_config.DatetimeColumn("Primera vez", format="DD/MM/YYYY HH:mm"),
+                    'Ultima_Vez': st.column_config.DatetimeColumn("Última vez", format="DD/MM/YYYY HH:mm")
+                },
+                hide_index=True,
+                width='stretch'
+            )
+
+    @staticmethod
+    @st.fragment
+    def _render_sheets_status(source_info=None):
+        """
+        Estado de la conexión con Google Sheets. Reutiliza la información obtenida
+        al cargar los datos; abrir una conexión nueva solo ocurre a pedido del
+        usuario (fragmento: el botón no re-ejecuta toda la app).
+        """
+        connection_info = (source_info or {}).get('connection_info')
+
+        if st.button("Comprobar conexión", key="sidebar_check_sheets", width='stretch'):
+            try:
+                from google_sheets_manager import GoogleSheetsManager
+                connection_info = GoogleSheetsManager().get_connection_info()
+            except Exception:
+                st.error("📝 Google Sheets: Error")
+                return
+
+        if connection_info is None:
+            st.info("📝 Google Sheets: Sin verificar")
+            return
+
+        if connection_info.get('connected', False):
+            st.success("📝 Google Sheets: Conectado")
+            if connection_info.get('fichas_available', False):
+                st.success("📋 Pestaña 'Fichas': Disponible")
+            else:
+                st.warning("📋 Pestaña 'Fichas': No disponible")
+        else:
+            st.error("📝 Google Sheets: Desconectado")
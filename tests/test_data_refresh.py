@@ -0,0 +1,147 @@
+"""
+Pruebas de la publicación de versiones del refresco en segundo plano
+(data_refresh.BackgroundRefresher): una carga fallida nunca reemplaza la versión
+publicada ni resuelve las alertas. Las cargas fallidas pasan por el camino real
+(load_dataset_snapshot → load_entities_dataset) con gestores de Sheets sin conexión
+"""
+
+import threading
+import time
+import pandas as pd
+import pytest
+import data_refresh
+from data_refresh import (BackgroundRefresher, DatasetSnapshot, load_dataset_snapshot, load_failure,
+                          load_shared_snapshot, record_alerts)
+from data_utils import DataLoader
+from engine.errors import SourceUnavailableError
+from engine.sheets import GoogleSheetsManager
+
+def _snapshot(version, df=None, fingerprint=None, error=None):
+    if df is None:
+        df = pd.DataFrame({'COD': ['A1'], 'Fecha': [pd.Timestamp('2024-01-01')], 'Valor': [1.0]})
+    fingerprint = {'indicadores': 'i', 'derivados': f"d{version}"} if fingerprint is None else fingerprint
+    return DatasetSnapshot(df, None, {}, version, time.time(), fingerprint, error=error)
+
+class _SinConexion(DataLoader):
+    """DataLoader con gestores de Sheets que no pueden conectarse (sin credenciales)"""
+
+    entidades = ('ICE',)
+
+    def __init__(self):
+        self.df = None
+        self.fingerprint = {}
+        self.sheets_managers = {}
+        for entidad in self.entidades:
+            gestor = GoogleSheetsManager({})
+            gestor.spreadsheet_url = f"https://sin-conexion/{entidad}"
+            self.sheets_managers[entidad] = gestor
+        self.sheets_manager = next(iter(self.sheets_managers.values()))
+
+@pytest.fixture
+def sin_conexion(monkeypatch):
+    """Loader del refrescador cuya lectura de Sheets falla sin última lectura correcta"""
+    monkeypatch.setattr(data_refresh, 'DataLoader', _SinConexion)
+    return load_dataset_snapshot
+
+class _LibroSinEscrituras:
+    huella = None
+
+    def update(self, *args, **kwargs):
+        raise AssertionError("Una carga fallida no debe actualizar el historial de alertas")
+
+@pytest.fixture
+def alertas(monkeypatch):
+    registradas = []
+    monkeypatch.setattr(data_refresh, 'record_alerts', lambda snapshot, **kwargs: registradas.append(snapshot))
+    return registradas
+
+def test_lectura_fallida_por_el_camino_real(sin_conexion):
+    fallida = sin_conexion(1)
+
+    assert fallida.df.empty
+    assert fallida.read_failed
+    assert fallida.fingerprint.get('indicadores') is None
+    assert load_failure(fallida) is not None
+
+def test_load_failure():
+    assert load_failure(_snapshot(1)) is None
+    assert load_failure(_snapshot(1, error=SourceUnavailableError("sin conexión"))) is not None
+    # Una hoja leída que de verdad está vacía sí es una versión válida
+    assert load_failure(_snapshot(1, df=pd.DataFrame(columns=['COD']), fingerprint={'indicadores': 'i'})) is None
+
+@pytest.mark.parametrize('entidades', [('ICE',), ('ICE', 'Otra')])
+def test_refresco_fallido_conserva_la_version(alertas, sin_conexion, monkeypatch, entidades):
+    monkeypatch.setattr(_SinConexion, 'entidades', entidades)
+    refresher = BackgroundRefresher(60, loader=sin_conexion)
+    buena = refresher._publish(_snapshot(1))
+
+    with pytest.raises(SourceUnavailableError):
+        refresher.refresh_now()
+
+    assert refresher.current() is buena
+    assert refresher.last_error
+    assert alertas == [buena]
+
+def test_alertas_ignoran_cargas_fallidas(monkeypatch, sin_conexion):
+    monkeypatch.setattr(data_refresh, '_ALERT_LEDGER', _LibroSinEscrituras())
+    record_alerts(sin_conexion(1))
+    record_alerts(_snapshot(1, error=SourceUnavailableError("sin conexión")))
+
+def test_arranque_desde_artefactos_conserva_la_version_si_falla_el_refresco(monkeypatch, alertas, sin_conexion):
+    artefactos = _snapshot(1)
+    monkeypatch.setattr(data_refresh, 'load_artifact_snapshot', lambda version: artefactos)
+    hilos, refrescar = [], BackgroundRefresher._refresh_async
+    monkeypatch.setattr(BackgroundRefresher, '_refresh_async', lambda self: hilos.append(refrescar(self)))
+    refresher = BackgroundRefresher(60, loader=sin_conexion)
+
+    assert refresher.boot_from_artifacts() is artefactos
+    hilos[0].join(5)
+
+    assert refresher.current() is artefactos
+    assert refresher.last_error
+
+def test_verificacion_fallida_no_compara_ni_publica(alertas, sin_conexion):
+    refresher = BackgroundRefresher(60, loader=sin_conexion)
+    local = refresher._publish(_snapshot(1))
+
+    refresher._verify_async(['A1'], local).join(5)
+
+    assert refresher.current() is local
+    assert refresher.last_verification['coincide'] is None
+    assert refresher.last_error.startswith("Verificación")
+
+def test_verificacion_compara_la_lectura(alertas):
+    leido = _snapshot(2)
+    refresher = BackgroundRefresher(60, loader=lambda version: leido)
+    local = refresher._publish(_snapshot(1))
+
+    refresher._verify_async(['A1'], local).join(5)
+
+    assert refresher.current() is leido
+    assert refresher.last_verification['coincide'] is True
+
+def test_carga_directa_y_refresco_comparten_la_carga(monkeypatch, alertas):
+    cargas, liberar = [], threading.Event()
+
+    def lenta(version):
+        cargas.append(version)
+        liberar.wait(5)
+        return _snapshot(version)
+
+    monkeypatch.setattr(data_refresh, 'dataset_key', lambda: 'dataset')
+    monkeypatch.setattr(data_refresh, 'load_dataset_snapshot', lenta)
+    refresher = BackgroundRefresher(60, loader=lenta, key=data_refresh.dataset_key())
+    directa = threading.Thread(target=load_shared_snapshot)
+    directa.start()
+    while not cargas:
+        time.sleep(0.01)
+    refresco = threading.Thread(target=refresher.refresh_now)
+    refresco.start()
+    time.sleep(0.1)
+    liberar.set()
+    directa.join(5)
+    refresco.join(5)
+
+    assert cargas == [0]
+    # La carga compartida se publica con la versión del refrescador
+    assert refresher.current().version == 1
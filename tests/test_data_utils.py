@@ -0,0 +1,34 @@
+"""
+Pruebas de los derivados compartidos entre sesiones (data_utils.DatasetArtifacts)
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from data_utils import DatasetArtifacts
+
+def _dataset():
+    return pd.DataFrame({
+        'COD': ['A1', 'A1', 'B1'],
+        'Indicador': ['Indicador A', 'Indicador A', 'Indicador B'],
+        'Componente': ['Datos', 'Datos', 'Seguridad'],
+        'Categoria': ['01', '01', '02'],
+        'Fecha': pd.to_datetime(['2023-01-01', '2024-01-01', '2024-01-01']),
+        'Valor': [1.0, 2.0, 3.0],
+        'Valor_Normalizado': [0.5, 0.6, 0.7],
+        'Meta': [4.0, 4.0, np.nan],
+        'Peso': [1.0, 1.0, 2.0]
+    })
+
+def test_las_tablas_entregadas_son_copias():
+    artifacts = DatasetArtifacts(_dataset())
+    latest = artifacts.get('latest')
+    latest.loc[:, 'Valor_Normalizado'] = 0.0
+    latest.drop(index=latest.index, inplace=True)
+
+    assert artifacts.get('latest')['Valor_Normalizado'].tolist() == [0.6, 0.7]
+
+def test_los_vectores_compartidos_son_de_solo_lectura():
+    base = DatasetArtifacts(_dataset()).get('scenario_base')
+    with pytest.raises(ValueError):
+        base.meta[0] = 10.0
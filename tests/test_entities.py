@@ -0,0 +1,44 @@
+"""
+Pruebas de la unión de entidades (engine.entities): una sola entidad se devuelve sin
+cambios y las hojas Fichas ya traen su propia columna 'Entidad'
+"""
+
+import pandas as pd
+from engine.entities import ENTITY_COLUMN, FICHAS_ENTITY_COLUMN, filter_entity, merge_entity_results
+from engine.pipeline import LoadResult
+
+def _resultado(cod, responsable):
+    df = pd.DataFrame({'COD': [cod], 'Fecha': [pd.Timestamp('2024-01-01')], 'Valor': [1.0]})
+    fichas = pd.DataFrame({'Codigo': [cod], 'Entidad': [responsable], 'Nombre': [f"Indicador {cod}"]})
+    huella = {'dataset': f"d-{cod}", 'indicadores': f"i-{cod}"}
+    return LoadResult(df, fichas, huella)
+
+def test_una_entidad_devuelve_su_resultado_sin_cambios():
+    resultado = _resultado('A1', 'Ministerio')
+    unido = merge_entity_results({'ICE': resultado})
+
+    assert unido is resultado
+    assert ENTITY_COLUMN not in unido.df.columns
+    assert unido.fingerprint == {'dataset': 'd-A1', 'indicadores': 'i-A1'}
+
+def test_varias_entidades_conservan_la_entidad_responsable():
+    unido = merge_entity_results({
+        'ICE': _resultado('A1', 'Ministerio'),
+        'Otra': _resultado('B1', 'Secretaría')
+    })
+
+    assert list(unido.df[ENTITY_COLUMN]) == ['ICE', 'Otra']
+    assert list(unido.fichas_data['Entidad']) == ['Ministerio', 'Secretaría']
+    assert list(unido.fichas_data[FICHAS_ENTITY_COLUMN]) == ['ICE', 'Otra']
+
+def test_filtrar_fichas_por_entidad_de_origen():
+    unido = merge_entity_results({
+        'ICE': _resultado('A1', 'Ministerio'),
+        'Otra': _resultado('B1', 'Secretaría')
+    })
+
+    fichas = filter_entity(unido.fichas_data, 'Otra')
+    assert list(fichas['Codigo']) == ['B1']
+    assert list(fichas['Entidad']) == ['Secretaría']
+    assert FICHAS_ENTITY_COLUMN not in fichas.columns
+    assert list(filter_entity(unido.df, 'Otra')['COD']) == ['B1']
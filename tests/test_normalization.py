@@ -0,0 +1,92 @@
+"""
+Pruebas de los kernels vectorizados de normalización (engine.normalization) contra
+la normalización anterior, indicador por indicador y fila por fila
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from engine.normalization import NormalizationEngine
+
+CALCULOS = ['', np.nan, 3, ' Promedio', 'ACUMULADO', 'promedio', 'acumulado', 'otro']
+
+def _dataset(semilla=7, n_codigos=40):
+    rng = np.random.default_rng(semilla)
+    filas = []
+    for i in range(n_codigos):
+        meta = rng.choice([np.nan, 0.0, 50.0, 120.0])
+        n = 1 if i % 10 == 0 else int(rng.integers(2, 25))
+        fechas = pd.to_datetime({'year': rng.integers(2015, 2025, n), 'month': rng.integers(1, 13, n), 'day': 1})
+        valores = np.round(rng.uniform(0, 150, n), 2)
+        valores[rng.random(n) < 0.15] = np.nan
+        if i % 13 == 0:
+            valores[:] = np.nan
+        elif i % 7 == 0:
+            valores[:] = 42.0
+        for fecha, valor in zip(fechas, valores):
+            filas.append({'COD': f"C{i}", 'Fecha': fecha, 'Valor': valor, 'Meta': meta,
+                          'Calculo': CALCULOS[i % len(CALCULOS)]})
+    return pd.DataFrame(filas).sample(frac=1, random_state=semilla).reset_index(drop=True)
+
+def _escala(valor, meta, valores):
+    if pd.notna(meta) and meta > 0:
+        return min(1.0, max(0.0, valor / meta))
+    rango = valores.max() - valores.min()
+    if len(valores) > 1 and rango > 0:
+        return min(1.0, max(0.0, (valor - valores.min()) / rango))
+    return 0.7
+
+def _normalizacion_por_filas(df):
+    """Normalización anterior: un COD y una fila a la vez (Calculo no textual: estándar)"""
+    resultado = pd.Series(np.nan, index=df.index)
+    for _, datos in df.groupby('COD', sort=False):
+        valores = datos['Valor'].dropna()
+        if valores.empty:
+            continue
+        meta, calculo = datos['Meta'].iloc[0], datos['Calculo'].iloc[0]
+        calculo = calculo.lower().strip() if isinstance(calculo, str) else ''
+        años = datos['Fecha'].dt.year
+        sumas = [datos.loc[años.between(año - 3, año), 'Valor'].sum() for año in años.unique()]
+
+        for index, fila in datos.iterrows():
+            ventana = datos.loc[años.between(años[index] - 3, años[index]), 'Valor']
+            if calculo == 'promedio':
+                normalizados = [_escala(valor, meta, valores) for valor in ventana.dropna()]
+                resultado[index] = sum(normalizados) / len(normalizados) if normalizados else 0.7
+            elif calculo == 'acumulado':
+                suma = ventana.sum()
+                if pd.notna(meta) and meta > 0:
+                    resultado[index] = min(1.0, max(0.0, suma / (meta * 4)))
+                elif len(sumas) > 1 and max(sumas) > min(sumas):
+                    resultado[index] = min(1.0, max(0.0, (suma - min(sumas)) / (max(sumas) - min(sumas))))
+                else:
+                    resultado[index] = 0.7
+            elif pd.notna(fila['Valor']):
+                resultado[index] = _escala(fila['Valor'], meta, valores)
+    return resultado.to_numpy()
+
+@pytest.mark.parametrize('semilla', [7, 11, 23])
+def test_kernels_igual_que_la_normalizacion_por_filas(semilla):
+    df = _dataset(semilla)
+
+    np.testing.assert_allclose(NormalizationEngine.normalize(df), _normalizacion_por_filas(df),
+                               rtol=1e-12, atol=1e-12, equal_nan=True)
+
+@pytest.mark.parametrize('calculo', [np.nan, None, 3, 2.5])
+def test_calculo_no_textual_usa_la_estandar(calculo):
+    df = _dataset()
+    estandar = NormalizationEngine.normalize(df.assign(Calculo=''))
+
+    np.testing.assert_array_equal(NormalizationEngine.normalize(df.assign(Calculo=calculo)), estandar)
+
+@pytest.mark.parametrize('calculo', ['promedio', 'acumulado'])
+def test_filas_sin_fecha_en_estrategias_por_años(calculo):
+    df = pd.DataFrame({
+        'COD': ['A1'] * 3, 'Fecha': [pd.Timestamp('2023-01-01'), pd.NaT, pd.Timestamp('2024-01-01')],
+        'Valor': [10.0, 20.0, 30.0], 'Meta': [np.nan] * 3, 'Calculo': [calculo] * 3
+    })
+
+    normalizado = NormalizationEngine.normalize(df)
+
+    assert normalizado[1] == 0.7
+    np.testing.assert_allclose(normalizado[[0, 2]], _normalizacion_por_filas(df.drop(index=1))[[0, 1]])
@@ -0,0 +1,40 @@
+"""
+Pruebas de los escenarios (engine.scenarios) con indicadores cuya estrategia de
+normalización no reproduce la simulación
+"""
+
+import numpy as np
+import pytest
+from engine.scenarios import CALCULO_FIJO, ScenarioBase, ScenarioEngine
+
+def _base(calculos):
+    n = len(calculos)
+    uno = np.ones(n)
+    return ScenarioBase(
+        codigos=np.array([f"C{i}" for i in range(n)], dtype=object),
+        componentes=np.array(['Datos'] * n, dtype=object), categorias=np.array(['01'] * n, dtype=object),
+        valor=uno * 50, normalizado=uno * 0.5, meta=uno * 100, peso=uno,
+        calculo=np.array([ScenarioEngine._calculo_code(c) for c in calculos], dtype=np.int8),
+        hist_min=uno * 10, hist_max=uno * 90, hist_n=uno * 5, ventana=np.full((n, 1), 50.0),
+        suma_ventana=uno * 50, sumas_min=uno * 10, sumas_max=uno * 90, sumas_n=uno * 5
+    )
+
+def test_codigos_de_calculo():
+    assert [ScenarioEngine._calculo_code(c) for c in ('', None, 'Promedio ', 'acumulado', 'otro')] == [0, 0, 1, 2, 0]
+    assert ScenarioEngine._calculo_code('inverso') == CALCULO_FIJO
+    assert ScenarioEngine._calculo_code('mediana_movil') == CALCULO_FIJO
+
+@pytest.mark.parametrize('escenario', [{'Meta': {'C1': 80}}, {'Calculo': {'C1': 'promedio'}}])
+def test_cambios_rechazados_en_calculos_fijos(escenario):
+    with pytest.raises(ValueError):
+        ScenarioEngine.evaluate(_base(['', 'inverso']), [escenario])
+
+def test_peso_de_calculos_fijos_se_puede_cambiar():
+    resultado = ScenarioEngine.evaluate(_base(['', 'inverso']), [{}, {'Peso': {'C1': 3.0}}])
+    assert resultado['general'].tolist() == pytest.approx([0.5, 0.5])
+
+def test_plan_no_despeja_el_valor_de_calculos_fijos():
+    plan, _ = ScenarioEngine.plan_target(_base(['', 'inverso']), 1.0)
+    objetivo = plan.set_index('COD')['Valor_Objetivo']
+    assert objetivo['C0'] == pytest.approx(100.0)
+    assert np.isnan(objetivo['C1'])
@@ -0,0 +1,25 @@
+"""
+Pruebas del catálogo de indicadores (engine.scoring.ScoreEngine.build_indicator_catalog)
+"""
+
+import numpy as np
+import pandas as pd
+from engine.scoring import ScoreEngine
+
+def test_catalogo_toma_la_primera_fila_de_cada_cod():
+    df = pd.DataFrame({
+        'COD': ['B1', 'A1', 'A1', 'B1'],
+        'Indicador': ['Nombre B', None, 'Otro nombre A', 'Otro nombre B'],
+        'Componente': ['Datos', 'Datos', 'Seguridad', 'Datos'],
+        'Meta': [np.nan, 10.0, 20.0, 5.0]
+    })
+
+    catalogo = ScoreEngine.build_indicator_catalog(df)
+
+    assert list(catalogo.index) == ['A1', 'B1']
+    assert catalogo.loc['A1', 'Indicador'] is None
+    assert catalogo.loc['A1', 'Componente'] == 'Datos'
+    assert np.isnan(catalogo.loc['B1', 'Meta'])
+    assert catalogo.loc['B1', 'Indicador'] == 'Nombre B'
+    assert list(catalogo['Registros']) == [2, 2]
+    assert catalogo['Tipo'].isna().all()
@@ -0,0 +1,82 @@
+"""
+Pruebas del plazo de carga y de la saturación del pool de llamadas a Google Sheets
+(engine.sheets.GoogleSheetsManager._call)
+"""
+
+import threading
+import time
+import pytest
+from engine import sheets
+from engine.sheets import GoogleSheetsManager, SheetsCircuitOpen, SheetsDeadlineExceeded, load_deadline
+
+def _gestor(url):
+    gestor = GoogleSheetsManager({})
+    gestor.spreadsheet_url = url
+    return gestor
+
+@pytest.fixture
+def colgada():
+    """Llamada a Sheets que no vuelve hasta el final de la prueba"""
+    liberar = threading.Event()
+
+    def get_all_records():
+        liberar.wait(10)
+        return []
+
+    yield get_all_records
+    liberar.set()
+
+def test_plazo_de_carga_abre_el_circuito(colgada):
+    gestor = _gestor('https://plazo-de-carga')
+    inicio = time.monotonic()
+    with load_deadline(0.2):
+        with pytest.raises(SheetsDeadlineExceeded):
+            gestor._call(colgada)
+        # El resto de la carga no espera ni envía trabajo al pool
+        llamadas = []
+        with pytest.raises((SheetsCircuitOpen, SheetsDeadlineExceeded)):
+            gestor._call(llamadas.append, 1)
+        assert llamadas == []
+    with pytest.raises(SheetsCircuitOpen):
+        gestor._call(llamadas.append, 1)
+
+    assert time.monotonic() - inicio < gestor.timeout
+    assert sheets.get_circuit_breaker(gestor.spreadsheet_url).state == 'abierto'
+
+def test_pool_ocupado_no_recibe_mas_trabajo(colgada):
+    for i in range(sheets._SHEETS_WORKERS):
+        gestor = _gestor(f'https://colgada-{i}')
+        gestor.timeout = 0.05
+        with pytest.raises(SheetsDeadlineExceeded):
+            gestor._call(colgada)
+
+    llamadas = []
+    gestor = _gestor('https://otra')
+    gestor.timeout = 0.1
+    with pytest.raises(SheetsDeadlineExceeded):
+        gestor._call(llamadas.append, 1)
+    assert llamadas == []
+
+class _Pestaña:
+    def __init__(self, title, filas):
+        self.title = title
+        self.filas = filas
+        self.lecturas = 0
+
+    def get_all_records(self):
+        self.lecturas += 1
+        return list(self.filas)
+
+def test_carga_lee_fichas_una_vez():
+    from engine.pipeline import load_combined_dataset
+
+    gestor = _gestor('https://una-lectura')
+    gestor.connected = True
+    gestor.worksheet = _Pestaña('IndicadoresICE', [{'COD': 'A1', 'Valor': 1.0, 'Fecha': '1/01/2024'}])
+    gestor.fichas_worksheet = _Pestaña('Fichas', [{'COD': 'A1', 'Componente': 'Datos', 'Meta': 1.0}])
+
+    resultado = load_combined_dataset(gestor)
+
+    assert gestor.fichas_worksheet.lecturas == 1
+    assert gestor.worksheet.lecturas == 1
+    assert list(resultado.fichas_data.columns) == ['COD', 'Componente', 'Meta']